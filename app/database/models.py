@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from typing import Optional
-from sqlalchemy import BigInteger, Integer, String, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, CheckConstraint, func, Float, LargeBinary, JSON
+from sqlalchemy import BigInteger, Integer, String, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, CheckConstraint, Index, func, Float, LargeBinary, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .session import Base
@@ -29,8 +29,15 @@ class User(Base):
 
 class MessageLog(Base):
     __tablename__ = "messages"
+    # Составные индексы горячих запросов (см. app/database/queries.py).
+    # Отдельный индекс по chat_id не нужен — его заменяет префикс (chat_id, created_at).
+    __table_args__ = (
+        Index('ix_messages_chat_created', 'chat_id', 'created_at'),
+        Index('ix_messages_chat_topic_created', 'chat_id', 'topic_id', 'created_at'),
+        Index('ix_messages_chat_user_created', 'chat_id', 'user_id', 'created_at'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    chat_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
     message_id: Mapped[int] = mapped_column(BigInteger)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
     username: Mapped[Optional[str]] = mapped_column(String(64))
@@ -41,6 +48,39 @@ class MessageLog(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, index=True)
 
 
+class ChatActivityRollup(Base):
+    """Почасовые счётчики активности пользователя в чате (app/services/activity_rollup.py)."""
+    __tablename__ = "chat_activity_rollups"
+    __table_args__ = (
+        UniqueConstraint('chat_id', 'hour', 'user_id', name='uq_rollup_chat_hour_user'),
+        Index('ix_rollups_chat_user_hour', 'chat_id', 'user_id', 'hour'),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    hour: Mapped[datetime] = mapped_column(DateTime)  # начало часа, UTC
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    username: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+    text_count: Mapped[int] = mapped_column(Integer, default=0)  # сообщения с текстом
+    link_count: Mapped[int] = mapped_column(Integer, default=0)
+    toxic_count: Mapped[int] = mapped_column(Integer, default=0)
+    positive_count: Mapped[int] = mapped_column(Integer, default=0)
+    negative_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ChatKeywordRollup(Base):
+    """Почасовые счётчики ключевых слов чата (для горячих тем)."""
+    __tablename__ = "chat_keyword_rollups"
+    __table_args__ = (
+        UniqueConstraint('chat_id', 'hour', 'keyword', name='uq_keyword_rollup_chat_hour_keyword'),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    hour: Mapped[datetime] = mapped_column(DateTime)  # начало часа, UTC
+    keyword: Mapped[str] = mapped_column(String(64))
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
 class GameStat(Base):
     __tablename__ = "game_stats"
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
@@ -368,12 +408,32 @@ class Chat(Base):
     auto_reply_mode: Mapped[str] = mapped_column(String(20), default="text")  # text, voice, both (legacy/override)
     reactions_enabled: Mapped[bool] = mapped_column(Boolean, default=True)  # Включены ли реакции Олега
     persona: Mapped[str] = mapped_column(String(32), default="default")  # Персона Олега: default, oleg_legacy
+    message_retention_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Хранение лога сообщений (None = глобальная настройка, 0 = вечно)
 
     owner_user_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
 
 
+class ChatMembership(Base):
+    """
+    Статус пользователя в чате.
+    
+    Обновляется из апдейтов chat_member и сообщений (app/services/member_sync.py);
+    checked_at — последняя сверка через get_chat_member (курсор выборочной сверки).
+    """
+    __tablename__ = "chat_memberships"
+    __table_args__ = (
+        Index('ix_chat_memberships_checked_at', 'checked_at'),
+        Index('ix_chat_memberships_user_id', 'user_id'),
+    )
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)  # Telegram user ID
+    status: Mapped[str] = mapped_column(String(16), default="member")  # member, administrator, creator, restricted, left, kicked
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now)
+    checked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
 class Admin(Base):
     __tablename__ = "admins"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
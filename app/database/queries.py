@@ -0,0 +1,107 @@
+"""
+Горячие запросы к MessageLog.
+
+Каждый запрос построен под составной индекс таблицы messages:
+- равенство по chat_id (и topic_id / user_id) — префикс индекса
+- ORDER BY created_at DESC LIMIT N — обратный проход по тому же индексу,
+  без сортировки во временном B-дереве
+- выбираются только нужные колонки, а не целые ORM-объекты
+
+Регрессионный тест планов: tests/integration/test_message_indexes.py.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Select, func, select
+
+from .models import MessageLog
+
+
+def recent_chat_messages_query(
+    chat_id: int,
+    topic_id: Optional[int] = None,
+    limit: int = 15,
+    exclude_bot: bool = False,
+) -> Select:
+    """
+    Последние сообщения чата или топика (новые первыми).
+
+    Индекс: ix_messages_chat_created / ix_messages_chat_topic_created.
+    """
+    query = select(
+        MessageLog.user_id,
+        MessageLog.username,
+        MessageLog.text,
+        MessageLog.created_at,
+    ).where(MessageLog.chat_id == chat_id)
+
+    if topic_id is not None:
+        query = query.where(MessageLog.topic_id == topic_id)
+
+    # Сообщения бота (user_id == 0) отбрасываются при проходе по индексу
+    if exclude_bot:
+        query = query.where(MessageLog.user_id != 0)
+
+    return query.order_by(MessageLog.created_at.desc()).limit(limit)
+
+
+def private_chat_history_query(user_id: int, limit: int) -> Select:
+    """
+    Последние сообщения личного диалога (в ЛС chat_id == user_id).
+
+    Индекс: ix_messages_chat_created.
+    """
+    return (
+        select(MessageLog.user_id, MessageLog.username, MessageLog.text, MessageLog.message_id)
+        .where(MessageLog.chat_id == user_id)
+        .order_by(MessageLog.created_at.desc())
+        .limit(limit)
+    )
+
+
+def chat_messages_in_range_query(
+    chat_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    limit: int = 500,
+    exclude_bot: bool = False,
+) -> Select:
+    """
+    Последние текстовые сообщения чата за период (для горячих тем).
+
+    Индекс: ix_messages_chat_created (диапазон по created_at).
+    """
+    query = select(
+        MessageLog.message_id,
+        MessageLog.user_id,
+        MessageLog.username,
+        MessageLog.text,
+        MessageLog.created_at,
+    ).where(
+        MessageLog.chat_id == chat_id,
+        MessageLog.created_at >= start_time,
+        MessageLog.created_at < end_time,
+        MessageLog.text.isnot(None),
+    )
+
+    # Ответы бота (user_id == 0) в темы не попадают
+    if exclude_bot:
+        query = query.where(MessageLog.user_id != 0)
+
+    return query.order_by(MessageLog.created_at.desc()).limit(limit)
+
+
+def user_message_stats_query(chat_id: int, user_id: int) -> Select:
+    """
+    Количество сообщений пользователя в чате и дата первого — одним запросом.
+
+    Индекс: ix_messages_chat_user_created (покрывающий, таблица не читается).
+    """
+    return select(
+        func.count(),
+        func.min(MessageLog.created_at),
+    ).where(
+        MessageLog.chat_id == chat_id,
+        MessageLog.user_id == user_id,
+    )
@@ -1,10 +1,15 @@
 import os
 import pathlib
+import logging
+import time
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class Base(DeclarativeBase):
     pass
@@ -12,6 +17,10 @@ class Base(DeclarativeBase):
 _engine: AsyncEngine | None = None
 _async_session: async_sessionmaker[AsyncSession] | None = None
 
+# Отдельный read-only пул для SQLite (WAL позволяет параллельных читателей)
+_read_engine: AsyncEngine | None = None
+_read_session: async_sessionmaker[AsyncSession] | None = None
+
 
 def _ensure_data_dir():
     if settings.database_url.startswith("sqlite"):
@@ -19,8 +28,92 @@ def _ensure_data_dir():
         path.mkdir(parents=True, exist_ok=True)
 
 
+def _is_sqlite_file(url: str) -> bool:
+    """SQLite с файлом на диске (не :memory:) — только для него имеет смысл read-пул."""
+    parsed = make_url(url)
+    if not parsed.drivername.startswith("sqlite"):
+        return False
+    database = parsed.database or ""
+    return bool(database) and database != ":memory:" and parsed.query.get("mode") != "memory"
+
+
+def _read_only_url(url: str):
+    """URL того же файла в режиме ``mode=ro`` через URI-имя SQLite."""
+    parsed = make_url(url)
+    return parsed.set(
+        database=f"file:{parsed.database}",
+        query={**parsed.query, "mode": "ro", "uri": "true"},
+    )
+
+
+def _sqlite_pragmas(read_only: bool) -> list[str]:
+    """PRAGMA для каждого нового соединения (они действуют на соединение, не на файл)."""
+    pragmas = [
+        "PRAGMA cache_size=-64000",  # 64MB cache
+        "PRAGMA busy_timeout=30000",  # 30s timeout
+        f"PRAGMA temp_store={settings.sqlite_temp_store.upper()}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        # WAL хранится в файле БД, но включить его можно только с пишущего соединения
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+        pragmas.insert(1, "PRAGMA synchronous=NORMAL")
+    return pragmas
+
+
+def _install_sqlite_pragmas(engine: AsyncEngine, read_only: bool = False) -> None:
+    """Выполнять PRAGMA на каждом соединении пула, а не только на первом."""
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+async def enable_incremental_auto_vacuum(engine: AsyncEngine, min_free_ratio: float) -> str | None:
+    """
+    Перевести файл SQLite в auto_vacuum=INCREMENTAL (при запуске, до работы бота).
+
+    Новая пустая база переводится сразу. Существующей нужен полный VACUUM
+    (эксклюзивная блокировка на время перестройки файла) — только если
+    свободные страницы составляют не меньше min_free_ratio файла. Дальше
+    место возвращает ``PRAGMA incremental_vacuum`` (message_retention).
+
+    Returns:
+        "incremental" (уже), "new", "vacuum" или None (не переведён)
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() == 2:
+            return "incremental"
+        # Пустой файл (первый запуск) перестраивается мгновенно
+        is_new = not (await conn.exec_driver_sql("SELECT count(*) FROM sqlite_master")).scalar()
+        freelist = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar() or 0
+        page_count = (await conn.exec_driver_sql("PRAGMA page_count")).scalar() or 0
+        if not is_new and (not page_count or freelist / page_count < min_free_ratio):
+            return None
+        started = time.perf_counter()
+        # В режиме WAL auto_vacuum меняется только через VACUUM, даже на новом файле
+        await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        await conn.exec_driver_sql("VACUUM")
+        if is_new:
+            return "new"
+        logger.info(
+            f"SQLite converted to incremental auto_vacuum: {freelist}/{page_count} free pages "
+            f"({time.perf_counter() - started:.1f}s)"
+        )
+        return "vacuum"
+
+
 async def init_db():
-    global _engine, _async_session
+    global _engine, _async_session, _read_engine, _read_session
     _ensure_data_dir()
     
     # Connection pool settings (важно для PostgreSQL, для SQLite игнорируется)
@@ -35,8 +128,9 @@ async def init_db():
         }
     else:
         pool_settings = {
-            "pool_size": 10,           # Базовый размер пула
-            "max_overflow": 20,        # Дополнительные соединения при нагрузке
+            "pool_size": settings.db_pool_size,          # Базовый размер пула
+            "max_overflow": settings.db_max_overflow,    # Дополнительные соединения при нагрузке
+            "pool_timeout": settings.db_pool_timeout,    # Ожидание свободного соединения
             "pool_pre_ping": True,     # Проверка живости соединения
             "pool_recycle": 3600,      # Пересоздавать соединения каждый час
         }
@@ -49,18 +143,58 @@ async def init_db():
         **pool_settings
     )
     _async_session = async_sessionmaker(_engine, expire_on_commit=False)
+    
+    # WAL, кэш, mmap и temp_store на каждом соединении SQLite
+    if settings.database_url.startswith("sqlite"):
+        _install_sqlite_pragmas(_engine)
+    
+    # Счётчики запросов/пула для UnitOfWork и метрик
+    from .unit_of_work import instrument_engine
+    instrument_engine(_engine)
+
+    # Возврат места после очистки сообщений — инкрементально, без периодического VACUUM
+    if _is_sqlite_file(settings.database_url):
+        try:
+            await enable_incremental_auto_vacuum(_engine, settings.sqlite_vacuum_freelist_ratio)
+        except Exception as e:
+            logger.warning(f"SQLite auto_vacuum conversion skipped: {e}")
 
     # import models and create tables
     from . import models  # noqa: F401
     async with _engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-        
-        # Enable WAL mode for SQLite (better concurrency)
-        if settings.database_url.startswith("sqlite"):
-            await conn.execute(text("PRAGMA journal_mode=WAL"))
-            await conn.execute(text("PRAGMA synchronous=NORMAL"))
-            await conn.execute(text("PRAGMA cache_size=-64000"))  # 64MB cache
-            await conn.execute(text("PRAGMA busy_timeout=30000"))  # 30s timeout
+    
+    # Read-only пул: тяжёлые выборки не занимают соединения писателя
+    if _is_sqlite_file(settings.database_url) and settings.sqlite_read_pool_size > 0:
+        _read_engine = create_async_engine(
+            _read_only_url(settings.database_url),
+            echo=False,
+            connect_args=connect_args,
+            pool_size=settings.sqlite_read_pool_size,
+            max_overflow=0,
+            pool_timeout=settings.db_pool_timeout,
+        )
+        _install_sqlite_pragmas(_read_engine, read_only=True)
+        instrument_engine(_read_engine)
+        _read_session = async_sessionmaker(_read_engine, expire_on_commit=False)
+        logger.info(
+            f"SQLite read pool enabled: {settings.sqlite_read_pool_size} connections "
+            f"(mmap_size={settings.sqlite_mmap_size}, temp_store={settings.sqlite_temp_store})"
+        )
+    else:
+        _read_engine = None
+        _read_session = None
+
+
+async def close_db():
+    """Закрыть пулы соединений (писатель и read-only)."""
+    global _read_engine, _read_session
+    if _read_engine is not None:
+        await _read_engine.dispose()
+        _read_engine = None
+        _read_session = None
+    if _engine is not None:
+        await _engine.dispose()
 
 
 def get_session() -> async_sessionmaker[AsyncSession]:
@@ -68,6 +202,19 @@ def get_session() -> async_sessionmaker[AsyncSession]:
     return _async_session
 
 
+def get_read_session() -> async_sessionmaker[AsyncSession]:
+    """
+    Фабрика сессий для тяжёлых выборок (статистика, сводки).
+    
+    Для файловой SQLite — отдельный read-only пул, который читает снимок WAL
+    параллельно с вставками. Для PostgreSQL или при выключенном пуле —
+    обычная фабрика get_session(). Писать через эти сессии нельзя.
+    """
+    if _read_session is not None:
+        return _read_session
+    return get_session()
+
+
 def async_session() -> AsyncSession:
     """Контекстный менеджер для получения сессии БД.
     
@@ -0,0 +1,308 @@
+"""
+Unit of Work и инструментирование запросов к БД.
+
+Один апдейт Telegram = одна единица работы:
+- UnitOfWorkMiddleware открывает UnitOfWork на весь апдейт и кладёт его
+  в data["uow"] (хендлеры получают его параметром ``uow``)
+- Сервисы используют ``session_scope()``: внутри активной единицы работы
+  это общая сессия, вне её — как раньше, отдельная сессия из get_session().
+  Транзакция не переживает scope: на выходе она коммитится (при ошибке —
+  откатывается), соединение возвращается в пул, а объекты отсоединяются
+  от сессии — следующий scope читает строки из БД, а не из identity map
+- События SQLAlchemy считают запросы, время запросов и checkout'ы пула
+  в рамках текущего апдейта (contextvars) и глобально
+- Если апдейт сделал больше ``settings.db_query_warn_threshold`` запросов,
+  пишется предупреждение о N+1 с самыми повторяющимися запросами
+
+Usage:
+    from app.database.unit_of_work import session_scope
+
+    async with session_scope() as session:
+        result = await session.execute(select(User).where(...))
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина SQL в статистике повторов
+_STATEMENT_KEY_LENGTH = 200
+
+
+@dataclass
+class QueryStats:
+    """Статистика запросов в рамках одного апдейта/задачи."""
+    label: str = ""
+    query_count: int = 0
+    query_time: float = 0.0
+    pool_checkouts: int = 0
+    statements: Counter = field(default_factory=Counter)
+
+    def most_repeated(self, limit: int = 3) -> list[tuple[str, int]]:
+        """Самые частые запросы (кандидаты на N+1)."""
+        return [(sql, n) for sql, n in self.statements.most_common(limit) if n > 1]
+
+
+class DatabaseMetrics:
+    """Глобальные счётчики БД (синхронные — обновляются из событий SQLAlchemy)."""
+
+    def __init__(self):
+        self.total_queries = 0
+        self.total_query_time = 0.0
+        self.pool_checkouts = 0
+        self.pool_checked_out = 0
+        self.units_of_work = 0
+        self.n_plus_one_warnings = 0
+
+    def snapshot(self) -> dict:
+        """Текущие значения для /health и Prometheus."""
+        return {
+            "total_queries": self.total_queries,
+            "total_query_time": round(self.total_query_time, 4),
+            "pool_checkouts": self.pool_checkouts,
+            "pool_checked_out": self.pool_checked_out,
+            "units_of_work": self.units_of_work,
+            "n_plus_one_warnings": self.n_plus_one_warnings,
+        }
+
+    def reset(self) -> None:
+        """Сбросить счётчики (для тестов)."""
+        self.__init__()
+
+
+# Глобальные метрики БД
+db_metrics = DatabaseMetrics()
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+_current_uow: ContextVar[Optional["UnitOfWork"]] = ContextVar("db_unit_of_work", default=None)
+
+# Движки, на которые уже повешены события
+_instrumented_engines: set[int] = set()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Подключить счётчики запросов и пула к движку (идемпотентно).
+
+    Args:
+        engine: Async-движок SQLAlchemy
+    """
+    sync_engine = engine.sync_engine
+    if id(sync_engine) in _instrumented_engines:
+        return
+    _instrumented_engines.add(id(sync_engine))
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+        db_metrics.total_queries += 1
+        db_metrics.total_query_time += elapsed
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.query_count += 1
+            stats.query_time += elapsed
+            stats.statements[statement[:_STATEMENT_KEY_LENGTH]] += 1
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        db_metrics.pool_checkouts += 1
+        db_metrics.pool_checked_out += 1
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.pool_checkouts += 1
+
+    @event.listens_for(sync_engine.pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        db_metrics.pool_checked_out = max(0, db_metrics.pool_checked_out - 1)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Статистика запросов текущего апдейта (или None вне track_queries)."""
+    return _current_stats.get()
+
+
+def current_unit_of_work() -> Optional["UnitOfWork"]:
+    """Активная единица работы текущего апдейта (или None)."""
+    uow = _current_uow.get()
+    if uow is None or uow.closed:
+        return None
+    return uow
+
+
+def _query_warn_threshold() -> int:
+    from app.config import settings
+    return settings.db_query_warn_threshold
+
+
+@asynccontextmanager
+async def track_queries(label: str, warn_threshold: Optional[int] = None) -> AsyncIterator[QueryStats]:
+    """
+    Считать запросы к БД внутри блока и предупредить о N+1.
+
+    Args:
+        label: Что выполняется (команда, тип апдейта, имя задачи)
+        warn_threshold: Порог запросов (по умолчанию settings.db_query_warn_threshold)
+
+    Yields:
+        QueryStats, наполняемый по мере выполнения запросов
+    """
+    stats = QueryStats(label=label)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        threshold = warn_threshold if warn_threshold is not None else _query_warn_threshold()
+        if threshold and stats.query_count > threshold:
+            db_metrics.n_plus_one_warnings += 1
+            repeated = "; ".join(f"{n}x {sql[:80]}" for sql, n in stats.most_repeated())
+            logger.warning(
+                f"[DB N+1] {label}: {stats.query_count} queries "
+                f"({stats.query_time * 1000:.1f}ms, {stats.pool_checkouts} checkouts) "
+                f"> {threshold}. Repeated: {repeated or 'none'}"
+            )
+
+
+class UnitOfWork:
+    """
+    Единица работы: одна лениво открываемая сессия на апдейт.
+
+    Сессия создаётся при первом обращении; каждый session_scope() коммитит
+    свою транзакцию на выходе, так что соединение не держится, пока
+    хендлер ждёт LLM. Общую сессию использует только задача, открывшая
+    единицу работы: другие задачи (asyncio.gather в хендлере, фоновые
+    задачи через create_task — они наследуют contextvars) получают
+    отдельную сессию.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], AsyncSession]] = None):
+        """
+        Args:
+            session_factory: Фабрика сессий (по умолчанию get_session())
+        """
+        if session_factory is None:
+            from app.database.session import get_session
+            session_factory = get_session()
+        self.session_factory = session_factory
+        self.closed = False
+        self._session: Optional[AsyncSession] = None
+        self._lock = asyncio.Lock()
+        self._owner: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._token = None
+
+    @property
+    def session(self) -> AsyncSession:
+        """Общая сессия единицы работы (открывается при первом обращении)."""
+        if self.closed:
+            raise RuntimeError("UnitOfWork is closed")
+        if self._session is None:
+            self._session = self.session_factory()
+        return self._session
+
+    async def commit(self) -> None:
+        """Закоммитить изменения общей сессии (если она открыта)."""
+        if self._session is not None:
+            await self._session.commit()
+
+    async def rollback(self) -> None:
+        """Откатить изменения общей сессии (если она открыта)."""
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        """Закрыть сессию; после этого session_scope() снова выдаёт отдельные сессии."""
+        async with self._lock:
+            self.closed = True
+            if self._session is not None:
+                session, self._session = self._session, None
+                await session.close()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        db_metrics.units_of_work += 1
+        self._task = asyncio.current_task()
+        self._token = _current_uow.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            async with self._lock:
+                if self._session is not None:
+                    if exc_type is None and self._session.in_transaction():
+                        await self._session.commit()
+                    elif exc_type is not None:
+                        await self._session.rollback()
+        finally:
+            await self.close()
+            _current_uow.reset(self._token)
+
+
+@asynccontextmanager
+async def session_scope(session: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для сервисного кода.
+
+    Если вызывающий передал свою сессию, она отдаётся как есть (транзакцией
+    управляет он).
+    Внутри активной UnitOfWork (в задаче апдейта) — общая сессия: на
+    выходе транзакция коммитится, при исключении откатывается только она,
+    объекты отсоединяются от сессии, сама сессия остаётся открытой.
+    Иначе — новая сессия из get_session(), закрываемая на выходе.
+    Повторный вход из той же задачи переиспользует общую сессию
+    (транзакцию завершает внешний scope).
+    """
+    if session is not None:
+        yield session
+        return
+
+    uow = current_unit_of_work()
+    task = asyncio.current_task()
+
+    if uow is not None and uow._owner is task and task is not None:
+        # Вложенный вызов из той же задачи
+        yield uow.session
+        return
+
+    # Другие задачи (gather, create_task) не трогают общую сессию
+    if uow is None or task is None or uow._task is not task or uow._lock.locked():
+        factory = uow.session_factory if uow is not None else None
+        if factory is None:
+            from app.database.session import get_session
+            factory = get_session()
+        async with factory() as session:
+            yield session
+        return
+
+    async with uow._lock:
+        uow._owner = task
+        try:
+            session = uow.session
+            try:
+                yield session
+            except BaseException:
+                await session.rollback()
+                raise
+            # Не держим транзакцию (и соединение пула) до конца апдейта
+            if session.in_transaction():
+                await session.commit()
+        finally:
+            # Как при закрытии отдельной сессии: загруженные объекты остаются
+            # читаемыми, но следующий scope не получит их из identity map
+            # вместо строки, которую за это время изменила другая сессия
+            session.expunge_all()
+            uow._owner = None
@@ -0,0 +1,187 @@
+"""
+Write Queue - единственный сериализованный писатель с пакетными коммитами.
+
+В SQLite одновременно пишет только одно соединение, а каждый коммит в WAL —
+это fsync-барьер. Вместо INSERT + COMMIT на каждое входящее сообщение
+строки (MessageLog и т.п.) складываются в очередь, а одна фоновая задача
+коммитит их пачками: до ``settings.sqlite_write_batch_size`` строк или
+по истечении ``settings.sqlite_write_batch_delay_ms``.
+
+Если очередь не запущена (скрипты, тесты), add() пишет строку сразу.
+
+Usage:
+    from app.database.write_queue import write_queue
+
+    await write_queue.add(MessageLog(...))
+    await write_queue.flush()  # дождаться записи всего, что уже в очереди
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Граница очереди: при переполнении add() ждёт, а не копит память
+_MAX_QUEUE_SIZE = 10000
+
+
+class WriteQueue:
+    """Пакетный писатель ORM-объектов в одну фоновую задачу."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        batch_size: Optional[int] = None,
+        batch_delay: Optional[float] = None,
+    ):
+        """
+        Args:
+            session_factory: Фабрика сессий (по умолчанию get_session())
+            batch_size: Максимум строк в одном коммите
+            batch_delay: Максимальное ожидание добора пачки, секунды
+        """
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._batch_delay = batch_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.rows_written = 0
+        self.batches_committed = 0
+        self.rows_failed = 0
+        self.last_batch_size = 0
+        self.last_commit_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        """Запущена ли фоновая задача писателя."""
+        return self._task is not None and not self._task.done()
+
+    def _factory(self) -> Callable[[], AsyncSession]:
+        if self._session_factory is not None:
+            return self._session_factory
+        from app.database.session import get_session
+        return get_session()
+
+    def _limits(self) -> tuple[int, float]:
+        from app.config import settings
+        batch_size = self._batch_size or settings.sqlite_write_batch_size
+        batch_delay = (
+            self._batch_delay
+            if self._batch_delay is not None
+            else settings.sqlite_write_batch_delay_ms / 1000
+        )
+        return batch_size, batch_delay
+
+    async def start(self) -> None:
+        """Запустить фоновую задачу писателя."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=_MAX_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Write queue started")
+
+    async def stop(self) -> None:
+        """Дописать очередь и остановить писателя."""
+        if not self.running:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(
+            f"Write queue stopped: {self.rows_written} rows in {self.batches_committed} batches"
+        )
+
+    async def add(self, obj: Any) -> None:
+        """
+        Поставить ORM-объект на запись.
+
+        Args:
+            obj: Новый ORM-объект (будет добавлен через session.add)
+        """
+        if not self.running:
+            await self._write_batch([obj])
+            return
+        await self._queue.put(obj)
+
+    async def flush(self) -> None:
+        """Дождаться записи всего, что уже поставлено в очередь."""
+        if self.running:
+            await self._queue.join()
+
+    def qsize(self) -> int:
+        """Текущая глубина очереди."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        """Основной цикл: собрать пачку, закоммитить, повторить."""
+        while True:
+            first = await self._queue.get()
+            batch: List[Any] = [first]
+            batch_size, batch_delay = self._limits()
+            deadline = time.monotonic() + batch_delay
+
+            while len(batch) < batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_batch(self, batch: List[Any]) -> None:
+        """Записать пачку одним коммитом; при ошибке — поштучно, чтобы не терять всю пачку."""
+        start = time.perf_counter()
+        try:
+            async with self._factory()() as session:
+                session.add_all(batch)
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Write queue batch of {len(batch)} failed, retrying one by one: {e}")
+            for obj in batch:
+                try:
+                    async with self._factory()() as session:
+                        session.add(obj)
+                        await session.commit()
+                    self.rows_written += 1
+                except Exception as row_error:
+                    self.rows_failed += 1
+                    logger.error(f"Write queue dropped {type(obj).__name__}: {row_error}")
+            return
+
+        self.rows_written += len(batch)
+        self.batches_committed += 1
+        self.last_batch_size = len(batch)
+        self.last_commit_seconds = time.perf_counter() - start
+
+    def get_stats(self) -> dict:
+        """Метрики очереди для /health и Prometheus."""
+        return {
+            "running": self.running,
+            "queue_depth": self.qsize(),
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "batches_committed": self.batches_committed,
+            "last_batch_size": self.last_batch_size,
+            "last_commit_seconds": round(self.last_commit_seconds, 4),
+        }
+
+
+# Глобальная очередь записи
+write_queue = WriteQueue()
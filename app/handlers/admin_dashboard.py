@@ -14,13 +14,14 @@ from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, desc
 
-from app.database.session import get_session
+from app.database.session import get_session, get_read_session
 from app.database.models import (
-    Chat, User, MessageLog
+    Chat, User
 )
 from app.config import settings
+from app.services.activity_rollup import activity_rollup, hour_bucket
 from app.utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -148,28 +149,17 @@ class AdminDashboard:
         Gather statistics for a chat.
         Requirements: 7.6
         """
-        async with get_session()() as session:
-            # Get message count for last 24h
-            yesterday = utc_now() - timedelta(hours=24)
-            
-            msg_count_result = await session.execute(
-                select(func.count(MessageLog.id))
-                .where(MessageLog.chat_id == chat_id)
-                .where(MessageLog.created_at >= yesterday)
-            )
-            message_count = msg_count_result.scalar() or 0
-            
-            # Get active users count
-            active_users_result = await session.execute(
-                select(func.count(func.distinct(MessageLog.user_id)))
-                .where(MessageLog.chat_id == chat_id)
-                .where(MessageLog.created_at >= yesterday)
-            )
-            active_users = active_users_result.scalar() or 0
+        # Last 24 hourly rollup buckets (current hour included)
+        now = utc_now()
+        since = hour_bucket(now) - timedelta(hours=23)
+        
+        await activity_rollup.flush()
+        async with get_read_session()() as session:
+            totals = await activity_rollup.chat_totals(session, chat_id, since, now)
             
         return {
-            "message_count": message_count,
-            "active_users": active_users
+            "message_count": totals["message_count"],
+            "active_users": totals["active_users"]
         }
     
     @staticmethod
@@ -183,24 +173,21 @@ class AdminDashboard:
             matplotlib.use('Agg')
             import matplotlib.pyplot as plt
             
-            async with get_session()() as session:
-                # Get hourly message counts for last 24h
-                now = utc_now()
-                yesterday = now - timedelta(hours=24)
-                
-                result = await session.execute(
-                    select(MessageLog.created_at)
-                    .where(MessageLog.chat_id == chat_id)
-                    .where(MessageLog.created_at >= yesterday)
-                )
-                messages = result.scalars().all()
+            # Hourly message counts for last 24h from rollups
+            now = utc_now()
+            current_hour = hour_bucket(now)
+            since = current_hour - timedelta(hours=23)
+            
+            await activity_rollup.flush()
+            async with get_read_session()() as session:
+                hourly = await activity_rollup.hourly_counts(session, chat_id, since, now)
             
             # Group by hour
             hours = [0] * 24
-            for msg_time in messages:
-                hour_diff = int((now - msg_time).total_seconds() // 3600)
+            for hour, count in hourly:
+                hour_diff = int((current_hour - hour).total_seconds() // 3600)
                 if 0 <= hour_diff < 24:
-                    hours[23 - hour_diff] += 1
+                    hours[23 - hour_diff] += count
             
             # Create plot
             fig, ax = plt.subplots(figsize=(10, 4))
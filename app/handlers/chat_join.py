@@ -96,6 +96,10 @@ async def create_pending_verification(user_id: int, chat_id: int, username: str,
         session.add(verification)
         await session.commit()
         logger.info(f"Создана pending верификация для user {user_id} в чате {chat_id}")
+    
+    # Кик точно по истечении срока (без поминутного опроса)
+    from app.services.delay_queue import delay_queue, VERIFICATION_EXPIRY
+    await delay_queue.schedule(VERIFICATION_EXPIRY, verification.id, verification.expires_at)
 
 
 async def mark_user_verified(user_id: int, chat_id: int) -> bool:
@@ -158,9 +162,23 @@ async def bot_removed_from_chat(event: ChatMemberUpdated):
     
     logger.info(f"Бот удален из чата {chat_title} (ID: {chat_id})")
     
-    # В реальной реализации можно удалить конфигурацию чата или отметить как неактивную
-    # Пока что просто логируем событие
-    pass
+    # Участников этого чата больше не видим и не сверяем
+    from app.services.member_sync import member_sync
+    await member_sync.forget_chat(chat_id)
+
+
+@router.chat_member()
+async def chat_member_changed(event: ChatMemberUpdated):
+    """
+    Вход, выход, кик, смена прав участника (бот должен быть админом).
+    Статус в chat_memberships обновляется сразу, без ночного обхода.
+    """
+    from app.services.member_sync import member_sync, membership_status
+
+    user = event.new_chat_member.user
+    if user.is_bot:
+        return
+    await member_sync.apply(event.chat.id, user.id, membership_status(event.new_chat_member))
 
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
@@ -179,6 +197,12 @@ async def new_chat_member_welcome(msg: Message):
     except Exception:
         pass
 
+    # Сервисное сообщение приходит и без прав админа — фиксируем вход
+    from app.services.member_sync import member_sync
+    for new_member in msg.new_chat_members:
+        if not new_member.is_bot:
+            await member_sync.apply(msg.chat.id, new_member.id, "member")
+
     # Приветствуем каждого нового участника
     for new_member in msg.new_chat_members:
         try:
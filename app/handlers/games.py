@@ -5,7 +5,7 @@ import random
 from datetime import datetime, timedelta
 import io
 from aiogram import Router, Bot
-from aiogram.types import Message, BufferedInputFile, CallbackQuery
+from aiogram.types import Message, CallbackQuery
 from aiogram import F
 from aiogram.filters import Command
 from sqlalchemy import select
@@ -17,10 +17,11 @@ from app.services.quests import check_and_update_quests
 from app.services.profile import get_full_user_profile
 from app.services.game_engine import game_engine, RouletteResult, CoinFlipResult
 from app.services.leagues import league_service, League
-from app.services.profile_generator import profile_generator, ProfileData
+from app.services.profile_generator import ProfileData
 from app.services.tournaments import tournament_service, TournamentDiscipline
 from app.services.state_manager import state_manager
-from app.services.sparkline import sparkline_generator
+from app.services.render_pool import render_pool
+from app.services.media_registry import media_registry
 from app.services.event_service import event_service, EventModifier
 from app.services import wallet_service
 from app.utils import utc_now
@@ -870,7 +871,7 @@ async def cmd_grow(msg: Message):
         sparkline_bytes = None
         if gs.grow_history and len(gs.grow_history) >= 2:
             try:
-                sparkline_bytes = sparkline_generator.generate(gs.grow_history)
+                sparkline_bytes = await render_pool.run("sparkline", gs.grow_history)
             except Exception as e:
                 logger.warning(f"Failed to generate sparkline: {e}")
         
@@ -891,8 +892,7 @@ async def cmd_grow(msg: Message):
         
         # Send with sparkline image if available (Requirements 7.1)
         if sparkline_bytes:
-            photo = BufferedInputFile(sparkline_bytes, filename="sparkline.png")
-            await msg.reply_photo(photo=photo, caption=reply_text)
+            await media_registry.send(msg.reply_photo, "photo", sparkline_bytes, "sparkline.png", caption=reply_text)
         else:
             await msg.reply(reply_text)
         
@@ -1032,7 +1032,7 @@ async def cmd_top(msg: Message, bot: Bot):
     
     Requirements: 7.1, 7.2, 7.3, 7.4
     """
-    from app.services.top_chart import top_chart_generator
+    from app.services.top_chart import to_chart_players
     
     async_session = get_session()
     async with async_session() as session:
@@ -1133,13 +1133,12 @@ async def cmd_top(msg: Message, bot: Bot):
         
         # Generate multi-line chart for all top 10 players
         try:
-            chart_bytes = top_chart_generator.generate_top10_chart(top10)
+            chart_bytes = await render_pool.run("top10", to_chart_players(top10))
             if chart_bytes:
-                photo = BufferedInputFile(chart_bytes, filename="top10_chart.png")
-                await bot.send_photo(
+                await media_registry.send(
+                    bot.send_photo, "photo", chart_bytes, "top10_chart.png",
                     chat_id=msg.chat.id,
                     message_thread_id=msg.message_thread_id,
-                    photo=photo,
                     caption=text
                 )
                 return
@@ -1179,7 +1178,7 @@ async def cmd_top_grow(msg: Message, bot: Bot):
     - Statistics: total grows, average per player
     - Special titles for most active players
     """
-    from app.services.top_chart import top_chart_generator
+    from app.services.top_chart import to_chart_players
     
     async_session = get_session()
     async with async_session() as session:
@@ -1264,13 +1263,12 @@ async def cmd_top_grow(msg: Message, bot: Bot):
         
         # Generate multi-line chart for top growers
         try:
-            chart_bytes = top_chart_generator.generate_top10_chart(top10)
+            chart_bytes = await render_pool.run("top10", to_chart_players(top10))
             if chart_bytes:
-                photo = BufferedInputFile(chart_bytes, filename="top_grow_chart.png")
-                await bot.send_photo(
+                await media_registry.send(
+                    bot.send_photo, "photo", chart_bytes, "top_grow_chart.png",
                     chat_id=msg.chat.id,
                     message_thread_id=msg.message_thread_id,
-                    photo=photo,
                     caption=text
                 )
                 return
@@ -1416,8 +1414,7 @@ async def cmd_profile(msg: Message, bot: Bot):
         
         # Generate profile image
         try:
-            image_bytes = profile_generator.generate(profile_data)
-            photo = BufferedInputFile(image_bytes, filename="profile.png")
+            image_bytes = await render_pool.run("profile", profile_data)
             
             # Build interactive keyboard
             from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -1428,7 +1425,10 @@ async def cmd_profile(msg: Message, bot: Bot):
             kb.button(text="🏆 Достижения", callback_data="profile_achievements")
             kb.adjust(2, 2)
             
-            await msg.reply_photo(photo=photo, reply_markup=kb.as_markup())
+            # Профиль без изменений уходит по file_id
+            await media_registry.send(
+                msg.reply_photo, "photo", image_bytes, "profile.png", reply_markup=kb.as_markup()
+            )
             
         except Exception as e:
             logger.error(f"Failed to generate profile image: {e}")
@@ -11,6 +11,7 @@ Analysis is disabled by default and can be enabled per-chat in admin panel.
 **Validates: Requirements 3.3, 3.4, 3.5**
 """
 
+import asyncio
 import logging
 import random
 import re
@@ -310,6 +311,17 @@ async def _process_gif_patrol(message: Message, bot: Bot, animation) -> None:
     """
     Обрабатывает GIF через patrol (модерация на запрещённый контент).
     """
+    # Репост уже проверенной гифки: вердикт без скачивания и модели
+    cached = await gif_patrol_service.cached_verdict(animation.file_unique_id)
+    if cached is not None:
+        if not cached.is_safe:
+            logger.warning(
+                f"Unsafe GIF (cached verdict) from user {message.from_user.id}: "
+                f"{cached.detected_categories}"
+            )
+            await handle_unsafe_content(message, cached, bot)
+        return
+    
     # Извлекаем байты анимации
     animation_bytes = await extract_animation_bytes(message, bot)
     
@@ -327,7 +339,9 @@ async def _process_gif_patrol(message: Message, bot: Bot, animation) -> None:
         )
         
         # Анализируем GIF
-        result = await gif_patrol_service.analyze_gif(animation_bytes)
+        result = await gif_patrol_service.analyze_gif(
+            animation_bytes, animation.file_unique_id, chat_id=message.chat.id
+        )
         
         # Clean up status message
         if status:
@@ -365,7 +379,8 @@ async def _process_gif_vision(message: Message, bot: Bot, animation, is_auto_rep
     """
     Обрабатывает GIF через vision pipeline.
     
-    Анализирует 3 кадра (начало, середина, конец) для полного понимания анимации.
+    Различающиеся кадры (до 3) склеиваются в раскадровку и описываются
+    одним запросом к vision-модели.
     """
     import random
     from app.services.vision_pipeline import vision_pipeline
@@ -378,10 +393,10 @@ async def _process_gif_vision(message: Message, bot: Bot, animation, is_auto_rep
             await safe_reply(message, "Не удалось загрузить гифку 😕")
         return
     
-    # Извлекаем 3 кадра (начало, середина, конец)
+    # Выбираем различающиеся кадры (по смене сцены)
     frames = []
     try:
-        frames = gif_patrol_service.extract_frames(animation_bytes)
+        frames = await asyncio.to_thread(gif_patrol_service.sample_frames, animation_bytes)
     except Exception as e:
         logger.warning(f"Error extracting GIF frames: {e}")
     
@@ -400,32 +415,29 @@ async def _process_gif_vision(message: Message, bot: Bot, animation, is_auto_rep
     try:
         # Для авто-ответов не показываем индикатор процесса
         if not is_auto_reply:
-            await safe_reply(message, "👀 Разглядываю гифку (3 кадра)...")
+            await safe_reply(message, "👀 Разглядываю гифку...")
         
-        # Анализируем все 3 кадра и собираем описания
-        frame_descriptions = []
-        frame_labels = ["начало", "середина", "конец"]
-        
-        for idx, frame_bytes in enumerate(frames):
-            try:
-                # Получаем описание кадра напрямую от Vision модели
-                description = await vision_pipeline._get_image_description(frame_bytes)
-                if description:
-                    frame_descriptions.append(f"[{frame_labels[idx]}]: {description}")
-            except Exception as e:
-                logger.warning(f"Error analyzing frame {idx}: {e}")
+        # Один запрос к Vision модели на всю раскадровку
+        if len(frames) > 1:
+            image_bytes = gif_patrol_service.build_contact_sheet(frames)
+        else:
+            image_bytes = gif_patrol_service._frame_to_bytes(frames[0])
+        description = None
+        try:
+            description = await vision_pipeline._get_image_description(
+                image_bytes, file_unique_id=animation.file_unique_id, chat_id=message.chat.id
+            )
+        except Exception as e:
+            logger.warning(f"Error describing GIF frames: {e}")
         
-        if not frame_descriptions:
+        if not description:
             if not is_auto_reply:
                 await safe_reply(message, "Хм, модель молчит. Попробуй другую гифку.")
             return
         
-        # Объединяем описания всех кадров
-        combined_description = "\n".join(frame_descriptions)
-        
-        # Генерируем комментарий Олега на основе всех кадров
+        # Генерируем комментарий Олега по раскадровке
         analysis_result = await vision_pipeline._generate_oleg_comment(
-            f"Это GIF-анимация из {len(frames)} кадров:\n{combined_description}",
+            f"Это GIF-анимация, кадры по порядку (пронумерованы на раскадровке):\n{description}",
             user_query
         )
         
@@ -4,7 +4,6 @@ Mafia Game Handlers (v9.5.0)
 Handles all mafia game commands and callbacks.
 """
 
-import asyncio
 import logging
 from datetime import timedelta
 from typing import Optional
@@ -17,6 +16,13 @@ from app.database.session import get_session
 from app.database.models import MafiaGame
 from app.services.mafia_game import MafiaGameService, LOBBY_TIMEOUT, NIGHT_TIMEOUT, DAY_DISCUSSION_TIMEOUT, DAY_VOTING_TIMEOUT
 from app.services.economy import EconomyService
+from app.services.delay_queue import (
+    delay_queue,
+    MAFIA_LOBBY_TIMEOUT,
+    MAFIA_NIGHT_END,
+    MAFIA_DISCUSSION_END,
+    MAFIA_VOTING_END,
+)
 from app.utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -99,7 +105,7 @@ async def cmd_mafia_start(message: Message, bot: Bot):
         )
         
         # Schedule lobby timeout
-        asyncio.create_task(schedule_lobby_timeout(bot, game.id, message.chat.id))
+        await schedule_phase_end(MAFIA_LOBBY_TIMEOUT, game.id, message.chat.id, LOBBY_TIMEOUT)
 
 
 @router.callback_query(F.data.startswith("mafia_join:"))
@@ -248,9 +254,8 @@ async def callback_mafia_start_game(callback: CallbackQuery):
         await callback.answer("✅ Игра началась!")
         
         # Schedule night phase processing
-        asyncio.create_task(
-            schedule_night_phase_end(callback.bot, game_id, callback.message.chat.id)
-        )
+        await send_night_actions(callback.bot, game_id)
+        await schedule_phase_end(MAFIA_NIGHT_END, game_id, callback.message.chat.id, NIGHT_TIMEOUT)
 
 
 
@@ -424,8 +429,8 @@ async def cmd_mafia_stats(message: Message):
 
 
 # Background task to process night phase
-async def process_night_phase_task(bot, game_id: int, chat_id: int):
-    """Process night phase after timeout."""
+async def process_night_phase_task(bot, game_id: int, chat_id: int) -> bool:
+    """Process night phase after timeout. Returns False if the game is no longer at night."""
     async_session = get_session()
     async with async_session() as session:
         service = MafiaGameService(session)
@@ -433,7 +438,8 @@ async def process_night_phase_task(bot, game_id: int, chat_id: int):
         result = await service.process_night_phase(game_id)
         
         if not result:
-            return
+            # Игра уже не в ночной фазе (отменена или закончилась)
+            return False
         
         killed_user_id = result.get("killed_user_id")
         detective_checks = result.get("detective_checks", {})
@@ -477,16 +483,19 @@ async def process_night_phase_task(bot, game_id: int, chat_id: int):
                 )
             except Exception as e:
                 logger.warning(f"Failed to send detective result to {detective_id}: {e}")
+        return True
 
 
 # Background task to start voting
-async def start_voting_task(bot, game_id: int, chat_id: int):
+async def start_voting_task(bot, game_id: int, chat_id: int) -> bool:
     """Start voting phase after discussion."""
     async_session = get_session()
     async with async_session() as session:
         service = MafiaGameService(session)
         
-        await service.start_voting(game_id)
+        if not await service.start_voting(game_id):
+            # Игра уже не в фазе обсуждения (отменена или закончилась)
+            return False
         
         # Get alive players
         players = await service.get_game_players(game_id, alive_only=True)
@@ -499,6 +508,7 @@ async def start_voting_task(bot, game_id: int, chat_id: int):
             reply_markup=get_voting_keyboard(game_id, players),
             parse_mode="HTML"
         )
+        return True
 
 
 # Background task to process voting
@@ -567,12 +577,16 @@ async def process_voting_task(bot, game_id: int, chat_id: int):
 
 
 
-# Scheduling functions for phase transitions
+# Scheduling functions for phase transitions.
+# Сроки фаз лежат в delay queue: переживают перезапуск и срабатывают точно.
+
+async def schedule_phase_end(kind: str, game_id: int, chat_id: int, seconds: int):
+    """Schedule the end of the current phase."""
+    await delay_queue.schedule(kind, game_id, utc_now() + timedelta(seconds=seconds), {"chat_id": chat_id})
 
-async def schedule_lobby_timeout(bot: Bot, game_id: int, chat_id: int):
+
+async def close_expired_lobby(bot: Bot, game_id: int, chat_id: int):
     """Cancel lobby if not started within timeout."""
-    await asyncio.sleep(LOBBY_TIMEOUT)
-    
     async_session = get_session()
     async with async_session() as session:
         service = MafiaGameService(session)
@@ -635,30 +649,24 @@ async def send_night_actions(bot: Bot, game_id: int):
                     logger.warning(f"Failed to send night action to user {player.user_id}: {e}")
 
 
-async def schedule_night_phase_end(bot: Bot, game_id: int, chat_id: int):
-    """Schedule night phase end after timeout."""
-    # Send night actions first (only for subsequent nights, not first one)
-    await send_night_actions(bot, game_id)
-    
-    await asyncio.sleep(NIGHT_TIMEOUT)
-    await process_night_phase_task(bot, game_id, chat_id)
-    
-    # Schedule discussion end
-    asyncio.create_task(schedule_discussion_end(bot, game_id, chat_id))
+async def on_lobby_timeout(bot: Bot, game_id: str, payload: dict):
+    await close_expired_lobby(bot, int(game_id), payload["chat_id"])
 
 
-async def schedule_discussion_end(bot: Bot, game_id: int, chat_id: int):
-    """Schedule discussion phase end after timeout."""
-    await asyncio.sleep(DAY_DISCUSSION_TIMEOUT)
-    await start_voting_task(bot, game_id, chat_id)
-    
-    # Schedule voting end
-    asyncio.create_task(schedule_voting_end(bot, game_id, chat_id))
+async def on_night_end(bot: Bot, game_id: str, payload: dict):
+    game_id, chat_id = int(game_id), payload["chat_id"]
+    if await process_night_phase_task(bot, game_id, chat_id):
+        await schedule_phase_end(MAFIA_DISCUSSION_END, game_id, chat_id, DAY_DISCUSSION_TIMEOUT)
+
 
+async def on_discussion_end(bot: Bot, game_id: str, payload: dict):
+    game_id, chat_id = int(game_id), payload["chat_id"]
+    if await start_voting_task(bot, game_id, chat_id):
+        await schedule_phase_end(MAFIA_VOTING_END, game_id, chat_id, DAY_VOTING_TIMEOUT)
 
-async def schedule_voting_end(bot: Bot, game_id: int, chat_id: int):
-    """Schedule voting phase end after timeout."""
-    await asyncio.sleep(DAY_VOTING_TIMEOUT)
+
+async def on_voting_end(bot: Bot, game_id: str, payload: dict):
+    game_id, chat_id = int(game_id), payload["chat_id"]
     result = await process_voting_task(bot, game_id, chat_id)
     
     # If game continues, schedule next night
@@ -671,4 +679,44 @@ async def schedule_voting_end(bot: Bot, game_id: int, chat_id: int):
             f"⏱ Ночь продлится {NIGHT_TIMEOUT // 60} минут",
             parse_mode="HTML"
         )
-        asyncio.create_task(schedule_night_phase_end(bot, game_id, chat_id))
+        await send_night_actions(bot, game_id)
+        await schedule_phase_end(MAFIA_NIGHT_END, game_id, chat_id, NIGHT_TIMEOUT)
+
+
+# Фаза → (вид задачи, длительность)
+_PHASE_TIMERS = {
+    "lobby": (MAFIA_LOBBY_TIMEOUT, LOBBY_TIMEOUT),
+    "night": (MAFIA_NIGHT_END, NIGHT_TIMEOUT),
+    "day_discussion": (MAFIA_DISCUSSION_END, DAY_DISCUSSION_TIMEOUT),
+    "day_voting": (MAFIA_VOTING_END, DAY_VOTING_TIMEOUT),
+}
+
+
+def _phase_deadlines_loader(kind: str):
+    async def load():
+        from sqlalchemy import select
+
+        statuses = [status for status, (timer, _) in _PHASE_TIMERS.items() if timer == kind]
+        async_session = get_session()
+        async with async_session() as session:
+            result = await session.execute(
+                select(MafiaGame).where(MafiaGame.status.in_(statuses))
+            )
+            deadlines = []
+            for game in result.scalars().all():
+                _, seconds = _PHASE_TIMERS[game.status]
+                started = game.phase_started_at or game.created_at
+                deadlines.append((game.id, started + timedelta(seconds=seconds), {"chat_id": game.chat_id}))
+            return deadlines
+    return load
+
+
+def register_phase_timers():
+    """Register mafia phase handlers in the delay queue."""
+    for kind, handler in (
+        (MAFIA_LOBBY_TIMEOUT, on_lobby_timeout),
+        (MAFIA_NIGHT_END, on_night_end),
+        (MAFIA_DISCUSSION_END, on_discussion_end),
+        (MAFIA_VOTING_END, on_voting_end),
+    ):
+        delay_queue.register(kind, handler, reload=_phase_deadlines_loader(kind))
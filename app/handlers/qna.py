@@ -12,8 +12,10 @@ from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime
 from sqlalchemy import select
 
-from app.database.session import get_session
+from app.database.unit_of_work import session_scope
 from app.database.models import User, UserQuestionHistory, MessageLog, Chat
+from app.services.activity_rollup import activity_rollup
+from app.services.toxicity_scorer import classify_text
 from app.handlers.games import ensure_user # For getting user object
 from app.services.ollama_client import generate_text_reply as generate_reply, generate_reply_with_context, generate_private_reply, is_ollama_available
 from app.services.recommendations import generate_recommendation
@@ -31,76 +33,40 @@ async def _send_video_note_fallback(msg: Message, voice_result, template_path: s
     Вспомогательная функция для сборки и отправки видео-сообщения (кружочка).
     Использует ffmpeg для наложения голоса на видео шаблон.
     Шаблон уже обрезан до 640x640 без звука.
+    Видео копируется из заранее закодированного сегмента шаблона, голос
+    подаётся через pipe; при ошибке кэша — полное перекодирование шаблона.
     """
-    import os
-    import uuid
-    import asyncio
-    
-    # Создаем временные файлы
-    unique_id = str(uuid.uuid4())[:8]
-    temp_voice = f"data/temp_voice_{unique_id}.mp3"
-    temp_video = f"data/temp_circle_{unique_id}.mp4"
-    
+    from aiogram.types import BufferedInputFile
+    from app.services import media_pipe
+    from app.services.video_note_templates import video_note_templates
+
+    audio = voice_result.audio_data
     try:
-        # Сохраняем аудио во временный файл
-        with open(temp_voice, "wb") as f:
-            f.write(voice_result.audio_data)
-        
-        # Команда FFmpeg (async version) - Optimized for pre-processed templates
-        cmd = [
-            'ffmpeg', '-y',
-            '-stream_loop', '-1',
-            '-i', template_path,
-            '-i', temp_voice,
-            '-vf', 'setsar=1', # Input is already 640x640, just ensure SAR is 1:1
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-tune', 'zerolatency',
-            '-crf', '28',
-            '-pix_fmt', 'yuv420p',
-            '-c:a', 'aac',
-            '-shortest',
-            temp_video
-        ]
-        
-        # Запускаем сборку асинхронно
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+        video = await video_note_templates.assemble(
+            template_path, audio, duration_hint=getattr(voice_result, "duration_seconds", None)
         )
-        
+    except Exception as e:
+        logger.warning(f"Video note template cache failed, re-encoding template: {e}")
         try:
             # 20 секунд должно хватить с головой для склейки готового видео
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=20.0)
-        except asyncio.TimeoutError:
-            try:
-                process.kill()
-            except Exception:
-                pass
-            logger.error("FFmpeg generation timed out (20s)")
+            video = await media_pipe.assemble_video_note(template_path, audio, timeout=20.0)
+        except media_pipe.FFmpegError as e:
+            logger.error(f"FFmpeg error: {e}")
             return False
-        
-        if process.returncode == 0 and os.path.exists(temp_video):
-            from aiogram.types import FSInputFile
-            await msg.reply_video_note(
-                video_note=FSInputFile(temp_video)
-            )
-            logger.info(f"Video note sent successfully")
-            return True
-        else:
-            logger.error(f"FFmpeg error: {stderr.decode()}")
+        except Exception as e:
+            logger.error(f"Failed to assemble video note: {e}")
             return False
-            
+
+    if not video:
+        logger.error("FFmpeg produced empty video note")
+        return False
+    try:
+        await msg.reply_video_note(video_note=BufferedInputFile(video, filename="circle.mp4"))
+        logger.info(f"Video note sent successfully")
+        return True
     except Exception as e:
-        logger.error(f"Failed to assemble video note: {e}")
+        logger.error(f"Failed to send video note: {e}")
         return False
-    finally:
-        # Чистим временные файлы
-        for f in [temp_voice, temp_video]:
-            if os.path.exists(f):
-                try: os.remove(f)
-                except: pass
 
 
 async def keep_typing(bot: Bot, chat_id: int, stop_event: asyncio.Event, thread_id: int = None, action: str = "typing"):
@@ -311,9 +277,8 @@ async def _log_bot_response(chat_id: int, message_id: int, text: str, bot_userna
         text: Текст ответа
         bot_username: Username бота
     """
-    async_session = get_session()
     try:
-        async with async_session() as session:
+        async with session_scope() as session:
             ml = MessageLog(
                 chat_id=chat_id,
                 message_id=message_id,
@@ -326,6 +291,7 @@ async def _log_bot_response(chat_id: int, message_id: int, text: str, bot_userna
             )
             session.add(ml)
             await session.commit()
+            activity_rollup.record(ml)
             logger.debug(f"Logged bot response to chat {chat_id}")
     except Exception as e:
         logger.warning(f"Failed to log bot response: {e}")
@@ -428,8 +394,7 @@ async def _should_reply(msg: Message) -> tuple[bool, bool]:
     auto_reply_chance = 1.0
     
     try:
-        async_session = get_session()
-        async with async_session() as session:
+        async with session_scope() as session:
             result = await session.execute(select(Chat).filter_by(id=msg.chat.id))
             chat = result.scalars().first()
             
@@ -509,8 +474,8 @@ async def adjust_toxicity_for_private_chat(user_id: int, text: str) -> float:
     # Простая эвристика для демонстрации
     toxicity = 30  # базовый уровень
 
-    # Повышаем токсичность на основании некоторых признаков
-    if any(word in text.lower() for word in ["идиот", "дурак", "тупой", "нах", "еба", "сука", "бля"]):
+    # Мат и оскорбления — тот же scorer, что и для статистики чатов
+    if classify_text(text).toxic:
         toxicity += 20
 
     if text.isupper() and len(text) > 10:
@@ -740,7 +705,6 @@ async def _process_qna_message(msg: Message, is_direct_mention: bool = False):
     text = msg.text or ""
     topic_id = getattr(msg, 'message_thread_id', None)
     is_forum = getattr(msg.chat, 'is_forum', False)
-    async_session = get_session()
     user = await ensure_user(msg.from_user)
 
     logger.info(f"[QNA PROCESS] Обрабатываем от {user_tag}: \"{text[:50]}...\"")
@@ -777,7 +741,8 @@ async def _process_qna_message(msg: Message, is_direct_mention: bool = False):
                 user_text=text_with_context,
                 username=msg.from_user.username,
                 user_id=msg.from_user.id,
-                chat_context=full_chat_context
+                chat_context=full_chat_context,
+                message_id=msg.message_id
             )
         else:
             # Для групповых чатов используем функцию с контекстом из памяти
@@ -803,7 +768,7 @@ async def _process_qna_message(msg: Message, is_direct_mention: bool = False):
         video_chance = 0.0
         current_persona = "oleg"  # Default persona
         try:
-            async with async_session() as session:
+            async with session_scope() as session:
                 chat_obj = await session.get(Chat, msg.chat.id)
                 if chat_obj:
                     text_chance = getattr(chat_obj, "auto_reply_chance", 0.0)
@@ -917,13 +882,10 @@ async def _process_qna_message(msg: Message, is_direct_mention: bool = False):
                 
                 result = await tts_service.generate_voice(reply, persona=persona)
                 if result is not None:
-                    from aiogram.types import BufferedInputFile
-                    voice_file = BufferedInputFile(
-                        file=result.audio_data,
-                        filename="voice.mp3"
-                    )
-                    await msg.reply_voice(
-                        voice=voice_file,
+                    # Повтор уже отправленной фразы уходит по file_id
+                    await tts_service.send_voice(
+                        msg.reply_voice,
+                        result,
                         caption=None,
                         duration=int(result.duration_seconds)
                     )
@@ -1069,7 +1031,7 @@ async def _process_qna_message(msg: Message, is_direct_mention: bool = False):
                 pass
 
         # Save to history
-        async with async_session() as session:
+        async with session_scope() as session:
             history_entry = UserQuestionHistory(
                 user_id=user.id,
                 question=text,
@@ -1141,10 +1103,9 @@ async def cmd_myhistory(msg: Message):
     """
     Handles the /myhistory command, displaying a user's question history.
     """
-    async_session = get_session()
     user = await ensure_user(msg.from_user)
 
-    async with async_session() as session:
+    async with session_scope() as session:
         history_res = await session.execute(
             select(UserQuestionHistory)
             .filter_by(user_id=user.id)
@@ -1177,9 +1138,8 @@ async def cmd_reset_context(msg: Message):
         await msg.reply("Эту команду можно использовать только в личных сообщениях.")
         return
 
-    async_session = get_session()
     try:
-        async with async_session() as session:
+        async with session_scope() as session:
             from sqlalchemy import delete
             # Удаляем историю сообщений в ЛС (chat_id == user_id для личных чатов)
             result = await session.execute(
@@ -1299,9 +1259,9 @@ async def cmd_whois(msg: Message):
     Использование: /whois (реплай) или /whois @username или /whois (свой профиль)
     """
     from app.services.user_memory import user_memory
-    from app.database.session import get_session
-    from app.database.models import MessageLog, User
-    from sqlalchemy import select, func
+    from app.database.models import User
+    from app.database.queries import user_message_stats_query
+    from sqlalchemy import select
     
     # Определяем целевого пользователя
     target_user_id = None
@@ -1318,7 +1278,7 @@ async def cmd_whois(msg: Message):
             username_arg = args[1].strip().lstrip('@')
             if username_arg:
                 # Ищем по username в БД
-                async with get_session()() as session:
+                async with session_scope() as session:
                     result = await session.execute(
                         select(User).where(User.username == username_arg)
                     )
@@ -1341,8 +1301,11 @@ async def cmd_whois(msg: Message):
     # Получаем профиль из памяти Олега
     profile = await user_memory.get_profile(msg.chat.id, target_user_id)
     
+    # Дописываем накопленные счётчики, чтобы /whois видел последние сообщения
+    await activity_rollup.flush()
+    
     # Получаем базовую статистику из БД
-    async with get_session()() as session:
+    async with session_scope() as session:
         db_user_result = await session.execute(
             select(User).where(User.tg_user_id == target_user_id)
         )
@@ -1355,19 +1318,17 @@ async def cmd_whois(msg: Message):
         )
         game_stat = game_stat_result.scalars().first()
         
-        msg_count = await session.scalar(
-            select(func.count(MessageLog.id)).where(
-                MessageLog.chat_id == msg.chat.id,
-                MessageLog.user_id == target_user_id
+        # Количество и первое сообщение — из почасовых счётчиков (O(часов));
+        # пока идёт первичный бэкфилл — по покрывающему индексу MessageLog
+        if activity_rollup.backfill_done:
+            msg_count, first_msg_date = await activity_rollup.user_totals(
+                session, msg.chat.id, target_user_id
             )
-        )
-        
-        first_msg_date = await session.scalar(
-            select(func.min(MessageLog.created_at)).where(
-                MessageLog.chat_id == msg.chat.id,
-                MessageLog.user_id == target_user_id
+        else:
+            stats_result = await session.execute(
+                user_message_stats_query(msg.chat.id, target_user_id)
             )
-        )
+            msg_count, first_msg_date = stats_result.one()
     
     # Формируем досье
     name = target_username or f"ID:{target_user_id}"
@@ -1407,7 +1368,7 @@ async def cmd_whois(msg: Message):
     spouse_id = await get_spouse_id(target_user_id, msg.chat.id)
     if spouse_id:
         # Получаем имя супруга
-        async with get_session()() as session:
+        async with session_scope() as session:
             spouse_result = await session.execute(
                 select(User).where(User.tg_user_id == spouse_id)
             )
@@ -223,13 +223,9 @@ async def callback_voice_summary(callback: CallbackQuery):
             return
         
         # Send voice message
-        from aiogram.types import BufferedInputFile
-        voice_file = BufferedInputFile(
-            file=result.audio_data,
-            filename="voice.mp3"
-        )
-        await callback.message.reply_voice(
-            voice=voice_file,
+        await tts_service.send_voice(
+            callback.message.reply_voice,
+            result,
             caption="🎤 Пересказ голосом Олега",
             duration=int(result.duration_seconds)
         )
@@ -88,6 +88,11 @@ async def cmd_war_declare(msg: Message):
         )
         session.add(new_war)
         await session.commit()
+        # Отмена непринятой войны и её завершение — точно в срок
+        from app.jobs.scheduler import WAR_ACCEPT_TIMEOUT
+        from app.services.delay_queue import delay_queue, TEAM_WAR_DEADLINE
+        await delay_queue.schedule(TEAM_WAR_DEADLINE, f"{new_war.id}:accept", utc_now() + WAR_ACCEPT_TIMEOUT)
+        await delay_queue.schedule(TEAM_WAR_DEADLINE, f"{new_war.id}:end", end_time)
         await msg.reply(f"Ваша гильдия '{declarer_guild.name}' объявила войну гильдии '{defender_guild.name}'! "
                         f"Война продлится {duration_hours} часов после принятия.")
         # Notify defender guild leader
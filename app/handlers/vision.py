@@ -260,6 +260,25 @@ async def extract_image_bytes(message: Message) -> Optional[bytes]:
 
 
 @router.message(F.photo | F.document | F.sticker)
+def media_unique_id(message: Message) -> Optional[str]:
+    """
+    file_unique_id изображения из сообщения (для кэша описаний).
+
+    Args:
+        message: Сообщение с изображением
+
+    Returns:
+        file_unique_id или None
+    """
+    if message.photo:
+        return message.photo[-1].file_unique_id
+    if message.document and message.document.mime_type and message.document.mime_type.startswith('image/'):
+        return message.document.file_unique_id
+    if message.sticker:
+        return message.sticker.file_unique_id
+    return None
+
+
 async def handle_image_message(msg: Message):
     """
     Обработчик сообщений с изображениями и стикерами.
@@ -383,7 +402,9 @@ async def _process_media_group(group_id: str) -> None:
             image_bytes = await extract_image_bytes(m)
             if image_bytes:
                 try:
-                    description = await vision_pipeline._get_image_description(image_bytes)
+                    description = await vision_pipeline._get_image_description(
+                        image_bytes, file_unique_id=media_unique_id(m), chat_id=m.chat.id
+                    )
                     if description:
                         image_descriptions.append(f"[Фото {idx}]: {description}")
                 except Exception as e:
@@ -463,7 +484,9 @@ async def _process_single_image(msg: Message, is_auto_reply: bool) -> None:
             await safe_reply(msg, "👀 Разглядываю...")
 
         # Анализируем изображение через 2-step Vision Pipeline
-        analysis_result = await vision_pipeline.analyze(image_bytes, user_query=user_query)
+        analysis_result = await vision_pipeline.analyze(
+            image_bytes, user_query=user_query, file_unique_id=media_unique_id(msg), chat_id=msg.chat.id
+        )
 
         # Проверяем на пустой результат
         if not analysis_result or not analysis_result.strip():
@@ -526,16 +549,12 @@ async def _process_single_image(msg: Message, is_auto_reply: bool) -> None:
         if should_voice and not video_sent:
             try:
                 from app.services.tts import tts_service
-                from aiogram.types import BufferedInputFile
                 
                 result = await tts_service.generate_voice(analysis_result)
                 if result is not None:
-                    voice_file = BufferedInputFile(
-                        file=result.audio_data,
-                        filename="voice.mp3"
-                    )
-                    await msg.reply_voice(
-                        voice=voice_file,
+                    await tts_service.send_voice(
+                        msg.reply_voice,
+                        result,
                         caption=None,
                         duration=int(result.duration_seconds)
                     )
@@ -12,6 +12,8 @@ Uses faster-whisper for speech recognition (STT).
 **Validates: Requirements 5.1, 5.2, 5.4, 15.1, 15.2, 15.3, 15.4**
 """
 
+import asyncio
+import io
 import logging
 from aiogram import Router, F
 from aiogram.filters import Command
@@ -68,7 +70,7 @@ async def handle_voice_message(msg: Message):
     
     try:
         # Transcribe voice message
-        text = await transcribe_voice_message(msg.bot, msg.voice.file_id)
+        text = await transcribe_voice_message(msg.bot, msg.voice.file_id, chat_id=msg.chat.id)
         
         if not text:
             await safe_reply(msg, "🎤 Не удалось распознать голосовое сообщение")
@@ -141,40 +143,51 @@ async def handle_video_note(msg: Message):
     visual_description = None
     
     try:
+        # Скачиваем кружочек один раз в память: он нужен и для STT, и для кадров
+        file = await msg.bot.get_file(msg.video_note.file_id)
+        video_data = await msg.bot.download_file(file.file_path, destination=io.BytesIO())
+        video_bytes = video_data.getvalue()
+
         # 1. Транскрибируем аудио (если STT доступен)
-        if stt_available():
+        async def transcribe():
+            if not stt_available():
+                return None
             try:
-                transcribed_text = await transcribe_video_note(msg.bot, msg.video_note.file_id)
-                if transcribed_text:
-                    logger.info(f"Transcribed video note: {transcribed_text[:100]}...")
+                text = await transcribe_video_note(
+                    msg.bot, msg.video_note.file_id, chat_id=msg.chat.id, data=video_bytes
+                )
+                if text:
+                    logger.info(f"Transcribed video note: {text[:100]}...")
+                return text
             except Exception as stt_err:
                 logger.warning(f"STT failed for video note: {stt_err}")
-        
+                return None
+
         # 2. Извлекаем кадры и анализируем визуально
-        try:
-            from app.services.gif_patrol import gif_patrol_service
-            from app.services.ollama_client import analyze_image_content
-            
-            # Скачиваем видео
-            file = await msg.bot.get_file(msg.video_note.file_id)
-            video_data = await msg.bot.download_file(file.file_path)
-            video_bytes = video_data.read() if hasattr(video_data, 'read') else video_data
-            
-            # Извлекаем кадры (используем метод из gif_patrol)
-            frames = gif_patrol_service.extract_frames(video_bytes)
-            
-            if frames:
+        async def describe():
+            try:
+                from app.services.gif_patrol import gif_patrol_service
+                from app.services.ollama_client import analyze_image_content
+
+                # Извлекаем кадры (используем метод из gif_patrol) вне event loop
+                frames = await asyncio.to_thread(gif_patrol_service.extract_frames, video_bytes)
+                if not frames:
+                    return None
                 # Анализируем средний кадр (самый репрезентативный)
                 middle_frame = frames[len(frames) // 2]
-                visual_description = await analyze_image_content(
+                description = await analyze_image_content(
                     middle_frame,
                     query="Опиши что видишь на этом кадре из видеосообщения. Кратко, 1-2 предложения."
                 )
-                logger.info(f"Visual analysis: {visual_description[:100]}...")
-                
-        except Exception as vision_err:
-            logger.warning(f"Vision analysis failed for video note: {vision_err}")
-        
+                logger.info(f"Visual analysis: {description[:100]}...")
+                return description
+            except Exception as vision_err:
+                logger.warning(f"Vision analysis failed for video note: {vision_err}")
+                return None
+
+        # Речь и картинка обрабатываются параллельно
+        transcribed_text, visual_description = await asyncio.gather(transcribe(), describe())
+
         # 3. Формируем контекст для ответа
         if not transcribed_text and not visual_description:
             await safe_reply(msg, "🎥 Не удалось обработать кружочек — ни речь, ни картинку")
@@ -2,7 +2,9 @@ from datetime import datetime, timedelta
 import pytz
 import random
 import asyncio
+import functools
 import logging
+import time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
@@ -78,70 +80,104 @@ async def job_regenerate_rooster_hp(bot: Bot):
             logger.info(f"Regenerated HP for {regenerated_count} roosters")
 
 
+async def _kick_unverified(bot: Bot, verification: PendingVerification, now: datetime) -> None:
+    """Кикает пользователя, не нажавшего кнопку верификации."""
+    try:
+        # Проверяем, не стал ли пользователь админом
+        try:
+            member = await bot.get_chat_member(verification.chat_id, verification.user_id)
+            if member.status in ['administrator', 'creator']:
+                # Админов не кикаем, просто отмечаем как верифицированных
+                verification.is_verified = True
+                logger.info(f"Пользователь {verification.user_id} — админ, пропускаем кик")
+                return
+        except Exception:
+            pass
+        
+        # Кикаем пользователя
+        await bot.ban_chat_member(
+            chat_id=verification.chat_id,
+            user_id=verification.user_id,
+            until_date=now + timedelta(seconds=60)  # Бан на 60 сек = кик с возможностью вернуться
+        )
+        
+        verification.is_kicked = True
+        
+        # Удаляем приветственное сообщение
+        if verification.welcome_message_id:
+            try:
+                await bot.delete_message(verification.chat_id, verification.welcome_message_id)
+            except Exception:
+                pass
+        
+        # Отправляем уведомление
+        try:
+            username = verification.username or str(verification.user_id)
+            await bot.send_message(
+                verification.chat_id,
+                f"👢 {username} был кикнут за неактивность (не подтвердил, что не бот)."
+            )
+        except Exception:
+            pass
+        
+        logger.info(f"Кикнут пользователь {verification.user_id} из чата {verification.chat_id} (не прошел верификацию)")
+        
+    except Exception as e:
+        logger.error(f"Ошибка при кике пользователя {verification.user_id}: {e}")
+        # Отмечаем как обработанный чтобы не пытаться снова
+        verification.is_kicked = True
+
+
+def _expired_verifications(now: datetime):
+    return select(PendingVerification).filter(
+        PendingVerification.expires_at <= now,
+        PendingVerification.is_verified == False,
+        PendingVerification.is_kicked == False
+    )
+
+
+async def expire_verification(bot: Bot, verification_id: str, payload: dict):
+    """Delay queue: срок верификации истёк — кикаем, если кнопка не нажата."""
+    now = utc_now()
+    async_session = get_session()
+    async with async_session() as session:
+        result = await session.execute(
+            _expired_verifications(now).filter(PendingVerification.id == int(verification_id))
+        )
+        verification = result.scalars().first()
+        if verification:
+            await _kick_unverified(bot, verification, now)
+            await session.commit()
+
+
+async def pending_verification_deadlines():
+    """Сроки необработанных верификаций для delay queue."""
+    async_session = get_session()
+    async with async_session() as session:
+        result = await session.execute(
+            select(PendingVerification.id, PendingVerification.expires_at).filter(
+                PendingVerification.is_verified == False,
+                PendingVerification.is_kicked == False
+            )
+        )
+        return [(verification_id, expires_at, None) for verification_id, expires_at in result.all()]
+
+
 async def job_check_pending_verifications(bot: Bot):
     """
-    Проверяет истекшие верификации и кикает пользователей, которые не нажали кнопку.
-    Запускается каждую минуту.
+    Страховочный проход по истекшим верификациям и очистка старых записей.
+    Кик в срок делает delay queue (expire_verification).
     """
     async_session = get_session()
     now = utc_now()
     
     async with async_session() as session:
         # Находим все истекшие и необработанные верификации
-        result = await session.execute(
-            select(PendingVerification).filter(
-                PendingVerification.expires_at <= now,
-                PendingVerification.is_verified == False,
-                PendingVerification.is_kicked == False
-            )
-        )
+        result = await session.execute(_expired_verifications(now))
         expired_verifications = result.scalars().all()
         
         for verification in expired_verifications:
-            try:
-                # Проверяем, не стал ли пользователь админом
-                try:
-                    member = await bot.get_chat_member(verification.chat_id, verification.user_id)
-                    if member.status in ['administrator', 'creator']:
-                        # Админов не кикаем, просто отмечаем как верифицированных
-                        verification.is_verified = True
-                        logger.info(f"Пользователь {verification.user_id} — админ, пропускаем кик")
-                        continue
-                except Exception:
-                    pass
-                
-                # Кикаем пользователя
-                await bot.ban_chat_member(
-                    chat_id=verification.chat_id,
-                    user_id=verification.user_id,
-                    until_date=now + timedelta(seconds=60)  # Бан на 60 сек = кик с возможностью вернуться
-                )
-                
-                verification.is_kicked = True
-                
-                # Удаляем приветственное сообщение
-                if verification.welcome_message_id:
-                    try:
-                        await bot.delete_message(verification.chat_id, verification.welcome_message_id)
-                    except Exception:
-                        pass
-                
-                # Отправляем уведомление
-                try:
-                    username = verification.username or str(verification.user_id)
-                    await bot.send_message(
-                        verification.chat_id,
-                        f"👢 {username} был кикнут за неактивность (не подтвердил, что не бот)."
-                    )
-                except Exception:
-                    pass
-                
-                logger.info(f"Кикнут пользователь {verification.user_id} из чата {verification.chat_id} (не прошел верификацию)")
-                
-            except Exception as e:
-                logger.error(f"Ошибка при кике пользователя {verification.user_id}: {e}")
-                # Отмечаем как обработанный чтобы не пытаться снова
-                verification.is_kicked = True
+            await _kick_unverified(bot, verification, now)
         
         await session.commit()
         
@@ -153,60 +189,65 @@ async def job_check_pending_verifications(bot: Bot):
         await session.commit()
 
 
+async def _broadcast_chats():
+    """Чаты для плановых рассылок (только нужные колонки)."""
+    async_session = get_session()
+    async with async_session() as session:
+        result = await session.execute(
+            select(Chat.id, Chat.summary_topic_id, Chat.creative_topic_id)
+        )
+        return result.all()
+
+
+def _dailies_outgoing(chat, messages: list, filename: str) -> list:
+    """Сообщения DailiesService -> OutgoingMessage в топик сводок."""
+    from app.services.chat_broadcast import OutgoingMessage
+
+    return [
+        OutgoingMessage(
+            chat_id=chat.id,
+            text=msg.get("text"),
+            photo=msg.get("photo"),
+            filename=filename,
+            topic_id=chat.summary_topic_id,
+        )
+        for msg in messages
+    ]
+
+
 async def job_daily_summary(bot: Bot):
     """
     Morning summary job (08:00). Summarizes yesterday.
     Sends to summary_topic_id if set, otherwise to main chat.
     """
-    from app.services.dailies import dailies_service
-    
-    async_session = get_session()
-    async with async_session() as session:
-        try:
-            result = await session.execute(select(Chat))
-            chats = result.scalars().all()
-
-            for chat in chats:
-                try:
-                    # Get summary for yesterday
-                    messages = await dailies_service.get_morning_messages(
-                        chat.id, session, for_today=False
-                    )
-                    
-                    for msg in messages:
-                        text = msg.get("text")
-                        # In the morning we send to summary_topic_id if available
-                        target_topic = chat.summary_topic_id
-                        
-                        await bot.send_message(
-                            chat_id=chat.id,
-                            message_thread_id=target_topic,
-                            text=text,
-                            parse_mode="HTML",
-                            disable_web_page_preview=True
-                        )
-                        await asyncio.sleep(1)
-                except Exception as e:
-                    logger.error(f"Failed morning summary for chat {chat.id}: {e}")
-        except Exception as e:
-            logger.error(f"Error in morning summary job: {e}")
+    from app.services.briefings import briefing_service, MORNING
+    from app.services.chat_broadcast import chat_fanout
+
+    async def prepare(chat):
+        # Обычно уже собрано job_precompute_briefings; иначе собирается сейчас
+        messages = await briefing_service.get_messages(MORNING, chat.id)
+        return _dailies_outgoing(chat, messages, "summary.png")
+
+    try:
+        await chat_fanout.run(bot, "daily_summary", await _broadcast_chats(), prepare)
+    except Exception as e:
+        logger.error(f"Error in morning summary job: {e}")
+
 
 async def job_creative(bot: Bot):
-    async_session = get_session()
-    async with async_session() as session:
-        result = await session.execute(select(Chat))
-        chats = result.scalars().all()
+    from app.services.chat_broadcast import OutgoingMessage, chat_fanout
 
-        for chat in chats:
-            if chat.creative_topic_id:
-                text = await generate_creative(chat.id)
-                await bot.send_message(
-                    chat_id=chat.id,
-                    message_thread_id=chat.creative_topic_id,
-                    text=text,
-                    disable_web_page_preview=True
-                )
-                await asyncio.sleep(1)
+    async def prepare(chat):
+        text = await generate_creative(chat.id)
+        return [OutgoingMessage(
+            chat_id=chat.id,
+            text=text,
+            topic_id=chat.creative_topic_id,
+            parse_mode=None,
+        )]
+
+    chats = [chat for chat in await _broadcast_chats() if chat.creative_topic_id]
+    await chat_fanout.run(bot, "creative", chats, prepare)
 
 
 async def job_expire_trades_and_auctions(bot: Bot):
@@ -278,6 +319,32 @@ async def job_assign_daily_quests(bot: Bot):
             logger.info(f"Assigned {len(quests_to_assign)} quests to user {user.tg_user_id}")
 
 
+# Сколько ждать принятия объявленной войны
+WAR_ACCEPT_TIMEOUT = timedelta(minutes=5)
+
+
+async def team_war_deadline(bot: Bot, key: str, payload: dict):
+    """Delay queue: у войны истёк срок принятия или она закончилась."""
+    await job_update_team_wars(bot)
+
+
+async def team_war_deadlines():
+    """Сроки объявленных и активных войн для delay queue."""
+    async_session = get_session()
+    async with async_session() as session:
+        result = await session.execute(
+            select(TeamWar.id, TeamWar.status, TeamWar.created_at, TeamWar.end_time)
+            .filter(TeamWar.status.in_(["declared", "active"]))
+        )
+        deadlines = []
+        for war_id, status, created_at, end_time in result.all():
+            if status == "declared":
+                deadlines.append((f"{war_id}:accept", created_at + WAR_ACCEPT_TIMEOUT, None))
+            if end_time:
+                deadlines.append((f"{war_id}:end", end_time, None))
+        return deadlines
+
+
 async def job_update_team_wars(bot: Bot):
     """
     Manages the lifecycle of team wars: starting, ending, and determining winners.
@@ -290,7 +357,7 @@ async def job_update_team_wars(bot: Bot):
             .filter(
                 TeamWar.start_time == None, # Not yet started
                 TeamWar.status == "declared",
-                TeamWar.created_at <= utc_now() - timedelta(minutes=5) # Allow some time for acceptance
+                TeamWar.created_at <= utc_now() - WAR_ACCEPT_TIMEOUT # Allow some time for acceptance
             )
             .options(joinedload(TeamWar.declarer_guild), joinedload(TeamWar.defender_guild))
         )
@@ -444,37 +511,18 @@ async def job_aggregate_daily_stats(bot: Bot):
 
 async def job_sync_chat_members(bot: Bot):
     """
-    Periodically checks chat members and updates their status in the database.
+    Выборочная сверка статусов участников.
+    
+    Статусы ведутся по апдейтам chat_member (app/handlers/chat_join.py);
+    здесь проверяется только выборка самых давно проверенных записей.
     """
-    async_session = get_session()
-    async with async_session() as session:
-        result = await session.execute(select(Chat))
-        chats = result.scalars().all()
-
-        for chat in chats:
-            active_users_res = await session.execute(
-                select(User).filter(User.status == "active")
-            )
-            active_users = active_users_res.scalars().all()
-
-            for user in active_users:
-                try:
-                    chat_member = await bot.get_chat_member(
-                        chat_id=chat.id,
-                        user_id=user.tg_user_id
-                    )
-                    if chat_member.status in ["left", "kicked"]:
-                        user.status = "left"
-                        logger.info(f"User {user.tg_user_id} has left the chat {chat.id}. Updating status.")
-                except Exception:
-                    user.status = "left" # User not found in chat
-                    logger.info(f"User {user.tg_user_id} not found in chat {chat.id}. Updating status.")
-                
-                await asyncio.sleep(0.1) # Rate limit
-            
-            await session.commit()
-
+    from app.services.member_sync import member_sync
 
+    report = await member_sync.reconcile(bot)
+    logger.info(
+        f"Сверка участников: проверено {report.checked}, изменено {report.changed}, "
+        f"без ответа {report.errors}"
+    )
 
 
 async def job_start_daily_tournament(bot: Bot):
@@ -617,58 +665,18 @@ async def job_dailies_evening_summary(bot: Bot):
     
     **Validates: Requirements 13.1, 13.4, 13.5**
     """
-    from app.services.dailies import dailies_service
-    from aiogram.types import BufferedInputFile
-    
-    async_session = get_session()
-    async with async_session() as session:
-        try:
-            # Get all chats
-            result = await session.execute(select(Chat))
-            chats = result.scalars().all()
-            
-            for chat in chats:
-                try:
-                    # Get summary messages (for_today=True for evening summary)
-                    messages = await dailies_service.get_morning_messages(
-                        chat.id, session, for_today=True
-                    )
-                    
-                    target_topic = chat.summary_topic_id
-                    
-                    for msg in messages:
-                        text = msg.get("text")
-                        photo = msg.get("photo")
-                        
-                        if photo:
-                            input_file = BufferedInputFile(photo, filename="summary.png")
-                            await bot.send_photo(
-                                chat_id=chat.id,
-                                message_thread_id=target_topic,
-                                photo=input_file,
-                                caption=text,
-                                parse_mode="HTML"
-                            )
-                        else:
-                            await bot.send_message(
-                                chat_id=chat.id,
-                                message_thread_id=target_topic,
-                                text=text,
-                                parse_mode="HTML",
-                                disable_web_page_preview=True
-                            )
-                        await asyncio.sleep(0.5)  # Rate limiting
-                    
-                    if messages:
-                        logger.info(f"Sent evening summary to chat {chat.id}")
-                    else:
-                        logger.debug(f"Skipped evening summary for chat {chat.id} (no activity or disabled)")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to send evening summary to chat {chat.id}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error in evening summary job: {e}")
+    from app.services.briefings import briefing_service, EVENING_SUMMARY
+    from app.services.chat_broadcast import chat_fanout
+
+    async def prepare(chat):
+        # Пустой список = нет активности или сводка выключена
+        messages = await briefing_service.get_messages(EVENING_SUMMARY, chat.id)
+        return _dailies_outgoing(chat, messages, "summary.png")
+
+    try:
+        await chat_fanout.run(bot, "evening_summary", await _broadcast_chats(), prepare)
+    except Exception as e:
+        logger.error(f"Error in evening summary job: {e}")
 
 
 async def job_dailies_evening_quote_and_stats(bot: Bot):
@@ -679,58 +687,31 @@ async def job_dailies_evening_quote_and_stats(bot: Bot):
     
     **Validates: Requirements 13.2, 13.3, 13.4**
     """
-    from app.services.dailies import dailies_service
-    from aiogram.types import BufferedInputFile
-    
-    async_session = get_session()
-    async with async_session() as session:
-        try:
-            # Get all chats
-            result = await session.execute(select(Chat))
-            chats = result.scalars().all()
-            
-            for chat in chats:
-                try:
-                    # Get evening messages (respects settings)
-                    messages = await dailies_service.get_evening_messages(
-                        chat.id, session
-                    )
-                    
-                    target_topic = chat.summary_topic_id
-                    
-                    for msg in messages:
-                        text = msg.get("text")
-                        photo = msg.get("photo")
-                        
-                        if photo:
-                            input_file = BufferedInputFile(photo, filename="stats.png")
-                            await bot.send_photo(
-                                chat_id=chat.id,
-                                message_thread_id=target_topic,
-                                photo=input_file,
-                                caption=text,
-                                parse_mode="HTML"
-                            )
-                        else:
-                            await bot.send_message(
-                                chat_id=chat.id,
-                                message_thread_id=target_topic,
-                                text=text,
-                                parse_mode="HTML",
-                                disable_web_page_preview=True
-                            )
-                        await asyncio.sleep(0.5)  # Rate limiting
-                    
-                    if messages:
-                        logger.info(f"Sent evening quote/stats to chat {chat.id}")
-                    else:
-                        logger.debug(f"Skipped evening messages for chat {chat.id} (disabled)")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to send evening messages to chat {chat.id}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error in evening quote/stats job: {e}")
+    from app.services.briefings import briefing_service, EVENING_EXTRAS
+    from app.services.chat_broadcast import chat_fanout
+
+    async def prepare(chat):
+        # Evening messages (respects settings)
+        messages = await briefing_service.get_messages(EVENING_EXTRAS, chat.id)
+        return _dailies_outgoing(chat, messages, "stats.png")
+
+    try:
+        await chat_fanout.run(bot, "evening_quote_stats", await _broadcast_chats(), prepare)
+    except Exception as e:
+        logger.error(f"Error in evening quote/stats job: {e}")
+
+
+async def job_precompute_briefings(bot: Bot, kind: str):
+    """
+    Предрасчёт сводки вида kind (LLM, темы, графики) до времени доставки.
+    Задачи доставки затем только отправляют готовые сообщения.
+    """
+    from app.services.briefings import briefing_service
+    try:
+        chats = await _broadcast_chats()
+        await briefing_service.precompute(kind, [chat.id for chat in chats])
+    except Exception as e:
+        logger.error(f"Ошибка в job_precompute_briefings ({kind}): {e}")
 
 
 async def job_sync_sdoc_admins(bot: Bot):
@@ -841,6 +822,108 @@ async def job_generate_system_auction(bot: Bot):
     await auction_service.create_system_auction(bot)
 
 
+async def job_message_retention(bot: Bot):
+    """
+    Архив и удаление сообщений старше горизонта чата, партиции (PostgreSQL)
+    и возврат места файлу БД (SQLite).
+    """
+    from app.services.message_retention import message_retention
+    try:
+        await message_retention.run()
+    except Exception as e:
+        logger.error(f"Ошибка в job_message_retention: {e}")
+
+
+def _leader_only(job_id: str, func):
+    """Задача выполняется только на реплике-лидере; время и статус — в метрики."""
+    @functools.wraps(func)
+    async def run(*args, **kwargs):
+        from app.services.metrics import metrics
+        from app.services.scheduler_leader import scheduler_leader
+
+        if not scheduler_leader.is_leader:
+            await metrics.increment_counter(
+                "scheduler_job_runs_total", labels={"job": job_id, "status": "follower"}
+            )
+            return
+        await scheduler_leader.record_run(job_id)
+        status = "ok"
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            await metrics.observe_histogram(
+                "scheduler_job_duration_seconds", time.perf_counter() - started, labels={"job": job_id}
+            )
+            await metrics.increment_counter(
+                "scheduler_job_runs_total", labels={"job": job_id, "status": status}
+            )
+    return run
+
+
+async def catch_up_missed_runs(scheduler: AsyncIOScheduler) -> int:
+    """
+    Один раз догнать cron-запуски, пропущенные за время простоя.
+
+    Вызывается, когда реплика становится лидером (старт или смена лидера).
+    Интервальные задачи не догоняются — они и так скоро сработают.
+
+    Returns:
+        Количество запланированных догоняющих запусков
+    """
+    from app.services.metrics import metrics
+    from app.services.scheduler_leader import previous_fire_time, scheduler_leader
+
+    grace = timedelta(minutes=settings.scheduler_catchup_grace_minutes)
+    if not grace:
+        return 0
+    now = datetime.now(scheduler.timezone)
+    scheduled = 0
+    for job in scheduler.get_jobs():
+        if not isinstance(job.trigger, CronTrigger):
+            continue
+        missed = previous_fire_time(job.trigger, now, grace)
+        if missed is None:
+            continue
+        last_run = await scheduler_leader.last_run(job.id)
+        if last_run is None:
+            # Первый запуск с учётом запусков: что было до него — неизвестно
+            await scheduler_leader.record_run(job.id, now)
+            continue
+        if last_run >= missed:
+            continue
+        logger.warning(f"Догоняем пропущенный запуск {job.id} ({missed.isoformat()})")
+        job.modify(next_run_time=now)
+        await metrics.increment_counter("scheduler_catchup_runs_total", labels={"job": job.id})
+        scheduled += 1
+    return scheduled
+
+
+def _register_delay_handlers():
+    """Обработчики сроков для delay queue (истечение точно в срок)."""
+    from app.handlers.mafia import register_phase_timers
+    from app.services.auction_service import auction_service
+    from app.services.delay_queue import (
+        delay_queue, AUCTION_END, TEAM_WAR_DEADLINE, TRADE_EXPIRY, VERIFICATION_EXPIRY,
+    )
+    from app.services.trade_service import trade_service
+
+    async def expire_trade(bot, trade_id, payload):
+        await trade_service.expire_old_trades(trade_id=int(trade_id))
+
+    async def complete_auction(bot, auction_id, payload):
+        await auction_service.complete_expired_auctions(auction_id=int(auction_id))
+
+    delay_queue.register(TRADE_EXPIRY, expire_trade, reload=trade_service.pending_trade_deadlines)
+    delay_queue.register(AUCTION_END, complete_auction, reload=auction_service.active_auction_deadlines)
+    delay_queue.register(VERIFICATION_EXPIRY, expire_verification, reload=pending_verification_deadlines)
+    delay_queue.register(TEAM_WAR_DEADLINE, team_war_deadline, reload=team_war_deadlines)
+    register_phase_timers()
+
+
 async def setup_scheduler(bot: Bot):
     global _scheduler
     if _scheduler:
@@ -855,13 +938,16 @@ async def setup_scheduler(bot: Bot):
     _scheduler.add_job(job_daily_summary, CronTrigger(hour=8, minute=0), args=[bot], id="daily_summary")
     _scheduler.add_job(job_creative, CronTrigger(hour=20, minute=0), args=[bot], id="creative")
     _scheduler.add_job(job_assign_daily_quests, CronTrigger(hour=0, minute=0), args=[bot], id="assign_daily_quests")
-    _scheduler.add_job(job_update_team_wars, CronTrigger(minute="*/1"), args=[bot], id="update_team_wars")
+    # Сроки (обмены, аукционы, верификации, войны) срабатывают через delay queue;
+    # периодические проходы ниже — только страховка на случай потерянной задачи
+    sweep = IntervalTrigger(minutes=settings.expiry_sweep_interval_minutes)
+    _scheduler.add_job(job_update_team_wars, sweep, args=[bot], id="update_team_wars")
     _scheduler.add_job(job_aggregate_daily_stats, CronTrigger(hour=23, minute=59), args=[bot], id="aggregate_daily_stats")
     _scheduler.add_job(job_sync_chat_members, CronTrigger(hour=3, minute=0), args=[bot], id="sync_chat_members")
-    # Welcome 2.0: проверка истекших верификаций каждую минуту
-    _scheduler.add_job(job_check_pending_verifications, IntervalTrigger(minutes=1), args=[bot], id="check_pending_verifications")
-    # Trading v9.5: expire trades and complete auctions every minute
-    _scheduler.add_job(job_expire_trades_and_auctions, IntervalTrigger(minutes=1), args=[bot], id="expire_trades_and_auctions")
+    # Welcome 2.0: страховочная проверка истекших верификаций и очистка старых записей
+    _scheduler.add_job(job_check_pending_verifications, sweep, args=[bot], id="check_pending_verifications")
+    # Trading v9.5: страховочное истечение обменов и завершение аукционов
+    _scheduler.add_job(job_expire_trades_and_auctions, sweep, args=[bot], id="expire_trades_and_auctions")
     
     # Dynamic Events
     _scheduler.add_job(job_generate_daily_event, CronTrigger(hour=9, minute=0), args=[bot], id="generate_daily_event")
@@ -870,6 +956,14 @@ async def setup_scheduler(bot: Bot):
     # System Auctions (Black Market) - Every 6 hours
     _scheduler.add_job(job_generate_system_auction, IntervalTrigger(hours=6), args=[bot], id="generate_system_auction")
     
+    # Хранение лога сообщений: архив старых строк, партиции, VACUUM — ночью
+    _scheduler.add_job(
+        job_message_retention,
+        CronTrigger(hour=4, minute=30, timezone='UTC'),
+        args=[bot],
+        id="message_retention"
+    )
+    
     # Rooster HP regeneration: every hour
     _scheduler.add_job(
         job_regenerate_rooster_hp,
@@ -934,5 +1028,43 @@ async def setup_scheduler(bot: Bot):
         id="dailies_evening_quote_stats"
     )
     
+    # Предрасчёт сводок в тихое окно перед доставкой (08:00, 20:00, 21:00)
+    if settings.briefing_precompute_enabled:
+        from app.services.briefings import DELIVERY_TIMES, precompute_time
+        for kind, (_, _, kind_tz) in DELIVERY_TIMES.items():
+            hour, minute = precompute_time(kind, settings.briefing_precompute_lead_minutes)
+            _scheduler.add_job(
+                job_precompute_briefings,
+                CronTrigger(hour=hour, minute=minute, timezone=kind_tz or tz),
+                args=[bot, kind],
+                id=f"precompute_briefing_{kind}"
+            )
+    
+    # Несколько реплик: задачи выполняет только держатель аренды в Redis
+    for job in _scheduler.get_jobs():
+        job.modify(func=_leader_only(job.id, job.func))
+    
     _scheduler.start()
-    logger.info("Планировщик запущен с tournament jobs, dailies jobs и job_check_pending_verifications")
\ No newline at end of file
+    
+    _register_delay_handlers()
+    from app.services.delay_queue import delay_queue
+    await delay_queue.start(bot)
+    
+    from app.services.scheduler_leader import scheduler_leader
+    await scheduler_leader.start(on_acquired=lambda: catch_up_missed_runs(_scheduler))
+    logger.info(
+        "Планировщик запущен с tournament jobs, dailies jobs и job_check_pending_verifications "
+        f"({'лидер' if scheduler_leader.is_leader else 'ожидает аренду'})"
+    )
+
+
+async def stop_scheduler():
+    """Остановить планировщик, delay queue и отдать аренду лидерства."""
+    global _scheduler
+    from app.services.delay_queue import delay_queue
+    from app.services.scheduler_leader import scheduler_leader
+    await delay_queue.stop()
+    await scheduler_leader.stop()
+    if _scheduler:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
\ No newline at end of file
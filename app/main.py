@@ -59,6 +59,7 @@ from app.middleware.logging import MessageLoggerMiddleware
 from app.middleware.anti_click import AntiClickMiddleware
 from app.middleware.feature_toggle import FeatureToggleMiddleware
 from app.middleware.sdoc_filter import SDOCFilterMiddleware
+from app.middleware.unit_of_work import UnitOfWorkMiddleware
 from app.jobs.scheduler import setup_scheduler
 
 # Логгер будет инициализирован в main()
@@ -88,6 +89,14 @@ async def on_startup(bot: Bot, dp: Dispatcher):
     await init_db()
     logger.info("База данных инициализирована")
     
+    # Единственный писатель лога сообщений с пакетными коммитами
+    from app.database.write_queue import write_queue
+    await write_queue.start()
+    
+    # Почасовые счётчики активности (и бэкфилл из MessageLog при первом запуске)
+    from app.services.activity_rollup import activity_rollup
+    await activity_rollup.start()
+    
     # Инициализация достижений и квестов
     logger.info("Инициализация достижений и квестов...")
     from app.services.achievements import init_achievements
@@ -161,6 +170,16 @@ async def on_startup(bot: Bot, dp: Dispatcher):
         else:
             logger.warning("Whisper не удалось инициализировать, распознавание голосовых недоступно")
 
+    # Шаблоны кружочков кодируются в сегменты фоном (сборка ответа — копирование)
+    from app.services import media_pipe
+    if media_pipe.ffmpeg_available():
+        from app.services.video_note_templates import video_note_templates
+        dp.tasks.append(asyncio.create_task(video_note_templates.warm_up()))
+
+    # Процессы отрисовки картинок: шрифты и фоны загружаются один раз
+    from app.services.render_pool import render_pool
+    dp.tasks.append(asyncio.create_task(render_pool.start()))
+
     # Edge TTS не требует предзагрузки (работает через API)
     logger.info("TTS: используется Edge TTS (Microsoft API)")
 
@@ -296,6 +315,9 @@ def build_dp() -> Dispatcher:
     """Построить диспетчер с обработчиками."""
     dp = Dispatcher(storage=MemoryStorage())
     
+    # Unit of Work — одна сессия БД на апдейт + счётчики запросов (N+1 warnings)
+    dp.update.outer_middleware(UnitOfWorkMiddleware())
+    
     # Retry middleware — автоматический повтор при сетевых ошибках (должен быть первым)
     from app.middleware.retry import RetryMiddleware
     dp.message.outer_middleware(RetryMiddleware(max_retries=3, base_delay=1.0))
@@ -496,6 +518,25 @@ async def main():
 
         logger.info("Фоновые задачи остановлены")
 
+        from app.jobs.scheduler import stop_scheduler
+        await stop_scheduler()
+        logger.info("Планировщик остановлен")
+
+        from app.services.voice_recognition import shutdown_whisper
+        await shutdown_whisper()
+
+        from app.services.render_pool import render_pool
+        render_pool.stop()
+
+        from app.services.vision_queue import vision_queue
+        await vision_queue.stop()
+
+        logger.info("Запись очереди сообщений в БД...")
+        from app.database.write_queue import write_queue
+        await write_queue.stop()
+        from app.services.activity_rollup import activity_rollup
+        await activity_rollup.stop()
+
         logger.info("Остановка воркеров загрузки контента...")
         from app.services.content_downloader import downloader
         await downloader.stop_workers()
@@ -531,6 +572,11 @@ async def main():
         await close_all_clients()
         logger.info("httpx клиенты закрыты")
 
+        # Close database pools (writer and SQLite read-only pool)
+        from app.database.session import close_db
+        await close_db()
+        logger.info("Пулы соединений БД закрыты")
+
         await bot.session.close()
         logger.info("Сессия бота закрыта")
 
@@ -7,7 +7,11 @@ from aiogram.types import Message
 from aiogram import types
 from datetime import datetime
 
-from app.database.session import get_session
+from app.database.unit_of_work import session_scope
+from app.database.write_queue import write_queue
+from app.services.activity_rollup import activity_rollup
+from app.services.topic_clusters import topic_clusters
+from app.services.member_sync import member_sync
 from app.database.models import MessageLog, User
 from sqlalchemy import select, update
 from app.utils import utc_now
@@ -51,8 +55,7 @@ class MessageLoggerMiddleware(BaseMiddleware):
                 )
             text = event.text or event.caption or ""
             links = LINK_RE.findall(text) if text else []
-            async_session = get_session()
-            async with async_session() as session:
+            async with session_scope() as session:
                 # upsert user by tg_user_id
                 res = await session.execute(select(User).where(User.tg_user_id == event.from_user.id))
                 user = res.scalars().first()
@@ -72,23 +75,31 @@ class MessageLoggerMiddleware(BaseMiddleware):
                         .values(username=event.from_user.username)
                     )
 
-                ml = MessageLog(
-                    chat_id=event.chat.id,
-                    message_id=event.message_id,
-                    user_id=event.from_user.id,
-                    username=event.from_user.username,
-                    text=text,
-                    has_link=bool(links),
-                    links="\n".join(links) if links else None,
-                    topic_id=getattr(event, 'message_thread_id', None),  # ID топика в форуме
-                    created_at=utc_now(),
-                )
-                session.add(ml)
                 try:
                     await session.commit()
                 except Exception:
                     await session.rollback()
             
+            # Лог сообщений пишется пачками единственным писателем (не блокирует апдейт)
+            ml = MessageLog(
+                chat_id=event.chat.id,
+                message_id=event.message_id,
+                user_id=event.from_user.id,
+                username=event.from_user.username,
+                text=text,
+                has_link=bool(links),
+                links="\n".join(links) if links else None,
+                topic_id=getattr(event, 'message_thread_id', None),  # ID топика в форуме
+                created_at=utc_now(),
+            )
+            await write_queue.add(ml)
+            # Почасовые счётчики активности (сводки, /whois, дашборд)
+            activity_rollup.record(ml)
+            # Онлайн-кластеры тем (горячие темы в сводках)
+            topic_clusters.record(ml)
+            # Писавший в группе — участник (статусы для сверки участников)
+            await member_sync.note_seen(ml.chat_id, ml.user_id)
+            
             # Extract facts ONLY when user directly interacts with Oleg (replies, mentions, or DM)
             if text and len(text) >= 10 and event.from_user:
                 # Check if this is a direct interaction with the bot
@@ -0,0 +1,79 @@
+"""
+Unit of Work Middleware.
+
+Открывает одну UnitOfWork на апдейт, передаёт её хендлерам как ``uow``
+и считает запросы к БД. Если апдейт сделал слишком много запросов,
+в лог пишется предупреждение о N+1 (см. app.database.unit_of_work).
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.database.unit_of_work import UnitOfWork, db_metrics, track_queries
+
+logger = logging.getLogger(__name__)
+
+
+def _describe_update(event: TelegramObject) -> str:
+    """Короткая метка апдейта для логов и метрик: команда или тип события."""
+    if isinstance(event, Update):
+        inner = event.event
+        event_type = event.event_type
+    else:
+        inner = event
+        event_type = type(event).__name__.lower()
+
+    text = getattr(inner, "text", None)
+    if isinstance(text, str) and text.startswith("/"):
+        return text.split()[0].split("@")[0].lower()
+
+    data = getattr(inner, "data", None)
+    if event_type == "callback_query" and isinstance(data, str):
+        return f"callback:{data.split(':')[0]}"
+
+    return event_type
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """
+    Middleware единицы работы (регистрируется на dp.update как outer).
+
+    - Одна сессия БД (identity map) на апдейт вместо нескольких
+      get_session()() в сервисах; транзакции короткие — по одной на
+      session_scope(), соединение не держится во время LLM-вызовов
+    - Метрики: запросы и время запросов на апдейт, checkout'ы пула
+    - Предупреждение о N+1 при превышении settings.db_query_warn_threshold
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        label = _describe_update(event)
+
+        async with track_queries(label) as stats:
+            async with UnitOfWork() as uow:
+                data["uow"] = uow
+                result = await handler(event, data)
+
+        await self._record_metrics(label, stats)
+        return result
+
+    @staticmethod
+    async def _record_metrics(label: str, stats) -> None:
+        """Отправить статистику апдейта в Prometheus-коллектор."""
+        try:
+            from app.services.metrics import metrics
+
+            await metrics.observe_histogram("bot_db_queries_per_update", stats.query_count)
+            await metrics.observe_histogram("bot_db_query_seconds_per_update", stats.query_time)
+            await metrics.increment_counter("bot_db_queries_total", stats.query_count)
+            await metrics.set_gauge("bot_db_pool_checked_out", db_metrics.pool_checked_out)
+            await metrics.set_gauge("bot_db_n_plus_one_warnings", db_metrics.n_plus_one_warnings)
+        except Exception as e:
+            logger.debug(f"Failed to record DB metrics for {label}: {e}")
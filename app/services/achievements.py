@@ -8,7 +8,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.models import Achievement, UserAchievement, User, GameStat, MessageLog
-from app.database.session import get_session
+from app.database.unit_of_work import session_scope
 from app.utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -53,8 +53,7 @@ ACHIEVEMENTS = [
 
 async def init_achievements():
     """Инициализировать достижения в БД при старте."""
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         for ach_data in ACHIEVEMENTS:
             existing = await session.scalar(
                 select(Achievement).where(Achievement.code == ach_data["code"])
@@ -95,96 +94,90 @@ async def check_and_award_achievements(
         user_id = user.tg_user_id
         session = None  # Создадим новую
     
-    close_session = False
-    if session is None:
-        async_session = get_session()
-        session = async_session()
-        close_session = True
-    
+    async with session_scope(session) as session:
+        return await _award_by_stats(session, user_id)
+
+
+async def _award_by_stats(session: AsyncSession, user_id: int) -> list[str]:
+    """Выдать достижения по статистике пользователя в переданной сессии."""
     awarded = []
     
-    try:
-        # Получаем пользователя
-        user = await session.scalar(
-            select(User).where(User.tg_user_id == user_id)
-        )
-        if not user:
-            return []
-        
-        # Получаем уже полученные достижения
-        existing = await session.execute(
-            select(UserAchievement.achievement_id)
-            .where(UserAchievement.user_id == user.id)
-        )
-        existing_ids = {row[0] for row in existing.fetchall()}
-        
-        # Получаем все достижения
-        all_achievements = await session.execute(select(Achievement))
-        achievements_map = {a.code: a for a in all_achievements.scalars()}
-        
-        # Получаем статистику
-        game_stat = await session.scalar(
-            select(GameStat).where(GameStat.tg_user_id == user_id)
-        )
-        
-        # Считаем сообщения
-        from sqlalchemy import func
-        msg_count = await session.scalar(
-            select(func.count(MessageLog.id))
-            .where(MessageLog.user_id == user_id)
-        ) or 0
-        
-        # Проверяем достижения
-        checks = [
-            ("first_message", msg_count >= 1),
-            ("chatterbox", msg_count >= 100),
-            ("storyteller", msg_count >= 1000),
-            ("legend", msg_count >= 10000),
-        ]
-        
-        if game_stat:
-            checks.extend([
-                ("grower", game_stat.size_cm >= 10),
-                ("average", game_stat.size_cm >= 15),
-                ("big_boy", game_stat.size_cm >= 25),
-                ("monster", game_stat.size_cm >= 50),
-                ("titan", game_stat.size_cm >= 100),
-                ("first_blood", game_stat.pvp_wins >= 1),
-                ("fighter", game_stat.pvp_wins >= 10),
-                ("warrior", game_stat.pvp_wins >= 50),
-                ("champion", game_stat.pvp_wins >= 100),
-                ("jackpot", game_stat.casino_jackpots >= 1),
-            ])
-        
-        # Выдаём достижения
-        for code, condition in checks:
-            if code in achievements_map and condition:
-                ach = achievements_map[code]
-                if ach.id not in existing_ids:
-                    ua = UserAchievement(
-                        user_id=user.id,
-                        achievement_id=ach.id,
-                        unlocked_at=utc_now()
-                    )
-                    session.add(ua)
-                    awarded.append(ach.name)
-                    existing_ids.add(ach.id)
-                    logger.info(f"Awarded achievement {code} to user {user_id}")
-        
-        if awarded:
-            await session.commit()
-        
-        return awarded
-        
-    finally:
-        if close_session:
-            await session.close()
+    # Получаем пользователя
+    user = await session.scalar(
+        select(User).where(User.tg_user_id == user_id)
+    )
+    if not user:
+        return []
+    
+    # Получаем уже полученные достижения
+    existing = await session.execute(
+        select(UserAchievement.achievement_id)
+        .where(UserAchievement.user_id == user.id)
+    )
+    existing_ids = {row[0] for row in existing.fetchall()}
+    
+    # Получаем все достижения
+    all_achievements = await session.execute(select(Achievement))
+    achievements_map = {a.code: a for a in all_achievements.scalars()}
+    
+    # Получаем статистику
+    game_stat = await session.scalar(
+        select(GameStat).where(GameStat.tg_user_id == user_id)
+    )
+    
+    # Считаем сообщения
+    from sqlalchemy import func
+    msg_count = await session.scalar(
+        select(func.count(MessageLog.id))
+        .where(MessageLog.user_id == user_id)
+    ) or 0
+    
+    # Проверяем достижения
+    checks = [
+        ("first_message", msg_count >= 1),
+        ("chatterbox", msg_count >= 100),
+        ("storyteller", msg_count >= 1000),
+        ("legend", msg_count >= 10000),
+    ]
+    
+    if game_stat:
+        checks.extend([
+            ("grower", game_stat.size_cm >= 10),
+            ("average", game_stat.size_cm >= 15),
+            ("big_boy", game_stat.size_cm >= 25),
+            ("monster", game_stat.size_cm >= 50),
+            ("titan", game_stat.size_cm >= 100),
+            ("first_blood", game_stat.pvp_wins >= 1),
+            ("fighter", game_stat.pvp_wins >= 10),
+            ("warrior", game_stat.pvp_wins >= 50),
+            ("champion", game_stat.pvp_wins >= 100),
+            ("jackpot", game_stat.casino_jackpots >= 1),
+        ])
+    
+    # Выдаём достижения
+    for code, condition in checks:
+        if code in achievements_map and condition:
+            ach = achievements_map[code]
+            if ach.id not in existing_ids:
+                ua = UserAchievement(
+                    user_id=user.id,
+                    achievement_id=ach.id,
+                    unlocked_at=utc_now()
+                )
+                session.add(ua)
+                awarded.append(ach.name)
+                existing_ids.add(ach.id)
+                logger.info(f"Awarded achievement {code} to user {user_id}")
+    
+    if awarded:
+        await session.commit()
+    
+    return awarded
 
 
 async def award_achievement(user_id: int, code: str) -> Optional[str]:
     """Выдать конкретное достижение пользователю."""
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         user = await session.scalar(
             select(User).where(User.tg_user_id == user_id)
         )
@@ -0,0 +1,501 @@
+"""
+Activity Rollup - потоковые почасовые счётчики активности чатов.
+
+Вместо того чтобы каждый раз перечитывать сырые строки MessageLog за период
+(сводки, /whois, дашборд), счётчики обновляются при приёме сообщения:
+
+- chat_activity_rollups: (chat_id, час, user_id) → сообщения, текстовые,
+  со ссылками, токсичные, позитивные, негативные
+- chat_keyword_rollups: (chat_id, час, слово) → упоминания
+
+record() только накапливает дельты в памяти; фоновая задача раз в
+``settings.rollup_flush_interval_seconds`` сливает их в БД одним upsert
+(counter = counter + delta). Чтение за период — O(часов), а не O(сообщений).
+
+При первом запуске (таблица пустая, а сообщения уже есть) счётчики
+строятся из существующего MessageLog в фоне, строго до максимального id
+на момент старта — новые сообщения к этому времени считает record().
+
+Usage:
+    from app.services.activity_rollup import activity_rollup
+
+    activity_rollup.record(message_log)
+    totals = await activity_rollup.chat_totals(session, chat_id, start, end)
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import ChatActivityRollup, ChatKeywordRollup, MessageLog
+from app.services.toxicity_scorer import TextSignals, classify_batch, classify_text
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Ключевые слова (горячие темы); токсичность/настроение — toxicity_scorer
+# ============================================================================
+
+# Слова, которые не считаются темой
+TOPIC_STOP_WORDS = {
+    'это', 'как', 'что', 'для', 'все', 'они', 'его', 'она', 'так',
+    'уже', 'или', 'если', 'есть', 'было', 'быть', 'был', 'была',
+    'были', 'будет', 'будут', 'очень', 'просто', 'можно', 'нужно',
+    'там', 'тут', 'здесь', 'когда', 'потом', 'тоже', 'только',
+    'ещё', 'еще', 'вот', 'чтобы', 'этот', 'этого', 'этом', 'этой',
+    'надо', 'меня', 'тебя', 'нахуй', 'сука', 'блять', 'хуй',
+}
+
+_KEYWORD_RE = re.compile(r'[а-яёa-z]{4,}')
+
+# Не больше стольких ключевых слов с одного сообщения (копипаста не раздувает таблицу)
+_MAX_KEYWORDS_PER_MESSAGE = 20
+# Длина колонки keyword
+_MAX_KEYWORD_LENGTH = 64
+# Строк в одном upsert
+_UPSERT_CHUNK = 500
+# Сообщений в одной порции бэкфилла
+_BACKFILL_CHUNK = 2000
+
+
+def extract_keywords(text: Optional[str]) -> List[str]:
+    """
+    Уникальные ключевые слова сообщения (4+ букв, без стоп-слов), в порядке появления.
+
+    Args:
+        text: Текст сообщения
+
+    Returns:
+        Список слов в нижнем регистре
+    """
+    if not text:
+        return []
+    seen: Dict[str, None] = {}
+    for word in _KEYWORD_RE.findall(text.lower()):
+        if word not in TOPIC_STOP_WORDS and word not in seen:
+            seen[word] = None
+            if len(seen) >= _MAX_KEYWORDS_PER_MESSAGE:
+                break
+    return [w[:_MAX_KEYWORD_LENGTH] for w in seen]
+
+
+def hour_bucket(moment: Optional[datetime]) -> datetime:
+    """
+    Начало часа в naive UTC — ключ строки счётчиков.
+
+    Aware-время приводится к UTC, naive считается уже UTC (так его
+    возвращает SQLite для MessageLog.created_at).
+    """
+    if moment is None:
+        moment = datetime.now(timezone.utc)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _upsert_statement(session: AsyncSession, model, key_columns: List[str], counter_columns: List[str],
+                      replace_columns: Tuple[str, ...] = ()):
+    """INSERT ... ON CONFLICT DO UPDATE counter = counter + excluded.counter (SQLite/PostgreSQL)."""
+    dialect = session.bind.dialect.name if session.bind is not None else "sqlite"
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = model.__table__
+    stmt = insert(table)
+    updates = {col: table.c[col] + stmt.excluded[col] for col in counter_columns}
+    for col in replace_columns:
+        updates[col] = func.coalesce(stmt.excluded[col], table.c[col])
+    return stmt.on_conflict_do_update(index_elements=key_columns, set_=updates)
+
+
+_USER_COUNTERS = (
+    "message_count", "text_count", "link_count",
+    "toxic_count", "positive_count", "negative_count",
+)
+
+
+class ActivityRollupService:
+    """Накопитель почасовых счётчиков с периодической записью в БД."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        """
+        Args:
+            session_factory: Фабрика сессий (по умолчанию get_session())
+            flush_interval: Период записи в БД, секунды
+                (по умолчанию settings.rollup_flush_interval_seconds)
+        """
+        self._session_factory = session_factory
+        self._flush_interval = flush_interval
+        # (chat_id, hour, user_id) -> [username, *counters]
+        self._pending_users: Dict[Tuple[int, datetime, int], List[Any]] = {}
+        self._pending_keywords: Counter = Counter()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._backfill_task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.messages_recorded = 0
+        self.rows_flushed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self.backfilled_messages = 0
+        self.backfill_done = False
+
+    @property
+    def running(self) -> bool:
+        """Запущена ли фоновая запись."""
+        return self._task is not None and not self._task.done()
+
+    def _factory(self) -> Callable[[], AsyncSession]:
+        if self._session_factory is not None:
+            return self._session_factory
+        from app.database.session import get_session
+        return get_session()
+
+    def _interval(self) -> float:
+        if self._flush_interval is not None:
+            return self._flush_interval
+        from app.config import settings
+        return settings.rollup_flush_interval_seconds
+
+    # ------------------------------------------------------------------
+    # Приём
+    # ------------------------------------------------------------------
+
+    def record(self, message: Any) -> None:
+        """
+        Учесть сообщение (MessageLog или строку с теми же полями).
+
+        Синхронно и без обращения к БД — вызывается прямо в middleware.
+        """
+        self._accumulate(message)
+        self.messages_recorded += 1
+
+    def _accumulate(self, message: Any, signals: Optional[TextSignals] = None) -> None:
+        hour = hour_bucket(getattr(message, "created_at", None))
+        chat_id = message.chat_id
+        text = getattr(message, "text", None)
+        if signals is None:
+            signals = classify_text(text)
+
+        key = (chat_id, hour, message.user_id)
+        row = self._pending_users.get(key)
+        if row is None:
+            row = [None, 0, 0, 0, 0, 0, 0]
+            self._pending_users[key] = row
+        if getattr(message, "username", None):
+            row[0] = message.username
+        row[1] += 1
+        row[2] += 1 if text else 0
+        row[3] += 1 if getattr(message, "has_link", False) else 0
+        row[4] += signals.toxic
+        row[5] += signals.positive
+        row[6] += signals.negative
+
+        for word in extract_keywords(text):
+            self._pending_keywords[(chat_id, hour, word)] += 1
+
+    def pending_rows(self) -> int:
+        """Сколько строк ждёт записи."""
+        return len(self._pending_users) + len(self._pending_keywords)
+
+    async def flush(self) -> int:
+        """
+        Записать накопленные дельты одним upsert'ом.
+
+        При ошибке дельты возвращаются в буфер и уйдут со следующей записью.
+
+        Returns:
+            Количество записанных строк
+        """
+        async with self._flush_lock:
+            users, self._pending_users = self._pending_users, {}
+            keywords, self._pending_keywords = self._pending_keywords, Counter()
+            if not users and not keywords:
+                return 0
+
+            start = time.perf_counter()
+            user_rows = [
+                {
+                    "chat_id": chat_id, "hour": hour, "user_id": user_id, "username": row[0],
+                    **dict(zip(_USER_COUNTERS, row[1:])),
+                }
+                for (chat_id, hour, user_id), row in users.items()
+            ]
+            keyword_rows = [
+                {"chat_id": chat_id, "hour": hour, "keyword": word, "count": count}
+                for (chat_id, hour, word), count in keywords.items()
+            ]
+
+            try:
+                async with self._factory()() as session:
+                    if user_rows:
+                        stmt = _upsert_statement(
+                            session, ChatActivityRollup, ["chat_id", "hour", "user_id"],
+                            list(_USER_COUNTERS), replace_columns=("username",),
+                        )
+                        for i in range(0, len(user_rows), _UPSERT_CHUNK):
+                            await session.execute(stmt, user_rows[i:i + _UPSERT_CHUNK])
+                    if keyword_rows:
+                        stmt = _upsert_statement(
+                            session, ChatKeywordRollup, ["chat_id", "hour", "keyword"], ["count"],
+                        )
+                        for i in range(0, len(keyword_rows), _UPSERT_CHUNK):
+                            await session.execute(stmt, keyword_rows[i:i + _UPSERT_CHUNK])
+                    await session.commit()
+            except Exception as e:
+                self.flush_errors += 1
+                self._merge_back(users, keywords)
+                logger.warning(f"Activity rollup flush failed ({len(user_rows)} rows kept for retry): {e}")
+                return 0
+
+            written = len(user_rows) + len(keyword_rows)
+            self.rows_flushed += written
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - start
+            return written
+
+    def _merge_back(self, users: Dict, keywords: Counter) -> None:
+        """Вернуть незаписанные дельты в буфер (поверх накопленных за время записи)."""
+        for key, row in users.items():
+            current = self._pending_users.get(key)
+            if current is None:
+                self._pending_users[key] = row
+            else:
+                current[0] = current[0] or row[0]
+                for i in range(1, len(row)):
+                    current[i] += row[i]
+        self._pending_keywords.update(keywords)
+
+    # ------------------------------------------------------------------
+    # Жизненный цикл
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Запустить фоновую запись и, если нужно, бэкфилл из MessageLog."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+        from app.config import settings
+        if settings.rollup_backfill_on_startup:
+            try:
+                max_id = await self._backfill_watermark()
+            except Exception as e:
+                logger.warning(f"Activity rollup backfill check failed: {e}")
+                max_id = None
+            if max_id:
+                self._backfill_task = asyncio.create_task(self.backfill(max_id))
+            else:
+                self.backfill_done = True
+        logger.info("Activity rollups started")
+
+    async def stop(self) -> None:
+        """Остановить фоновые задачи и записать остаток буфера."""
+        for task in (self._backfill_task, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._backfill_task = None
+        await self.flush()
+        logger.info(f"Activity rollups stopped: {self.rows_flushed} rows in {self.flushes} flushes")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval())
+            await self.flush()
+
+    async def _backfill_watermark(self) -> Optional[int]:
+        """Максимальный id MessageLog, если счётчики ещё ни разу не строились."""
+        async with self._factory()() as session:
+            has_rollups = await session.scalar(select(ChatActivityRollup.id).limit(1))
+            if has_rollups is not None:
+                return None
+            return await session.scalar(select(func.max(MessageLog.id)))
+
+    async def backfill(self, max_id: int, chunk_size: int = _BACKFILL_CHUNK) -> int:
+        """
+        Построить счётчики из существующих сообщений с id <= max_id.
+
+        Идёт порциями по первичному ключу и записывает каждую порцию,
+        не задерживая обработку апдейтов.
+
+        Returns:
+            Количество учтённых сообщений
+        """
+        last_id = 0
+        logger.info(f"Activity rollup backfill started (messages up to id={max_id})")
+        while True:
+            async with self._factory()() as session:
+                rows = (await session.execute(
+                    select(
+                        MessageLog.id, MessageLog.chat_id, MessageLog.user_id, MessageLog.username,
+                        MessageLog.text, MessageLog.has_link, MessageLog.created_at,
+                    )
+                    .where(MessageLog.id > last_id, MessageLog.id <= max_id)
+                    .order_by(MessageLog.id)
+                    .limit(chunk_size)
+                )).all()
+            if not rows:
+                break
+            # Вся порция оценивается одним проходом regex
+            for row, signals in zip(rows, classify_batch(row.text for row in rows)):
+                self._accumulate(row, signals)
+            self.backfilled_messages += len(rows)
+            last_id = rows[-1].id
+            await self.flush()
+            await asyncio.sleep(0)
+
+        self.backfill_done = True
+        logger.info(f"Activity rollup backfill finished: {self.backfilled_messages} messages")
+        return self.backfilled_messages
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    async def chat_totals(
+        self, session: AsyncSession, chat_id: int, start: datetime, end: datetime
+    ) -> Dict[str, int]:
+        """
+        Суммы счётчиков чата за [start, end) с точностью до часа.
+
+        Returns:
+            message_count, text_count, link_count, toxic_count,
+            positive_count, negative_count, active_users и user_text_count
+            (текстовые без ответов бота, user_id == 0)
+        """
+        columns = [func.coalesce(func.sum(getattr(ChatActivityRollup, c)), 0) for c in _USER_COUNTERS]
+        user_text = func.coalesce(func.sum(case(
+            (ChatActivityRollup.user_id != 0, ChatActivityRollup.text_count), else_=0
+        )), 0)
+        row = (await session.execute(
+            select(*columns, user_text, func.count(func.distinct(ChatActivityRollup.user_id)))
+            .where(
+                ChatActivityRollup.chat_id == chat_id,
+                ChatActivityRollup.hour >= hour_bucket(start),
+                ChatActivityRollup.hour < _naive_utc(end),
+            )
+        )).one()
+        totals = {name: int(value or 0) for name, value in zip(_USER_COUNTERS, row)}
+        totals["user_text_count"] = int(row[-2] or 0)
+        totals["active_users"] = int(row[-1] or 0)
+        return totals
+
+    async def hourly_counts(
+        self, session: AsyncSession, chat_id: int, start: datetime, end: datetime
+    ) -> List[Tuple[datetime, int]]:
+        """Сообщений по часам за [start, end), по возрастанию часа."""
+        rows = (await session.execute(
+            select(ChatActivityRollup.hour, func.sum(ChatActivityRollup.message_count))
+            .where(
+                ChatActivityRollup.chat_id == chat_id,
+                ChatActivityRollup.hour >= hour_bucket(start),
+                ChatActivityRollup.hour < _naive_utc(end),
+            )
+            .group_by(ChatActivityRollup.hour)
+            .order_by(ChatActivityRollup.hour)
+        )).all()
+        return [(_naive_utc(hour), int(count or 0)) for hour, count in rows]
+
+    async def top_users(
+        self, session: AsyncSession, chat_id: int, start: datetime, end: datetime, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Самые активные пользователи за [start, end)."""
+        total = func.sum(ChatActivityRollup.message_count).label("msg_count")
+        rows = (await session.execute(
+            select(ChatActivityRollup.user_id, func.max(ChatActivityRollup.username), total)
+            .where(
+                ChatActivityRollup.chat_id == chat_id,
+                ChatActivityRollup.hour >= hour_bucket(start),
+                ChatActivityRollup.hour < _naive_utc(end),
+            )
+            .group_by(ChatActivityRollup.user_id)
+            .order_by(total.desc())
+            .limit(limit)
+        )).all()
+        return [
+            {"user_id": user_id, "username": username, "count": int(count or 0)}
+            for user_id, username, count in rows
+        ]
+
+    async def top_keywords(
+        self, session: AsyncSession, chat_id: int, start: datetime, end: datetime, limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        """Самые упоминаемые слова за [start, end)."""
+        total = func.sum(ChatKeywordRollup.count).label("mentions")
+        rows = (await session.execute(
+            select(ChatKeywordRollup.keyword, total)
+            .where(
+                ChatKeywordRollup.chat_id == chat_id,
+                ChatKeywordRollup.hour >= hour_bucket(start),
+                ChatKeywordRollup.hour < _naive_utc(end),
+            )
+            .group_by(ChatKeywordRollup.keyword)
+            .order_by(total.desc())
+            .limit(limit)
+        )).all()
+        return [(keyword, int(count or 0)) for keyword, count in rows]
+
+    async def user_totals(
+        self, session: AsyncSession, chat_id: int, user_id: int
+    ) -> Tuple[int, Optional[datetime]]:
+        """
+        Всего сообщений пользователя в чате и час первого из них.
+
+        Returns:
+            (message_count, first_hour или None)
+        """
+        count, first_hour = (await session.execute(
+            select(
+                func.coalesce(func.sum(ChatActivityRollup.message_count), 0),
+                func.min(ChatActivityRollup.hour),
+            ).where(
+                ChatActivityRollup.chat_id == chat_id,
+                ChatActivityRollup.user_id == user_id,
+            )
+        )).one()
+        return int(count or 0), first_hour
+
+    def get_stats(self) -> dict:
+        """Метрики для /health и Prometheus."""
+        return {
+            "running": self.running,
+            "pending_rows": self.pending_rows(),
+            "messages_recorded": self.messages_recorded,
+            "rows_flushed": self.rows_flushed,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+            "backfilled_messages": self.backfilled_messages,
+            "backfill_done": self.backfill_done,
+        }
+
+
+# Глобальный сервис счётчиков активности
+activity_rollup = ActivityRollupService()
@@ -16,6 +16,7 @@ from app.database.session import get_session
 from app.database.models import Auction, AuctionBid
 from app.services.inventory import inventory_service, ITEM_CATALOG
 from app.services import wallet_service
+from app.services.delay_queue import delay_queue, AUCTION_END
 from app.utils import utc_now
 from app.services.ollama_client import generate_text_reply
 from aiogram import Bot
@@ -105,6 +106,7 @@ class AuctionService:
             await session.commit()
             
             auction_id = auction.id
+        await delay_queue.schedule(AUCTION_END, auction_id, ends_at)
             
         # 4. Announce
         text = (
@@ -202,6 +204,7 @@ class AuctionService:
                 
                 auction_id = auction.id
         
+        await delay_queue.schedule(AUCTION_END, auction_id, ends_at)
         item_info = ITEM_CATALOG[item_type]
         return AuctionResult(
             True,
@@ -342,19 +345,19 @@ class AuctionService:
             )
             return list(result.scalars().all())
     
-    async def complete_expired_auctions(self) -> int:
-        """Complete expired auctions and transfer items. Returns count of completed auctions."""
+    async def complete_expired_auctions(self, auction_id: Optional[int] = None) -> int:
+        """
+        Complete expired auctions and transfer items. Returns count of completed auctions.
+        
+        With auction_id only that auction is checked (delay queue deadline).
+        """
         async_session = get_session()
         async with async_session() as session:
             async with session.begin():
-                result = await session.execute(
-                    select(Auction).where(
-                        and_(
-                            Auction.status == "active",
-                            Auction.ends_at < utc_now()
-                        )
-                    )
-                )
+                conditions = [Auction.status == "active", Auction.ends_at <= utc_now()]
+                if auction_id is not None:
+                    conditions.append(Auction.id == auction_id)
+                result = await session.execute(select(Auction).where(and_(*conditions)))
                 expired_auctions = result.scalars().all()
                 
                 count = 0
@@ -401,6 +404,15 @@ class AuctionService:
                 
                 await session.commit()
                 return count
+    
+    async def active_auction_deadlines(self) -> List[tuple]:
+        """Deadlines of active auctions for the delay queue: [(auction_id, ends_at, None)]."""
+        async_session = get_session()
+        async with async_session() as session:
+            result = await session.execute(
+                select(Auction.id, Auction.ends_at).where(Auction.status == "active")
+            )
+            return [(auction_id, ends_at, None) for auction_id, ends_at in result.all()]
 
 
 # Global instance
@@ -7,10 +7,11 @@ Requirements: 5.1, 5.2, 5.3, 5.4, 5.5
 
 import logging
 import random
-import re
 from dataclasses import dataclass
 from typing import Optional, List
 
+from app.services.pattern_matcher import PatternMatcher
+
 logger = logging.getLogger(__name__)
 
 
@@ -75,6 +76,7 @@ class AutoReplySystem:
             triggers: Список триггерных слов (опционально)
         """
         self.triggers = triggers or self.DEFAULT_TRIGGERS.copy()
+        self._trigger_matcher = PatternMatcher(self.triggers)
     
     def is_caps_lock(self, text: str) -> bool:
         """
@@ -112,15 +114,11 @@ class AutoReplySystem:
         if not text:
             return 0
         
-        text_lower = text.lower()
-        count = 0
-        for trigger in self.triggers:
-            # Используем word boundary для точного совпадения
-            pattern = rf'\b{re.escape(trigger)}\b'
-            if re.search(pattern, text_lower):
-                count += 1
+        # Список триггеров могли изменить снаружи — пересобираем автомат только при изменении
+        self._trigger_matcher.sync(self.triggers)
         
-        return count
+        # Используем word boundary для точного совпадения
+        return len(self._trigger_matcher.find_all(text.lower(), whole_words=True))
     
     def calculate_probability(self, text: str, triggers: Optional[List[str]] = None) -> float:
         """
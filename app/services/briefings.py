@@ -0,0 +1,249 @@
+"""
+Предрасчёт ежедневных сводок (dailies) до времени доставки.
+
+Утренняя сводка (08:00), вечерняя сводка (20:00) и цитата+статистика (21:00)
+раньше целиком собирались в момент отправки: LLM-саммари, горячие темы,
+цитата, рендер графика. Теперь это два этапа:
+
+1. precompute — за ``briefing_precompute_lead_minutes`` до доставки, по одному
+   чату за раз (``briefing_precompute_concurrency``), готовые сообщения
+   (текст + PNG) сохраняются в Redis, а без Redis — на диск;
+2. доставка — берёт готовый payload и только отправляет; если его нет
+   (бот перезапускался, предрасчёт упал), сводка собирается как раньше.
+
+Ключ содержит дату доставки, поэтому вчерашний payload никогда не уйдёт.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import pytz
+
+from app.config import settings
+from app.database.session import get_session
+from app.services.metrics import metrics
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+MORNING = "morning"
+EVENING_SUMMARY = "evening_summary"
+EVENING_EXTRAS = "evening_extras"
+
+# Время доставки каждого вида сводки: (час, минута, часовой пояс или None = settings.timezone)
+DELIVERY_TIMES: Dict[str, tuple] = {
+    MORNING: (8, 0, None),
+    EVENING_SUMMARY: (20, 0, "Europe/Moscow"),
+    EVENING_EXTRAS: (21, 0, "Europe/Moscow"),
+}
+
+REDIS_KEY_PREFIX = "briefing:"
+
+# Payload живёт сутки: после доставки он уже не нужен
+PAYLOAD_TTL_SECONDS = 24 * 3600
+
+
+def delivery_timezone(kind: str):
+    return pytz.timezone(DELIVERY_TIMES[kind][2] or settings.timezone)
+
+
+def delivery_date(kind: str, now: Optional[datetime] = None) -> date:
+    """Дата доставки сводки в её часовом поясе."""
+    now = now or datetime.now(pytz.utc)
+    return now.astimezone(delivery_timezone(kind)).date()
+
+
+def precompute_time(kind: str, lead_minutes: int) -> tuple:
+    """(час, минута) запуска предрасчёта: за lead_minutes до доставки, в тот же день."""
+    hour, minute, _ = DELIVERY_TIMES[kind]
+    total = max(0, hour * 60 + minute - lead_minutes)
+    return total // 60, total % 60
+
+
+def _encode(messages: List[Dict[str, Any]]) -> str:
+    return json.dumps([
+        {
+            "text": msg.get("text"),
+            "photo": base64.b64encode(msg["photo"]).decode("ascii") if msg.get("photo") else None,
+        }
+        for msg in messages
+    ], ensure_ascii=False)
+
+
+def _decode(raw: str) -> List[Dict[str, Any]]:
+    messages = []
+    for item in json.loads(raw):
+        msg = {"text": item.get("text")}
+        if item.get("photo"):
+            msg["photo"] = base64.b64decode(item["photo"])
+        messages.append(msg)
+    return messages
+
+
+class BriefingService:
+    """Сборка, хранение и выдача готовых сводок."""
+
+    def __init__(self, storage_dir: Optional[str] = None, session_factory=None):
+        self.storage_dir = storage_dir or settings.briefing_cache_dir
+        self._session_factory = session_factory
+        self.hits = 0
+        self.misses = 0
+        self.precomputed = 0
+        self.precompute_errors = 0
+
+    def _sessions(self):
+        return self._session_factory or get_session()
+
+    # =========================================================================
+    # Хранилище: Redis или файлы
+    # =========================================================================
+
+    def _key(self, kind: str, chat_id: int, day: date) -> str:
+        return f"{REDIS_KEY_PREFIX}{kind}:{day.isoformat()}:{chat_id}"
+
+    def _path(self, kind: str, chat_id: int, day: date) -> str:
+        return os.path.join(self.storage_dir, day.isoformat(), f"{kind}_{chat_id}.json")
+
+    def _write_file(self, path: str, raw: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+
+    def _read_file(self, path: str) -> Optional[str]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _prune_files(self, keep: date) -> None:
+        """Удалить каталоги прошлых дней (только YYYY-MM-DD, чужие файлы не трогаем)."""
+        if not os.path.isdir(self.storage_dir):
+            return
+        for name in os.listdir(self.storage_dir):
+            folder = os.path.join(self.storage_dir, name)
+            try:
+                day = date.fromisoformat(name)
+            except ValueError:
+                continue
+            if day.isoformat() == name and day < keep and os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+
+    async def store(self, kind: str, chat_id: int, day: date, messages: List[Dict[str, Any]]) -> None:
+        raw = _encode(messages)
+        if redis_client.is_available and await redis_client.set(
+            self._key(kind, chat_id, day), raw, ex=PAYLOAD_TTL_SECONDS
+        ):
+            return
+        await asyncio.to_thread(self._write_file, self._path(kind, chat_id, day), raw)
+
+    async def load(self, kind: str, chat_id: int, day: date) -> Optional[List[Dict[str, Any]]]:
+        """Готовые сообщения или None, если предрасчёта не было."""
+        raw = None
+        if redis_client.is_available:
+            raw = await redis_client.get(self._key(kind, chat_id, day))
+        if raw is None:
+            raw = await asyncio.to_thread(self._read_file, self._path(kind, chat_id, day))
+        if raw is None:
+            return None
+        try:
+            return _decode(raw)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"[BRIEFING] Corrupted payload {kind} for chat {chat_id}: {e}")
+            return None
+
+    # =========================================================================
+    # Сборка
+    # =========================================================================
+
+    async def build(self, kind: str, chat_id: int, session=None) -> List[Dict[str, Any]]:
+        """Собрать сообщения сводки (LLM, темы, рендер) через DailiesService."""
+        from app.services.dailies import dailies_service
+
+        if kind == MORNING:
+            messages = await dailies_service.get_morning_messages(chat_id, session, for_today=False)
+            # Утром только текст
+            return [{"text": msg.get("text")} for msg in messages]
+        if kind == EVENING_SUMMARY:
+            return await dailies_service.get_morning_messages(chat_id, session, for_today=True)
+        if kind == EVENING_EXTRAS:
+            return await dailies_service.get_evening_messages(chat_id, session)
+        raise ValueError(f"Unknown briefing kind: {kind}")
+
+    async def precompute(self, kind: str, chat_ids: Iterable[int], now: Optional[datetime] = None) -> int:
+        """
+        Собрать и сохранить сводки для чатов заранее.
+
+        Чаты обрабатываются с низким параллелизмом, чтобы не создавать
+        пик нагрузки на LLM. Пустой результат (сводка выключена или не было
+        активности) тоже сохраняется — доставка не будет пересобирать его.
+
+        Returns:
+            Количество сохранённых payload'ов
+        """
+        day = delivery_date(kind, now)
+        semaphore = asyncio.Semaphore(settings.briefing_precompute_concurrency)
+        stored = 0
+        started = time.monotonic()
+
+        async def handle(chat_id: int) -> None:
+            nonlocal stored
+            async with semaphore:
+                try:
+                    async with self._sessions()() as session:
+                        messages = await self.build(kind, chat_id, session)
+                    await self.store(kind, chat_id, day, messages)
+                    stored += 1
+                except Exception as e:
+                    self.precompute_errors += 1
+                    logger.error(f"[BRIEFING] Precompute {kind} failed for chat {chat_id}: {e}")
+
+        await asyncio.gather(*(handle(chat_id) for chat_id in chat_ids))
+        self.precomputed += stored
+
+        if not redis_client.is_available:
+            await asyncio.to_thread(self._prune_files, day)
+        await metrics.observe_histogram(
+            "briefing_precompute_seconds", time.monotonic() - started, {"kind": kind}
+        )
+        logger.info(f"[BRIEFING] Precomputed {kind} for {stored} chats")
+        return stored
+
+    async def get_messages(
+        self, kind: str, chat_id: int, session=None, now: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Сообщения для доставки: из предрасчёта, иначе собрать сейчас."""
+        messages = await self.load(kind, chat_id, delivery_date(kind, now))
+        if messages is not None:
+            self.hits += 1
+            await metrics.increment_counter("briefing_cache_total", labels={"kind": kind, "result": "hit"})
+            return messages
+
+        self.misses += 1
+        await metrics.increment_counter("briefing_cache_total", labels={"kind": kind, "result": "miss"})
+        if session is not None:
+            return await self.build(kind, chat_id, session)
+        async with self._sessions()() as session:
+            return await self.build(kind, chat_id, session)
+
+    def get_stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "precomputed": self.precomputed,
+            "precompute_errors": self.precompute_errors,
+            "backend": "redis" if redis_client.is_available else "disk",
+        }
+
+
+# Глобальный экземпляр
+briefing_service = BriefingService()
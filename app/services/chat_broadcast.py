@@ -0,0 +1,220 @@
+"""
+Fan-out рассылка по чатам для плановых задач.
+
+Утренние/вечерние сводки и креатив раньше шли по чатам последовательно:
+генерация LLM → отправка → sleep(1). Здесь генерация контента идёт
+параллельно (не больше ``fanout_concurrency`` чатов одновременно), а
+отправка проходит через общий ограничитель Telegram:
+
+- глобальный token bucket (``telegram_send_rate_per_second``);
+- минимальный интервал между сообщениями в один чат;
+- при TelegramRetryAfter пауза применяется ко всем отправкам бота.
+
+Ошибка или таймаут одного чата не мешают остальным.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.config import settings
+from app.services.media_registry import media_registry
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять отправку после TelegramRetryAfter
+MAX_SEND_RETRIES = 3
+
+
+@dataclass
+class OutgoingMessage:
+    """Одно сообщение рассылки (текст или фото с подписью)."""
+    chat_id: int
+    text: Optional[str] = None
+    photo: Optional[bytes] = None
+    filename: str = "image.png"
+    topic_id: Optional[int] = None
+    parse_mode: Optional[str] = "HTML"
+
+
+@dataclass
+class FanOutReport:
+    """Итог одного прогона fan-out."""
+    job: str
+    total: int = 0
+    sent_chats: int = 0
+    skipped: int = 0
+    failed: int = 0
+    messages_sent: int = 0
+    duration: float = 0.0
+    errors: Dict[int, str] = field(default_factory=dict)
+
+
+class SendLimiter:
+    """
+    Ограничитель отправок в Telegram: глобальный token bucket и
+    минимальный интервал между сообщениями в один чат.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: Optional[float] = None,
+        chat_interval: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_second if rate_per_second is not None else settings.telegram_send_rate_per_second
+        self.chat_interval = chat_interval if chat_interval is not None else settings.telegram_chat_send_interval_seconds
+        self.burst = max(1.0, self.rate)
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._next_chat_slot: Dict[int, float] = {}
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Приостановить все отправки (flood control Telegram действует на весь бот)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def _reserve(self, chat_id: int) -> float:
+        """Зарезервировать слот; возвращает сколько ждать до отправки."""
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        start = max(now, self._paused_until, self._next_chat_slot.get(chat_id, 0.0))
+        # Токен берём в долг: отрицательный баланс = очередь на глобальном ведре
+        self._tokens -= 1
+        if self._tokens < 0:
+            start = max(start, now - self._tokens / self.rate)
+        self._next_chat_slot[chat_id] = start + self.chat_interval
+        return start - now
+
+    async def acquire(self, chat_id: int) -> None:
+        async with self._lock:
+            delay = self._reserve(chat_id)
+        if delay > 0:
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+
+
+class ChatFanOut:
+    """Параллельная подготовка контента по чатам и отправка через SendLimiter."""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        chat_timeout: Optional[float] = None,
+        limiter: Optional[SendLimiter] = None,
+    ):
+        self.concurrency = concurrency or settings.fanout_concurrency
+        self.chat_timeout = chat_timeout if chat_timeout is not None else settings.fanout_chat_timeout_seconds
+        self._limiter = limiter
+
+    @property
+    def limiter(self) -> SendLimiter:
+        # Создаётся лениво: asyncio.Lock должен жить в цикле бота
+        if self._limiter is None:
+            self._limiter = SendLimiter()
+        return self._limiter
+
+    async def send(self, bot: Bot, message: OutgoingMessage) -> Any:
+        """Отправить сообщение с учётом лимитов и повтором после RetryAfter."""
+        for attempt in range(MAX_SEND_RETRIES + 1):
+            await self.limiter.acquire(message.chat_id)
+            try:
+                if message.photo:
+                    # Один и тот же график во все чаты: загрузка один раз, дальше file_id
+                    return await media_registry.send(
+                        bot.send_photo, "photo", message.photo, message.filename,
+                        chat_id=message.chat_id,
+                        message_thread_id=message.topic_id,
+                        caption=message.text,
+                        parse_mode=message.parse_mode,
+                    )
+                return await bot.send_message(
+                    chat_id=message.chat_id,
+                    message_thread_id=message.topic_id,
+                    text=message.text,
+                    parse_mode=message.parse_mode,
+                    disable_web_page_preview=True,
+                )
+            except TelegramRetryAfter as e:
+                if attempt >= MAX_SEND_RETRIES:
+                    raise
+                logger.warning(f"[FANOUT] Flood control, pausing sends for {e.retry_after}s")
+                self.limiter.pause(e.retry_after)
+                await metrics.increment_counter("fanout_retry_after_total")
+
+    async def run(
+        self,
+        bot: Bot,
+        job: str,
+        chats: Iterable[Any],
+        prepare: Callable[[Any], Awaitable[List[OutgoingMessage]]],
+    ) -> FanOutReport:
+        """
+        Подготовить и разослать сообщения по всем чатам.
+
+        Args:
+            bot: Экземпляр бота
+            job: Имя задачи (метки метрик и логи)
+            chats: Элементы с атрибутом ``id`` (Chat или строки select)
+            prepare: Корутина, возвращающая сообщения для чата (пустой список = пропуск)
+        """
+        chats = list(chats)
+        report = FanOutReport(job=job, total=len(chats))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        labels = {"job": job}
+        started = time.monotonic()
+        done = 0
+
+        async def handle(chat: Any) -> None:
+            nonlocal done
+            chat_started = time.monotonic()
+            status = "sent"
+            try:
+                # Семафор держим только на генерации: пока один чат ждёт
+                # слота отправки, следующий уже генерирует контент
+                async with semaphore:
+                    messages = await asyncio.wait_for(prepare(chat), timeout=self.chat_timeout)
+                if not messages:
+                    status = "skipped"
+                    report.skipped += 1
+                    return
+                # Внутри чата порядок сообщений сохраняется
+                for message in messages:
+                    await self.send(bot, message)
+                    report.messages_sent += 1
+                report.sent_chats += 1
+            except Exception as e:
+                status = "failed"
+                report.failed += 1
+                report.errors[chat.id] = f"{type(e).__name__}: {e}"
+                logger.error(f"[FANOUT] {job}: chat {chat.id} failed: {e}")
+            finally:
+                done += 1
+                await metrics.increment_counter("fanout_chats_total", labels={"job": job, "status": status})
+                await metrics.observe_histogram("fanout_chat_seconds", time.monotonic() - chat_started, labels)
+                await metrics.set_gauge("fanout_progress", done / report.total, labels)
+
+        await asyncio.gather(*(handle(chat) for chat in chats))
+
+        report.duration = time.monotonic() - started
+        await metrics.observe_histogram("fanout_duration_seconds", report.duration, labels)
+        logger.info(
+            f"[FANOUT] {job}: {report.sent_chats}/{report.total} chats sent, "
+            f"{report.skipped} skipped, {report.failed} failed in {report.duration:.1f}s"
+        )
+        return report
+
+
+# Глобальный экземпляр
+chat_fanout = ChatFanOut()
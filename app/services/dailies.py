@@ -17,14 +17,16 @@ Features:
 Requirements: 13.1, 13.2, 13.3, 13.4, 13.5
 """
 
+import asyncio
 import logging
 import random
+import time
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import Optional, List, Dict, Any
 
-from sqlalchemy import select, func, and_, extract, desc
+from sqlalchemy import select, func, and_, case, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
@@ -37,6 +39,13 @@ logger = logging.getLogger(__name__)
 # Minimum activity threshold for sending summary (Requirement 13.5)
 MIN_ACTIVITY_FOR_SUMMARY = 1  # At least 1 message to send summary
 
+# Hot topics: clusters shown in the summary and messages read to rebuild them
+HOT_TOPICS_LIMIT = 8
+HOT_TOPICS_REBUILD_LIMIT = 2000
+
+# Global game stats (#dailystats) are shared across chats for this long
+GLOBAL_STATS_TTL_SECONDS = 300
+
 # Quote categories for variety
 QUOTE_CATEGORIES = {
     "philosophy": [
@@ -247,6 +256,9 @@ class DailiesService:
     def __init__(self):
         """Initialize DailiesService."""
         self._golden_fund_service = None
+        # (start_of_day, computed_at, payload) for the chat-independent stats
+        self._global_stats_cache = None
+        self._global_stats_lock = asyncio.Lock()
     
     @property
     def golden_fund_service(self):
@@ -287,43 +299,34 @@ class DailiesService:
             DailiesConfig for the chat
         """
         from app.database.models import DailiesConfig as DailiesConfigModel
-        from app.database.session import get_session
-        
-        close_session = False
-        if session is None:
-            async_session = get_session()
-            session = async_session()
-            close_session = True
+        from app.database.unit_of_work import session_scope
         
         try:
-            # Get dailies config from database
-            result = await session.execute(
-                select(DailiesConfigModel).filter_by(chat_id=chat_id)
-            )
-            db_config = result.scalar_one_or_none()
-            
-            if db_config is None:
-                # Return default config for chats without explicit settings
-                return DailiesConfig(chat_id=chat_id)
-            
-            # Map database model to dataclass
-            return DailiesConfig(
-                chat_id=chat_id,
-                summary_enabled=db_config.summary_enabled,
-                quote_enabled=db_config.quote_enabled,
-                stats_enabled=db_config.stats_enabled,
-                summary_time_hour=db_config.summary_time_hour,
-                quote_time_hour=db_config.quote_time_hour,
-            )
+            async with session_scope(session) as session:
+                # Get dailies config from database
+                result = await session.execute(
+                    select(DailiesConfigModel).filter_by(chat_id=chat_id)
+                )
+                db_config = result.scalar_one_or_none()
+                
+                if db_config is None:
+                    # Return default config for chats without explicit settings
+                    return DailiesConfig(chat_id=chat_id)
+                
+                # Map database model to dataclass
+                return DailiesConfig(
+                    chat_id=chat_id,
+                    summary_enabled=db_config.summary_enabled,
+                    quote_enabled=db_config.quote_enabled,
+                    stats_enabled=db_config.stats_enabled,
+                    summary_time_hour=db_config.summary_time_hour,
+                    quote_time_hour=db_config.quote_time_hour,
+                )
             
         except Exception as e:
             logger.warning(f"Failed to get dailies config for chat {chat_id}: {e}")
             # Return default config on error
             return DailiesConfig(chat_id=chat_id)
-            
-        finally:
-            if close_session:
-                await session.close()
     
     async def update_config(
         self,
@@ -350,45 +353,40 @@ class DailiesService:
             Updated DailiesConfig
         """
         from app.database.models import DailiesConfig as DailiesConfigModel
-        from app.database.session import get_session
-        
-        close_session = False
-        if session is None:
-            async_session = get_session()
-            session = async_session()
-            close_session = True
+        from app.database.unit_of_work import session_scope
         
         try:
-            # Get or create config
-            result = await session.execute(
-                select(DailiesConfigModel).filter_by(chat_id=chat_id)
-            )
-            db_config = result.scalar_one_or_none()
-            
-            if db_config is None:
-                # Create new config
-                db_config = DailiesConfigModel(chat_id=chat_id)
-                session.add(db_config)
-            
-            # Update fields if provided
-            if summary_enabled is not None:
-                db_config.summary_enabled = summary_enabled
-            if quote_enabled is not None:
-                db_config.quote_enabled = quote_enabled
-            if stats_enabled is not None:
-                db_config.stats_enabled = stats_enabled
-            
-            await session.commit()
-            
-            # Return updated config as dataclass
-            return DailiesConfig(
-                chat_id=chat_id,
-                summary_enabled=db_config.summary_enabled,
-                quote_enabled=db_config.quote_enabled,
-                stats_enabled=db_config.stats_enabled,
-                summary_time_hour=db_config.summary_time_hour,
-                quote_time_hour=db_config.quote_time_hour,
-            )
+            async with session_scope(session) as session:
+                # Get or create config
+                result = await session.execute(
+                    select(DailiesConfigModel).filter_by(chat_id=chat_id)
+                )
+                db_config = result.scalar_one_or_none()
+                
+                if db_config is None:
+                    # Create new config
+                    db_config = DailiesConfigModel(chat_id=chat_id)
+                    session.add(db_config)
+                
+                # Update fields if provided
+                if summary_enabled is not None:
+                    db_config.summary_enabled = summary_enabled
+                if quote_enabled is not None:
+                    db_config.quote_enabled = quote_enabled
+                if stats_enabled is not None:
+                    db_config.stats_enabled = stats_enabled
+                
+                await session.commit()
+                
+                # Return updated config as dataclass
+                return DailiesConfig(
+                    chat_id=chat_id,
+                    summary_enabled=db_config.summary_enabled,
+                    quote_enabled=db_config.quote_enabled,
+                    stats_enabled=db_config.stats_enabled,
+                    summary_time_hour=db_config.summary_time_hour,
+                    quote_time_hour=db_config.quote_time_hour,
+                )
             
         except Exception as e:
             logger.error(f"Failed to update dailies config for chat {chat_id}: {e}")
@@ -396,10 +394,6 @@ class DailiesService:
                 await session.rollback()
             # Return current config on error
             return await self.get_config(chat_id, session)
-            
-        finally:
-            if close_session:
-                await session.close()
     
     def should_send_message(
         self,
@@ -449,13 +443,15 @@ class DailiesService:
         Returns:
             DailySummary if there was activity, None otherwise
         """
-        from app.database.models import MessageLog, User
-        from app.database.session import get_session
+        from app.database.models import User
+        from app.database.session import get_read_session
+        from app.services.activity_rollup import activity_rollup
         from app.utils import utc_now
         
         close_session = False
         if session is None:
-            async_session = get_session()
+            # Только чтение: read-only пул не мешает вставкам сообщений
+            async_session = get_read_session()
             session = async_session()
             close_session = True
         
@@ -470,15 +466,10 @@ class DailiesService:
                 start_time = (now - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
                 end_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
             
-            # Count messages
-            message_count_result = await session.execute(
-                select(func.count(MessageLog.id)).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time
-                )
-            )
-            message_count = message_count_result.scalar() or 0
+            # Counters come from hourly rollups: O(hours) instead of O(messages)
+            await activity_rollup.flush()
+            totals = await activity_rollup.chat_totals(session, chat_id, start_time, end_time)
+            message_count = totals["message_count"]
             
             # Property 34: Skip if no activity
             if message_count < MIN_ACTIVITY_FOR_SUMMARY:
@@ -491,14 +482,7 @@ class DailiesService:
                 )
             
             # Count active users
-            active_users_result = await session.execute(
-                select(func.count(func.distinct(MessageLog.user_id))).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time
-                )
-            )
-            active_users = active_users_result.scalar() or 0
+            active_users = totals["active_users"]
             
             # Count new members (users created in range)
             new_members_result = await session.execute(
@@ -512,68 +496,31 @@ class DailiesService:
             moderation_actions = 0
             
             # Toxicity & incidents
-            toxicity_score, toxicity_incidents = await self._calculate_toxicity_from_messages(
-                chat_id, start_time, end_time, session
-            )
+            toxicity_score, toxicity_incidents = self._calculate_toxicity(totals)
             
             # Peak activity hour
-            peak_hour_result = await session.execute(
-                select(
-                    extract('hour', MessageLog.created_at).label('hour'),
-                    func.count(MessageLog.id).label('cnt')
-                ).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time
-                ).group_by(
-                    extract('hour', MessageLog.created_at)
-                ).order_by(
-                    desc('cnt')
-                ).limit(1)
-            )
-            peak_row = peak_hour_result.first()
-            peak_hour = int(peak_row[0]) if peak_row else None
+            hourly_counts = await activity_rollup.hourly_counts(session, chat_id, start_time, end_time)
+            peak_hour = self._find_peak_hour(hourly_counts)
             
             # Top chatters
-            top_chatters_result = await session.execute(
-                select(
-                    MessageLog.username,
-                    MessageLog.user_id,
-                    func.count(MessageLog.id).label('msg_count')
-                ).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time
-                ).group_by(
-                    MessageLog.user_id, MessageLog.username
-                ).order_by(
-                    desc('msg_count')
-                ).limit(5)
-            )
             top_chatters = [
                 {
-                    "username": row.username or f"User {row.user_id}",
-                    "user_id": row.user_id,
-                    "count": row.msg_count
+                    "username": row["username"] or f"User {row['user_id']}",
+                    "user_id": row["user_id"],
+                    "count": row["count"]
                 }
-                for row in top_chatters_result.all()
+                for row in await activity_rollup.top_users(session, chat_id, start_time, end_time, limit=5)
             ]
             
             # Hot topics
             hot_topics = await self._extract_hot_topics(
-                chat_id, start_time, end_time, session
+                chat_id, start_time, end_time, session, expected_messages=totals["user_text_count"]
             )
             
             # Activity comparison with previous period
             prev_start = start_time - (end_time - start_time)
-            prev_count_result = await session.execute(
-                select(func.count(MessageLog.id)).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= prev_start,
-                    MessageLog.created_at < start_time
-                )
-            )
-            prev_message_count = prev_count_result.scalar() or 0
+            prev_totals = await activity_rollup.chat_totals(session, chat_id, prev_start, start_time)
+            prev_message_count = prev_totals["message_count"]
             
             activity_change = None
             if prev_message_count > 0:
@@ -585,9 +532,7 @@ class DailiesService:
             )
             
             # Mood analysis
-            mood_score, mood_label = await self._analyze_chat_mood(
-                chat_id, start_time, end_time, session, toxicity_score
-            )
+            mood_score, mood_label = self._analyze_chat_mood(totals, toxicity_score)
             
             # LLM Summary
             llm_summary = await self._generate_llm_summary(
@@ -629,190 +574,121 @@ class DailiesService:
         chat_id: int,
         start_time: datetime,
         end_time: datetime,
-        session: AsyncSession
+        session: AsyncSession,
+        expected_messages: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
         """
-        Extract hot topics from messages using LLM clustering.
+        Extract hot topics from incremental topic clusters.
         
-        Uses LLM to identify and group discussion topics, then finds
-        representative messages for each topic.
+        Clusters are maintained at ingest by topic_clusters in this process;
+        when the bot has not been running for the whole period, or this
+        process saw fewer messages than the rollups counted (another replica
+        handled them), they are rebuilt from the period's messages with the
+        same algorithm. The LLM is only asked to name the top clusters.
         
         Args:
             chat_id: Telegram chat ID
             start_time: Start of time range
             end_time: End of time range
             session: Database session
+            expected_messages: User text messages in the period according to
+                rollups (bot replies are not clustered)
             
         Returns:
             List of hot topics with message links and counts
         """
-        from app.database.models import MessageLog
-        import re
-        import json
+        from app.services.topic_clusters import topic_clusters, cluster_messages
         
         try:
-            # Get messages with text
-            messages_result = await session.execute(
-                select(MessageLog).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time,
-                    MessageLog.text.isnot(None)
-                ).order_by(MessageLog.created_at.desc()).limit(500)
+            clusters = topic_clusters.top_clusters(
+                chat_id, start_time, end_time, limit=HOT_TOPICS_LIMIT, expected_messages=expected_messages
             )
-            messages = messages_result.scalars().all()
+            if clusters is None:
+                from app.database.queries import chat_messages_in_range_query
+                
+                # Index range scan on (chat_id, created_at); oldest first for clustering
+                messages_result = await session.execute(
+                    chat_messages_in_range_query(
+                        chat_id, start_time, end_time, limit=HOT_TOPICS_REBUILD_LIMIT,
+                        exclude_bot=True,
+                    )
+                )
+                messages = list(reversed(messages_result.all()))
+                clusters = cluster_messages(messages, limit=HOT_TOPICS_LIMIT)
             
-            if not messages or len(messages) < 10:
+            if not clusters:
                 return []
             
-            # Prepare messages sample for LLM
-            messages_sample = []
-            for msg in messages[:200]:
-                if msg.text and len(msg.text) > 5:
-                    messages_sample.append({
-                        "id": msg.message_id,
-                        "text": msg.text[:200],
-                        "user": msg.username or "user"
-                    })
-            
-            if len(messages_sample) < 10:
-                return []
+            names = await self._name_topic_clusters(clusters)
+            return [
+                {
+                    "keyword": names.get(cluster.cluster_id) or cluster.label,
+                    "mentions": cluster.count,
+                    "message_id": cluster.message_id,
+                    "chat_id": chat_id
+                }
+                for cluster in clusters
+            ]
             
-            # Use LLM to extract topics
-            try:
-                from app.services.ollama_client import _ollama_chat
-                
-                sample_text = "\n".join([
-                    f"[{m['id']}] {m['user']}: {m['text']}" 
-                    for m in messages_sample[:100]
-                ])
-                
-                prompt = f"""Проанализируй сообщения чата и выдели 5-8 основных тем обсуждения.
-
-Сообщения:
-{sample_text}
+        except Exception as e:
+            logger.warning(f"Failed to extract hot topics: {e}")
+            return []
+    
+    async def _name_topic_clusters(self, clusters: List[Any]) -> Dict[int, str]:
+        """
+        Ask the LLM for short topic titles given cluster keywords and one example.
+        
+        Returns:
+            cluster_id -> title; empty dict if the LLM is unavailable
+            (callers fall back to keyword labels)
+        """
+        import re
+        import json
+        
+        lines = []
+        for cluster in clusters:
+            sample = cluster.sample.replace("\n", " ")[:120]
+            lines.append(
+                f"{cluster.cluster_id}. слова: {', '.join(cluster.terms)}; "
+                f"сообщений: {cluster.count}; пример: {sample}"
+            )
+        
+        prompt = f"""Придумай короткое название (2-4 слова) с эмодзи для каждой темы чата.
 
-Для каждой темы укажи:
-1. Краткое название темы (2-4 слова) с эмодзи
-2. Примерное количество сообщений по теме
-3. ID одного характерного сообщения из списка
+Темы:
+{chr(10).join(lines)}
 
 Ответь СТРОГО в JSON формате:
 [
-  {{"topic": "😂 Смешные моменты", "count": 45, "msg_id": 12345}},
-  {{"topic": "🔧 Технические проблемы", "count": 30, "msg_id": 12346}}
+  {{"id": 1, "topic": "🔧 Технические проблемы"}}
 ]
 
 Только JSON, без пояснений!"""
-
-                llm_messages = [
-                    {"role": "system", "content": "Ты анализируешь чаты и выделяешь темы. Отвечай только JSON."},
-                    {"role": "user", "content": prompt}
-                ]
-                
-                response = await _ollama_chat(llm_messages, temperature=0.3)
-                
-                # Parse JSON response
-                # Try to extract JSON from response
-                json_match = re.search(r'\[.*\]', response, re.DOTALL)
-                if json_match:
-                    topics_data = json.loads(json_match.group())
-                else:
-                    topics_data = json.loads(response)
-                
-                hot_topics = []
-                for item in topics_data[:8]:
-                    topic_text = item.get("topic", "Тема")
-                    msg_id = item.get("msg_id")
-                    
-                    # Verify if msg_id exists in our sample, if not/missing, try to find a relevant message
-                    if not msg_id or not any(m.message_id == msg_id for m in messages):
-                        # Try to find a message containing part of the topic keywords
-                        # Split topic into words and find a message containing them
-                        topic_words = [w.lower() for w in re.findall(r'\w+', topic_text) if len(w) > 3]
-                        found_msg = None
-                        
-                        if topic_words:
-                            for msg in messages:
-                                if not msg.text: continue
-                                text_lower = msg.text.lower()
-                                # If any significant word from topic is in message
-                                if any(w in text_lower for w in topic_words):
-                                    found_msg = msg
-                                    break
-                        
-                        if found_msg:
-                            msg_id = found_msg.message_id
-                        elif messages:
-                            # Fallback to random message from sample if we can't match
-                            # Better than no link? Maybe not. Let's leave it None if we can't match.
-                            pass
-
-                    topic = {
-                        "keyword": topic_text,
-                        "mentions": item.get("count", 10),
-                        "message_id": msg_id,
-                        "chat_id": chat_id
-                    }
-                    hot_topics.append(topic)
-                
-                return hot_topics
-                
-            except Exception as llm_error:
-                logger.debug(f"LLM topic extraction failed: {llm_error}, falling back to keywords")
-                # Fallback to keyword extraction
-                return await self._extract_hot_topics_fallback(messages, chat_id)
+        
+        try:
+            from app.services.ollama_client import _ollama_chat
             
+            response = await _ollama_chat(
+                [
+                    {"role": "system", "content": "Ты называешь темы обсуждений в чате. Отвечай только JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3
+            )
+            json_match = re.search(r'\[.*\]', response, re.DOTALL)
+            items = json.loads(json_match.group() if json_match else response)
+            
+            known = {cluster.cluster_id for cluster in clusters}
+            names = {}
+            for item in items:
+                cluster_id = item.get("id")
+                title = str(item.get("topic") or "").strip()
+                if cluster_id in known and title:
+                    names[cluster_id] = title[:60]
+            return names
         except Exception as e:
-            logger.warning(f"Failed to extract hot topics: {e}")
-            return []
-    
-    async def _extract_hot_topics_fallback(
-        self,
-        messages: List,
-        chat_id: int
-    ) -> List[Dict[str, Any]]:
-        """Fallback keyword-based topic extraction."""
-        from collections import Counter
-        import re
-        
-        stop_words = {
-            'это', 'как', 'что', 'для', 'все', 'они', 'его', 'она', 'так',
-            'уже', 'или', 'если', 'есть', 'было', 'быть', 'был', 'была',
-            'были', 'будет', 'будут', 'очень', 'просто', 'можно', 'нужно',
-            'там', 'тут', 'здесь', 'когда', 'потом', 'тоже', 'только',
-            'ещё', 'еще', 'вот', 'чтобы', 'этот', 'этого', 'этом', 'этой',
-            'надо', 'меня', 'тебя', 'нахуй', 'сука', 'блять', 'хуй',
-        }
-        
-        word_messages = {}
-        word_counts = Counter()
-        
-        for msg in messages:
-            if not msg.text:
-                continue
-            words = re.findall(r'[а-яёa-z]{4,}', msg.text.lower())
-            seen = set()
-            for word in words:
-                if word not in stop_words and word not in seen:
-                    seen.add(word)
-                    word_counts[word] += 1
-                    if word not in word_messages:
-                        word_messages[word] = msg
-        
-        hot_topics = []
-        for word, count in word_counts.most_common(5):
-            if count < 5:
-                continue
-            msg = word_messages.get(word)
-            hot_topics.append({
-                "keyword": word.capitalize(),
-                "mentions": count,
-                "message_id": msg.message_id if msg else None,
-                "chat_id": chat_id
-            })
-        
-        return hot_topics
+            logger.debug(f"LLM topic naming failed: {e}, using keyword labels")
+            return {}
     
     async def _extract_interesting_quotes(
         self,
@@ -883,145 +759,70 @@ class DailiesService:
             logger.warning(f"Failed to extract interesting quotes: {e}")
             return []
     
-    async def _calculate_toxicity_from_messages(
-        self,
-        chat_id: int,
-        start_time: datetime,
-        end_time: datetime,
-        session: AsyncSession
-    ) -> tuple[float, int]:
+    def _calculate_toxicity(self, totals: Dict[str, int]) -> tuple[float, int]:
         """
-        Calculate toxicity score from message content as fallback.
+        Calculate toxicity score from rollup counters.
         
+        Args:
+            totals: Result of activity_rollup.chat_totals()
+            
         Returns:
             (toxicity_score 0-100, incident_count)
         """
-        from app.database.models import MessageLog
-        import re
-        
-        try:
-            messages_result = await session.execute(
-                select(MessageLog.text).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time,
-                    MessageLog.text.isnot(None)
-                ).limit(500)
-            )
-            texts = [row[0] for row in messages_result.all() if row[0]]
-            
-            if not texts:
-                return 0.0, 0
-            
-            # Toxic patterns (Russian mat and aggressive words)
-            toxic_patterns = [
-                r'\b[хx][уy][йиеяюёijey]\w*',
-                r'\b[пp][иiе][зz][дd]\w*',
-                r'\b[бb][лl][яa]\w*',
-                r'\b[еe][бb]\w*',
-                r'\b[сc][уy][кk]\w*',
-                r'\b[мm][уy][дd][аa]\w*',
-                r'\bf+u+c+k+\w*',
-                r'\bs+h+i+t+\w*',
-                r'\b(убью|сдохни|урод|дебил|идиот|кретин|даун|лох)\b',
-            ]
-            
-            toxic_count = 0
-            incident_messages = 0
-            
-            for text in texts:
-                text_lower = text.lower()
-                is_toxic = False
-                for pattern in toxic_patterns:
-                    if re.search(pattern, text_lower, re.IGNORECASE):
-                        toxic_count += 1
-                        is_toxic = True
-                        break
-                if is_toxic:
-                    incident_messages += 1
-            
-            # Calculate score (0-100)
-            total = len(texts)
-            toxicity_ratio = toxic_count / total if total > 0 else 0
-            toxicity_score = min(100, toxicity_ratio * 100)
-            
-            return toxicity_score, incident_messages
-            
-        except Exception as e:
-            logger.warning(f"Failed to calculate toxicity from messages: {e}")
+        total = totals.get("text_count", 0)
+        incidents = totals.get("toxic_count", 0)
+        if total <= 0:
             return 0.0, 0
+        
+        toxicity_score = min(100, incidents / total * 100)
+        return toxicity_score, incidents
 
-    async def _analyze_chat_mood(
+    @staticmethod
+    def _find_peak_hour(hourly_counts: List[tuple]) -> Optional[int]:
+        """Hour of day (0-23) with the most messages, from (hour_start, count) rollups."""
+        by_hour: Dict[int, int] = {}
+        for hour_start, count in hourly_counts:
+            by_hour[hour_start.hour] = by_hour.get(hour_start.hour, 0) + count
+        if not by_hour:
+            return None
+        return max(by_hour.items(), key=lambda item: item[1])[0]
+
+    def _analyze_chat_mood(
         self,
-        chat_id: int,
-        start_time: datetime,
-        end_time: datetime,
-        session: AsyncSession,
+        totals: Dict[str, int],
         toxicity_score: float
     ) -> tuple[float, str]:
         """
-        Analyze overall chat mood based on message patterns.
+        Analyze overall chat mood from rollup counters.
         
         Returns:
             (mood_score, mood_label) where score is 0-100 (50=neutral)
         """
-        from app.database.models import MessageLog
-        
-        try:
-            messages_result = await session.execute(
-                select(MessageLog.text).filter(
-                    MessageLog.chat_id == chat_id,
-                    MessageLog.created_at >= start_time,
-                    MessageLog.created_at < end_time,
-                    MessageLog.text.isnot(None)
-                ).limit(200)
-            )
-            texts = [row[0] for row in messages_result.all() if row[0]]
-            
-            if not texts:
-                return 50.0, "Нейтрально"
-            
-            positive_count = 0
-            negative_count = 0
-            
-            positive_markers = ['😊', '😄', '🥰', '❤️', '👍', '🎉', '😁', 'круто', 'класс', 
-                              'отлично', 'супер', 'спасибо', 'молодец', 'красава', 'топ']
-            negative_markers = ['😢', '😭', '😤', '😡', '👎', '💔', 'плохо', 'ужас', 
-                              'отстой', 'хуйня', 'пиздец', 'блять', 'дерьмо']
-            
-            for text in texts:
-                text_lower = text.lower()
-                if any(m in text_lower for m in positive_markers):
-                    positive_count += 1
-                if any(m in text_lower for m in negative_markers):
-                    negative_count += 1
-            
-            total = len(texts)
-            positive_ratio = positive_count / total if total > 0 else 0
-            negative_ratio = negative_count / total if total > 0 else 0
-            
-            # Calculate mood score (0-100, 50 is neutral)
-            # Toxicity also affects mood negatively
-            base_mood = 50 + (positive_ratio * 40) - (negative_ratio * 30) - (toxicity_score * 0.2)
-            mood_score = max(0, min(100, base_mood))
-            
-            # Determine label
-            if mood_score >= 75:
-                mood_label = "Райский сад 🌸"
-            elif mood_score >= 60:
-                mood_label = "Лампово 🍺"
-            elif mood_score >= 45:
-                mood_label = "Стабильное болото 🐸"
-            elif mood_score >= 30:
-                mood_label = "Духота 📉"
-            else:
-                mood_label = "Токсичный полигон ☢️"
-            
-            return mood_score, mood_label
-            
-        except Exception as e:
-            logger.warning(f"Failed to analyze mood: {e}")
+        total = totals.get("text_count", 0)
+        if total <= 0:
             return 50.0, "Нейтрально"
+        
+        positive_ratio = totals.get("positive_count", 0) / total
+        negative_ratio = totals.get("negative_count", 0) / total
+        
+        # Calculate mood score (0-100, 50 is neutral)
+        # Toxicity also affects mood negatively
+        base_mood = 50 + (positive_ratio * 40) - (negative_ratio * 30) - (toxicity_score * 0.2)
+        mood_score = max(0, min(100, base_mood))
+        
+        # Determine label
+        if mood_score >= 75:
+            mood_label = "Райский сад 🌸"
+        elif mood_score >= 60:
+            mood_label = "Лампово 🍺"
+        elif mood_score >= 45:
+            mood_label = "Стабильное болото 🐸"
+        elif mood_score >= 30:
+            mood_label = "Духота 📉"
+        else:
+            mood_label = "Токсичный полигон ☢️"
+        
+        return mood_score, mood_label
     
     async def _generate_llm_summary(
         self,
@@ -1345,23 +1146,15 @@ class DailiesService:
                 # Fetch persona from BotConfig
                 from app.database.models import BotConfig
                 from sqlalchemy import select
+                from app.database.unit_of_work import session_scope
                 
-                close_session = False
-                if session is None:
-                    from app.database.session import get_session
-                    async_session = get_session()
-                    session = async_session()
-                    close_session = True
-                
-                result = await session.execute(
-                    select(BotConfig.persona).filter_by(chat_id=chat_id)
-                )
-                db_persona = result.scalar_one_or_none()
+                async with session_scope(session) as db:
+                    result = await db.execute(
+                        select(BotConfig.persona).filter_by(chat_id=chat_id)
+                    )
+                    db_persona = result.scalar_one_or_none()
                 if db_persona:
                     persona = db_persona
-                
-                if close_session:
-                    await session.close()
             except Exception as e:
                 logger.warning(f"Failed to fetch context for quote: {e}")
 
@@ -1579,137 +1372,190 @@ class DailiesService:
         THEN the Dailies System SHALL send a #dailystats message
         with game statistics.
         """
-        from app.database.models import GameStat, User, GameHistory
-        from app.database.session import get_session
+        from app.database.unit_of_work import session_scope
         from app.utils import utc_now
         
-        close_session = False
-        if session is None:
-            async_session = get_session()
-            session = async_session()
-            close_session = True
-        
         try:
-            now = utc_now()
-            start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            async with session_scope(session) as session:
+                now = utc_now()
+                start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+                
+                # Game stats are global: computed once and shared by all chats at 21:00
+                shared = await self._get_global_daily_stats(session, start_of_day)
+                
+                ds = DailyStats(
+                    chat_id=chat_id,
+                    date=now,
+                    top_growers=shared["top_growers"],
+                    top_losers=shared["top_losers"],
+                    tournament_standings=shared["tournament_standings"],
+                    chart_data=shared["chart_data"]
+                )
+                # Add extra fields to the dataclass instance dynamically
+                ds.big_winners = shared["big_winners"]
+                ds.top_gamblers = shared["top_gamblers"]
+                return ds
             
-            # Get top growers (by size_cm) - get top 10 for the chart
-            top_growers_result = await session.execute(
-                select(GameStat)
-                .order_by(GameStat.size_cm.desc())
-                .limit(10)
+        except Exception as e:
+            logger.error(f"Failed to aggregate stats for chat {chat_id}: {e}")
+            return DailyStats(chat_id=chat_id, date=utc_now())
+    
+    async def _get_global_daily_stats(
+        self,
+        session: AsyncSession,
+        start_of_day: datetime
+    ) -> Dict[str, Any]:
+        """
+        Return the chat-independent part of the daily stats, cached for
+        GLOBAL_STATS_TTL_SECONDS so concurrent chats share one computation.
+        """
+        async with self._global_stats_lock:
+            cached = self._global_stats_cache
+            if (
+                cached is not None
+                and cached[0] == start_of_day
+                and time.monotonic() - cached[1] < GLOBAL_STATS_TTL_SECONDS
+            ):
+                return cached[2]
+            
+            shared = await self._load_global_daily_stats(session, start_of_day)
+            self._global_stats_cache = (start_of_day, time.monotonic(), shared)
+            return shared
+    
+    async def _load_global_daily_stats(
+        self,
+        session: AsyncSession,
+        start_of_day: datetime
+    ) -> Dict[str, Any]:
+        """
+        Load growers, losers, winners, gamblers and tournament standings
+        in a fixed number of queries (no per-user lookups).
+        """
+        from app.database.models import GameStat, User, GameHistory, Tournament, TournamentScore
+        
+        # Top growers (by size_cm) - top 10 for the chart
+        top_growers_result = await session.execute(
+            select(GameStat)
+            .order_by(GameStat.size_cm.desc())
+            .limit(10)
+        )
+        top_growers_stats = top_growers_result.scalars().all()
+        
+        top_growers = [
+            {
+                "username": gs.username or f"User {gs.tg_user_id}",
+                "size": gs.size_cm
+            }
+            for gs in top_growers_stats[:5]
+        ]
+        
+        # Generate chart
+        chart_data = None
+        try:
+            from app.services.render_pool import render_pool
+            from app.services.top_chart import to_chart_players
+            chart_data = await render_pool.run("top10", to_chart_players(top_growers_stats))
+        except Exception as e:
+            logger.warning(f"Failed to generate top chart: {e}")
+        
+        # Top losers (lowest size_cm, but > 0)
+        top_losers_result = await session.execute(
+            select(GameStat)
+            .filter(GameStat.size_cm > 0)
+            .order_by(GameStat.size_cm.asc())
+            .limit(3)
+        )
+        top_losers = [
+            {
+                "username": gs.username or f"User {gs.tg_user_id}",
+                "size": gs.size_cm
+            }
+            for gs in top_losers_result.scalars().all()
+        ]
+        
+        # ===== Game Stats =====
+        # Big winners and most active gamblers: one grouped pass over today's
+        # games, ranked both ways with window functions and joined to users
+        per_user = (
+            select(
+                GameHistory.user_id,
+                func.sum(
+                    case((GameHistory.result_amount > 0, GameHistory.result_amount), else_=0)
+                ).label('total_win'),
+                func.count(GameHistory.id).label('games_count')
             )
-            top_growers_stats = top_growers_result.scalars().all()
-            
-            top_growers = [
-                {
-                    "username": gs.username or f"User {gs.tg_user_id}",
-                    "size": gs.size_cm
-                }
-                for gs in top_growers_stats[:5]
-            ]
-            
-            # Generate chart
-            chart_data = None
-            try:
-                from app.services.top_chart import top_chart_generator
-                chart_data = top_chart_generator.generate_top10_chart(top_growers_stats)
-            except Exception as e:
-                logger.warning(f"Failed to generate top chart: {e}")
-            
-            # ===== Game Stats =====
-            # Big winners today
-            winners_result = await session.execute(
-                select(GameHistory.user_id, func.sum(GameHistory.result_amount).label('total_win'))
-                .filter(GameHistory.played_at >= start_of_day, GameHistory.result_amount > 0)
-                .group_by(GameHistory.user_id)
-                .order_by(desc('total_win'))
-                .limit(3)
+            .filter(GameHistory.played_at >= start_of_day)
+            .group_by(GameHistory.user_id)
+            .subquery()
+        )
+        ranked = select(
+            per_user,
+            func.row_number().over(order_by=per_user.c.total_win.desc()).label('win_rank'),
+            func.row_number().over(order_by=per_user.c.games_count.desc()).label('games_rank')
+        ).subquery()
+        game_rows = (await session.execute(
+            select(
+                ranked.c.total_win, ranked.c.games_count,
+                ranked.c.win_rank, ranked.c.games_rank,
+                User.username, User.first_name, User.tg_user_id
             )
-            big_winners = []
-            for row in winners_result.all():
-                user_res = await session.execute(select(User).filter(User.id == row.user_id))
-                user = user_res.scalar()
-                if user:
-                    big_winners.append({
-                        "username": user.username or user.first_name or f"ID:{user.tg_user_id}",
-                        "amount": row.total_win
-                    })
-            
-            # Most active gamblers
-            gamblers_result = await session.execute(
-                select(GameHistory.user_id, func.count(GameHistory.id).label('games_count'))
-                .filter(GameHistory.played_at >= start_of_day)
-                .group_by(GameHistory.user_id)
-                .order_by(desc('games_count'))
-                .limit(3)
+            .join(User, User.id == ranked.c.user_id)
+            .filter(or_(ranked.c.win_rank <= 3, ranked.c.games_rank <= 3))
+        )).all()
+        
+        def _display_name(row) -> str:
+            return row.username or row.first_name or f"ID:{row.tg_user_id}"
+        
+        big_winners = [
+            {"username": _display_name(row), "amount": row.total_win}
+            for row in sorted(game_rows, key=lambda r: r.win_rank)
+            if row.win_rank <= 3 and row.total_win > 0
+        ]
+        top_gamblers = [
+            {"username": _display_name(row), "count": row.games_count}
+            for row in sorted(game_rows, key=lambda r: r.games_rank)
+            if row.games_rank <= 3
+        ]
+        
+        # Daily tournament standings: top 3 per discipline in one windowed query
+        tournament_standings = []
+        try:
+            rank = func.row_number().over(
+                partition_by=TournamentScore.discipline,
+                order_by=TournamentScore.score.desc()
+            ).label('rank')
+            scores = (
+                select(TournamentScore.discipline, TournamentScore.user_id, TournamentScore.score, rank)
+                .join(Tournament, Tournament.id == TournamentScore.tournament_id)
+                .filter(Tournament.type == 'daily', Tournament.status == 'active')
+                .subquery()
             )
-            top_gamblers = []
-            for row in gamblers_result.all():
-                user_res = await session.execute(select(User).filter(User.id == row.user_id))
-                user = user_res.scalar()
-                if user:
-                    top_gamblers.append({
-                        "username": user.username or user.first_name or f"ID:{user.tg_user_id}",
-                        "count": row.games_count
-                    })
-            
-            # Get top losers (lowest size_cm, but > 0)
-            top_losers_result = await session.execute(
-                select(GameStat)
-                .filter(GameStat.size_cm > 0)
-                .order_by(GameStat.size_cm.asc())
-                .limit(3)
+            standings_result = await session.execute(
+                select(scores.c.discipline, scores.c.user_id, scores.c.score, scores.c.rank, User.username)
+                .outerjoin(User, User.tg_user_id == scores.c.user_id)
+                .filter(scores.c.rank <= 3)
+                .order_by(scores.c.discipline, scores.c.rank)
             )
-            top_losers = [
+            tournament_standings = [
                 {
-                    "username": gs.username or f"User {gs.tg_user_id}",
-                    "size": gs.size_cm
+                    "discipline": row.discipline,
+                    "username": row.username or f"User {row.user_id}",
+                    "score": row.score,
+                    "rank": row.rank
                 }
-                for gs in top_losers_result.scalars().all()
+                for row in standings_result.all()
             ]
-            
-            # Get tournament standings
-            tournament_standings = []
-            try:
-                from app.services.tournaments import tournament_service, TournamentType
-                
-                daily_tournament = await tournament_service.get_current_tournament(
-                    TournamentType.DAILY, session
-                )
-                
-                if daily_tournament:
-                    for discipline, standings in daily_tournament.standings.items():
-                        for standing in standings[:3]:
-                            tournament_standings.append({
-                                "discipline": discipline.value,
-                                "username": standing.username or f"User {standing.user_id}",
-                                "score": standing.score,
-                                "rank": standing.rank
-                            })
-            except Exception as e:
-                logger.warning(f"Failed to get tournament standings: {e}")
-            
-            ds = DailyStats(
-                chat_id=chat_id,
-                date=now,
-                top_growers=top_growers,
-                top_losers=top_losers,
-                tournament_standings=tournament_standings,
-                chart_data=chart_data
-            )
-            # Add extra fields to the dataclass instance dynamically
-            ds.big_winners = big_winners
-            ds.top_gamblers = top_gamblers
-            return ds
-            
         except Exception as e:
-            logger.error(f"Failed to aggregate stats for chat {chat_id}: {e}")
-            return DailyStats(chat_id=chat_id, date=utc_now())
-            
-        finally:
-            if close_session:
-                await session.close()
+            logger.warning(f"Failed to get tournament standings: {e}")
+        
+        return {
+            "top_growers": top_growers,
+            "top_losers": top_losers,
+            "big_winners": big_winners,
+            "top_gamblers": top_gamblers,
+            "tournament_standings": tournament_standings,
+            "chart_data": chart_data,
+        }
     
     def format_stats(self, stats: DailyStats) -> str:
         """
@@ -0,0 +1,295 @@
+"""
+Delay Queue - отложенные задачи с точным сроком вместо поминутного опроса.
+
+Раньше истечение обменов, аукционов, верификаций и войн гильдий
+проверялось задачами планировщика раз в минуту (скан таблиц, опоздание до
+60 с), а фазы мафии жили в ``asyncio.create_task(... sleep ...)`` и
+терялись при перезапуске. Теперь каждое событие ставит задачу со сроком:
+
+- с Redis — sorted set ``delay_queue`` (score = срок в unix-секундах) и
+  hash с payload; срочные задачи забираются Lua-скриптом атомарно
+  (ZREM), поэтому при нескольких репликах каждая выполняется один раз;
+- без Redis — куча в памяти;
+- фоновый цикл спит ровно до ближайшего срока (или до постановки более
+  ранней задачи), в простое не трогает БД;
+- при старте каждый вид задач может перечитать незавершённые сроки из БД
+  (``reload``), так что задачи не теряются и без Redis.
+
+Обработчик получает ``(bot, key, payload)`` и должен быть идемпотентным:
+проверять по БД, что срок действительно наступил и событие ещё не
+обработано. Упавшая задача повторяется через ``RETRY_DELAY_SECONDS``.
+
+Usage:
+    from app.services.delay_queue import delay_queue, TRADE_EXPIRY
+
+    delay_queue.register(TRADE_EXPIRY, handler, reload=pending_trades)
+    await delay_queue.schedule(TRADE_EXPIRY, trade.id, trade.expires_at)
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.services.metrics import metrics
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Виды задач
+TRADE_EXPIRY = "trade_expiry"
+AUCTION_END = "auction_end"
+VERIFICATION_EXPIRY = "verification_expiry"
+TEAM_WAR_DEADLINE = "team_war_deadline"
+MAFIA_LOBBY_TIMEOUT = "mafia_lobby_timeout"
+MAFIA_NIGHT_END = "mafia_night_end"
+MAFIA_DISCUSSION_END = "mafia_discussion_end"
+MAFIA_VOTING_END = "mafia_voting_end"
+
+QUEUE_KEY = "delay_queue"
+PAYLOAD_KEY = "delay_queue:payload"
+
+# С Redis задачи могут ставить другие реплики — не спим дольше этого
+REDIS_POLL_SECONDS = 5.0
+POP_BATCH = 100
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 30
+
+Handler = Callable[[Any, str, Dict[str, Any]], Awaitable[None]]
+Reloader = Callable[[], Awaitable[Iterable[Tuple[Any, Union[datetime, float], Optional[Dict[str, Any]]]]]]
+
+_SCHEDULE_SCRIPT = """
+redis.call('zadd', KEYS[1], ARGV[2], ARGV[1])
+redis.call('hset', KEYS[2], ARGV[1], ARGV[3])
+return 1
+"""
+_CANCEL_SCRIPT = """
+redis.call('hdel', KEYS[2], ARGV[1])
+return redis.call('zrem', KEYS[1], ARGV[1])
+"""
+_POP_SCRIPT = """
+local members = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local out = {}
+for _, member in ipairs(members) do
+    if redis.call('zrem', KEYS[1], member) == 1 then
+        table.insert(out, member)
+        table.insert(out, redis.call('hget', KEYS[2], member) or '')
+        redis.call('hdel', KEYS[2], member)
+    end
+end
+return out
+"""
+_NEXT_DUE_SCRIPT = """
+local first = redis.call('zrange', KEYS[1], 0, 0, 'WITHSCORES')
+return first[2]
+"""
+
+
+def _timestamp(due: Union[datetime, float]) -> float:
+    if isinstance(due, datetime):
+        # В БД время хранится без зоны — это UTC
+        if due.tzinfo is None:
+            due = due.replace(tzinfo=timezone.utc)
+        return due.timestamp()
+    return float(due)
+
+
+def _member(kind: str, key: Any) -> str:
+    return f"{kind}:{key}"
+
+
+class DelayQueue:
+    """Отложенные задачи: Redis sorted set или куча в памяти."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._handlers: Dict[str, Handler] = {}
+        self._reloaders: Dict[str, Reloader] = {}
+        # Без Redis: member -> (срок, payload); в куче бывают устаревшие записи
+        self._pending: Dict[str, Tuple[float, str]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._bot = None
+
+    @property
+    def _use_redis(self) -> bool:
+        return redis_client.is_available
+
+    def register(self, kind: str, handler: Handler, reload: Optional[Reloader] = None) -> None:
+        """
+        Зарегистрировать обработчик вида задач.
+
+        Args:
+            kind: Вид задачи
+            handler: ``async (bot, key, payload)``
+            reload: ``async () -> [(key, срок, payload)]`` — незавершённые
+                сроки из БД, перечитываются при старте
+        """
+        self._handlers[kind] = handler
+        if reload:
+            self._reloaders[kind] = reload
+
+    async def schedule(
+        self,
+        kind: str,
+        key: Any,
+        due: Union[datetime, float],
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Поставить (или перенести) задачу: повторная постановка с тем же
+        ``kind`` и ``key`` заменяет срок.
+        """
+        member = _member(kind, key)
+        due_ts = _timestamp(due)
+        encoded = json.dumps(payload or {}, ensure_ascii=False)
+        if self._use_redis:
+            await redis_client.eval(_SCHEDULE_SCRIPT, [QUEUE_KEY, PAYLOAD_KEY], [member, due_ts, encoded])
+        else:
+            self._pending[member] = (due_ts, encoded)
+            heapq.heappush(self._heap, (due_ts, member))
+        self._wakeup.set()
+
+    async def cancel(self, kind: str, key: Any) -> None:
+        """Снять задачу, если она ещё не выполнена."""
+        member = _member(kind, key)
+        if self._use_redis:
+            await redis_client.eval(_CANCEL_SCRIPT, [QUEUE_KEY, PAYLOAD_KEY], [member])
+        else:
+            self._pending.pop(member, None)
+
+    async def _pop_due(self, now: float) -> List[Tuple[str, str]]:
+        if self._use_redis:
+            flat = await redis_client.eval(_POP_SCRIPT, [QUEUE_KEY, PAYLOAD_KEY], [now, POP_BATCH]) or []
+            return list(zip(flat[::2], flat[1::2]))
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < POP_BATCH:
+            due_ts, member = heapq.heappop(self._heap)
+            entry = self._pending.get(member)
+            # Задача перенесена или снята — запись в куче устарела
+            if entry is None or entry[0] != due_ts:
+                continue
+            del self._pending[member]
+            due.append((member, entry[1]))
+        return due
+
+    async def next_due(self) -> Optional[float]:
+        """Срок ближайшей задачи (unix-секунды) или None."""
+        if self._use_redis:
+            value = await redis_client.eval(_NEXT_DUE_SCRIPT, [QUEUE_KEY], [])
+            return float(value) if value else None
+        while self._heap:
+            due_ts, member = self._heap[0]
+            entry = self._pending.get(member)
+            if entry is not None and entry[0] == due_ts:
+                return due_ts
+            heapq.heappop(self._heap)
+        return None
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """
+        Выполнить все задачи со сроком не позже ``now``.
+
+        Returns:
+            Количество выполненных задач
+        """
+        now = self._clock() if now is None else now
+        done = 0
+        while True:
+            batch = await self._pop_due(now)
+            if not batch:
+                return done
+            for member, encoded in batch:
+                await self._execute(member, encoded, now)
+                done += 1
+
+    async def _execute(self, member: str, encoded: str, now: float) -> None:
+        kind, _, key = member.partition(":")
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logger.warning(f"Delay queue: no handler for {member}")
+            return
+        try:
+            payload = json.loads(encoded) if encoded else {}
+        except ValueError:
+            payload = {}
+
+        status = "ok"
+        try:
+            await handler(self._bot, key, payload)
+        except Exception as e:
+            attempt = payload.get("_attempt", 0) + 1
+            if attempt < MAX_ATTEMPTS:
+                status = "retry"
+                logger.warning(f"Delay queue task {member} failed ({e}), retry {attempt}/{MAX_ATTEMPTS - 1}")
+                await self.schedule(kind, key, now + RETRY_DELAY_SECONDS, {**payload, "_attempt": attempt})
+            else:
+                status = "error"
+                logger.error(f"Delay queue task {member} failed permanently: {e}")
+        await metrics.increment_counter("delay_queue_tasks_total", labels={"kind": kind, "status": status})
+
+    async def reload(self) -> int:
+        """Перечитать незавершённые сроки из БД (идемпотентно)."""
+        count = 0
+        for kind, reloader in self._reloaders.items():
+            try:
+                for key, due, payload in await reloader():
+                    await self.schedule(kind, key, due, payload)
+                    count += 1
+            except Exception as e:
+                logger.error(f"Delay queue reload for {kind} failed: {e}")
+        return count
+
+    async def start(self, bot) -> None:
+        """Перечитать сроки и запустить фоновый цикл."""
+        self._bot = bot
+        reloaded = await self.reload()
+        logger.info(
+            f"Delay queue started ({'redis' if self._use_redis else 'memory'}), {reloaded} deadlines reloaded"
+        )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = REDIS_POLL_SECONDS if self._use_redis else None
+            try:
+                await self.run_due()
+                due = await self.next_due()
+                if due is not None:
+                    wait = max(0.0, due - self._clock())
+                    timeout = wait if timeout is None else min(timeout, wait)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Delay queue loop error: {e}")
+                timeout = REDIS_POLL_SECONDS
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self._use_redis else "memory",
+            "pending_local": len(self._pending),
+            "kinds": sorted(self._handlers),
+        }
+
+
+# Global delay queue instance
+delay_queue = DelayQueue()
@@ -0,0 +1,59 @@
+"""
+Fair Queue - ограниченная очередь с круговым обходом ключей (чатов).
+
+Общая для тяжёлых очередей бота: распознавание голосовых
+(voice_recognition) и запросы к vision-модели (vision_queue). Чат,
+заваливший очередь, не задерживает остальные: задачи выдаются по одной
+от каждого чата по очереди, у одного чата не больше ``per_key`` ожидающих.
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Hashable
+
+
+class QueueFull(Exception):
+    """Очередь переполнена (общая или чата)."""
+
+
+class FairQueue:
+    """
+    Ограниченная очередь с круговым обходом ключей (чатов).
+
+    Чат с десятью задачами не задерживает чат с одной: задачи
+    выдаются по одной от каждого чата по очереди.
+    """
+
+    # Исключение при переполнении (подклассы уточняют тип)
+    full_error = QueueFull
+
+    def __init__(self, maxsize: int, per_key: int):
+        self.maxsize = maxsize
+        self.per_key = per_key
+        self._queues: "OrderedDict[Hashable, Deque[Any]]" = OrderedDict()
+        self._size = 0
+        self._available = asyncio.Semaphore(0)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def put_nowait(self, key: Hashable, item: Any) -> None:
+        queue = self._queues.get(key)
+        if self._size >= self.maxsize or (queue is not None and len(queue) >= self.per_key):
+            raise self.full_error(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(item)
+        self._size += 1
+        self._available.release()
+
+    async def get(self) -> Any:
+        await self._available.acquire()
+        key, queue = next(iter(self._queues.items()))
+        item = queue.popleft()
+        # Чат уходит в конец круга (или из него, если задач больше нет)
+        del self._queues[key]
+        if queue:
+            self._queues[key] = queue
+        self._size -= 1
+        return item
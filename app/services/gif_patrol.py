@@ -1,8 +1,12 @@
 """
 GIF Patrol Service - анализ GIF-анимаций на запрещённый контент.
 
-Извлекает кадры из GIF и анализирует их через Vision Pipeline
-для обнаружения порнографии, скримеров и насилия.
+Выбирает различающиеся кадры GIF (смена сцены по гистограммам),
+склеивает их в одну раскадровку и анализирует одним запросом к
+Vision Pipeline для обнаружения порнографии, скримеров и насилия. Вердикты
+запоминаются по file_unique_id и перцептивным хэшам кадров
+(perceptual_cache): репосты и перекодированные копии не анализируются
+заново.
 
 **Feature: fortress-update**
 **Validates: Requirements 3.1, 3.2, 3.6**
@@ -11,13 +15,16 @@ GIF Patrol Service - анализ GIF-анимаций на запрещённы
 import asyncio
 import io
 import logging
+import math
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
-from PIL import Image
+from PIL import Image, ImageDraw, ImageSequence
 
-from app.services.vision_pipeline import vision_pipeline
+from app.services.metrics import metrics
+from app.services.perceptual_cache import PerceptualCache, image_dhash
+from app.services.vision_pipeline import VisionPipeline, vision_pipeline
 
 logger = logging.getLogger(__name__)
 
@@ -54,8 +61,10 @@ class GIFPatrolService:
     """
     Сервис для анализа GIF-анимаций на запрещённый контент.
     
-    Извлекает 3 кадра (начало, середина, конец) и анализирует
-    каждый через существующий Vision Pipeline.
+    Выбирает до 3 различающихся кадров, склеивает их в раскадровку и
+    анализирует одним запросом через существующий Vision Pipeline. Если
+    модель вернула ошибку, кадры проверяются по одному до первого
+    небезопасного; после таймаута — нет.
     """
     
     # Промпт для анализа кадра на запрещённый контент
@@ -73,10 +82,29 @@ Respond with ONLY one of these categories:
 
 Your response must be exactly one word from the list above."""
 
+    # Промпт для раскадровки: те же категории, но про все кадры сразу
+    CONTACT_SHEET_PROMPT = """This image is a contact sheet: numbered frames taken from one animation.
+""" + CONTENT_ANALYSIS_PROMPT.replace(
+        "Analyze this image for inappropriate content.",
+        "Analyze ALL frames together for inappropriate content. If ANY frame is inappropriate, report its category.",
+    )
+
     # Количество кадров для извлечения
     FRAME_COUNT = 3
     
-    # Таймаут для анализа одного кадра (секунды)
+    # Сколько кадров-кандидатов сравнивать по гистограммам
+    SAMPLE_CANDIDATES = 24
+    
+    # L1-разница гистограмм (0..1), ниже которой кадр считается той же сценой
+    SCENE_CHANGE_THRESHOLD = 0.08
+    
+    # Размер входа vision-модели: кадры уменьшаются до кодирования
+    FRAME_MAX_SIDE = 512
+    CONTACT_SHEET_TILE = 384
+    JPEG_QUALITY = 85
+    
+    # Таймаут на запрос к vision-модели (секунды). Считается с момента,
+    # когда vision_queue взяла запрос в работу, ожидание в очереди не входит
     FRAME_ANALYSIS_TIMEOUT = 5.0
     
     # Порог уверенности для определения небезопасного контента
@@ -85,23 +113,95 @@ Your response must be exactly one word from the list above."""
     def __init__(self):
         """Инициализация сервиса."""
         self._vision_pipeline = vision_pipeline
+        self._verdicts = PerceptualCache("gif_verdict")
+    
+    @staticmethod
+    def _verdict_to_dict(result: GIFAnalysisResult) -> dict:
+        return {
+            "is_safe": result.is_safe,
+            "detected_categories": result.detected_categories,
+            "confidence": result.confidence,
+        }
+    
+    @staticmethod
+    def _verdict_from_dict(data: dict) -> GIFAnalysisResult:
+        # Покадровые ответы модели не хранятся — только итоговый вердикт
+        return GIFAnalysisResult(
+            is_safe=data["is_safe"],
+            detected_categories=list(data["detected_categories"]),
+            confidence=data["confidence"],
+            frame_results=[],
+        )
+    
+    async def cached_verdict(self, file_unique_id: Optional[str]) -> Optional[GIFAnalysisResult]:
+        """
+        Вердикт для уже проверенной анимации по file_unique_id (без скачивания).
+        
+        Args:
+            file_unique_id: Telegram file_unique_id анимации
+            
+        Returns:
+            Сохранённый результат или None
+        """
+        if not file_unique_id:
+            return None
+        data = await self._verdicts.get(file_unique_id=file_unique_id)
+        return self._verdict_from_dict(data) if data else None
     
     def extract_frames(self, gif_data: bytes) -> List[bytes]:
         """
-        Извлекает 3 кадра из GIF или MP4 анимации (начало, середина, конец).
+        Извлекает 3 кадра из GIF или MP4 анимации.
+        
+        Кадры выбираются по смене сцены (см. sample_frames), уменьшаются
+        до входа vision-модели и кодируются в JPEG. Если различающихся
+        кадров меньше трёх, кадры повторяются (порядок сохраняется).
+        
+        Args:
+            gif_data: Байты GIF или MP4 файла
+            
+        Returns:
+            Список из 3 кадров в формате JPEG bytes
+            
+        Raises:
+            ValueError: Если данные не являются валидным GIF/MP4
+        """
+        frames = self.sample_frames(gif_data)
+        # Дополняем до FRAME_COUNT: [a] -> [a, a, a], [a, b] -> [a, a, b]
+        padded = [frames[i * len(frames) // self.FRAME_COUNT] for i in range(self.FRAME_COUNT)]
+        encoded = {id(frame): self._frame_to_bytes(frame) for frame in frames}
+        return [encoded[id(frame)] for frame in padded]
+    
+    def sample_frames(self, gif_data: bytes, count: Optional[int] = None) -> List[Image.Image]:
+        """
+        Выбирает до ``count`` различающихся кадров анимации.
+        
+        Кадры декодируются потоком; для сравнения остаётся не больше
+        ``SAMPLE_CANDIDATES`` кандидатов (равномерное прореживание), каждый
+        сразу уменьшается до ``FRAME_MAX_SIDE``. Первый кадр берётся всегда,
+        дальше — самый непохожий на уже выбранные по гистограмме яркости,
+        пока разница больше ``SCENE_CHANGE_THRESHOLD``.
         
         Telegram часто конвертирует GIF в MP4 для экономии трафика,
         поэтому поддерживаем оба формата.
         
         Args:
             gif_data: Байты GIF или MP4 файла
+            count: Сколько кадров нужно (по умолчанию FRAME_COUNT)
             
         Returns:
-            Список из 3 кадров в формате PNG bytes
+            От 1 до ``count`` RGB-кадров в порядке следования
             
         Raises:
             ValueError: Если данные не являются валидным GIF/MP4
         """
+        candidates = self._decode_candidates(gif_data)
+        if not candidates:
+            raise ValueError("Animation has no frames")
+        chosen = self._select_distinct(candidates, count or self.FRAME_COUNT)
+        return [frame for _, frame in chosen]
+    
+    def _decode_candidates(self, gif_data: bytes) -> List[Tuple[int, Image.Image]]:
+        """Кандидаты (индекс кадра, уменьшенный кадр) из GIF/MP4."""
         # Определяем формат по magic bytes
         is_mp4 = gif_data[:4] == b'\x00\x00\x00\x18' or gif_data[4:8] == b'ftyp'
         is_gif = gif_data[:6] in (b'GIF87a', b'GIF89a')
@@ -111,96 +211,37 @@ Your response must be exactly one word from the list above."""
         # Если это MP4 — сразу идём в imageio
         if is_mp4:
             logger.info("Detected MP4 format, using imageio")
-            return self._extract_frames_mp4(gif_data)
+            return self._decode_candidates_mp4(gif_data)
         
-        # Пробуем открыть как GIF через PIL
+        # Пробуем открыть как GIF (или статичную картинку) через PIL
         try:
             gif = Image.open(io.BytesIO(gif_data))
-            
-            # Проверяем, что это анимированный GIF
-            if not hasattr(gif, 'n_frames'):
-                # Статичное изображение - возвращаем его 3 раза
-                frame_bytes = self._frame_to_bytes(gif)
-                return [frame_bytes, frame_bytes, frame_bytes]
-            
-            total_frames = gif.n_frames
-            
-            if total_frames == 0:
-                raise ValueError("GIF has no frames")
-            
-            # Определяем индексы кадров для извлечения
-            if total_frames == 1:
-                frame_indices = [0, 0, 0]
-            elif total_frames == 2:
-                frame_indices = [0, 0, 1]
-            else:
-                frame_indices = [
-                    0,                          # Начало
-                    total_frames // 2,          # Середина
-                    total_frames - 1            # Конец
-                ]
-            
-            frames = []
-            for idx in frame_indices:
-                gif.seek(idx)
-                frame = gif.convert('RGB')
-                frame_bytes = self._frame_to_bytes(frame)
-                frames.append(frame_bytes)
-            
-            logger.info(f"Extracted {len(frames)} frames from GIF with {total_frames} total frames")
-            return frames
-            
+            candidates = self._thin_stream(ImageSequence.Iterator(gif))
+            logger.info(f"Sampled {len(candidates)} candidate frames from {getattr(gif, 'n_frames', 1)} GIF frames")
+            return candidates
         except Exception as pil_error:
             logger.debug(f"PIL failed to open as GIF: {pil_error}, trying as MP4...")
         
         # Если PIL не смог открыть - пробуем как MP4 через imageio
-        return self._extract_frames_mp4(gif_data)
+        return self._decode_candidates_mp4(gif_data)
     
-    def _extract_frames_mp4(self, mp4_data: bytes) -> List[bytes]:
+    def _decode_candidates_mp4(self, mp4_data: bytes) -> List[Tuple[int, Image.Image]]:
         """
-        Извлекает кадры из MP4 через imageio.
+        Кандидаты из MP4 через imageio (кадры читаются потоком, не все сразу).
         
         Args:
             mp4_data: Байты MP4 файла
             
         Returns:
-            Список из 3 кадров в формате PNG bytes
+            Список (индекс, уменьшенный кадр)
         """
         try:
             import imageio.v3 as iio
             
-            # Читаем все кадры из MP4
-            frames_array = iio.imread(io.BytesIO(mp4_data), plugin="pyav")
-            total_frames = len(frames_array)
-            
-            logger.info(f"MP4 has {total_frames} frames")
-            
-            if total_frames == 0:
-                raise ValueError("MP4 has no frames")
-            
-            # Определяем индексы кадров
-            if total_frames == 1:
-                frame_indices = [0, 0, 0]
-            elif total_frames == 2:
-                frame_indices = [0, 0, 1]
-            else:
-                frame_indices = [
-                    0,
-                    total_frames // 2,
-                    total_frames - 1
-                ]
-            
-            frames = []
-            for idx in frame_indices:
-                # Конвертируем numpy array в PIL Image
-                frame_img = Image.fromarray(frames_array[idx])
-                if frame_img.mode != 'RGB':
-                    frame_img = frame_img.convert('RGB')
-                frame_bytes = self._frame_to_bytes(frame_img)
-                frames.append(frame_bytes)
-            
-            logger.info(f"Extracted {len(frames)} frames from MP4")
-            return frames
+            frames = (Image.fromarray(array) for array in iio.imiter(io.BytesIO(mp4_data), plugin="pyav"))
+            candidates = self._thin_stream(frames)
+            logger.info(f"Sampled {len(candidates)} candidate frames from MP4")
+            return candidates
             
         except ImportError as e:
             logger.error(f"imageio not available for MP4 processing: {e}")
@@ -209,33 +250,132 @@ Your response must be exactly one word from the list above."""
             logger.error(f"Error extracting frames from MP4: {e}")
             raise ValueError(f"Failed to extract frames from MP4: {e}")
     
+    def _thin_stream(self, frames: Iterable[Image.Image]) -> List[Tuple[int, Image.Image]]:
+        """
+        Равномерное прореживание потока кадров неизвестной длины: при
+        переполнении отбрасывается каждый второй кандидат и шаг удваивается.
+        Последний кадр сохраняется всегда.
+        """
+        kept: List[Tuple[int, Image.Image]] = []
+        stride = 1
+        last = None
+        for index, frame in enumerate(frames):
+            if index % stride == 0:
+                kept.append((index, self._downscale(frame)))
+                if len(kept) > self.SAMPLE_CANDIDATES:
+                    kept = kept[::2]
+                    stride *= 2
+                last = None
+            else:
+                last = (index, frame)
+        if last is not None:
+            kept.append((last[0], self._downscale(last[1])))
+        return kept
+    
+    def _downscale(self, frame: Image.Image) -> Image.Image:
+        """RGB-копия кадра, вписанная в FRAME_MAX_SIDE."""
+        frame = frame.convert('RGB')
+        frame.thumbnail((self.FRAME_MAX_SIDE, self.FRAME_MAX_SIDE), Image.Resampling.BILINEAR)
+        return frame
+    
+    @staticmethod
+    def _histogram(frame: Image.Image) -> List[float]:
+        """Нормированная гистограмма яркости (64 корзины) по миниатюре 64x64."""
+        counts = frame.convert('L').resize((64, 64)).histogram()
+        bins = [sum(counts[i:i + 4]) for i in range(0, 256, 4)]
+        total = float(sum(bins)) or 1.0
+        return [b / total for b in bins]
+    
+    def _select_distinct(
+        self, candidates: List[Tuple[int, Image.Image]], count: int
+    ) -> List[Tuple[int, Image.Image]]:
+        """Первый кадр + наиболее непохожие (farthest-point по L1 гистограмм)."""
+        histograms = [self._histogram(frame) for _, frame in candidates]
+        
+        def distance(a: int, b: int) -> float:
+            return sum(abs(x - y) for x, y in zip(histograms[a], histograms[b])) / 2
+        
+        chosen = [0]
+        nearest = [distance(i, 0) for i in range(len(candidates))]
+        while len(chosen) < min(count, len(candidates)):
+            best = max(range(len(candidates)), key=lambda i: nearest[i])
+            if nearest[best] <= self.SCENE_CHANGE_THRESHOLD:
+                break  # Оставшиеся кадры — та же сцена
+            chosen.append(best)
+            nearest = [min(nearest[i], distance(i, best)) for i in range(len(candidates))]
+        return [candidates[i] for i in sorted(chosen)]
+    
+    def build_contact_sheet(self, frames: List[Image.Image]) -> bytes:
+        """
+        Склеивает кадры в одну раскадровку (сетка, номер в углу каждого кадра)
+        для одного запроса к vision-модели.
+        
+        Args:
+            frames: Кадры в порядке следования
+            
+        Returns:
+            Раскадровка в формате JPEG bytes
+        """
+        tile = self.CONTACT_SHEET_TILE
+        cols = math.ceil(math.sqrt(len(frames)))
+        rows = math.ceil(len(frames) / cols)
+        sheet = Image.new('RGB', (cols * tile, rows * tile), (16, 16, 16))
+        draw = ImageDraw.Draw(sheet)
+        for n, frame in enumerate(frames):
+            thumb = frame.copy()
+            thumb.thumbnail((tile, tile), Image.Resampling.BILINEAR)
+            x = (n % cols) * tile + (tile - thumb.width) // 2
+            y = (n // cols) * tile + (tile - thumb.height) // 2
+            sheet.paste(thumb, (x, y))
+            label_x, label_y = (n % cols) * tile + 6, (n // cols) * tile + 6
+            draw.rectangle([label_x, label_y, label_x + 18, label_y + 16], fill=(0, 0, 0))
+            draw.text((label_x + 5, label_y + 2), str(n + 1), fill=(255, 255, 255))
+        return self._frame_to_bytes(sheet)
+    
     def _frame_to_bytes(self, frame: Image.Image) -> bytes:
-        """Конвертирует PIL Image в PNG bytes."""
+        """Конвертирует PIL Image в JPEG bytes."""
         buffer = io.BytesIO()
         # Конвертируем в RGB если нужно (для GIF с прозрачностью)
-        if frame.mode in ('RGBA', 'P', 'LA'):
+        if frame.mode != 'RGB':
             frame = frame.convert('RGB')
-        frame.save(buffer, format='PNG')
+        frame.save(buffer, format='JPEG', quality=self.JPEG_QUALITY)
         return buffer.getvalue()
     
-    async def analyze_frame(self, frame_data: bytes, frame_index: int) -> FrameAnalysis:
+    async def analyze_frame(
+        self,
+        frame_data: bytes,
+        frame_index: int,
+        prompt: Optional[str] = None,
+        chat_id: Optional[int] = None,
+    ) -> FrameAnalysis:
         """
-        Анализирует один кадр на запрещённый контент.
+        Анализирует один кадр (или раскадровку) на запрещённый контент.
         
         Args:
-            frame_data: Байты кадра (PNG)
+            frame_data: Байты кадра (JPEG)
             frame_index: Индекс кадра (0, 1, 2)
+            prompt: Промпт (по умолчанию CONTENT_ANALYSIS_PROMPT)
+            chat_id: Чат (справедливость очереди vision-модели)
             
         Returns:
             Результат анализа кадра
+
+        Raises:
+            asyncio.TimeoutError: модель не уложилась в FRAME_ANALYSIS_TIMEOUT
         """
         try:
             # Используем Vision Pipeline для анализа
             response = await self._vision_pipeline.analyze(
                 frame_data, 
-                user_query=self.CONTENT_ANALYSIS_PROMPT
+                user_query=prompt or self.CONTENT_ANALYSIS_PROMPT,
+                chat_id=chat_id,
+                vision_timeout=self.FRAME_ANALYSIS_TIMEOUT,
             )
             
+            # Модель недоступна или очередь переполнена — это ошибка, а не SAFE
+            if response in (VisionPipeline.ERROR_VISION_UNAVAILABLE, VisionPipeline.ERROR_ANALYSIS_FAILED):
+                raise RuntimeError(response)
+            
             # Парсим ответ модели
             category, confidence = self._parse_analysis_response(response)
             
@@ -249,6 +389,8 @@ Your response must be exactly one word from the list above."""
                 description=response
             )
             
+        except asyncio.TimeoutError:
+            raise
         except Exception as e:
             logger.error(f"Error analyzing frame {frame_index}: {e}")
             # При ошибке считаем кадр безопасным (fail-open для доступности)
@@ -285,49 +427,43 @@ Your response must be exactly one word from the list above."""
             # Не удалось определить - считаем безопасным с низкой уверенностью
             return ContentCategory.SAFE, 0.5
     
-    async def analyze_gif(self, gif_data: bytes) -> GIFAnalysisResult:
+    async def analyze_gif(
+        self,
+        gif_data: bytes,
+        file_unique_id: Optional[str] = None,
+        chat_id: Optional[int] = None,
+    ) -> GIFAnalysisResult:
         """
         Полный анализ GIF на запрещённый контент.
         
-        Извлекает 3 кадра и анализирует каждый параллельно.
-        GIF считается небезопасным, если хотя бы один кадр небезопасен.
+        Различающиеся кадры склеиваются в раскадровку и проверяются одним
+        запросом к модели. Если модель ответила ошибкой, кадры проверяются
+        по одному до первого небезопасного. GIF считается небезопасным, если хотя
+        бы один кадр небезопасен. Если та же или почти такая же анимация
+        уже проверялась, вердикт берётся из кэша без обращения к модели.
         
         Args:
             gif_data: Байты GIF-файла
+            file_unique_id: Telegram file_unique_id (опционально)
+            chat_id: Чат (справедливость очереди vision-модели)
             
         Returns:
             Результат анализа GIF
         """
         try:
-            # Извлекаем кадры
-            frames = self.extract_frames(gif_data)
-            
-            # Анализируем кадры параллельно с таймаутом
-            tasks = [
-                asyncio.wait_for(
-                    self.analyze_frame(frame, idx),
-                    timeout=self.FRAME_ANALYSIS_TIMEOUT
-                )
-                for idx, frame in enumerate(frames)
-            ]
+            # Декодирование и выбор кадров — вне event loop
+            frames = await asyncio.to_thread(self.sample_frames, gif_data)
+            frame_bytes = [self._frame_to_bytes(frame) for frame in frames]
             
-            frame_results = await asyncio.gather(*tasks, return_exceptions=True)
+            hashes = [image_dhash(frame) for frame in frame_bytes]
+            cached = await self._verdicts.get(file_unique_id=file_unique_id, hashes=hashes)
+            if cached:
+                logger.info(f"GIF verdict reused from cache: safe={cached['is_safe']}")
+                if file_unique_id:
+                    await self._verdicts.put(cached, file_unique_id=file_unique_id)
+                return self._verdict_from_dict(cached)
             
-            # Обрабатываем результаты
-            valid_results = []
-            for idx, result in enumerate(frame_results):
-                if isinstance(result, Exception):
-                    logger.warning(f"Frame {idx} analysis failed: {result}")
-                    # Создаём безопасный результат при ошибке
-                    valid_results.append(FrameAnalysis(
-                        frame_index=idx,
-                        is_safe=True,
-                        detected_category=None,
-                        confidence=0.0,
-                        description=f"Analysis timeout/error"
-                    ))
-                else:
-                    valid_results.append(result)
+            valid_results = await self._analyze_frames(frames, frame_bytes, chat_id)
             
             # Определяем общий результат
             detected_categories = []
@@ -342,13 +478,21 @@ Your response must be exactly one word from the list above."""
                         detected_categories.append(category_name)
                     max_confidence = max(max_confidence, result.confidence)
             
-            return GIFAnalysisResult(
+            result = GIFAnalysisResult(
                 is_safe=is_safe,
                 detected_categories=detected_categories,
                 confidence=max_confidence if not is_safe else 1.0,
                 frame_results=valid_results
             )
             
+            # Вердикт с ошибками кадров (fail-open) не запоминаем
+            if all(frame.confidence > 0 for frame in valid_results):
+                await self._verdicts.put(
+                    self._verdict_to_dict(result), file_unique_id=file_unique_id, hashes=hashes
+                )
+            
+            return result
+            
         except ValueError as e:
             # Ошибка извлечения кадров
             return GIFAnalysisResult(
@@ -368,6 +512,54 @@ Your response must be exactly one word from the list above."""
                 error=str(e)
             )
     
+    async def _analyze_frames(
+        self, frames: List[Image.Image], frame_bytes: List[bytes], chat_id: Optional[int] = None
+    ) -> List[FrameAnalysis]:
+        """
+        Один запрос по раскадровке; при ошибке модели — кадры по очереди до
+        первого небезопасного.
+
+        После таймаута по кадрам не идём: модель и так не успевает, ещё
+        несколько запросов только удлинили бы очередь.
+        """
+        if len(frames) > 1:
+            sheet = self.build_contact_sheet(frames)
+            try:
+                result = await self.analyze_frame(sheet, 0, prompt=self.CONTACT_SHEET_PROMPT, chat_id=chat_id)
+            except asyncio.TimeoutError:
+                logger.warning("Contact sheet analysis timed out, skipping per-frame checks")
+                return [self._timeout_result(0)]
+            finally:
+                await metrics.increment_counter("gif_patrol_vision_calls_total", labels={"mode": "contact_sheet"})
+            if result.confidence > 0:
+                return [result]
+        
+        results = []
+        for idx, frame in enumerate(frame_bytes):
+            try:
+                result = await self.analyze_frame(frame, idx, chat_id=chat_id)
+            except asyncio.TimeoutError:
+                logger.warning(f"Frame {idx} analysis timed out, skipping remaining frames")
+                results.append(self._timeout_result(idx))
+                break
+            finally:
+                await metrics.increment_counter("gif_patrol_vision_calls_total", labels={"mode": "frame"})
+            results.append(result)
+            if not result.is_safe:
+                break  # Одного небезопасного кадра достаточно
+        return results
+    
+    @staticmethod
+    def _timeout_result(frame_index: int) -> FrameAnalysis:
+        """Безопасный результат при таймауте (fail-open, в кэш не попадает)."""
+        return FrameAnalysis(
+            frame_index=frame_index,
+            is_safe=True,
+            detected_category=None,
+            confidence=0.0,
+            description="Analysis timeout"
+        )
+    
     async def queue_analysis(
         self, 
         gif_data: bytes,
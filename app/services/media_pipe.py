@@ -0,0 +1,271 @@
+"""
+Media Pipe - ffmpeg через stdin/stdout без временных файлов.
+
+Раньше голосовые, кружочки и TTS проходили через диск: скачать в
+временный mp4/ogg, записать mp3, запустить ffmpeg с путями, прочитать
+результат, удалить файлы. На маленьком SSD это лишний I/O и гонки имён.
+Теперь:
+
+- загрузка из Telegram читается потоком (чанками) и сразу пишется в
+  stdin ffmpeg, пока он уже декодирует начало — стадии перекрываются;
+- выход читается из stdout в память (PCM для Whisper, mp3 для голоса,
+  фрагментированный mp4 для кружочка);
+- stderr читается параллельно, чтобы ffmpeg не встал на полном буфере.
+
+Дополнительный вход (например, звук для шаблона кружочка) передаётся
+через анонимный pipe (``pipe:N``) — тоже без файла на диске.
+
+Исключение — mp4 (кружочки): если moov-атом лежит после mdat (не
+faststart), mov-демуксеру нужен seek, а pipe его не умеет. Такие входы
+собираются в анонимный файл в памяти (memfd) и передаются ffmpeg как
+``/proc/self/fd/N`` — seekable, но всё равно не на диске.
+
+Usage:
+    from app.services import media_pipe
+
+    pcm = await media_pipe.to_pcm(media_pipe.stream_telegram_file(bot, file_id))
+    mp3 = await media_pipe.transcode(wav_bytes, ["-f", "mp3", "-acodec", "libmp3lame"])
+"""
+
+import asyncio
+import io
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 64 * 1024
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+MediaSource = Union[bytes, AsyncIterator[bytes]]
+
+_ffmpeg_available: Optional[bool] = None
+
+
+class FFmpegError(Exception):
+    """ffmpeg завершился с ошибкой или по таймауту."""
+
+
+def ffmpeg_available() -> bool:
+    """Есть ли ffmpeg в PATH (проверяется один раз)."""
+    global _ffmpeg_available
+    if _ffmpeg_available is None:
+        _ffmpeg_available = shutil.which("ffmpeg") is not None
+        if not _ffmpeg_available:
+            logger.warning("FFmpeg не найден в PATH, медиа-конвейер недоступен")
+    return _ffmpeg_available
+
+
+async def stream_telegram_file(bot, file_id: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Читать файл из Telegram чанками, не собирая его целиком.
+
+    Для локального Bot API сервера (файл уже на диске) и ботов без
+    HTTP-сессии читает через ``download_file`` в память.
+    """
+    file_info = await bot.get_file(file_id)
+    session = getattr(bot, "session", None)
+    api = getattr(session, "api", None)
+    if api is not None and not getattr(api, "is_local", False):
+        url = api.file_url(bot.token, file_info.file_path)
+        async for chunk in session.stream_content(url=url, chunk_size=chunk_size, raise_for_status=True):
+            yield chunk
+        return
+    buffer = await bot.download_file(file_info.file_path, destination=io.BytesIO())
+    yield buffer.getvalue()
+
+
+async def read_all(source: MediaSource) -> bytes:
+    """Собрать источник в bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    return b"".join([chunk async for chunk in source])
+
+
+async def _feed(writer: asyncio.StreamWriter, source: MediaSource) -> None:
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            writer.write(source)
+            await writer.drain()
+        else:
+            async for chunk in source:
+                writer.write(chunk)
+                await writer.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg прочитал всё нужное (например, -shortest) и закрыл вход
+        pass
+    finally:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+@contextmanager
+def seekable_input(data: bytes) -> Iterator[Tuple[str, List[int]]]:
+    """
+    Seekable вход для ffmpeg: путь и дескрипторы, которые нужно передать.
+
+    На Linux — memfd (файл в памяти), ffmpeg открывает его как
+    ``/proc/self/fd/N``; иначе — временный файл.
+    """
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("ffmpeg-input")
+        try:
+            _write_all(fd, data)
+            yield f"/proc/self/fd/{fd}", [fd]
+        finally:
+            os.close(fd)
+        return
+    with tempfile.NamedTemporaryFile(suffix=".mp4") as tmp:
+        tmp.write(data)
+        tmp.flush()
+        yield tmp.name, []
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _feed_fd(fd: int, data: bytes) -> None:
+    """Записать дополнительный вход в pipe (в потоке, чтобы не блокировать loop)."""
+    try:
+        with os.fdopen(fd, "wb") as pipe:
+            pipe.write(data)
+    except (BrokenPipeError, OSError):
+        pass
+
+
+async def run_ffmpeg(
+    args: Sequence[str],
+    source: Optional[MediaSource] = None,
+    extra_input: Optional[bytes] = None,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    pass_fds: Sequence[int] = (),
+) -> bytes:
+    """
+    Запустить ffmpeg: ``source`` -> stdin, stdout -> bytes.
+
+    Args:
+        args: Аргументы ffmpeg (вход ``pipe:0``, выход ``pipe:1``);
+            ``{extra}`` заменяется на ``pipe:N`` дополнительного входа
+        source: bytes или асинхронный поток чанков для stdin
+        extra_input: Второй вход (bytes) через отдельный pipe
+        timeout: Общий таймаут
+        pass_fds: Дескрипторы, которые наследует ffmpeg (см. seekable_input)
+
+    Returns:
+        Содержимое stdout
+
+    Raises:
+        FFmpegError: ненулевой код возврата или таймаут
+        FileNotFoundError: ffmpeg не установлен
+    """
+    read_fd = write_fd = None
+    pass_fds = list(pass_fds)
+    if extra_input is not None:
+        read_fd, write_fd = os.pipe()
+        pass_fds.append(read_fd)
+        args = [arg.replace("{extra}", f"pipe:{read_fd}") for arg in args]
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error", *args,
+            stdin=asyncio.subprocess.PIPE if source is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            pass_fds=pass_fds,
+        )
+    except BaseException:
+        for fd in (read_fd, write_fd):
+            if fd is not None:
+                os.close(fd)
+        raise
+    if read_fd is not None:
+        os.close(read_fd)  # Дочерний процесс держит свою копию
+
+    async def communicate():
+        tasks = []
+        if source is not None:
+            tasks.append(asyncio.ensure_future(_feed(process.stdin, source)))
+        if write_fd is not None:
+            tasks.append(asyncio.ensure_future(asyncio.to_thread(_feed_fd, write_fd, extra_input)))
+        stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        await asyncio.gather(*tasks)
+        await process.wait()
+        return stdout, stderr
+
+    try:
+        stdout, stderr = await asyncio.wait_for(communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise FFmpegError(f"timeout after {timeout:.0f}s")
+    if process.returncode != 0:
+        raise FFmpegError(stderr.decode(errors="replace")[-500:].strip() or f"exit code {process.returncode}")
+    return stdout
+
+
+async def to_pcm(
+    source: MediaSource,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    seekable: bool = False,
+) -> bytes:
+    """
+    Аудио/видео -> 16 кГц mono s16le PCM (для Whisper).
+
+    ``seekable=True`` — для mp4: вход сначала собирается в memfd, чтобы
+    ffmpeg мог дочитать moov-атом из конца файла.
+    """
+    output_args = ["-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+                   "-ar", str(SAMPLE_RATE), "-ac", "1", "pipe:1"]
+    if not seekable:
+        return await run_ffmpeg(["-i", "pipe:0", *output_args], source, timeout=timeout)
+    data = await read_all(source)
+    with seekable_input(data) as (path, fds):
+        return await run_ffmpeg(["-i", path, *output_args], timeout=timeout, pass_fds=fds)
+
+
+async def transcode(
+    source: MediaSource,
+    output_args: Sequence[str],
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+) -> bytes:
+    """Перекодировать stdin -> stdout с заданными выходными параметрами."""
+    return await run_ffmpeg(["-i", "pipe:0", *output_args, "pipe:1"], source, timeout=timeout)
+
+
+async def assemble_video_note(template_path: str, audio: bytes, timeout: float = 20.0) -> bytes:
+    """
+    Наложить звук на зацикленный шаблон кружочка (640x640 без звука).
+
+    Звук идёт через отдельный pipe, результат — фрагментированный mp4 из
+    stdout (обычный mp4 требует seek для moov-атома).
+    """
+    return await run_ffmpeg(
+        [
+            "-stream_loop", "-1",
+            "-i", template_path,
+            "-i", "{extra}",
+            "-vf", "setsar=1",  # Шаблон уже 640x640, просто SAR 1:1
+            "-c:v", "libx264",
+            "-preset", "ultrafast",
+            "-tune", "zerolatency",
+            "-crf", "28",
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac",
+            "-shortest",
+            "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+            "-f", "mp4",
+            "pipe:1",
+        ],
+        extra_input=audio,
+        timeout=timeout,
+    )
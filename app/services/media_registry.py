@@ -0,0 +1,143 @@
+"""
+Media Registry - повторная отправка сгенерированных медиа по file_id.
+
+Цитаты, карточки профиля, графики топов, спарклайны и голос TTS
+отправлялись как ``BufferedInputFile`` каждый раз, даже если байты не
+менялись (тот же график в ежедневной рассылке по всем чатам, тот же
+профиль без изменений). Теперь байты хэшируются (sha256), после первой
+отправки запоминается ``file_id`` из ответа Telegram, и повтор уходит по
+ID — без загрузки.
+
+- записи живут в Redis (``media_fid:<тип>:<sha256>``) с TTL
+  ``media_registry_ttl_days``, локально — небольшой LRU;
+- без Redis работает только локальный LRU;
+- если Telegram не принимает file_id, файл загружается заново и ID
+  перезаписывается.
+
+Usage:
+    from app.services.media_registry import media_registry
+
+    await media_registry.send(msg.reply_photo, "photo", png_bytes, "chart.png", caption=text)
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "media_fid"
+LOCAL_CACHE_SIZE = 2048
+
+# Типы медиа: имя аргумента в методе отправки = атрибут в ответе
+KINDS = frozenset({"photo", "voice", "sticker", "document", "animation", "video", "video_note", "audio"})
+
+
+def media_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sent_file_id(message: Any, kind: str) -> Optional[str]:
+    """file_id из отправленного сообщения (для фото — самый большой размер)."""
+    media = getattr(message, kind, None)
+    if kind == "photo" and isinstance(media, (list, tuple)):
+        media = media[-1] if media else None
+    file_id = getattr(media, "file_id", None)
+    return file_id if isinstance(file_id, str) and file_id else None
+
+
+class MediaRegistry:
+    """file_id по хэшу содержимого: Redis с TTL + локальный LRU."""
+
+    def __init__(self, ttl_seconds: Optional[int] = None, local_size: int = LOCAL_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds or settings.media_registry_ttl_days * 86400
+        self.local_size = local_size
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def _key(kind: str, digest: str) -> str:
+        return f"{KEY_PREFIX}:{kind}:{digest}"
+
+    async def get(self, kind: str, digest: str) -> Optional[str]:
+        key = self._key(kind, digest)
+        file_id = self._local.get(key)
+        if file_id is not None:
+            self._local.move_to_end(key)
+            return file_id
+        file_id = await redis_client.get(key)
+        if file_id:
+            self._remember_local(key, file_id)
+        return file_id or None
+
+    async def remember(self, kind: str, digest: str, file_id: str) -> None:
+        key = self._key(kind, digest)
+        self._remember_local(key, file_id)
+        await redis_client.set(key, file_id, ex=self.ttl_seconds)
+
+    async def forget(self, kind: str, digest: str) -> None:
+        key = self._key(kind, digest)
+        self._local.pop(key, None)
+        await redis_client.delete(key)
+
+    def _remember_local(self, key: str, file_id: str) -> None:
+        self._local[key] = file_id
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def send(
+        self,
+        sender: Callable[..., Awaitable[Any]],
+        kind: str,
+        data: bytes,
+        filename: str,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Отправить медиа: по file_id, если эти байты уже отправлялись,
+        иначе загрузкой (и запомнить полученный file_id).
+
+        Args:
+            sender: Метод отправки (msg.reply_photo, bot.send_voice, ...)
+            kind: Тип медиа — имя аргумента метода (photo, voice, sticker, ...)
+            data: Байты файла
+            filename: Имя файла для загрузки
+            **kwargs: Остальные аргументы метода (chat_id, caption, ...)
+
+        Returns:
+            Отправленное сообщение
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown media kind: {kind}")
+        digest = media_digest(data)
+        file_id = await self.get(kind, digest)
+        if file_id:
+            try:
+                sent = await sender(**{kind: file_id}, **kwargs)
+                await metrics.increment_counter("media_registry_sends_total", labels={"kind": kind, "result": "file_id"})
+                return sent
+            except TelegramBadRequest as e:
+                # Отвергнут сам файл — загружаем заново; остальные ошибки (чат, реплай) не лечатся повтором
+                if "file" not in str(e).lower():
+                    raise
+                logger.info(f"Media registry: {kind} file_id rejected ({e}), uploading again")
+                await self.forget(kind, digest)
+
+        sent = await sender(**{kind: BufferedInputFile(data, filename=filename)}, **kwargs)
+        await metrics.increment_counter("media_registry_sends_total", labels={"kind": kind, "result": "upload"})
+        new_file_id = sent_file_id(sent, kind)
+        if new_file_id:
+            await self.remember(kind, digest, new_file_id)
+        return sent
+
+
+# Global media registry instance
+media_registry = MediaRegistry()
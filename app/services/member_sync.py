@@ -0,0 +1,266 @@
+"""
+Member Sync - статус участников чатов без ночного обхода всех пользователей.
+
+Раньше job_sync_chat_members каждую ночь вызывал get_chat_member для
+каждого активного пользователя в каждом чате (O(чаты × пользователи)
+запросов с паузой 0.1 с) и ставил User.status = "left", если человека не
+было хотя бы в одном чате. Теперь статус ведётся по событиям:
+
+- апдейты ``chat_member`` и сервисные сообщения о входе
+  (app/handlers/chat_join.py) сразу записывают статус в chat_memberships;
+- первое сообщение пользователя в чате (за время работы процесса)
+  добавляет пару чат-пользователь, если её ещё нет;
+- ``User.status`` = "active", если пользователь состоит хотя бы в одном
+  известном чате, иначе "left".
+
+Ночная сверка проверяет только небольшую выборку: самые давно
+проверенные записи (курсор — ``checked_at`` в БД, новые записи первыми),
+параллельно и с общим ограничением частоты запросов к API.
+
+Usage:
+    from app.services.member_sync import member_sync
+
+    await member_sync.apply(chat_id, user_id, "left")
+    report = await member_sync.reconcile(bot)
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.models import ChatMembership, User
+from app.database.session import get_session
+from app.services.chat_broadcast import SendLimiter
+from app.services.metrics import metrics
+from app.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых пользователь находится в чате
+ACTIVE_STATUSES = frozenset({"member", "administrator", "creator", "restricted"})
+
+# Пары, уже виденные в сообщениях этим процессом (чтобы не писать в БД на каждое)
+_MAX_SEEN_PAIRS = 200_000
+
+
+def membership_status(member: Any) -> str:
+    """Статус из aiogram ChatMember (restricted без is_member — вышел)."""
+    status = getattr(member, "status", "left")
+    status = getattr(status, "value", status)
+    if status == "restricted" and not getattr(member, "is_member", True):
+        return "left"
+    return status
+
+
+def _naive(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def _insert(session: AsyncSession):
+    dialect = session.bind.dialect.name if session.bind is not None else "sqlite"
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(ChatMembership.__table__)
+
+
+@dataclass
+class ReconcileReport:
+    """Итог выборочной сверки."""
+    checked: int = 0
+    changed: int = 0
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+
+class MemberSyncService:
+    """Статусы участников: события + выборочная сверка."""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._seen: Set[Tuple[int, int]] = set()
+
+    def _sessions(self):
+        return self._session_factory or get_session()
+
+    async def apply(
+        self,
+        chat_id: int,
+        user_id: int,
+        status: str,
+        session: Optional[AsyncSession] = None,
+    ) -> None:
+        """
+        Записать статус пользователя в чате (из апдейта chat_member).
+
+        Args:
+            chat_id: ID чата
+            user_id: Telegram ID пользователя
+            status: Статус Telegram (member, left, kicked, ...)
+        """
+        if session is None:
+            async with self._sessions()() as session:
+                await self.apply(chat_id, user_id, status, session)
+                await session.commit()
+            return
+
+        now = _naive(utc_now())
+        stmt = _insert(session).values(chat_id=chat_id, user_id=user_id, status=status, updated_at=now)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=["chat_id", "user_id"],
+            set_={"status": stmt.excluded.status, "updated_at": stmt.excluded.updated_at},
+        ))
+        await self._refresh_user_status(session, [user_id])
+        self._seen.add((chat_id, user_id))
+
+    async def note_seen(self, chat_id: int, user_id: Optional[int]) -> None:
+        """Пользователь написал в группе — он участник (только первая встреча пары)."""
+        if chat_id >= 0 or not user_id or (chat_id, user_id) in self._seen:
+            return
+        if len(self._seen) >= _MAX_SEEN_PAIRS:
+            self._seen.clear()
+        self._seen.add((chat_id, user_id))
+        try:
+            async with self._sessions()() as session:
+                stmt = _insert(session).values(
+                    chat_id=chat_id, user_id=user_id, status="member", updated_at=_naive(utc_now())
+                )
+                await session.execute(stmt.on_conflict_do_nothing(index_elements=["chat_id", "user_id"]))
+                await session.commit()
+        except Exception as e:
+            self._seen.discard((chat_id, user_id))
+            logger.debug(f"Member sync note_seen failed: {e}")
+
+    async def forget_chat(self, chat_id: int) -> None:
+        """Бота удалили из чата — его участников больше не сверяем."""
+        async with self._sessions()() as session:
+            await session.execute(delete(ChatMembership).where(ChatMembership.chat_id == chat_id))
+            await session.commit()
+        self._seen = {pair for pair in self._seen if pair[0] != chat_id}
+
+    async def _refresh_user_status(self, session: AsyncSession, user_ids: Iterable[int]) -> None:
+        """User.status = active, если есть хоть одно активное членство, иначе left."""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return
+        result = await session.execute(
+            select(ChatMembership.user_id).where(
+                ChatMembership.user_id.in_(user_ids),
+                ChatMembership.status.in_(ACTIVE_STATUSES),
+            ).distinct()
+        )
+        active = {row[0] for row in result.all()}
+        left = [uid for uid in user_ids if uid not in active]
+        if active:
+            await session.execute(
+                update(User).where(User.tg_user_id.in_(active), User.status != "active").values(status="active")
+            )
+        if left:
+            await session.execute(
+                update(User).where(User.tg_user_id.in_(left), User.status != "left").values(status="left")
+            )
+
+    async def _check(self, bot, limiter: SendLimiter, row: Tuple[int, int, str]) -> Optional[str]:
+        """Статус из get_chat_member; None — ответа нет (сеть, бот не в чате)."""
+        chat_id, user_id, _ = row
+        await limiter.acquire(chat_id)
+        try:
+            member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+            return membership_status(member)
+        except TelegramRetryAfter as e:
+            limiter.pause(e.retry_after)
+            return None
+        except TelegramBadRequest as e:
+            # "user not found" / "PARTICIPANT_ID_INVALID": в чате его нет
+            if "not found" in str(e).lower() or "participant" in str(e).lower():
+                return "left"
+            return None
+        except Exception as e:
+            logger.debug(f"get_chat_member({chat_id}, {user_id}) failed: {e}")
+            return None
+
+    async def reconcile(
+        self,
+        bot,
+        sample_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        limiter: Optional[SendLimiter] = None,
+    ) -> ReconcileReport:
+        """
+        Выборочная сверка: самые давно проверенные записи активных участников.
+
+        Args:
+            bot: Bot
+            sample_size: Сколько записей проверить за проход
+            concurrency: Параллельных запросов к API
+            limiter: Ограничитель частоты (по умолчанию из настроек)
+
+        Returns:
+            ReconcileReport
+        """
+        sample_size = sample_size or settings.member_sync_sample_size
+        concurrency = concurrency or settings.member_sync_concurrency
+        limiter = limiter or SendLimiter(rate_per_second=settings.member_sync_rate_per_second, chat_interval=0.0)
+        report = ReconcileReport()
+
+        async with self._sessions()() as session:
+            result = await session.execute(
+                select(ChatMembership.chat_id, ChatMembership.user_id, ChatMembership.status)
+                .where(ChatMembership.status.in_(ACTIVE_STATUSES))
+                # Курсор: никогда не проверенные, затем самые давние
+                .order_by(ChatMembership.checked_at.isnot(None), ChatMembership.checked_at)
+                .limit(sample_size)
+            )
+            rows: List[Tuple[int, int, str]] = [tuple(row) for row in result.all()]
+        if not rows:
+            return report
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(row):
+            async with semaphore:
+                return await self._check(bot, limiter, row)
+
+        statuses = await asyncio.gather(*(check(row) for row in rows))
+
+        now = _naive(utc_now())
+        changed_users = []
+        async with self._sessions()() as session:
+            for (chat_id, user_id, old_status), status in zip(rows, statuses):
+                report.checked += 1
+                if status is None:
+                    report.errors += 1
+                    continue
+                report.statuses[status] = report.statuses.get(status, 0) + 1
+                if status != old_status:
+                    report.changed += 1
+                    changed_users.append(user_id)
+                    await session.execute(
+                        update(ChatMembership)
+                        .where(ChatMembership.chat_id == chat_id, ChatMembership.user_id == user_id)
+                        .values(status=status, updated_at=now)
+                    )
+            # Отметка сверки и для ошибок: иначе проблемная запись вечно стоит первой
+            await session.execute(
+                update(ChatMembership)
+                .where(tuple_(ChatMembership.chat_id, ChatMembership.user_id).in_([(c, u) for c, u, _ in rows]))
+                .values(checked_at=now)
+            )
+            await self._refresh_user_status(session, changed_users)
+            await session.commit()
+
+        await metrics.increment_counter("member_sync_checked_total", report.checked)
+        await metrics.increment_counter("member_sync_changed_total", report.changed)
+        return report
+
+
+# Global member sync instance
+member_sync = MemberSyncService()
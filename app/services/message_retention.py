@@ -0,0 +1,572 @@
+"""
+Message Retention - срок хранения, архив и обслуживание таблицы messages.
+
+Сырые сообщения нужны только за недавние окна (24 часа статистики,
+последние N сообщений для контекста, сутки для сводок); долгосрочные
+счётчики уже лежат в почасовых роллапах (app/services/activity_rollup.py).
+Поэтому сообщения старше горизонта чата:
+
+1. архивируются в ``{message_archive_dir}/{chat_id}/{YYYY-MM}.jsonl.gz``
+   (gzip дописывается новыми членами, файл читается обычным gzip.open);
+2. удаляются из горячей таблицы пачками по индексу (chat_id, created_at).
+
+Между архивом и удалением диапазоны id пачки записываются в
+``{chat_id}/.archived-ids.json``: если DELETE не прошёл, следующий проход
+удалит эти строки, не дописывая их в архив второй раз.
+
+Горизонт: ``chats.message_retention_days`` (0 = хранить вечно) или
+``settings.message_retention_days``; меньше MIN_RETENTION_DAYS не бывает.
+
+Тем же проходом чистятся почасовые роллапы: chat_activity_rollups старше
+``settings.activity_rollup_retention_days`` и chat_keyword_rollups старше
+``settings.keyword_rollup_retention_days`` (0 = хранить вечно), пачками по
+индексу (chat_id, hour, ...).
+
+PostgreSQL: messages разбита на месячные партиции (миграция
+20261018_msg_retention). Сервис заранее создаёт партиции на следующие
+месяцы, а месяцы, истёкшие для всех чатов, архивирует и удаляет целиком
+(DETACH + DROP вместо DELETE — без раздувания таблицы и индексов);
+заархивированная, но ещё не удалённая партиция отмечается файлом
+``.partitions/<имя>.archived``.
+
+SQLite: после удаления свободные страницы возвращаются через
+``PRAGMA incremental_vacuum``. Полного VACUUM здесь нет — он держит
+эксклюзивную блокировку; файл переводится в auto_vacuum=INCREMENTAL при
+запуске (app/database/session.py: enable_incremental_auto_vacuum).
+
+Usage:
+    from app.services.message_retention import message_retention
+
+    report = await message_retention.run()
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Chat, ChatActivityRollup, ChatKeywordRollup, MessageLog
+from app.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+# Ниже этого горизонта сводки (вчера + позавчера) и контекст остались бы без данных
+MIN_RETENTION_DAYS = 7
+# PostgreSQL: держать готовые партиции на столько месяцев вперёд
+PARTITION_MONTHS_AHEAD = 2
+
+_PARTITION_RE = re.compile(r"^messages_p(\d{4})(\d{2})$")
+
+_ARCHIVE_COLUMNS = (
+    "id", "chat_id", "message_id", "user_id", "username",
+    "text", "has_link", "links", "topic_id", "created_at",
+)
+
+
+def month_start(moment: datetime) -> datetime:
+    """Первое число месяца, 00:00."""
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month: datetime) -> datetime:
+    """Первое число следующего месяца."""
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month: datetime) -> str:
+    """Имя месячной партиции messages (PostgreSQL)."""
+    return f"messages_p{month:%Y%m}"
+
+
+def archive_path(archive_dir: str, chat_id: int, month: datetime) -> str:
+    """Путь файла архива чата за месяц."""
+    return os.path.join(archive_dir, str(chat_id), f"{month:%Y-%m}.jsonl.gz")
+
+
+def _naive_utc_now() -> datetime:
+    return utc_now().replace(tzinfo=None)
+
+
+def archived_ids_path(archive_dir: str, chat_id: int) -> str:
+    """Журнал id, уже записанных в архив, но ещё не удалённых."""
+    return os.path.join(archive_dir, str(chat_id), ".archived-ids.json")
+
+
+def partition_marker_path(archive_dir: str, name: str) -> str:
+    """Отметка «партиция уже в архиве» (PostgreSQL), пока её не удалили."""
+    return os.path.join(archive_dir, ".partitions", f"{name}.archived")
+
+
+def _touch(path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _to_ranges(ids: Set[int]) -> List[List[int]]:
+    ranges: List[List[int]] = []
+    for value in sorted(ids):
+        if ranges and ranges[-1][1] == value - 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+
+def _load_archived_ids(archive_dir: str, chat_id: int) -> Set[int]:
+    try:
+        with open(archived_ids_path(archive_dir, chat_id), encoding="utf-8") as f:
+            ranges = json.load(f)
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable archive journal for chat {chat_id}: {e}")
+        return set()
+    return {value for start, end in ranges for value in range(start, end + 1)}
+
+
+def _save_archived_ids(archive_dir: str, chat_id: int, ids: Set[int]) -> None:
+    """Записать диапазоны id атомарно (пустой набор — удалить журнал)."""
+    path = archived_ids_path(archive_dir, chat_id)
+    if not ids:
+        _remove_file(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_to_ranges(ids), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _row_to_record(row: Any) -> Dict[str, Any]:
+    record = {col: getattr(row, col) for col in _ARCHIVE_COLUMNS}
+    created_at = record["created_at"]
+    if isinstance(created_at, datetime):
+        record["created_at"] = created_at.isoformat()
+    return record
+
+
+def _write_archive(archive_dir: str, rows: List[Any]) -> int:
+    """
+    Дописать строки в архив (по файлу на чат и месяц) и сбросить на диск.
+
+    Вызывается в отдельном потоке. Возвращает количество записанных строк.
+    """
+    grouped: Dict[Tuple[int, datetime], List[str]] = defaultdict(list)
+    for row in rows:
+        created_at = row.created_at or _naive_utc_now()
+        grouped[(row.chat_id, month_start(created_at))].append(
+            json.dumps(_row_to_record(row), ensure_ascii=False)
+        )
+
+    for (chat_id, month), lines in grouped.items():
+        path = archive_path(archive_dir, chat_id, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+                gz.write(("\n".join(lines) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+    return len(rows)
+
+
+@dataclass
+class RetentionReport:
+    """Итог одного прохода очистки."""
+    archived: int = 0
+    deleted: int = 0
+    chats_trimmed: int = 0
+    partitions_created: List[str] = field(default_factory=list)
+    partitions_dropped: List[str] = field(default_factory=list)
+    rollups_deleted: int = 0
+    vacuum: Optional[str] = None
+    pages_freed: int = 0
+    hot_rows: Optional[int] = None
+    duration: float = 0.0
+
+
+class MessageRetentionService:
+    """Архивирование и удаление сообщений старше горизонта чата."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        archive_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ):
+        """
+        Args:
+            session_factory: Фабрика сессий (по умолчанию get_session())
+            archive_dir: Каталог архива (по умолчанию settings.message_archive_dir)
+            batch_size: Строк в пачке (по умолчанию settings.message_retention_batch_size)
+        """
+        self._session_factory = session_factory
+        self._archive_dir = archive_dir
+        self._batch_size = batch_size
+        self._lock = asyncio.Lock()
+        self.last_report: Optional[RetentionReport] = None
+        self.last_run_at: Optional[datetime] = None
+
+    def _factory(self) -> Callable[[], AsyncSession]:
+        if self._session_factory is not None:
+            return self._session_factory
+        from app.database.session import get_session
+        return get_session()
+
+    @staticmethod
+    def _settings():
+        from app.config import settings
+        return settings
+
+    @property
+    def archive_dir(self) -> str:
+        return self._archive_dir or self._settings().message_archive_dir
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size or self._settings().message_retention_batch_size
+
+    @staticmethod
+    def effective_days(days: Optional[int], default_days: int) -> Optional[int]:
+        """
+        Горизонт чата в днях или None, если хранить вечно.
+
+        Args:
+            days: Настройка чата (None — взять default_days)
+            default_days: Глобальная настройка
+        """
+        value = default_days if days is None else days
+        if value <= 0:
+            return None
+        return max(value, MIN_RETENTION_DAYS)
+
+    async def _load_horizons(self, session: AsyncSession) -> Tuple[Optional[int], Dict[int, Optional[int]]]:
+        """Глобальный горизонт и переопределения чатов."""
+        default_days = self.effective_days(None, self._settings().message_retention_days)
+        rows = (await session.execute(
+            select(Chat.id, Chat.message_retention_days)
+            .where(Chat.message_retention_days.is_not(None))
+        )).all()
+        overrides = {
+            chat_id: self.effective_days(days, self._settings().message_retention_days)
+            for chat_id, days in rows
+        }
+        return default_days, overrides
+
+    # ------------------------------------------------------------------
+    # Основной проход
+    # ------------------------------------------------------------------
+
+    async def run(self) -> RetentionReport:
+        """Один проход: партиции, архив + удаление, обслуживание файла БД."""
+        async with self._lock:
+            started = time.perf_counter()
+            report = RetentionReport()
+            now = _naive_utc_now()
+
+            async with self._factory()() as session:
+                default_days, overrides = await self._load_horizons(session)
+                dialect = session.bind.dialect.name if session.bind is not None else "sqlite"
+
+            if dialect == "postgresql" and await self._pg_is_partitioned():
+                report.partitions_created = await self._pg_ensure_partitions(now)
+                report.partitions_dropped = await self._pg_drop_expired_partitions(
+                    now, default_days, overrides, report
+                )
+
+            await self._trim_rows(now, default_days, overrides, report)
+            await self._trim_rollups(now, report)
+
+            if dialect == "sqlite" and (report.deleted or report.rollups_deleted):
+                report.vacuum, report.pages_freed = await self._sqlite_reclaim_space()
+
+            async with self._factory()() as session:
+                report.hot_rows = await session.scalar(select(func.count()).select_from(MessageLog))
+
+            report.duration = time.perf_counter() - started
+            self.last_report = report
+            self.last_run_at = now
+            logger.info(
+                f"Message retention: archived={report.archived} deleted={report.deleted} "
+                f"chats={report.chats_trimmed} rollups={report.rollups_deleted} "
+                f"dropped={report.partitions_dropped} "
+                f"vacuum={report.vacuum} hot_rows={report.hot_rows} ({report.duration:.1f}s)"
+            )
+            return report
+
+    async def _trim_rows(
+        self,
+        now: datetime,
+        default_days: Optional[int],
+        overrides: Dict[int, Optional[int]],
+        report: RetentionReport,
+    ) -> None:
+        """Архивировать и удалить строки старше горизонта каждого чата."""
+        async with self._factory()() as session:
+            oldest_by_chat = (await session.execute(
+                select(MessageLog.chat_id, func.min(MessageLog.created_at))
+                .group_by(MessageLog.chat_id)
+            )).all()
+
+        for chat_id, oldest in oldest_by_chat:
+            days = overrides.get(chat_id, default_days)
+            if days is None or oldest is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            if oldest >= cutoff:
+                continue
+            trimmed = await self._trim_chat(chat_id, cutoff, report)
+            if trimmed:
+                report.chats_trimmed += 1
+
+    async def _trim_chat(self, chat_id: int, cutoff: datetime, report: RetentionReport) -> int:
+        """
+        Пачками: прочитать по индексу (chat_id, created_at) → архив → DELETE.
+
+        Строки из журнала .archived-ids.json (архив записан, а DELETE в прошлый
+        раз не прошёл) повторно не архивируются.
+        """
+        archive = self._settings().message_archive_enabled
+        archived_ids = (
+            await asyncio.to_thread(_load_archived_ids, self.archive_dir, chat_id) if archive else set()
+        )
+        total = 0
+        while True:
+            async with self._factory()() as session:
+                rows = (await session.execute(
+                    select(*(getattr(MessageLog, col) for col in _ARCHIVE_COLUMNS))
+                    .where(MessageLog.chat_id == chat_id, MessageLog.created_at < cutoff)
+                    .order_by(MessageLog.created_at)
+                    .limit(self.batch_size)
+                )).all()
+                if not rows:
+                    break
+                batch_ids = {row.id for row in rows}
+
+                # Сначала архив на диске (fsync) и журнал id, потом удаление
+                if archive:
+                    fresh = [row for row in rows if row.id not in archived_ids]
+                    if fresh:
+                        report.archived += await asyncio.to_thread(_write_archive, self.archive_dir, fresh)
+                        archived_ids |= batch_ids
+                        await asyncio.to_thread(_save_archived_ids, self.archive_dir, chat_id, archived_ids)
+
+                await session.execute(delete(MessageLog).where(MessageLog.id.in_(batch_ids)))
+                await session.commit()
+
+            if archive and archived_ids & batch_ids:
+                archived_ids -= batch_ids
+                await asyncio.to_thread(_save_archived_ids, self.archive_dir, chat_id, archived_ids)
+
+            total += len(rows)
+            report.deleted += len(rows)
+            if len(rows) < self.batch_size:
+                break
+            await asyncio.sleep(0)
+        return total
+
+    async def _trim_rollups(self, now: datetime, report: RetentionReport) -> None:
+        """Удалить почасовые роллапы старше их горизонтов (по чатам и пачками)."""
+        settings = self._settings()
+        for model, days in (
+            (ChatActivityRollup, settings.activity_rollup_retention_days),
+            (ChatKeywordRollup, settings.keyword_rollup_retention_days),
+        ):
+            if days <= 0:
+                continue
+            cutoff = now - timedelta(days=days)
+            async with self._factory()() as session:
+                chat_ids = (await session.execute(select(model.chat_id).distinct())).scalars().all()
+            for chat_id in chat_ids:
+                while True:
+                    async with self._factory()() as session:
+                        ids = (await session.execute(
+                            select(model.id)
+                            .where(model.chat_id == chat_id, model.hour < cutoff)
+                            .limit(self.batch_size)
+                        )).scalars().all()
+                        if not ids:
+                            break
+                        await session.execute(delete(model).where(model.id.in_(ids)))
+                        await session.commit()
+                    report.rollups_deleted += len(ids)
+                    if len(ids) < self.batch_size:
+                        break
+                    await asyncio.sleep(0)
+
+    # ------------------------------------------------------------------
+    # PostgreSQL: месячные партиции
+    # ------------------------------------------------------------------
+
+    async def _pg_is_partitioned(self) -> bool:
+        async with self._factory()() as session:
+            result = await session.execute(text(
+                "SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'messages'"
+            ))
+            return result.first() is not None
+
+    async def _pg_partitions(self) -> List[Tuple[str, datetime]]:
+        """Месячные партиции messages: (имя, первое число месяца), по возрастанию."""
+        async with self._factory()() as session:
+            names = (await session.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'messages'"
+            ))).scalars().all()
+        partitions = []
+        for name in names:
+            match = _PARTITION_RE.match(name)
+            if match:
+                partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda item: item[1])
+
+    async def _pg_ensure_partitions(self, now: datetime) -> List[str]:
+        """Создать недостающие партиции текущего и следующих месяцев."""
+        existing = {name for name, _ in await self._pg_partitions()}
+        created = []
+        month = month_start(now)
+        for _ in range(PARTITION_MONTHS_AHEAD + 1):
+            upper = next_month(month)
+            name = partition_name(month)
+            if name not in existing:
+                try:
+                    async with self._factory()() as session:
+                        await session.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                        ))
+                        await session.commit()
+                    created.append(name)
+                except Exception as e:
+                    # Например, строки этого месяца уже попали в messages_default
+                    logger.warning(f"Failed to create partition {name}: {e}")
+            month = upper
+        return created
+
+    async def _pg_drop_expired_partitions(
+        self,
+        now: datetime,
+        default_days: Optional[int],
+        overrides: Dict[int, Optional[int]],
+        report: RetentionReport,
+    ) -> List[str]:
+        """Архивировать и удалить целиком месяцы, истёкшие для всех чатов."""
+        horizons = [default_days, *overrides.values()]
+        if any(days is None for days in horizons):
+            return []  # кто-то хранит вечно — только построчное удаление
+        drop_before = now - timedelta(days=max(horizons))
+
+        dropped = []
+        archive = self._settings().message_archive_enabled
+        for name, month in await self._pg_partitions():
+            if next_month(month) > drop_before:
+                break
+            marker = partition_marker_path(self.archive_dir, name)
+            # Архив уже записан, а DROP в прошлый раз не прошёл — не дублируем
+            if archive and not os.path.exists(marker):
+                last_id = 0
+                while True:
+                    async with self._factory()() as session:
+                        rows = (await session.execute(text(
+                            f"SELECT {', '.join(_ARCHIVE_COLUMNS)} FROM {name} "
+                            f"WHERE id > :last_id ORDER BY id LIMIT :limit"
+                        ), {"last_id": last_id, "limit": self.batch_size})).all()
+                    if not rows:
+                        break
+                    report.archived += await asyncio.to_thread(_write_archive, self.archive_dir, rows)
+                    last_id = rows[-1].id
+                await asyncio.to_thread(_touch, marker)
+            async with self._factory()() as session:
+                count = await session.scalar(text(f"SELECT count(*) FROM {name}"))
+                await session.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+                await session.execute(text(f"DROP TABLE {name}"))
+                await session.commit()
+            if archive:
+                await asyncio.to_thread(_remove_file, marker)
+            report.deleted += count or 0
+            dropped.append(name)
+            logger.info(f"Dropped expired partition {name} ({count} rows)")
+        return dropped
+
+    # ------------------------------------------------------------------
+    # SQLite: возврат места
+    # ------------------------------------------------------------------
+
+    async def _sqlite_reclaim_space(self) -> Tuple[Optional[str], int]:
+        """
+        Вернуть свободные страницы файлу БД через incremental_vacuum.
+
+        Полный VACUUM не выполняется: файл переводится в auto_vacuum=INCREMENTAL
+        при запуске (enable_incremental_auto_vacuum).
+
+        Returns:
+            ("incremental" | None, освобождено страниц)
+        """
+        async with self._factory()() as session:
+            engine = session.bind
+
+        try:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                auto_vacuum = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+                freelist = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar() or 0
+                if not freelist:
+                    return None, 0
+                if auto_vacuum != 2:
+                    logger.info(
+                        f"SQLite: {freelist} free pages, auto_vacuum is not INCREMENTAL; "
+                        f"the file is converted at next startup"
+                    )
+                    return None, 0
+
+                await conn.exec_driver_sql("PRAGMA incremental_vacuum")
+                remaining = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar() or 0
+                return "incremental", max(0, freelist - remaining)
+        except Exception as e:
+            logger.warning(f"SQLite vacuum skipped: {e}")
+            return None, 0
+
+    def get_stats(self) -> dict:
+        """Метрики последнего прохода для /health и Prometheus."""
+        report = self.last_report
+        if report is None:
+            return {"last_run_at": None}
+        return {
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "archived": report.archived,
+            "deleted": report.deleted,
+            "chats_trimmed": report.chats_trimmed,
+            "rollups_deleted": report.rollups_deleted,
+            "partitions_dropped": len(report.partitions_dropped),
+            "vacuum": report.vacuum,
+            "pages_freed": report.pages_freed,
+            "hot_rows": report.hot_rows,
+            "duration_seconds": round(report.duration, 2),
+        }
+
+
+# Глобальный сервис хранения сообщений
+message_retention = MessageRetentionService()
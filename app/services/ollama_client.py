@@ -7,15 +7,18 @@ import httpx
 from sqlalchemy import select
 import cachetools
 import asyncio
+import hashlib
 import json
 
 from app.config import settings
-from app.database.session import get_session
+from app.database.session import get_session, get_read_session
 from app.database.models import MessageLog
+from app.database.queries import private_chat_history_query, recent_chat_messages_query
 from app.services.vector_db import vector_db
 from app.services.think_filter import think_filter
 from app.services.link_preview import link_preview_service
 from app.services.http_clients import get_ollama_client
+from app.services.pattern_matcher import pattern_registry
 from app.utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -136,6 +139,11 @@ KNOWN_TECH_TERMS = [
     'bios', 'uefi', 'прошивка', 'драйвер', 'kernel', 'ядро',
 ]
 
+# Автомат Aho–Corasick по техническим терминам (один проход вместо цикла по списку)
+_tech_terms_matcher = pattern_registry.register(
+    "known_tech_terms", (term.lower() for term in KNOWN_TECH_TERMS)
+)
+
 # Стоп-слова (игнорируем даже если в CAPS)
 STOP_WORDS = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'her', 'was', 'one', 'our', 'out'}
 
@@ -156,9 +164,9 @@ def extract_search_terms(text: str) -> list[str]:
     text_lower = text.lower()
     
     # 1. Известные технические термины (приоритет)
-    for term in KNOWN_TECH_TERMS:
-        if term.lower() in text_lower:
-            terms.append(term)
+    found_terms = _tech_terms_matcher.find_all(text_lower)
+    if found_terms:
+        terms.extend(term for term in KNOWN_TECH_TERMS if term.lower() in found_terms)
     
     # 2. Слова полностью в верхнем регистре (GPU, CPU, DDR5) — явно технические
     caps_words = re.findall(r'\b[A-Z][A-Z0-9]{2,}\b', text)
@@ -2335,6 +2343,33 @@ CONTEXT_TRIGGERS = {
     "перестань быть": ["олегом", "ботом", "собой"],
 }
 
+
+def _injection_scan_patterns() -> set[str]:
+    """Все строки, которые ищет _contains_prompt_injection, для одного автомата."""
+    patterns = set(TECH_TERMS_WHITELIST)
+    patterns.update(HIGH_RISK_INJECTION_STRINGS)
+    for trigger, contexts in CONTEXT_TRIGGERS.items():
+        patterns.add(trigger)
+        patterns.update(contexts)
+    return patterns
+
+
+# Единый автомат для whitelist, high-risk и контекстных паттернов:
+# один линейный проход по тексту вместо ~250 проверок подстрок
+_injection_matcher = pattern_registry.register("prompt_injection", _injection_scan_patterns())
+
+
+def reload_injection_patterns() -> None:
+    """
+    Пересобрать автоматы после изменения списков паттернов.
+
+    Вызывать после правки TECH_TERMS_WHITELIST, HIGH_RISK_INJECTION_STRINGS,
+    CONTEXT_TRIGGERS или KNOWN_TECH_TERMS во время работы бота.
+    """
+    _injection_matcher.reload(_injection_scan_patterns())
+    _tech_terms_matcher.reload(term.lower() for term in KNOWN_TECH_TERMS)
+
+
 # Pre-compiled regex patterns for suspicious pattern detection (Requirements 4.1, 4.4)
 # Base64 pattern - often used to bypass filters
 BASE64_PATTERN = re.compile(r'[A-Za-z0-9+/]{20,}={0,2}')
@@ -2390,8 +2425,11 @@ def _contains_prompt_injection(text: str) -> bool:
     
     text_lower = text.lower()
     
+    # Один проход автомата находит все whitelist/high-risk/контекстные строки
+    found = _injection_matcher.find_all(text_lower)
+    
     # Если текст содержит много технических терминов — скорее всего это обычный разговор о железе
-    tech_term_count = sum(1 for term in TECH_TERMS_WHITELIST if term in text_lower)
+    tech_term_count = len(found & TECH_TERMS_WHITELIST)
     if tech_term_count >= 2:
         logger.debug(f"[INJECTION] Tech discussion passed (found {tech_term_count} tech terms)")
         return False
@@ -2403,7 +2441,7 @@ def _contains_prompt_injection(text: str) -> bool:
     # Высокорисковые паттерны — явные попытки манипуляции (срабатывают сразу)
     # Uses pre-compiled HIGH_RISK_INJECTION_STRINGS from module level
     for pattern in HIGH_RISK_INJECTION_STRINGS:
-        if pattern in text_lower:
+        if pattern in found:
             # Для паттернов типа "отвечай как" проверяем что это не часть легитимной фразы
             if pattern in ["отвечай как", "ответь как", "говори как", "общайся как", "веди себя как"]:
                 # Проверяем что после паттерна идет попытка смены роли, а не вопрос
@@ -2419,21 +2457,204 @@ def _contains_prompt_injection(text: str) -> bool:
     # Эти слова сами по себе могут быть частью обычного разговора
     # Uses pre-compiled CONTEXT_TRIGGERS from module level
     for trigger, contexts in CONTEXT_TRIGGERS.items():
-        if trigger in text_lower:
+        if trigger in found:
             for context in contexts:
-                if context in text_lower:
+                if context in found:
                     logger.warning(f"[INJECTION] Context pattern detected: '{trigger}' + '{context}' in text: {text[:100]}...")
                     return True
 
     return False
 
 
+# ============================================================================
+# Translation-based injection check: fast path
+# ============================================================================
+
+# Кэш вердиктов перевода: ключ — хэш нормализованного текста (TTL 6 часов)
+_translation_verdict_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=2048, ttl=6 * 3600)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Скрипты, для которых в HIGH_RISK_INJECTION_STRINGS/CONTEXT_TRIGGERS уже есть паттерны.
+# Для них перевод нужен только при наличии сигнала риска; для остальных
+# (арабский, хангыль, деванагари и т.д.) дёшево судить не можем — переводим.
+# Латиница попадает сюда только если текст уверенно английский: у
+# нидерландского, турецкого, индонезийского и т.п. своих сигналов нет.
+_SCRIPTS_WITH_LOCAL_SIGNALS = {"latin", "cjk"}
+
+# Частые служебные слова английского: по их доле отличаем английский
+# от прочих языков на латинице
+_ENGLISH_STOPWORDS = frozenset({
+    "a", "an", "the", "and", "or", "but", "if", "so", "of", "to", "in", "on",
+    "at", "for", "with", "from", "by", "about", "as", "into", "than", "then",
+    "i", "you", "he", "she", "it", "we", "they", "me", "my", "your", "our",
+    "this", "that", "these", "those", "there", "here", "what", "who", "how",
+    "why", "when", "where", "which", "is", "are", "was", "were", "be", "been",
+    "do", "does", "did", "have", "has", "had", "can", "could", "will", "would",
+    "should", "not", "no", "yes", "just", "any", "anyone", "all", "some",
+    "it's", "i'm", "don't", "know", "think", "get", "got",
+})
+
+_ENGLISH_WORD_PATTERN = re.compile(r"[a-z']+")
+
+# Минимум слов и доля стоп-слов, чтобы считать текст английским
+ENGLISH_MIN_WORDS = 3
+ENGLISH_STOPWORD_RATIO = 0.25
+
+# Дешёвые сигналы риска: корни слов, без которых инъекция на этих языках
+# практически не формулируется. Ищутся одним проходом автомата.
+INJECTION_RISK_SIGNALS = [
+    # English
+    "ignore", "forget", "disregard", "instruction", "prompt", "system", "role",
+    "rules", "pretend", "act as", "you are", "from now", "jailbreak", "bypass",
+    "override", "reveal", "developer", "urgent", "important", "will die",
+    # Deutsch
+    "anweisung", "vergiss", "ignorier", "regeln", "rolle", "du bist", "sterben",
+    # Français
+    "oublie", "consigne", "règle", "rôle", "tu es", "désormais",
+    # Español / Português / Italiano
+    "olvida", "ignora", "instrucci", "instruç", "istruzion", "reglas", "regras",
+    "regole", "eres", "você é", "ruolo", "dimentica", "esqueça",
+    # Polski / Čeština
+    "zignoruj", "zapomnij", "instrukcj", "zasady", "jesteś", "instrukce",
+    # 中文 / 日本語
+    "指令", "提示", "系统", "角色", "忽略", "忘记", "规则", "你是",
+    "指示", "プロンプト", "システム", "役割", "無視", "忘れ", "あなたは",
+]
+
+_risk_signal_matcher = pattern_registry.register("injection_risk_signals", INJECTION_RISK_SIGNALS)
+
+
+def _dominant_script(text: str) -> str:
+    """
+    Дешёвый детектор письменности по кодовым точкам.
+
+    Returns:
+        "cyrillic", "latin", "cjk", "other" или "none" (нет букв)
+    """
+    counts = {"cyrillic": 0, "latin": 0, "cjk": 0, "other": 0}
+    for c in text:
+        if not c.isalpha():
+            continue
+        if '\u0400' <= c <= '\u04FF':
+            counts["cyrillic"] += 1
+        elif c.isascii() or '\u00C0' <= c <= '\u024F':
+            counts["latin"] += 1
+        elif '\u3040' <= c <= '\u30FF' or '\u4E00' <= c <= '\u9FFF':
+            counts["cjk"] += 1
+        else:
+            counts["other"] += 1
+    script, count = max(counts.items(), key=lambda item: item[1])
+    return script if count else "none"
+
+
+def _translation_cache_key(text: str) -> str:
+    """Ключ кэша: sha1 от текста без регистра, zero-width символов и лишних пробелов."""
+    normalized = text.lower()
+    for char in ZERO_WIDTH_CHARS:
+        normalized = normalized.replace(char, '')
+    normalized = _WHITESPACE_PATTERN.sub(' ', normalized).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _is_confidently_english(text: str) -> bool:
+    """
+    Уверенно английский текст: только ASCII и заметная доля стоп-слов.
+
+    Диакритика (турецкий, вьетнамский, польский) или почти полное отсутствие
+    английских служебных слов (нидерландский, индонезийский) — не английский.
+    """
+    if not text.isascii():
+        return False
+    words = _ENGLISH_WORD_PATTERN.findall(text.lower())
+    if len(words) < ENGLISH_MIN_WORDS:
+        return False
+    stopwords = sum(1 for word in words if word in _ENGLISH_STOPWORDS)
+    return stopwords / len(words) >= ENGLISH_STOPWORD_RATIO
+
+
+def _needs_translation_check(text: str) -> bool:
+    """
+    Нужен ли перевод для проверки на injection.
+    
+    Перевод пропускается для кириллицы, а также для уверенно английского
+    текста и CJK без единого сигнала риска — такие сообщения не могут
+    содержать инъекцию, которую не поймал бы _contains_prompt_injection
+    на оригинале. Прочая латиница переводится всегда; повторы дешёвые
+    благодаря _translation_verdict_cache.
+    """
+    if not _detect_non_cyrillic_text(text):
+        return False
+    
+    script = _dominant_script(text)
+    if script == "latin" and not _is_confidently_english(text):
+        return True
+    if script in _SCRIPTS_WITH_LOCAL_SIGNALS:
+        return _risk_signal_matcher.contains_any(text.lower())
+    
+    return True
+
+
+async def _translate_for_injection_check(text: str) -> str | None:
+    """Переводит текст на русский базовой моделью. None при ошибке."""
+    translation_prompt = f"Переведи на русский язык, только перевод без комментариев:\n{text}"
+    
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.post(
+            f"{settings.ollama_base_url}/api/generate",
+            json={
+                "model": settings.ollama_base_model,
+                "prompt": translation_prompt,
+                "stream": False,
+                "options": {
+                    "temperature": 0.1,
+                    "num_predict": 200,
+                    "num_ctx": 8192  # Increased from default 2048 to 8192 (2x)
+                }
+            }
+        )
+        if response.status_code != 200:
+            return None
+        return response.json().get("response", "").strip()
+
+
+async def _check_translated_injection(text: str) -> bool:
+    """
+    Проверяет перевод текста на injection (с кэшем вердиктов).
+    
+    Вызывать только если _needs_translation_check(text) вернул True.
+    Неудачные переводы не кэшируются, чтобы повторить попытку позже.
+    """
+    cache_key = _translation_cache_key(text)
+    cached = _translation_verdict_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"[INJECTION CHECK] Translation verdict cache hit: {cached}")
+        return cached
+    
+    logger.info(f"[INJECTION CHECK] Non-cyrillic text needs translation, translating for check...")
+    try:
+        translated = await _translate_for_injection_check(text)
+    except Exception as e:
+        logger.debug(f"[INJECTION CHECK] Translation failed: {e}")
+        return False
+    
+    if translated is None:
+        return False
+    
+    verdict = bool(translated) and _contains_prompt_injection(translated)
+    if verdict:
+        logger.warning(f"[INJECTION CHECK] Injection detected in translation: {translated[:100]}...")
+    _translation_verdict_cache[cache_key] = verdict
+    return verdict
+
+
 async def _check_injection_with_translation(text: str) -> bool:
     """
     Проверяет текст на injection, при необходимости переводя на русский.
     
-    Если текст содержит много не-кириллических символов, сначала переводим
-    его на русский и проверяем перевод на injection паттерны.
+    Если текст содержит много не-кириллических символов и сигнал риска,
+    переводим его на русский и проверяем перевод на injection паттерны.
+    Вердикты перевода кэшируются по хэшу нормализованного текста.
     
     Args:
         text: Текст для проверки
@@ -2445,73 +2666,65 @@ async def _check_injection_with_translation(text: str) -> bool:
     if _contains_prompt_injection(text):
         return True
     
-    # Если текст преимущественно не на русском — переводим и проверяем
-    if _detect_non_cyrillic_text(text):
-        logger.info(f"[INJECTION CHECK] Non-cyrillic text detected, translating for check...")
-        try:
-            # Используем LLM для перевода (быстрый запрос)
-            translation_prompt = f"Переведи на русский язык, только перевод без комментариев:\n{text}"
-            
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.post(
-                    f"{settings.ollama_base_url}/api/generate",
-                    json={
-                        "model": settings.ollama_base_model,
-                        "prompt": translation_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.1,
-                            "num_predict": 200,
-                            "num_ctx": 8192  # Increased from default 2048 to 8192 (2x)
-                        }
-                    }
-                )
-                if response.status_code == 200:
-                    translated = response.json().get("response", "").strip()
-                    if translated and _contains_prompt_injection(translated):
-                        logger.warning(f"[INJECTION CHECK] Injection detected in translation: {translated[:100]}...")
-                        return True
-        except Exception as e:
-            logger.debug(f"[INJECTION CHECK] Translation failed: {e}")
+    if not _needs_translation_check(text):
+        return False
     
-    return False
+    return await _check_translated_injection(text)
+
 
+# Сколько ждать записи очереди MessageLog перед чтением истории ЛС (секунды)
+HISTORY_FLUSH_TIMEOUT = 0.5
 
-async def _get_private_chat_history(user_id: int, limit: int = 10) -> list[dict]:
+
+async def _get_private_chat_history(
+    user_id: int, limit: int = 10, current_message_id: int | None = None
+) -> list[dict]:
     """
     Получить историю диалога в личных сообщениях.
     
     Args:
         user_id: ID пользователя (в ЛС chat_id == user_id)
         limit: Максимальное количество сообщений для контекста
+        current_message_id: ID текущего сообщения (исключается из истории)
         
     Returns:
         Список сообщений в формате [{"role": "user"/"assistant", "content": "..."}]
         
     Note:
-        Исключает самое последнее сообщение пользователя, т.к. оно будет добавлено
+        Исключает текущее сообщение пользователя, т.к. оно будет добавлено
         отдельно в generate_text_reply (чтобы избежать дублирования).
+        MessageLog пишется пачками через write_queue, поэтому сначала
+        дожидаемся записи очереди (с ограничением по времени), а текущее
+        сообщение исключаем по message_id, а не по позиции.
     """
     async_session = get_session()
     history = []
     
     try:
+        from app.database.write_queue import write_queue
+        try:
+            await asyncio.wait_for(write_queue.flush(), timeout=HISTORY_FLUSH_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.debug("[HISTORY] Очередь записи не успела сброситься, история может быть неполной")
+        
         async with async_session() as session:
             # Получаем последние сообщения из ЛС (chat_id == user_id для личных чатов)
             result = await session.execute(
-                select(MessageLog)
-                .where(MessageLog.chat_id == user_id)
-                .order_by(MessageLog.created_at.desc())
-                .limit(limit * 2 + 1)  # +1 чтобы пропустить текущее сообщение
+                private_chat_history_query(user_id, limit * 2 + 1)  # +1 чтобы пропустить текущее сообщение
             )
-            messages = result.scalars().all()
+            messages = result.all()
             
             # Переворачиваем чтобы получить хронологический порядок
             messages = list(reversed(messages))
             
-            # Пропускаем последнее сообщение пользователя (оно будет добавлено отдельно)
+            # Пропускаем текущее сообщение пользователя (оно будет добавлено отдельно)
             # Это предотвращает дублирование текущего сообщения в контексте
-            if messages:
+            if current_message_id is not None:
+                messages = [
+                    m for m in messages
+                    if not (m.message_id == current_message_id and m.user_id == user_id)
+                ]
+            elif messages:
                 last_msg = messages[-1]
                 # Если последнее сообщение от пользователя (не от бота) — пропускаем его
                 is_bot_message = (
@@ -2580,22 +2793,11 @@ async def get_recent_chat_messages(
     
     try:
         async with async_session() as session:
-            # Строим запрос
-            query = select(MessageLog).where(MessageLog.chat_id == chat_id)
-            
-            # Фильтруем по топику если указан
-            if topic_id is not None:
-                query = query.where(MessageLog.topic_id == topic_id)
-            
-            # Исключаем сообщения бота если нужно
-            if exclude_bot:
-                query = query.where(MessageLog.user_id != 0)
-            
-            # Сортируем и лимитируем
-            query = query.order_by(MessageLog.created_at.desc()).limit(limit)
+            # Запрос по индексу (chat_id[, topic_id], created_at)
+            query = recent_chat_messages_query(chat_id, topic_id, limit, exclude_bot)
             
             result = await session.execute(query)
-            messages = result.scalars().all()
+            messages = result.all()
             
             # Переворачиваем для хронологического порядка
             messages = list(reversed(messages))
@@ -2698,10 +2900,15 @@ async def generate_text_reply(user_text: str, username: str | None, chat_context
         if warning:
             logger.info(f"Spam warning for user {user_id}: {warning}")
     
-    # Проверяем на наличие потенциальной промпт-инъекции (с переводом если нужно)
-    if await _check_injection_with_translation(user_text):
+    # Проверяем на наличие потенциальной промпт-инъекции в оригинале
+    if _contains_prompt_injection(user_text):
         logger.warning(f"Potential prompt injection detected: {user_text[:100]}...")
         return _get_injection_response()
+    
+    # Проверка перевода (LLM round-trip) идёт параллельно с загрузкой контекста
+    translation_check: asyncio.Task | None = None
+    if _needs_translation_check(user_text):
+        translation_check = asyncio.create_task(_check_translated_injection(user_text))
 
     display_name = username or "пользователь"
     
@@ -2836,6 +3043,11 @@ async def generate_text_reply(user_text: str, username: str | None, chat_context
         except Exception as e:
             logger.warning(f"[FORCED SEARCH] Ошибка поиска: {e}")
     
+    # Дожидаемся проверки перевода до обращения к модели
+    if translation_check is not None and await translation_check:
+        logger.warning(f"Potential prompt injection detected in translation: {user_text[:100]}...")
+        return _get_injection_response()
+    
     # Формируем системный промпт с актуальной датой
     # Используем ГЛОБАЛЬНУЮ персону (устанавливается через /owner)
     persona = get_global_persona()
@@ -3122,7 +3334,8 @@ def _check_knowledge_base(text: str) -> str | None:
 
 
 async def generate_private_reply(user_text: str, username: str | None, user_id: int,
-                                  chat_context: str | None = None) -> str | None:
+                                  chat_context: str | None = None,
+                                  message_id: int | None = None) -> str | None:
     """
     Генерирует ответ для личных сообщений с учётом истории диалога.
     
@@ -3131,12 +3344,13 @@ async def generate_private_reply(user_text: str, username: str | None, user_id:
         username: Никнейм пользователя
         user_id: ID пользователя (для получения истории)
         chat_context: Дополнительный контекст
+        message_id: ID текущего сообщения (не попадает в историю)
         
     Returns:
         Ответ от Олега
     """
     # Получаем историю диалога
-    history = await _get_private_chat_history(user_id, limit=10)
+    history = await _get_private_chat_history(user_id, limit=10, current_message_id=message_id)
     
     logger.debug(f"Генерация ответа в ЛС для user_id={user_id} с {len(history)} сообщениями в истории")
     
@@ -4146,18 +4360,21 @@ async def gather_comprehensive_chat_stats(chat_id: int, hours: int = 24):
         active_users_count — количество активных пользователей,
         top_flooder_info — (имя пользователя, количество сообщений)
     """
-    async_session = get_session()
+    from app.services.topic_clusters import cluster_messages
+
+    async_session = get_read_session()  # тяжёлая выборка — через read-only пул
     since = utc_now() - timedelta(hours=hours)
     topics: dict[str, int] = {}
     links: list[str] = []
     user_messages_count: dict[str, int] = {}  # Счетчик сообщений по пользователям
+    unthemed: list = []
 
     async with async_session() as session:
         res = await session.execute(
             select(MessageLog).where(
                 MessageLog.created_at >= since,
                 MessageLog.chat_id == chat_id
-            )
+            ).order_by(MessageLog.created_at)  # кластеризация идёт в хронологическом порядке
         )
         rows = res.scalars().all()
 
@@ -4174,12 +4391,7 @@ async def gather_comprehensive_chat_stats(chat_id: int, hours: int = 24):
                         found_topic = True
                         break
                 if not found_topic:
-                    # Fallback: берем первые 4 слова
-                    key = (
-                        " ".join(m.text.split()[:4])
-                        or "misc"
-                    ).lower()
-                    topics[key] = topics.get(key, 0) + 1
+                    unthemed.append(m)
 
                 # Считаем сообщения по пользователям
                 username = m.username or f"ID:{m.user_id}"
@@ -4188,6 +4400,11 @@ async def gather_comprehensive_chat_stats(chat_id: int, hours: int = 24):
             if m.links:
                 links.extend(m.links.split("\n"))
 
+    # Сообщения вне STORY_THEMES — кластеры по ключевым словам (TF-IDF)
+    for cluster in cluster_messages(unthemed, limit=5):
+        key = cluster.label.lower()
+        topics[key] = topics.get(key, 0) + cluster.count
+
     # Получаем количество активных пользователей
     active_users_count = len(user_messages_count)
 
@@ -4258,54 +4475,58 @@ async def analyze_chat_toxicity(chat_id: int, hours: int = 24) -> tuple[float, s
     """
     Анализирует уровень токсичности в чате за последние N часов.
 
+    Берёт готовые счётчики из почасовых роллапов (оценки посчитаны при
+    приёме сообщений); пока роллапы не построены — оценивает последние
+    сообщения одним проходом toxicity_scorer. Запросов к LLM нет.
+
     Args:
         chat_id: ID чата для анализа
         hours: Количество часов для анализа
 
     Returns:
-        Кортеж (уровень токсичности в %, вердикт от ИИ)
+        Кортеж (уровень токсичности в %, вердикт)
     """
-    async_session = get_session()
-    since = utc_now() - timedelta(hours=hours)
-
-    async with async_session() as session:
-        res = await session.execute(
-            select(MessageLog).where(
-                (MessageLog.created_at >= since) &
-                (MessageLog.text.is_not(None)) &
-                (MessageLog.chat_id == chat_id)
-            ).limit(100)  # Ограничиваем выборку для производительности
-        )
-        rows = res.scalars().all()
+    from app.services.activity_rollup import activity_rollup
+    from app.services.toxicity_scorer import SignalTotals, score_batch
 
-        if not rows:
-            return 0.0, "Чат спокойный, токсичность не обнаружена"
+    now = utc_now()
+    since = now - timedelta(hours=hours)
 
-        # Анализируем случайные сообщения для оценки токсичности
-        toxic_messages_count = 0
-        total_analyzed = 0
+    # Дельты последних секунд ещё в памяти
+    await activity_rollup.flush()
 
-        # Пробуем анализировать до 20 сообщений
-        sample_messages = random.sample(rows, min(20, len(rows)))
+    async_session = get_read_session()
+    async with async_session() as session:
+        if activity_rollup.backfill_done:
+            counters = await activity_rollup.chat_totals(session, chat_id, since, now)
+            totals = SignalTotals(
+                text_count=counters["text_count"],
+                toxic_count=counters["toxic_count"],
+            )
+        else:
+            res = await session.execute(
+                select(MessageLog.text).where(
+                    (MessageLog.created_at >= since) &
+                    (MessageLog.text.is_not(None)) &
+                    (MessageLog.chat_id == chat_id)
+                ).order_by(MessageLog.created_at.desc()).limit(500)
+            )
+            totals = score_batch(res.scalars().all())
 
-        for msg in sample_messages:
-            if msg.text and len(msg.text.strip()) > 5:  # Пропускаем слишком короткие сообщения
-                toxicity_result = await analyze_toxicity(msg.text)
-                if toxicity_result and toxicity_result.get('is_toxic', False):
-                    toxic_messages_count += 1
-                total_analyzed += 1
+    if totals.text_count == 0:
+        return 0.0, "Чат спокойный, токсичность не обнаружена"
 
-        toxicity_percentage = (toxic_messages_count / total_analyzed * 100) if total_analyzed > 0 else 0.0
+    toxicity_percentage = totals.toxicity_percent
 
-        # Генерируем вердикт ИИ
-        if toxicity_percentage > 70:
-            verdict = "Чат очень токсичный, участники ругаются и конфликтуют"
-        elif toxicity_percentage > 30:
-            verdict = "Умеренный уровень токсичности, есть напряжение в обсуждениях"
-        else:
-            verdict = "Чат в целом спокойный, токсичных высказываний немного"
+    # Вердикт по доле токсичных сообщений
+    if toxicity_percentage > 70:
+        verdict = "Чат очень токсичный, участники ругаются и конфликтуют"
+    elif toxicity_percentage > 30:
+        verdict = "Умеренный уровень токсичности, есть напряжение в обсуждениях"
+    else:
+        verdict = "Чат в целом спокойный, токсичных высказываний немного"
 
-        return min(toxicity_percentage, 100.0), verdict
+    return toxicity_percentage, verdict
 
 
 async def summarize_chat(chat_id: int) -> str:
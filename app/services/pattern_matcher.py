@@ -0,0 +1,284 @@
+"""
+Pattern Matcher - мультипаттерновый поиск подстрок (Aho–Corasick).
+
+Заменяет циклы вида ``for p in PATTERNS: if p in text`` одним линейным
+проходом по тексту: автомат строится один раз при загрузке списков и
+отвечает на вопрос «какие паттерны встречаются в тексте» за O(len(text)).
+
+Используется для:
+- Детекции prompt injection (TECH_TERMS_WHITELIST, HIGH_RISK_INJECTION_STRINGS,
+  CONTEXT_TRIGGERS)
+- Извлечения технических терминов для RAG (KNOWN_TECH_TERMS)
+- Триггерных слов авто-ответов (AutoReplySystem)
+- Спам-слов в именах новых пользователей (UserScanner)
+
+Автомат неизменяем: reload() строит новый автомат и атомарно подменяет
+ссылку, поэтому параллельные сканы никогда не видят полусобранное состояние.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _is_word_char(char: str) -> bool:
+    """Совпадает с семантикой ``\\w`` в ``re`` для str."""
+    return char.isalnum() or char == "_"
+
+
+class _Automaton:
+    """
+    Собранный автомат Aho–Corasick.
+
+    Переходы хранятся как список словарей (состояние -> {символ: состояние}).
+    Каждое состояние хранит кортеж всех паттернов, оканчивающихся в нём,
+    включая паттерны из суффиксных ссылок, поэтому при сканировании
+    не нужно ходить по цепочке выходов.
+    """
+
+    __slots__ = ("goto", "fail", "outputs")
+
+    def __init__(self, patterns: Iterable[str]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[str, ...]] = [()]
+
+        # 1. Бор (trie)
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    outputs.append(())
+                state = nxt
+            if pattern not in outputs[state]:
+                outputs[state] = outputs[state] + (pattern,)
+
+        # 2. Суффиксные ссылки обходом в ширину
+        fail = [0] * len(goto)
+        queue: List[int] = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+                if outputs[fail[nxt]]:
+                    outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Генерирует (end, pattern) для каждого вхождения; end — индекс после совпадения."""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        state = 0
+        for index, char in enumerate(text):
+            nxt = goto[state].get(char)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(char)
+            if nxt is None:
+                state = 0
+                continue
+            state = nxt
+            for pattern in outputs[state]:
+                yield index + 1, pattern
+
+    def find_all(self, text: str) -> Set[str]:
+        """Множество найденных паттернов (горячий путь без генератора и позиций)."""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            nxt = goto[state].get(char)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(char)
+            if nxt is None:
+                continue
+            state = nxt
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+class PatternMatcher:
+    """
+    Потокобезопасный мультипаттерновый матчер с горячей перезагрузкой.
+
+    Example:
+        >>> matcher = PatternMatcher(["jailbreak", "system:"])
+        >>> matcher.find_all("try jailbreak now")
+        {'jailbreak'}
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        """
+        Args:
+            patterns: Паттерны для поиска (пустые строки игнорируются)
+        """
+        self._lock = threading.Lock()
+        self._patterns: frozenset = frozenset()
+        self._automaton = _Automaton(())
+        self.version = 0
+        self.reload(patterns)
+
+    @property
+    def patterns(self) -> frozenset:
+        """Текущий набор паттернов."""
+        return self._patterns
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._patterns
+
+    def reload(self, patterns: Iterable[str]) -> None:
+        """
+        Перестраивает автомат из нового набора паттернов.
+
+        Новый автомат собирается до подмены, поэтому сканы, идущие
+        параллельно, используют старый автомат до конца своего прохода.
+
+        Args:
+            patterns: Новый набор паттернов
+        """
+        new_patterns = frozenset(p for p in patterns if p)
+        automaton = _Automaton(sorted(new_patterns))
+        with self._lock:
+            self._patterns = new_patterns
+            self._automaton = automaton
+            self.version += 1
+        logger.debug(f"PatternMatcher reloaded: {len(new_patterns)} patterns (v{self.version})")
+
+    def sync(self, patterns: Iterable[str]) -> bool:
+        """
+        Перестраивает автомат только если набор паттернов изменился.
+
+        Args:
+            patterns: Актуальный набор паттернов
+
+        Returns:
+            True если автомат был перестроен
+        """
+        new_patterns = frozenset(p for p in patterns if p)
+        if new_patterns == self._patterns:
+            return False
+        self.reload(new_patterns)
+        return True
+
+    def iter_matches(self, text: str, whole_words: bool = False) -> Iterator[Tuple[int, str]]:
+        """
+        Перебирает все вхождения паттернов в тексте.
+
+        Args:
+            text: Текст для поиска (регистр не меняется — передавайте lower())
+            whole_words: Требовать границы слова с обеих сторон (как ``\\b`` в re)
+
+        Yields:
+            Кортежи (start, pattern) в порядке окончания совпадений
+        """
+        if not text:
+            return
+        for end, pattern in self._automaton.iter_matches(text):
+            start = end - len(pattern)
+            if whole_words and not self._at_word_boundaries(text, start, end):
+                continue
+            yield start, pattern
+
+    def find_all(self, text: str, whole_words: bool = False) -> Set[str]:
+        """
+        Возвращает множество паттернов, встречающихся в тексте.
+
+        Эквивалентно ``{p for p in patterns if p in text}``, но за один проход.
+
+        Args:
+            text: Текст для поиска
+            whole_words: Требовать границы слова (как ``\\b`` в re)
+
+        Returns:
+            Множество найденных паттернов
+        """
+        if not whole_words:
+            return self._automaton.find_all(text) if text else set()
+        return {pattern for _, pattern in self.iter_matches(text, whole_words)}
+
+    def contains_any(self, text: str, whole_words: bool = False) -> bool:
+        """Есть ли в тексте хотя бы один паттерн (останавливается на первом)."""
+        for _ in self.iter_matches(text, whole_words):
+            return True
+        return False
+
+    @staticmethod
+    def _at_word_boundaries(text: str, start: int, end: int) -> bool:
+        """Проверяет ``\\b`` перед start и после end с семантикой re."""
+        before = start > 0 and _is_word_char(text[start - 1])
+        after = end < len(text) and _is_word_char(text[end])
+        return (
+            before != _is_word_char(text[start])
+            and after != _is_word_char(text[end - 1])
+        )
+
+
+class PatternRegistry:
+    """
+    Реестр именованных матчеров.
+
+    Позволяет собрать автомат один раз при загрузке модуля и перезагрузить
+    его по имени, когда владелец меняет списки (например, спам-слова).
+    """
+
+    def __init__(self):
+        self._matchers: Dict[str, PatternMatcher] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, patterns: Iterable[str]) -> PatternMatcher:
+        """
+        Регистрирует (или перезагружает существующий) матчер.
+
+        Args:
+            name: Имя набора паттернов
+            patterns: Паттерны
+
+        Returns:
+            Матчер, зарегистрированный под этим именем
+        """
+        with self._lock:
+            matcher = self._matchers.get(name)
+            if matcher is None:
+                matcher = PatternMatcher(patterns)
+                self._matchers[name] = matcher
+                return matcher
+        matcher.reload(patterns)
+        return matcher
+
+    def get(self, name: str) -> Optional[PatternMatcher]:
+        """Возвращает матчер по имени или None."""
+        return self._matchers.get(name)
+
+    def reload(self, name: str, patterns: Iterable[str]) -> PatternMatcher:
+        """Перезагружает матчер по имени (создаёт, если его ещё нет)."""
+        return self.register(name, patterns)
+
+    def names(self) -> List[str]:
+        """Имена зарегистрированных матчеров."""
+        return sorted(self._matchers)
+
+
+# Глобальный реестр
+pattern_registry = PatternRegistry()
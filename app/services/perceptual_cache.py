@@ -0,0 +1,272 @@
+"""
+Perceptual Cache - переиспользование вердиктов и описаний для похожих медиа.
+
+Одну и ту же гифку или стикер репостят десятки раз, и каждый раз
+GIF-патруль делал три запроса к vision-модели, а VisionPipeline кэшировал
+только по точному sha256 байтов (перекодированная Telegram копия — уже
+другие байты). Теперь результат анализа запоминается по:
+
+- ``file_unique_id`` Telegram — точное совпадение, можно не скачивать файл;
+- перцептивному хэшу (dHash, 64 бита) кадров — совпадение с расстоянием
+  Хэмминга до ``perceptual_cache_max_distance`` бит по каждому кадру.
+
+Хранилище — Redis с TTL ``perceptual_cache_ttl_days``: запись
+``pcache:<ns>:e:<хэши>`` и индекс по 8 байтам хэша первого кадра
+(``pcache:<ns>:b:<i>:<байт>``). При расстоянии до 7 бит хотя бы один байт
+совпадает точно, поэтому кандидаты находятся без полного перебора.
+
+Полосы индекса — ZSET, где score — момент истечения записи: популярный
+байт получает новые записи постоянно, и TTL ключа целиком никогда бы не
+наступил. Истёкшие записи вычищаются ZREMRANGEBYSCORE при записи и чтении,
+а размер полосы ограничен ``BAND_MAX_SIZE`` (вытесняются ближайшие к
+истечению), так что чтение кандидатов не растёт без предела.
+
+Без Redis работает локальный LRU с линейным поиском.
+
+Usage:
+    from app.services.perceptual_cache import PerceptualCache, image_dhash
+
+    cache = PerceptualCache("gif_verdict")
+    hashes = [image_dhash(frame) for frame in frames]
+    verdict = await cache.get(file_unique_id=uid, hashes=hashes)
+    ...
+    await cache.put(verdict, file_unique_id=uid, hashes=hashes)
+"""
+
+import io
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "pcache"
+HASH_SIZE = 8  # 8x8 разностей = 64 бита
+BANDS = 8  # 8 бит на полосу: точное совпадение полосы гарантировано до 7 бит разницы
+LOCAL_CACHE_SIZE = 4096
+BAND_MAX_SIZE = 256  # записей в одной полосе индекса
+
+# Запись + индекс по полосам первого хэша (ZSET, score — момент истечения).
+# ARGV: значение, TTL, entry_id, текущее время, лимит полосы
+_STORE_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+local now = tonumber(ARGV[4])
+local cap = tonumber(ARGV[5])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ttl)
+for i = 2, #KEYS do
+  redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+  redis.call('ZADD', KEYS[i], now + ttl, ARGV[3])
+  local extra = redis.call('ZCARD', KEYS[i]) - cap
+  if extra > 0 then
+    redis.call('ZREMRANGEBYRANK', KEYS[i], 0, extra - 1)
+  end
+  redis.call('EXPIRE', KEYS[i], ttl)
+end
+return 1
+"""
+
+# Живые кандидаты из всех полос одним запросом. ARGV: текущее время
+_CANDIDATES_SCRIPT = """
+local now = tonumber(ARGV[1])
+local out = {}
+for _, key in ipairs(KEYS) do
+  redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+  for _, member in ipairs(redis.call('ZRANGE', key, 0, -1)) do
+    out[#out + 1] = member
+  end
+end
+return out
+"""
+
+
+def dhash(image: Image.Image, size: int = HASH_SIZE) -> int:
+    """Разностный хэш: знак перепада яркости между соседними пикселями."""
+    gray = image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def image_dhash(data: bytes) -> Optional[int]:
+    """dHash картинки из байтов (первый кадр для анимаций); None, если не картинка."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return dhash(image)
+    except Exception as e:
+        logger.debug(f"dHash failed: {e}")
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _entry_id(hashes: Sequence[int]) -> str:
+    return "-".join(f"{h:016x}" for h in hashes)
+
+
+def _parse_entry_id(entry_id: str) -> Tuple[int, ...]:
+    return tuple(int(part, 16) for part in entry_id.split("-"))
+
+
+def _bands(value: int) -> List[int]:
+    width = 64 // BANDS
+    mask = (1 << width) - 1
+    return [(value >> (i * width)) & mask for i in range(BANDS)]
+
+
+class PerceptualCache:
+    """Результаты анализа по file_unique_id и перцептивным хэшам: Redis + локальный LRU."""
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl_seconds: Optional[int] = None,
+        max_distance: Optional[int] = None,
+        local_size: int = LOCAL_CACHE_SIZE,
+        band_size: int = BAND_MAX_SIZE,
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds or settings.perceptual_cache_ttl_days * 86400
+        self.max_distance = settings.perceptual_cache_max_distance if max_distance is None else max_distance
+        self.local_size = local_size
+        self.band_size = band_size
+        # entry_id / "u:<file_unique_id>" -> (значение, истекает)
+        self._local: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    # --- ключи ---
+
+    def _key(self, kind: str, value: str) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:{kind}:{value}"
+
+    def _band_keys(self, first_hash: int) -> List[str]:
+        return [self._key("b", f"{i}:{band:02x}") for i, band in enumerate(_bands(first_hash))]
+
+    # --- локальный LRU ---
+
+    def _local_get(self, key: str) -> Optional[Any]:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires < time.time():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_put(self, key: str, value: Any) -> None:
+        self._local[key] = (value, time.time() + self.ttl_seconds)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    def _matches(self, candidate: Sequence[int], hashes: Sequence[int]) -> Optional[int]:
+        """Суммарное расстояние, если каждый кадр достаточно близок, иначе None."""
+        if len(candidate) != len(hashes):
+            return None
+        distances = [hamming(a, b) for a, b in zip(candidate, hashes)]
+        if max(distances) > self.max_distance:
+            return None
+        return sum(distances)
+
+    def _best(self, entry_ids: Sequence[str], hashes: Sequence[int]) -> Optional[str]:
+        best, best_distance = None, None
+        for entry_id in set(entry_ids):
+            try:
+                distance = self._matches(_parse_entry_id(entry_id), hashes)
+            except ValueError:
+                continue
+            if distance is not None and (best_distance is None or distance < best_distance):
+                best, best_distance = entry_id, distance
+        return best
+
+    # --- API ---
+
+    async def get(self, file_unique_id: Optional[str] = None, hashes: Sequence[Optional[int]] = ()) -> Optional[Any]:
+        """
+        Найти сохранённый результат.
+
+        Args:
+            file_unique_id: Telegram file_unique_id (точное совпадение)
+            hashes: dHash кадров (все должны быть посчитаны)
+
+        Returns:
+            Сохранённое значение или None
+        """
+        if file_unique_id:
+            key = f"u:{file_unique_id}"
+            value = self._local_get(key)
+            if value is None:
+                value = await redis_client.get_json(self._key("u", file_unique_id))
+                if value is not None:
+                    self._local_put(key, value)
+            if value is not None:
+                await self._count("file_unique_id")
+                return value
+
+        if hashes and all(h is not None for h in hashes):
+            value = await self._get_near(list(hashes))
+            if value is not None:
+                await self._count("near")
+                return value
+
+        await self._count("miss")
+        return None
+
+    async def _get_near(self, hashes: List[int]) -> Optional[Any]:
+        local_ids = [key for key in self._local if not key.startswith("u:")]
+        entry_id = self._best(local_ids, hashes)
+        if entry_id is not None:
+            value = self._local_get(entry_id)
+            if value is not None:
+                return value
+
+        candidates = await redis_client.eval(_CANDIDATES_SCRIPT, self._band_keys(hashes[0]), [int(time.time())])
+        if not candidates:
+            return None
+        candidates = [c.decode() if isinstance(c, bytes) else c for c in candidates]
+        entry_id = self._best(candidates, hashes)
+        if entry_id is None:
+            return None
+        value = await redis_client.get_json(self._key("e", entry_id))
+        if value is not None:
+            self._local_put(entry_id, value)
+        return value
+
+    async def put(
+        self,
+        value: Any,
+        file_unique_id: Optional[str] = None,
+        hashes: Sequence[Optional[int]] = (),
+    ) -> None:
+        """Сохранить результат (значение должно сериализоваться в JSON)."""
+        payload = json.dumps(value, ensure_ascii=False)
+        if file_unique_id:
+            self._local_put(f"u:{file_unique_id}", value)
+            await redis_client.set(self._key("u", file_unique_id), payload, ex=self.ttl_seconds)
+        if hashes and all(h is not None for h in hashes):
+            entry_id = _entry_id(hashes)
+            self._local_put(entry_id, value)
+            await redis_client.eval(
+                _STORE_SCRIPT,
+                [self._key("e", entry_id), *self._band_keys(hashes[0])],
+                [payload, self.ttl_seconds, entry_id, int(time.time()), self.band_size],
+            )
+
+    async def _count(self, result: str) -> None:
+        await metrics.increment_counter(
+            "perceptual_cache_total", labels={"namespace": self.namespace, "result": result}
+        )
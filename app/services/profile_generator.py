@@ -13,15 +13,18 @@ Features:
 - Interactive buttons in caption
 """
 
+import hashlib
 import io
 import logging
 import re
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 
 from app.services.leagues import League
+from app.services.text_layout import text_layout
 
 logger = logging.getLogger(__name__)
 
@@ -116,11 +119,19 @@ class ProfileGenerator:
     }
     
     AVATAR_SIZE = 120
+    AVATAR_CACHE_SIZE = 256
     
     def __init__(self):
-        """Initialize fonts."""
+        """Initialize fonts and per-process image caches."""
+        self._gradients: Dict[Tuple, Image.Image] = {}
+        self._avatars: "OrderedDict[str, Image.Image]" = OrderedDict()
         self._load_fonts()
     
+    def warm_up(self):
+        """Pre-render league backgrounds (called once per render pool worker)."""
+        for theme in self.LEAGUE_THEMES.values():
+            self._create_gradient_bg(theme["gradient"])
+    
     def _load_fonts(self):
         """Load fonts with fallbacks."""
         font_paths = [
@@ -177,7 +188,14 @@ class ProfileGenerator:
         return buffer.getvalue()
     
     def _create_gradient_bg(self, colors: list) -> Image.Image:
-        """Create vertical gradient background."""
+        """Create vertical gradient background (cached, a copy is returned)."""
+        key = tuple(tuple(c) for c in colors)
+        cached = self._gradients.get(key)
+        if cached is None:
+            cached = self._gradients[key] = self._render_gradient(colors)
+        return cached.copy()
+    
+    def _render_gradient(self, colors: list) -> Image.Image:
         image = Image.new("RGB", (self.CARD_WIDTH, self.CARD_HEIGHT))
         draw = ImageDraw.Draw(image)
         
@@ -212,7 +230,7 @@ class ProfileGenerator:
         badge_y = 105
         
         # Badge background
-        bbox = self._font_medium.getbbox(league_name)
+        bbox = text_layout.bbox(self._font_medium, league_name)
         badge_w = bbox[2] - bbox[0] + 20
         self._draw_rounded_rect(draw, text_x, badge_y, text_x + badge_w, badge_y + 28, 
                                  radius=14, fill=(*theme["accent"], 40), outline=theme["accent"])
@@ -254,18 +272,7 @@ class ProfileGenerator:
         
         if avatar_bytes:
             try:
-                avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
-                avatar = avatar.resize((size, size), Image.Resampling.LANCZOS)
-                
-                # Circular mask
-                mask = Image.new("L", (size, size), 0)
-                ImageDraw.Draw(mask).ellipse([0, 0, size, size], fill=255)
-                
-                # Create circular avatar
-                output = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-                output.paste(avatar, (0, 0))
-                output.putalpha(mask)
-                
+                output = self._circular_avatar(avatar_bytes)
                 image.paste(output, (x, y), output)
                 return
             except Exception as e:
@@ -278,6 +285,32 @@ class ProfileGenerator:
         draw.ellipse([cx-20, cy-30, cx+20, cy-5], fill=theme["text"])  # Head
         draw.ellipse([cx-30, cy+5, cx+30, cy+45], fill=theme["text"])  # Body
     
+    def _circular_avatar(self, avatar_bytes: bytes) -> Image.Image:
+        """Resize and mask avatar (cached by content hash)."""
+        key = hashlib.sha1(avatar_bytes).hexdigest()
+        cached = self._avatars.get(key)
+        if cached is not None:
+            self._avatars.move_to_end(key)
+            return cached
+        
+        size = self.AVATAR_SIZE
+        avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
+        avatar = avatar.resize((size, size), Image.Resampling.LANCZOS)
+        
+        # Circular mask
+        mask = Image.new("L", (size, size), 0)
+        ImageDraw.Draw(mask).ellipse([0, 0, size, size], fill=255)
+        
+        # Create circular avatar
+        output = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        output.paste(avatar, (0, 0))
+        output.putalpha(mask)
+        
+        self._avatars[key] = output
+        if len(self._avatars) > self.AVATAR_CACHE_SIZE:
+            self._avatars.popitem(last=False)
+        return output
+    
     def _draw_stats_section(self, draw: ImageDraw.ImageDraw, data: ProfileData, theme: dict):
         """Draw main stats in two columns."""
         start_y = 180
@@ -331,7 +364,7 @@ class ProfileGenerator:
             current_x = x
             for item in social_items:
                 draw.text((current_x, start_y), item, fill=theme["highlight"], font=self._font_medium)
-                bbox = self._font_medium.getbbox(item)
+                bbox = text_layout.bbox(self._font_medium, item)
                 current_x += bbox[2] - bbox[0] + 30
     
     def _draw_progress_section(self, draw: ImageDraw.ImageDraw, data: ProfileData, theme: dict):
@@ -414,7 +447,7 @@ class ProfileGenerator:
         y = self.CARD_HEIGHT - 30
         text = "/games • /shop • /quests • /achievements"
         
-        bbox = self._font_small.getbbox(text)
+        bbox = text_layout.bbox(self._font_small, text)
         text_w = bbox[2] - bbox[0]
         x = (self.CARD_WIDTH - text_w) // 2
         
@@ -1,9 +1,15 @@
 """
 Quote Generator Service - QuotAI style with transparent background.
+
+Rendering itself is synchronous (``draw_quote`` / ``draw_quote_chain``);
+the global instance runs it in the render process pool
+(app/services/render_pool.py) so Pillow work stays off the event loop.
 """
 
+import hashlib
 import logging
 import random
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
 from io import BytesIO
@@ -11,6 +17,8 @@ from typing import List, Optional, Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 
+from app.services.text_layout import text_layout
+
 logger = logging.getLogger(__name__)
 
 
@@ -67,11 +75,15 @@ RENDER_SCALE = 2  # 2x supersampling for crisp text
 MAX_IMAGE_WIDTH = 512 * RENDER_SCALE  # 1024px render width
 MAX_IMAGE_HEIGHT = 512 * RENDER_SCALE  # 1024px render height
 MAX_CHAIN_MESSAGES = 10
+# Circular avatars kept per process (the same people get quoted over and over)
+AVATAR_CACHE_SIZE = 256
 
 
 class QuoteGeneratorService:
     
-    def __init__(self):
+    def __init__(self, use_pool: bool = False):
+        self._use_pool = use_pool
+        self._avatars: "OrderedDict[Tuple[str, int], Image.Image]" = OrderedDict()
         self._load_fonts()
     
     def _load_fonts(self):
@@ -103,31 +115,12 @@ class QuoteGeneratorService:
         self.text_font = self.text_font_small = self.username_font = ImageFont.load_default()
 
     def _get_username_color(self, username: str) -> Tuple[int, int, int]:
-        import hashlib
         h = int(hashlib.md5(username.encode()).hexdigest()[:8], 16)
         return COLORS["username_colors"][h % len(COLORS["username_colors"])]
     
     def _wrap_text(self, text: str, font, max_width: int) -> List[str]:
-        words = text.split()
-        lines, current = [], []
-        
-        for word in words:
-            test = ' '.join(current + [word])
-            try:
-                w = font.getbbox(test)[2]
-            except:
-                w = len(test) * 8
-            
-            if w <= max_width:
-                current.append(word)
-            else:
-                if current:
-                    lines.append(' '.join(current))
-                current = [word]
-        
-        if current:
-            lines.append(' '.join(current))
-        return lines or ['']
+        # Glyph advances and line breaks are cached in the shared layout engine
+        return list(text_layout.wrap(text, font, max_width))
 
     def _draw_rounded_rect(self, draw, coords, radius, fill):
         x1, y1, x2, y2 = coords
@@ -140,16 +133,29 @@ class QuoteGeneratorService:
         draw.ellipse([x1, y2 - radius * 2, x1 + radius * 2, y2], fill=fill)
         draw.ellipse([x2 - radius * 2, y2 - radius * 2, x2, y2], fill=fill)
 
+    def _circular_avatar(self, avatar_data: bytes, size: int) -> Image.Image:
+        key = (hashlib.sha1(avatar_data).hexdigest(), size)
+        av = self._avatars.get(key)
+        if av is not None:
+            self._avatars.move_to_end(key)
+            return av
+        
+        av = Image.open(BytesIO(avatar_data)).convert('RGBA')
+        av = av.resize((size, size), Image.Resampling.LANCZOS)
+        
+        mask = Image.new('L', (size, size), 0)
+        ImageDraw.Draw(mask).ellipse([0, 0, size, size], fill=255)
+        av.putalpha(mask)
+        
+        self._avatars[key] = av
+        if len(self._avatars) > AVATAR_CACHE_SIZE:
+            self._avatars.popitem(last=False)
+        return av
+
     def _draw_avatar(self, img, x, y, size, username, avatar_data=None):
         if avatar_data:
             try:
-                av = Image.open(BytesIO(avatar_data)).convert('RGBA')
-                av = av.resize((size, size), Image.Resampling.LANCZOS)
-                
-                mask = Image.new('L', (size, size), 0)
-                ImageDraw.Draw(mask).ellipse([0, 0, size, size], fill=255)
-                av.putalpha(mask)
-                
+                av = self._circular_avatar(avatar_data, size)
                 img.paste(av, (x, y), av)
                 return
             except Exception as e:
@@ -162,7 +168,7 @@ class QuoteGeneratorService:
         
         initial = username[0].upper() if username else "?"
         try:
-            bbox = self.username_font.getbbox(initial)
+            bbox = text_layout.bbox(self.username_font, initial)
             tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
         except:
             tw, th = 10, 10
@@ -181,6 +187,28 @@ class QuoteGeneratorService:
         media_data: Optional[bytes] = None,
     ) -> QuoteImage:
         """Render QuotAI-style quote with transparent background."""
+        kwargs = dict(
+            text=text, username=username, avatar_url=avatar_url, style=style, timestamp=timestamp,
+            avatar_data=avatar_data, custom_title=custom_title, full_name=full_name, media_data=media_data,
+        )
+        if self._use_pool:
+            from app.services.render_pool import render_pool
+            return await render_pool.run("quote", **kwargs)
+        return self.draw_quote(**kwargs)
+
+    def draw_quote(
+        self,
+        text: str,
+        username: str,
+        avatar_url: Optional[str] = None,
+        style: Optional[QuoteStyle] = None,
+        timestamp: Optional[str] = None,
+        avatar_data: Optional[bytes] = None,
+        custom_title: Optional[str] = None,
+        full_name: Optional[str] = None,
+        media_data: Optional[bytes] = None,
+    ) -> QuoteImage:
+        """Synchronous quote rendering (called in the render pool)."""
         
         # All sizes scaled by RENDER_SCALE for high-res output
         padding = 24  # 12 * 2
@@ -194,8 +222,8 @@ class QuoteGeneratorService:
         
         display_name = full_name or username or "Anonymous"
         try:
-            name_h = self.username_font.getbbox(display_name)[3]
-            line_h = self.text_font.getbbox("Ayg")[3] + 6  # 3 * 2
+            name_h = text_layout.bbox(self.username_font, display_name)[3]
+            line_h = text_layout.line_height(self.text_font) + 6  # 3 * 2
         except:
             name_h, line_h = 36, 46  # 18 * 2, 23 * 2
         
@@ -268,10 +296,17 @@ class QuoteGeneratorService:
         return QuoteImage(image_data=output.getvalue(), format='webp', width=final_w, height=final_h)
 
     async def render_quote_chain(self, messages: List[MessageData], style: Optional[QuoteStyle] = None) -> QuoteImage:
+        if self._use_pool:
+            from app.services.render_pool import render_pool
+            return await render_pool.run("quote_chain", messages[:MAX_CHAIN_MESSAGES], style)
+        return self.draw_quote_chain(messages, style)
+
+    def draw_quote_chain(self, messages: List[MessageData], style: Optional[QuoteStyle] = None) -> QuoteImage:
+        """Synchronous chain rendering (called in the render pool)."""
         if len(messages) > MAX_CHAIN_MESSAGES:
             messages = messages[:MAX_CHAIN_MESSAGES]
         if not messages:
-            return await self.render_quote("(empty)", "System", style=style)
+            return self.draw_quote("(empty)", "System", style=style)
         
         # All sizes scaled by RENDER_SCALE for high-res output
         padding = 20  # 10 * 2
@@ -289,8 +324,8 @@ class QuoteGeneratorService:
         for msg in messages:
             lines = self._wrap_text(msg.text, self.text_font_small, max_text_w) if msg.text else []
             try:
-                name_h = self.username_font.getbbox(msg.username)[3]
-                line_h = self.text_font_small.getbbox("Ayg")[3] + 4  # 2 * 2
+                name_h = text_layout.bbox(self.username_font, msg.username)[3]
+                line_h = text_layout.line_height(self.text_font_small) + 4  # 2 * 2
             except:
                 name_h, line_h = 32, 40  # 16 * 2, 20 * 2
             
@@ -396,4 +431,4 @@ class QuoteGeneratorService:
             return None
 
 
-quote_generator_service = QuoteGeneratorService()
+quote_generator_service = QuoteGeneratorService(use_pool=True)
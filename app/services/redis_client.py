@@ -91,6 +91,7 @@ class RedisClient:
         value: str,
         ex: Optional[int] = None,
         px: Optional[int] = None,
+        nx: bool = False,
     ) -> bool:
         """
         Set key-value pair.
@@ -100,15 +101,15 @@ class RedisClient:
             value: Value to store
             ex: Expiration time in seconds
             px: Expiration time in milliseconds
+            nx: Only set if the key does not exist
             
         Returns:
-            True if successful
+            True if successful (False if nx and the key already exists)
         """
         if not self._available:
             return False
         try:
-            await self._client.set(key, value, ex=ex, px=px)
-            return True
+            return bool(await self._client.set(key, value, ex=ex, px=px, nx=nx))
         except Exception as e:
             logger.error(f"Redis SET error: {e}")
             return False
@@ -165,6 +166,16 @@ class RedisClient:
             logger.error(f"Redis EXISTS error: {e}")
             return False
     
+    async def eval(self, script: str, keys: list, args: list) -> Optional[Any]:
+        """Run a Lua script atomically."""
+        if not self._available:
+            return None
+        try:
+            return await self._client.eval(script, len(keys), *keys, *args)
+        except Exception as e:
+            logger.error(f"Redis EVAL error: {e}")
+            return None
+    
     async def get_json(self, key: str) -> Optional[Any]:
         """Get JSON value by key."""
         value = await self.get(key)
@@ -0,0 +1,188 @@
+"""
+Render Pool - Pillow-рендеринг картинок в пуле процессов.
+
+Цитаты, карточки профиля, графики топов и спарклайны рисовались прямо в
+event loop: LANCZOS-ресайзы, скруглённые прямоугольники и раскладка текста
+занимают десятки-сотни миллисекунд CPU, и всё это время бот не отвечал
+остальным чатам. Теперь рендер уходит в ``ProcessPoolExecutor``:
+
+- воркеры запускаются через ``spawn`` (в главном процессе живут потоки
+  Whisper и HTTP-клиенты — ``fork`` с ними небезопасен);
+- при старте воркер один раз загружает шрифты и готовит фоны-градиенты
+  (``_init_worker``), аватары кэшируются внутри генераторов;
+- задача ограничена ``render_timeout_seconds`` (``RenderTimeout``);
+  зависший рендер продолжает занимать свой процесс, но вызывающий не ждёт;
+- сломавшийся пул (упавший процесс) пересоздаётся при следующем вызове;
+- ``render_pool_workers=0`` — рендер в потоке без отдельных процессов.
+
+Usage:
+    from app.services.render_pool import render_pool
+
+    png = await render_pool.run("sparkline", history)
+    card = await render_pool.run("profile", profile_data)
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RenderTimeout(Exception):
+    """Рендер не уложился в таймаут."""
+
+
+# --- выполняется в процессах пула ---
+
+
+def _render_quote(**kwargs: Any):
+    from app.services.quote_generator import quote_generator_service
+
+    return quote_generator_service.draw_quote(**kwargs)
+
+
+def _render_quote_chain(messages, style=None):
+    from app.services.quote_generator import quote_generator_service
+
+    return quote_generator_service.draw_quote_chain(messages, style)
+
+
+def _render_profile(data):
+    from app.services.profile_generator import profile_generator
+
+    return profile_generator.generate(data)
+
+
+def _render_top10(players):
+    from app.services.top_chart import top_chart_generator
+
+    return top_chart_generator.generate_top10_chart(players)
+
+
+def _render_sparkline(history):
+    from app.services.sparkline import sparkline_generator
+
+    return sparkline_generator.generate(history)
+
+
+JOBS: Dict[str, Callable[..., Any]] = {
+    "quote": _render_quote,
+    "quote_chain": _render_quote_chain,
+    "profile": _render_profile,
+    "top10": _render_top10,
+    "sparkline": _render_sparkline,
+}
+
+
+def _init_worker() -> None:
+    """Предзагрузка в воркере: шрифты (при импорте генераторов) и градиенты."""
+    # Ctrl+C получает главный процесс, он и закрывает пул
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from app.services.profile_generator import profile_generator
+    from app.services.quote_generator import quote_generator_service  # noqa: F401
+    from app.services.sparkline import sparkline_generator  # noqa: F401
+    from app.services.top_chart import top_chart_generator
+
+    profile_generator.warm_up()
+    top_chart_generator.warm_up()
+
+
+def _run_job(job: str, args: tuple, kwargs: dict) -> Any:
+    return JOBS[job](*args, **kwargs)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# --- главный процесс ---
+
+
+class RenderPool:
+    """Пул процессов для Pillow с async API и таймаутами."""
+
+    def __init__(self, workers: Optional[int] = None, timeout: Optional[float] = None):
+        self.workers = settings.render_pool_workers if workers is None else workers
+        self.timeout = timeout or settings.render_timeout_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Запустить воркеры заранее, чтобы первый рендер не ждал загрузки шрифтов."""
+        executor = self._get_executor()
+        if executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        pids = await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(self.workers)))
+        logger.info(f"Render pool ready: {len(set(pids))} processes in {time.perf_counter() - started:.1f}s")
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, job: str, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        Выполнить рендер в пуле.
+
+        Args:
+            job: Имя задачи из ``JOBS`` (quote, quote_chain, profile, top10, sparkline)
+            *args, **kwargs: Аргументы генератора (должны сериализоваться pickle)
+            timeout: Таймаут, секунды (по умолчанию ``render_timeout_seconds``)
+
+        Returns:
+            Результат генератора (bytes / QuoteImage / None)
+
+        Raises:
+            RenderTimeout: рендер не уложился в таймаут
+        """
+        if job not in JOBS:
+            raise ValueError(f"Unknown render job: {job}")
+        executor = self._get_executor()
+        started = time.perf_counter()
+        if executor is None:
+            future = asyncio.to_thread(_run_job, job, args, kwargs)
+        else:
+            future = asyncio.get_running_loop().run_in_executor(executor, _run_job, job, args, kwargs)
+        try:
+            result = await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            await metrics.increment_counter("render_jobs_total", labels={"job": job, "status": "timeout"})
+            raise RenderTimeout(f"Render {job} timed out")
+        except BrokenProcessPool:
+            # Процесс пула упал (OOM, segfault в Pillow) — следующий вызов создаст новый пул
+            logger.error(f"Render pool broken during {job}, restarting")
+            self.stop()
+            await metrics.increment_counter("render_jobs_total", labels={"job": job, "status": "broken"})
+            raise
+        except Exception:
+            await metrics.increment_counter("render_jobs_total", labels={"job": job, "status": "error"})
+            raise
+        await metrics.increment_counter("render_jobs_total", labels={"job": job, "status": "ok"})
+        await metrics.observe_histogram("render_seconds", time.perf_counter() - started, labels={"job": job})
+        return result
+
+
+# Global render pool instance
+render_pool = RenderPool()
@@ -0,0 +1,212 @@
+"""
+Scheduler Leader - аренда лидерства для планировщика при нескольких репликах.
+
+Планировщик (APScheduler) работает в памяти каждой реплики, поэтому при
+двух экземплярах бота каждая cron-задача срабатывала дважды: двойные
+сводки, турниры, аукционы. Теперь задачи выполняет только реплика,
+держащая аренду в Redis:
+
+- аренда — ключ ``scheduler:leader`` со значением-идентификатором реплики
+  и TTL; берётся через ``SET NX PX``, продлевается Lua-скриптом только
+  владельцем, при остановке освобождается;
+- остальные реплики продолжают пытаться взять аренду и подхватывают
+  задачи, когда лидер пропадает (не позже чем через TTL);
+- время последнего запуска каждой задачи хранится в Redis — по нему новый
+  лидер (или перезапущенный бот) один раз догоняет cron-запуски,
+  пропущенные не больше чем на ``scheduler_catchup_grace_minutes``.
+
+Без Redis реплика одна и всегда лидер; время запусков хранится в памяти.
+
+Usage:
+    from app.services.scheduler_leader import scheduler_leader
+
+    await scheduler_leader.start(on_acquired=catch_up)
+    if scheduler_leader.is_leader:
+        ...
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "scheduler:leader"
+LAST_RUN_KEY = "scheduler:last_run:{job_id}"
+# Дольше самого редкого cron (ежемесячный турнир)
+LAST_RUN_TTL_SECONDS = 40 * 24 * 3600
+
+# Продлить аренду, только если она всё ещё наша
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _replica_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class SchedulerLeader:
+    """Аренда лидерства в Redis и время последних запусков задач."""
+
+    def __init__(
+        self,
+        lease_seconds: Optional[int] = None,
+        replica_id: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.lease_seconds = lease_seconds or settings.scheduler_leader_lease_seconds
+        self.replica_id = replica_id or _replica_id()
+        self._clock = clock
+        self._held = False
+        # Локальный срок аренды: без связи с Redis лидерство истекает само
+        self._lease_until = 0.0
+        self._last_runs: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._on_acquired: Optional[Callable[[], Awaitable[None]]] = None
+
+    @property
+    def standalone(self) -> bool:
+        """Без Redis реплика считается единственной."""
+        return not redis_client.is_available
+
+    @property
+    def is_leader(self) -> bool:
+        if self.standalone:
+            return True
+        return self._held and self._clock() < self._lease_until
+
+    async def try_acquire(self) -> bool:
+        """
+        Взять или продлить аренду.
+
+        Returns:
+            True, если эта реплика — лидер
+        """
+        was_leader = self.is_leader
+        if self.standalone:
+            held = True
+        else:
+            started = self._clock()
+            ttl_ms = self.lease_seconds * 1000
+            if self._held:
+                held = bool(await redis_client.eval(
+                    _RENEW_SCRIPT, [LEASE_KEY], [self.replica_id, ttl_ms]
+                ))
+            else:
+                held = False
+            if not held:
+                held = await redis_client.set(LEASE_KEY, self.replica_id, px=ttl_ms, nx=True)
+            self._held = held
+            # Срок считаем от момента запроса: Redis мог продлить ключ позже
+            self._lease_until = started + self.lease_seconds if held else 0.0
+
+        if held != was_leader:
+            logger.info(
+                f"Scheduler leadership {'acquired' if held else 'lost'} by {self.replica_id}"
+            )
+            await metrics.set_gauge("scheduler_leader", 1 if held else 0)
+            if held and self._on_acquired:
+                try:
+                    await self._on_acquired()
+                except Exception as e:
+                    logger.error(f"Scheduler on_acquired callback failed: {e}")
+        return held
+
+    async def start(self, on_acquired: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """
+        Первая попытка взять аренду и фоновое продление.
+
+        Args:
+            on_acquired: Вызывается каждый раз, когда реплика становится лидером
+        """
+        self._on_acquired = on_acquired
+        await self.try_acquire()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Продлеваем с запасом: три попытки за время жизни аренды
+        interval = max(1.0, self.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.try_acquire()
+            except Exception as e:
+                logger.error(f"Scheduler lease renewal failed: {e}")
+
+    async def stop(self) -> None:
+        """Остановить продление и отдать аренду другой реплике."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._held and not self.standalone:
+            await redis_client.eval(_RELEASE_SCRIPT, [LEASE_KEY], [self.replica_id])
+        self._held = False
+        self._lease_until = 0.0
+
+    async def record_run(self, job_id: str, when: Optional[datetime] = None) -> None:
+        """Запомнить запуск задачи (для догоняющих запусков)."""
+        when = when or datetime.now(timezone.utc)
+        self._last_runs[job_id] = when
+        if not self.standalone:
+            await redis_client.set(
+                LAST_RUN_KEY.format(job_id=job_id), when.isoformat(), ex=LAST_RUN_TTL_SECONDS
+            )
+
+    async def last_run(self, job_id: str) -> Optional[datetime]:
+        """Время последнего запуска задачи любой репликой."""
+        if not self.standalone:
+            value = await redis_client.get(LAST_RUN_KEY.format(job_id=job_id))
+            if value:
+                try:
+                    return datetime.fromisoformat(value)
+                except ValueError:
+                    logger.warning(f"Bad last run timestamp for {job_id}: {value!r}")
+        return self._last_runs.get(job_id)
+
+
+def previous_fire_time(trigger, now: datetime, grace: timedelta) -> Optional[datetime]:
+    """
+    Последнее срабатывание триггера в окне (now - grace, now].
+
+    Args:
+        trigger: APScheduler trigger (CronTrigger)
+        now: Текущее время (aware)
+        grace: Насколько далеко назад искать
+
+    Returns:
+        Время срабатывания или None
+    """
+    previous = None
+    fire = trigger.get_next_fire_time(None, now - grace)
+    while fire is not None and fire <= now:
+        previous = fire
+        fire = trigger.get_next_fire_time(fire, fire + timedelta(microseconds=1))
+    return previous
+
+
+# Global scheduler leader instance
+scheduler_leader = SchedulerLeader()
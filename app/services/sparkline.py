@@ -13,6 +13,8 @@ from dataclasses import dataclass
 
 from PIL import Image, ImageDraw
 
+from app.services.text_layout import text_layout
+
 
 @dataclass
 class SparklineData:
@@ -174,16 +176,9 @@ class SparklineGenerator:
         size_range = max_size - min_size if max_size != min_size else 1
         
         # Draw min/max labels
+        # Try to load a nicer font, fallback to default (loaded once per process)
         try:
-            from PIL import ImageFont
-            # Try to load a nicer font, fallback to default
-            try:
-                font = ImageFont.truetype("arial.ttf", 20)
-            except IOError:
-                try:
-                    font = ImageFont.load_default(size=20)
-                except TypeError:
-                    font = ImageFont.load_default()
+            font = text_layout.load_font(("arial.ttf",), 20)
         except Exception:
             font = None
         
@@ -0,0 +1,172 @@
+"""
+Text Layout - общий кэш метрик шрифтов и переноса строк для рендеров.
+
+Цитаты переносили текст, измеряя ``font.getbbox`` для каждой растущей
+строки (квадратично по числу слов), профиль, графики и спарклайны
+заново мерили одни и те же подписи и грузили шрифты на каждый рендер.
+Теперь все рендеры (quote_generator, profile_generator, top_chart,
+sparkline) меряют текст здесь:
+
+- ширина глифа (advance) кэшируется на шрифт: ширина строки — сумма
+  advance без повторного обхода FreeType;
+- перенос строк мемоизирован по (текст, шрифт, ширина) — LRU;
+- ``bbox`` подписей мемоизирован по (шрифт, текст) — LRU;
+- ``load_font`` держит загруженные шрифты по (кандидаты, размер).
+
+Кэши живут в каждом процессе пула рендеринга (render_pool) отдельно.
+
+Usage:
+    from app.services.text_layout import text_layout
+
+    lines = text_layout.wrap(text, font, max_width)
+    left, top, right, bottom = text_layout.bbox(font, title)
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+WRAP_CACHE_SIZE = 2048
+BBOX_CACHE_SIZE = 4096
+
+
+def font_key(font: Any) -> Hashable:
+    """Ключ шрифта: файл, размер и грань; для шрифтов без файла — id объекта."""
+    path = getattr(font, "path", None)
+    if isinstance(path, (str, bytes)):
+        return (path, getattr(font, "size", None), getattr(font, "index", 0))
+    return ("id", id(font))
+
+
+class _LRU(OrderedDict):
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.move_to_end(key)
+        return value
+
+    def store(self, key: Hashable, value: Any) -> Any:
+        self[key] = value
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+        return value
+
+
+class TextLayout:
+    """Метрики глифов, ширина строк, перенос и bbox с кэшами."""
+
+    def __init__(self, wrap_cache_size: int = WRAP_CACHE_SIZE, bbox_cache_size: int = BBOX_CACHE_SIZE):
+        self._advances: Dict[Hashable, Dict[str, float]] = {}
+        self._wraps = _LRU(wrap_cache_size)
+        self._bboxes = _LRU(bbox_cache_size)
+        self._fonts: Dict[Tuple[Tuple[str, ...], int], Any] = {}
+
+    def load_font(self, candidates: Sequence[str], size: int) -> Any:
+        """Первый загрузившийся шрифт из ``candidates`` (иначе встроенный), кэшируется."""
+        key = (tuple(candidates), size)
+        font = self._fonts.get(key)
+        if font is not None:
+            return font
+        for name in candidates:
+            try:
+                font = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        else:
+            try:
+                font = ImageFont.load_default(size=size)
+            except TypeError:
+                font = ImageFont.load_default()
+        self._fonts[key] = font
+        return font
+
+    def advance(self, font: Any, char: str) -> float:
+        """Ширина глифа (advance), кэш на шрифт."""
+        glyphs = self._advances.setdefault(font_key(font), {})
+        width = glyphs.get(char)
+        if width is None:
+            try:
+                width = font.getlength(char)
+            except AttributeError:
+                width = font.getbbox(char)[2]
+            glyphs[char] = width
+        return width
+
+    def text_width(self, font: Any, text: str) -> float:
+        """Ширина строки как сумма advance глифов."""
+        return sum(self.advance(font, char) for char in text)
+
+    def bbox(self, font: Any, text: str) -> Tuple[int, int, int, int]:
+        """``font.getbbox(text)`` с мемоизацией."""
+        key = (font_key(font), text)
+        box = self._bboxes.lookup(key)
+        if box is None:
+            box = self._bboxes.store(key, tuple(font.getbbox(text)))
+        return box
+
+    def line_height(self, font: Any, sample: str = "Ayg") -> int:
+        """Высота строки по образцу с выносными элементами."""
+        return self.bbox(font, sample)[3]
+
+    def wrap(self, text: str, font: Any, max_width: float) -> Tuple[str, ...]:
+        """
+        Жадный перенос по словам в ``max_width`` пикселей.
+
+        Слово шире строки остаётся целым на своей строке. Пустой текст —
+        одна пустая строка.
+        """
+        key = (text, font_key(font), max_width)
+        lines = self._wraps.lookup(key)
+        if lines is None:
+            lines = self._wraps.store(key, self._wrap(text, font, max_width))
+        return lines
+
+    def _wrap(self, text: str, font: Any, max_width: float) -> Tuple[str, ...]:
+        space = self.advance(font, " ")
+        lines = []
+        current = []
+        current_width = 0.0
+        for word in text.split():
+            width = self.text_width(font, word)
+            candidate = current_width + space + width if current else width
+            if candidate <= max_width:
+                current.append(word)
+                current_width = candidate
+            else:
+                if current:
+                    lines.append(" ".join(current))
+                current = [word]
+                current_width = width
+        if current:
+            lines.append(" ".join(current))
+        return tuple(lines) or ("",)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "fonts": len(self._advances),
+            "glyphs": sum(len(glyphs) for glyphs in self._advances.values()),
+            "wrap_entries": len(self._wraps),
+            "wrap_hits": self._wraps.hits,
+            "wrap_misses": self._wraps.misses,
+            "bbox_entries": len(self._bboxes),
+            "bbox_hits": self._bboxes.hits,
+            "bbox_misses": self._bboxes.misses,
+        }
+
+
+# Global text layout instance
+text_layout = TextLayout()
@@ -11,12 +11,37 @@ import io
 import os
 import logging
 import requests
+from dataclasses import dataclass, field
 from typing import List, Optional
 from PIL import Image, ImageDraw, ImageFont
 
+from app.services.text_layout import text_layout
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ChartPlayer:
+    """Plain copy of the GameStat fields the chart needs (picklable for the render pool)."""
+    tg_user_id: int
+    username: Optional[str]
+    size_cm: int
+    grow_history: List[dict] = field(default_factory=list)
+
+
+def to_chart_players(stats: List) -> List[ChartPlayer]:
+    """Detach GameStat rows into ChartPlayer objects before sending them to the render pool."""
+    return [
+        ChartPlayer(
+            tg_user_id=s.tg_user_id,
+            username=s.username,
+            size_cm=s.size_cm,
+            grow_history=list(s.grow_history or []),
+        )
+        for s in stats
+    ]
+
+
 class TopChartGenerator:
     """
     Generates multi-line charts for top 10 players visualization.
@@ -63,8 +88,54 @@ class TopChartGenerator:
     
     def __init__(self):
         """Initialize the chart generator."""
+        self._fonts = None
         self._ensure_font_exists()
     
+    def warm_up(self):
+        """Load chart fonts once (called once per render pool worker)."""
+        self._load_fonts()
+    
+    def _load_fonts(self):
+        """Fonts for the chart: (normal, small, title, using_emoji_font), cached."""
+        if self._fonts is not None:
+            return self._fonts
+        
+        # Font sizes scaled by supersampling factor
+        size_normal = 24 * self.SCALE
+        size_small = 20 * self.SCALE
+        size_title = 36 * self.SCALE
+        
+        font_candidates = [
+            "assets/fonts/Roboto-Regular.ttf", # Bundled font (highest priority)
+            "seguiemj.ttf", # Windows Emoji
+            "arial.ttf",
+            "DejaVuSans.ttf",
+            "LiberationSans-Regular.ttf",
+            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        ]
+        
+        for font_name in font_candidates:
+            try:
+                font = ImageFont.truetype(font_name, size_normal)
+                font_small = ImageFont.truetype(font_name, size_small)
+                font_title = ImageFont.truetype(font_name, size_title)
+                self._fonts = (font, font_small, font_title, "seguiemj" in font_name.lower())
+                return self._fonts
+            except Exception:
+                continue
+        
+        # Fallback to default
+        try:
+            font = ImageFont.load_default(size=size_normal)
+            font_small = ImageFont.load_default(size=size_small)
+            font_title = ImageFont.load_default(size=size_title)
+        except TypeError:
+            font = ImageFont.load_default()
+            font_small = font
+            font_title = font
+        self._fonts = (font, font_small, font_title, False)
+        return self._fonts
+    
     def _ensure_font_exists(self):
         """Download Roboto font if not present to ensure consistent rendering on Linux."""
         font_dir = "assets/fonts"
@@ -92,7 +163,7 @@ class TopChartGenerator:
         Generate a multi-line chart showing growth history for all top 10 players.
         
         Args:
-            top10_players: List of GameStat objects (top 10 by size)
+            top10_players: GameStat or ChartPlayer objects (top 10 by size)
             
         Returns:
             PNG image as bytes, or None if insufficient data
@@ -115,47 +186,8 @@ class TopChartGenerator:
         draw = ImageDraw.Draw(image)
         
         # Load font - prioritize bundled font, then system fonts
-        font = None
-        font_small = None
-        font_title = None
-        using_emoji_font = False
-        
-        # Font sizes scaled by supersampling factor
-        size_normal = 24 * self.SCALE
-        size_small = 20 * self.SCALE
-        size_title = 36 * self.SCALE
+        font, font_small, font_title, using_emoji_font = self._load_fonts()
         
-        font_candidates = [
-            "assets/fonts/Roboto-Regular.ttf", # Bundled font (highest priority)
-            "seguiemj.ttf", # Windows Emoji
-            "arial.ttf",
-            "DejaVuSans.ttf",
-            "LiberationSans-Regular.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        ]
-        
-        for font_name in font_candidates:
-            try:
-                font = ImageFont.truetype(font_name, size_normal)
-                font_small = ImageFont.truetype(font_name, size_small)
-                font_title = ImageFont.truetype(font_name, size_title)
-                if "seguiemj" in font_name.lower():
-                    using_emoji_font = True
-                break
-            except Exception:
-                continue
-        
-        if font is None:
-            # Fallback to default
-            try:
-                font = ImageFont.load_default(size=size_normal)
-                font_small = ImageFont.load_default(size=size_small)
-                font_title = ImageFont.load_default(size=size_title)
-            except TypeError:
-                font = ImageFont.load_default()
-                font_small = font
-                font_title = font
-            
         # Helper to clean text if no emoji support
         import re
         def clean_text_for_chart(text: str) -> str:
@@ -175,11 +207,8 @@ class TopChartGenerator:
         
         # Draw title
         title = "📈 ГРАФИК РОСТА ТОП-10 ИГРОКОВ"
-        try:
-            title_bbox = draw.textbbox((0, 0), title, font=font_title)
-            title_width = title_bbox[2] - title_bbox[0]
-        except AttributeError:
-             title_width = draw.textlength(title, font=font_title)
+        title_bbox = text_layout.bbox(font_title, title)
+        title_width = title_bbox[2] - title_bbox[0]
 
         draw.text(
             ((self.WIDTH - self.LEGEND_WIDTH - title_width) // 2, 30 * self.SCALE),
@@ -230,11 +259,8 @@ class TopChartGenerator:
         
         # Draw X-axis label
         x_label = "История (дни)"
-        try:
-            x_label_bbox = draw.textbbox((0, 0), x_label, font=font)
-            x_label_width = x_label_bbox[2] - x_label_bbox[0]
-        except AttributeError:
-            x_label_width = draw.textlength(x_label, font=font)
+        x_label_bbox = text_layout.bbox(font, x_label)
+        x_label_width = x_label_bbox[2] - x_label_bbox[0]
 
         draw.text(
             (chart_left + (chart_width - x_label_width) // 2, chart_bottom + (20 * self.SCALE)),
@@ -0,0 +1,409 @@
+"""
+Topic Clusters - онлайн-кластеризация сообщений чата по темам.
+
+Горячие темы для сводок раньше выделял LLM по сотне сырых сообщений
+(~20k символов промпта, недетерминированно), а запасной вариант
+группировал сообщения по первым четырём словам. Теперь темы
+поддерживаются инкрементально при приёме сообщения:
+
+- сообщение → набор ключевых слов (extract_keywords) с весами TF-IDF;
+  документная частота слов считается по чату на лету;
+- кандидаты ищутся по инвертированному индексу слово → кластеры,
+  сообщение попадает в самый похожий кластер (косинус ≥ порога) или
+  открывает новый;
+- кластер — это «скетч»: не больше ``_MAX_CENTROID_TERMS`` самых частых
+  слов, счётчики по часам и лучший пример сообщения за каждый час;
+- перед сводкой кластеры одной темы с похожими центроидами сливаются
+  (онлайн-присвоение дробит тему, пока её центроиды малы).
+
+Сводка берёт топ кластеров за период, а LLM только придумывает им
+названия по ключевым словам и одному примеру. Состояние живёт в памяти
+процесса, поэтому оно сверяется с почасовыми роллапами (общая БД): если
+процесс видел заметно меньше сообщений чата за период, чем насчитали
+роллапы (перезапуск, сообщения обработала другая реплика), те же кластеры
+строятся тем же алгоритмом по сообщениям из БД.
+
+Usage:
+    from app.services.topic_clusters import topic_clusters
+
+    topic_clusters.record(message_log)
+    clusters = topic_clusters.top_clusters(chat_id, start, end, limit=8)
+"""
+
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.activity_rollup import extract_keywords, hour_bucket
+
+logger = logging.getLogger(__name__)
+
+
+# Минимальный косинус для присоединения к кластеру
+SIMILARITY_THRESHOLD = 0.3
+# Косинус центроидов, при котором кластеры одной темы сливаются
+MERGE_THRESHOLD = 0.5
+# Сообщения с меньшим числом ключевых слов не несут темы ("ок", "ахах")
+MIN_TERMS = 2
+# Кластер считается темой, если в нём столько сообщений за период
+MIN_CLUSTER_SIZE = 3
+# Кластеры хранятся столько часов после последнего сообщения
+CLUSTER_TTL_HOURS = 48
+# Доля сообщений периода (по роллапам), которую должен был увидеть процесс,
+# чтобы сводка строилась по онлайн-состоянию
+MIN_COVERAGE = 0.9
+
+_MAX_CENTROID_TERMS = 40
+# Слияние проверяется среди стольких крупнейших кластеров
+_MERGE_CANDIDATES = 40
+_MAX_CLUSTERS_PER_CHAT = 300
+_MAX_DF_TERMS = 20000
+_SAMPLE_LENGTH = 160
+
+
+def _naive(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+@dataclass
+class TopicCluster:
+    """Скетч темы: частоты слов и почасовые счётчики."""
+    id: int
+    terms: Counter = field(default_factory=Counter)
+    hour_counts: Dict[datetime, int] = field(default_factory=dict)
+    # час → (оценка, message_id, фрагмент текста) лучшего примера
+    samples: Dict[datetime, Tuple[float, int, str]] = field(default_factory=dict)
+    users: Set[int] = field(default_factory=set)
+    last_hour: Optional[datetime] = None
+
+    def count_between(self, start: datetime, end: datetime) -> int:
+        return sum(n for hour, n in self.hour_counts.items() if start <= hour < end)
+
+    def top_terms(self, limit: int = 5) -> List[str]:
+        return [term for term, _ in sorted(self.terms.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]]
+
+    def best_sample(self, start: datetime, end: datetime) -> Optional[Tuple[float, int, str]]:
+        in_window = [s for hour, s in self.samples.items() if start <= hour < end]
+        return max(in_window, key=lambda s: (s[0], -s[1])) if in_window else None
+
+    def label(self) -> str:
+        """Детерминированное название без LLM: два главных слова."""
+        return " ".join(self.top_terms(2)).capitalize() or "Разное"
+
+
+@dataclass
+class ClusterSummary:
+    """Кластер за период — то, что уходит в сводку и в промпт."""
+    cluster_id: int
+    count: int
+    terms: List[str]
+    label: str
+    message_id: Optional[int]
+    sample: str
+    users: int
+
+
+class ChatTopics:
+    """Состояние кластеризации одного чата."""
+
+    def __init__(self):
+        self.clusters: Dict[int, TopicCluster] = {}
+        self.index: Dict[str, Set[int]] = {}
+        self.df: Counter = Counter()
+        self.documents = 0
+        # час → сообщений с текстом, учтённых этим процессом
+        self.hour_messages: Dict[datetime, int] = {}
+        self._next_id = 1
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + self.documents) / (1 + self.df[term])) + 1.0
+
+    def _similarity(self, terms: List[str], weights: Dict[str, float], cluster: TopicCluster) -> float:
+        dot = sum(weights[t] * cluster.terms[t] * self._idf(t) for t in terms if t in cluster.terms)
+        if dot <= 0:
+            return 0.0
+        norm_message = math.sqrt(sum(w * w for w in weights.values()))
+        norm_cluster = math.sqrt(sum((n * self._idf(t)) ** 2 for t, n in cluster.terms.items()))
+        return dot / (norm_message * norm_cluster)
+
+    def add(self, terms: List[str], message_id: Optional[int], user_id: Optional[int],
+            text: str, created_at: Optional[datetime]) -> Optional[int]:
+        """Учесть сообщение; возвращает id кластера или None, если слов мало."""
+        self.documents += 1
+        message_hour = hour_bucket(created_at)
+        self.hour_messages[message_hour] = self.hour_messages.get(message_hour, 0) + 1
+        self.df.update(terms)
+        if len(self.df) > _MAX_DF_TERMS:
+            # Единичные слова не влияют на темы — выбрасываем, чтобы память не росла
+            self.df = Counter({t: n for t, n in self.df.items() if n > 1})
+        if len(terms) < MIN_TERMS:
+            return None
+
+        weights = {t: self._idf(t) for t in terms}
+        candidates = sorted(set().union(*(self.index.get(t, set()) for t in terms)))
+        best_id, best_sim = None, 0.0
+        for cluster_id in candidates:
+            sim = self._similarity(terms, weights, self.clusters[cluster_id])
+            if sim > best_sim:
+                best_id, best_sim = cluster_id, sim
+
+        if best_id is None or best_sim < SIMILARITY_THRESHOLD:
+            best_id = self._next_id
+            self._next_id += 1
+            self.clusters[best_id] = TopicCluster(id=best_id)
+            # Основатель — пример только пока не пришло более типичное сообщение
+            best_sim = 0.0
+        cluster = self.clusters[best_id]
+
+        cluster.terms.update(terms)
+        if len(cluster.terms) > _MAX_CENTROID_TERMS:
+            kept = dict(cluster.terms.most_common(_MAX_CENTROID_TERMS))
+            for term in set(cluster.terms) - set(kept):
+                self.index.get(term, set()).discard(best_id)
+            cluster.terms = Counter(kept)
+        for term in cluster.terms:
+            self.index.setdefault(term, set()).add(best_id)
+
+        hour = message_hour
+        cluster.hour_counts[hour] = cluster.hour_counts.get(hour, 0) + 1
+        cluster.last_hour = max(cluster.last_hour or hour, hour)
+        if user_id is not None:
+            cluster.users.add(user_id)
+        # Пример часа — сообщение, больше всех похожее на тему
+        if message_id is not None:
+            current = cluster.samples.get(hour)
+            if current is None or best_sim > current[0]:
+                cluster.samples[hour] = (best_sim, message_id, text[:_SAMPLE_LENGTH])
+
+        if len(self.clusters) > _MAX_CLUSTERS_PER_CHAT:
+            self._evict_smallest()
+        return best_id
+
+    def _centroid_similarity(self, a: TopicCluster, b: TopicCluster) -> float:
+        shared = set(a.terms) & set(b.terms)
+        if not shared:
+            return 0.0
+        idf = {t: self._idf(t) for t in set(a.terms) | set(b.terms)}
+        dot = sum(a.terms[t] * b.terms[t] * idf[t] ** 2 for t in shared)
+        norm_a = math.sqrt(sum((n * idf[t]) ** 2 for t, n in a.terms.items()))
+        norm_b = math.sqrt(sum((n * idf[t]) ** 2 for t, n in b.terms.items()))
+        return dot / (norm_a * norm_b)
+
+    def merge_similar(self) -> int:
+        """
+        Слить кластеры одной темы.
+
+        Онлайн-присвоение дробит тему, пока центроиды малы: первые сообщения
+        темы ещё мало похожи друг на друга. Крупнейшие кластеры сравниваются
+        попарно, меньший вливается в больший.
+
+        Returns:
+            Количество слияний
+        """
+        merged = 0
+        while True:
+            ranked = sorted(
+                self.clusters.values(), key=lambda c: (-sum(c.hour_counts.values()), c.id)
+            )[:_MERGE_CANDIDATES]
+            best = None
+            for i, a in enumerate(ranked):
+                for b in ranked[i + 1:]:
+                    sim = self._centroid_similarity(a, b)
+                    if sim >= MERGE_THRESHOLD and (best is None or sim > best[0]):
+                        best = (sim, a, b)
+            if best is None:
+                return merged
+            _, target, source = best
+            self._absorb(target, source)
+            merged += 1
+
+    def _absorb(self, target: TopicCluster, source: TopicCluster) -> None:
+        self._remove(source.id)
+        target.terms.update(source.terms)
+        if len(target.terms) > _MAX_CENTROID_TERMS:
+            kept = dict(target.terms.most_common(_MAX_CENTROID_TERMS))
+            for term in set(target.terms) - set(kept):
+                self.index.get(term, set()).discard(target.id)
+            target.terms = Counter(kept)
+        for term in target.terms:
+            self.index.setdefault(term, set()).add(target.id)
+        for hour, n in source.hour_counts.items():
+            target.hour_counts[hour] = target.hour_counts.get(hour, 0) + n
+        for hour, sample in source.samples.items():
+            current = target.samples.get(hour)
+            if current is None or sample[0] > current[0]:
+                target.samples[hour] = sample
+        target.users |= source.users
+        if source.last_hour and (target.last_hour is None or source.last_hour > target.last_hour):
+            target.last_hour = source.last_hour
+
+    def _remove(self, cluster_id: int) -> None:
+        cluster = self.clusters.pop(cluster_id)
+        for term in cluster.terms:
+            ids = self.index.get(term)
+            if ids is not None:
+                ids.discard(cluster_id)
+                if not ids:
+                    del self.index[term]
+
+    def _evict_smallest(self) -> None:
+        victim = min(
+            self.clusters.values(),
+            key=lambda c: (sum(c.hour_counts.values()), c.last_hour or datetime.min, c.id),
+        )
+        self._remove(victim.id)
+
+    def prune(self, before: datetime) -> None:
+        """Удалить кластеры без сообщений после before и старые часы остальных."""
+        self.hour_messages = {h: n for h, n in self.hour_messages.items() if h >= before}
+        for cluster in list(self.clusters.values()):
+            if cluster.last_hour is None or cluster.last_hour < before:
+                self._remove(cluster.id)
+                continue
+            cluster.hour_counts = {h: n for h, n in cluster.hour_counts.items() if h >= before}
+            cluster.samples = {h: s for h, s in cluster.samples.items() if h >= before}
+
+    def summarize(
+        self, start: Optional[datetime], end: Optional[datetime], limit: int
+    ) -> List[ClusterSummary]:
+        """Топ кластеров по сообщениям за [start, end) с точностью до часа (None = всё)."""
+        if start is None or end is None:
+            start, end = datetime.min, datetime.max
+        else:
+            end_hour = hour_bucket(end)
+            # Неполный последний час входит в период
+            end = end_hour + timedelta(hours=1) if _naive(end) > end_hour else end_hour
+            start = hour_bucket(start)
+        self.merge_similar()
+        ranked = []
+        for cluster in self.clusters.values():
+            count = cluster.count_between(start, end)
+            if count >= MIN_CLUSTER_SIZE:
+                ranked.append((count, cluster))
+        ranked.sort(key=lambda item: (-item[0], item[1].id))
+
+        summaries = []
+        for count, cluster in ranked[:limit]:
+            sample = cluster.best_sample(start, end)
+            summaries.append(ClusterSummary(
+                cluster_id=cluster.id,
+                count=count,
+                terms=cluster.top_terms(),
+                label=cluster.label(),
+                message_id=sample[1] if sample else None,
+                sample=sample[2] if sample else "",
+                users=len(cluster.users),
+            ))
+        return summaries
+
+
+def cluster_messages(messages: Iterable[Any], limit: int = 8) -> List[ClusterSummary]:
+    """
+    Кластеризовать готовый набор сообщений тем же алгоритмом (без состояния).
+
+    Args:
+        messages: Строки с полями text и (необязательно) message_id, user_id,
+            created_at — в хронологическом порядке
+
+    Returns:
+        Топ кластеров по числу сообщений
+    """
+    topics = ChatTopics()
+    for msg in messages:
+        text = getattr(msg, "text", None)
+        if not text:
+            continue
+        topics.add(
+            extract_keywords(text),
+            getattr(msg, "message_id", None),
+            getattr(msg, "user_id", None),
+            text,
+            getattr(msg, "created_at", None),
+        )
+    return topics.summarize(None, None, limit)
+
+
+class TopicClusterService:
+    """Онлайн-кластеры тем по всем чатам."""
+
+    def __init__(self):
+        self._chats: Dict[int, ChatTopics] = {}
+        # С какого часа онлайн-состояние полное (время запуска бота)
+        self.tracking_since: datetime = hour_bucket(None) + timedelta(hours=1)
+        self.messages_clustered = 0
+
+    def record(self, message: Any) -> None:
+        """
+        Учесть сообщение (MessageLog). Синхронно, без обращения к БД.
+        """
+        text = getattr(message, "text", None)
+        if not text:
+            return
+        topics = self._chats.get(message.chat_id)
+        if topics is None:
+            topics = self._chats[message.chat_id] = ChatTopics()
+        topics.add(
+            extract_keywords(text),
+            getattr(message, "message_id", None),
+            getattr(message, "user_id", None),
+            text,
+            getattr(message, "created_at", None),
+        )
+        self.messages_clustered += 1
+        if topics.documents % 500 == 0:
+            topics.prune(hour_bucket(None) - timedelta(hours=CLUSTER_TTL_HOURS))
+
+    def covers(self, start: datetime) -> bool:
+        """Есть ли полное онлайн-состояние с начала периода."""
+        return hour_bucket(start) >= self.tracking_since
+
+    def messages_between(self, chat_id: int, start: datetime, end: datetime) -> int:
+        """Сообщений с текстом, учтённых этим процессом за [start, end) с точностью до часа."""
+        topics = self._chats.get(chat_id)
+        if topics is None:
+            return 0
+        start, end = hour_bucket(start), _naive(end)
+        return sum(n for hour, n in topics.hour_messages.items() if start <= hour < end)
+
+    def top_clusters(
+        self,
+        chat_id: int,
+        start: datetime,
+        end: datetime,
+        limit: int = 8,
+        expected_messages: Optional[int] = None,
+    ) -> Optional[List[ClusterSummary]]:
+        """
+        Топ тем чата за период или None, если онлайн-состояние не покрывает
+        период (тогда вызывающий строит кластеры по БД через cluster_messages).
+
+        Args:
+            expected_messages: Сообщений с текстом за период по роллапам
+                (text_count); если процесс видел меньше MIN_COVERAGE из них —
+                состояние неполное
+        """
+        if not self.covers(start):
+            return None
+        if expected_messages and self.messages_between(chat_id, start, end) < MIN_COVERAGE * expected_messages:
+            return None
+        topics = self._chats.get(chat_id)
+        if topics is None:
+            return []
+        return topics.summarize(start, end, limit)
+
+    def get_stats(self) -> dict:
+        return {
+            "chats": len(self._chats),
+            "clusters": sum(len(t.clusters) for t in self._chats.values()),
+            "messages_clustered": self.messages_clustered,
+            "tracking_since": self.tracking_since.isoformat(),
+        }
+
+
+# Глобальный экземпляр
+topic_clusters = TopicClusterService()
@@ -0,0 +1,182 @@
+"""
+Toxicity Scorer - токсичность и настроение сообщений одним проходом regex.
+
+Все признаки (мат/агрессия, позитивные и негативные маркеры) собраны в одно
+скомпилированное выражение с именованными группами. Пачка сообщений
+склеивается через перевод строки и сканируется одним ``finditer``, а
+совпадения раскладываются по сообщениям по смещениям — цикл по сообщениям
+и по отдельным паттернам не нужен.
+
+Оценки считаются при приёме сообщения (ActivityRollupService.record) и
+лежат в почасовых роллапах; сводки, analyze_chat_toxicity и ответы в
+личке только суммируют готовые счётчики или переиспользуют этот scorer.
+
+Usage:
+    from app.services.toxicity_scorer import classify_text, score_batch
+
+    classify_text("ну ты и дебил").toxic  # True
+    totals = score_batch(texts)           # SignalTotals
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+
+# Мат и агрессия (ru/en)
+TOXIC_PATTERNS = [
+    r'\b(?:на|по|от|за)?[хx][уy][йиеяюёijey]\w*',
+    r'\b[пp][иiе][зz][дd]\w*',
+    r'\b[бb][лl][яa]\w*',
+    r'\b(?:за|вы|на|от|до|по|у)?[еeё][бb]\w*',
+    r'\b[сc][уy][кk]\w*',
+    r'\b[мm][уy][дd][аa]\w*',
+    r'\bf+u+c+k+\w*',
+    r'\bs+h+i+t+\w*',
+    r'\b(?:убью|сдохни|урод|дебил|идиот|кретин|даун|лох|дурак|тупой)\b',
+]
+
+POSITIVE_MARKERS = [
+    '😊', '😄', '🥰', '❤️', '👍', '🎉', '😁', 'круто', 'класс',
+    'отлично', 'супер', 'спасибо', 'молодец', 'красава', 'топ',
+]
+NEGATIVE_MARKERS = [
+    '😢', '😭', '😤', '😡', '👎', '💔', 'плохо', 'ужас',
+    'отстой', 'хуйня', 'пиздец', 'блять', 'дерьмо',
+]
+
+
+def _alternation(markers: List[str]) -> str:
+    # Длинные маркеры первыми, чтобы более короткий префикс их не перекрывал
+    return "|".join(re.escape(m) for m in sorted(markers, key=len, reverse=True))
+
+
+def _without_boundary(pattern: str) -> str:
+    return pattern[2:] if pattern.startswith(r'\b') else pattern
+
+
+# \b вынесен за скобки: в середине слова токсичная ветка отсекается сразу.
+# Без IGNORECASE — текст приводится к нижнему регистру до сканирования.
+_SIGNALS_RE = re.compile(
+    r"(?P<toxic>\b(?:" + "|".join(f"(?:{_without_boundary(p)})" for p in TOXIC_PATTERNS) + "))"
+    "|(?P<positive>" + _alternation(POSITIVE_MARKERS) + ")"
+    "|(?P<negative>" + _alternation(NEGATIVE_MARKERS) + ")"
+)
+# Отдельные выражения маркеров — только для текста внутри токсичного совпадения
+_POSITIVE_RE = re.compile(_alternation(POSITIVE_MARKERS))
+_NEGATIVE_RE = re.compile(_alternation(NEGATIVE_MARKERS))
+
+# Разделитель сообщений в пачке: ни один паттерн не переходит через перевод строки
+_BATCH_SEPARATOR = "\n"
+
+
+@dataclass(frozen=True)
+class TextSignals:
+    """Признаки одного сообщения."""
+    toxic: bool = False
+    positive: bool = False
+    negative: bool = False
+
+
+@dataclass
+class SignalTotals:
+    """Суммарные признаки пачки сообщений (те же поля, что в роллапах)."""
+    text_count: int = 0
+    toxic_count: int = 0
+    positive_count: int = 0
+    negative_count: int = 0
+
+    @property
+    def toxicity_percent(self) -> float:
+        """Доля токсичных сообщений среди текстовых, 0-100."""
+        if self.text_count <= 0:
+            return 0.0
+        return min(100.0, self.toxic_count / self.text_count * 100)
+
+
+_NO_SIGNALS = TextSignals()
+
+
+def _scan(text_lower: str, flags: List[List[bool]], offsets: Optional[List[int]] = None) -> None:
+    """Один проход по тексту; flags[i] = [toxic, positive, negative] сообщения i."""
+    for match in _SIGNALS_RE.finditer(text_lower):
+        index = bisect_right(offsets, match.start()) - 1 if offsets else 0
+        row = flags[index]
+        kind = match.lastgroup
+        if kind == "toxic":
+            row[0] = True
+            # Токсичное слово поглощает символы: маркеры внутри него ('блять',
+            # 'хуйня') ищем отдельно, чтобы результат не зависел от порядка групп
+            word = match.group()
+            if _NEGATIVE_RE.search(word):
+                row[2] = True
+            if _POSITIVE_RE.search(word):
+                row[1] = True
+        elif kind == "positive":
+            row[1] = True
+        else:
+            row[2] = True
+
+
+def classify_text(text: Optional[str]) -> TextSignals:
+    """
+    Токсичность и настроение одного сообщения.
+
+    Args:
+        text: Текст сообщения
+
+    Returns:
+        TextSignals
+    """
+    if not text:
+        return _NO_SIGNALS
+    flags = [[False, False, False]]
+    _scan(text.lower(), flags)
+    return TextSignals(*flags[0])
+
+
+def classify_batch(texts: Iterable[Optional[str]]) -> List[TextSignals]:
+    """
+    Признаки для пачки сообщений за один проход regex.
+
+    Args:
+        texts: Тексты сообщений (None/пустые допустимы)
+
+    Returns:
+        TextSignals для каждого текста, в том же порядке
+    """
+    texts = list(texts)
+    offsets: List[int] = []
+    parts: List[str] = []
+    position = 0
+    for text in texts:
+        offsets.append(position)
+        # Переводы строк внутри сообщения не мешают: \b и \w* их не пересекают
+        part = text.lower() if text else ""
+        parts.append(part)
+        position += len(part) + len(_BATCH_SEPARATOR)
+
+    flags = [[False, False, False] for _ in texts]
+    if texts:
+        _scan(_BATCH_SEPARATOR.join(parts), flags, offsets)
+    return [TextSignals(*row) for row in flags]
+
+
+def score_batch(texts: Iterable[Optional[str]]) -> SignalTotals:
+    """
+    Суммарные признаки для пачки сообщений (для fallback без роллапов).
+
+    Args:
+        texts: Тексты сообщений
+
+    Returns:
+        SignalTotals; text_count считает только непустые тексты
+    """
+    texts = list(texts)
+    totals = SignalTotals(text_count=sum(1 for text in texts if text))
+    for signals in classify_batch(texts):
+        totals.toxic_count += signals.toxic
+        totals.positive_count += signals.positive
+        totals.negative_count += signals.negative
+    return totals
@@ -16,6 +16,7 @@ from app.database.session import get_session
 from app.database.models import Trade, UserInventory
 from app.services.inventory import inventory_service, ITEM_CATALOG
 from app.services import wallet_service
+from app.services.delay_queue import delay_queue, TRADE_EXPIRY
 from app.utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -123,6 +124,8 @@ class TradeService:
                 
                 trade_id = trade.id
         
+        # Истечение — точно в срок, без поминутного опроса
+        await delay_queue.schedule(TRADE_EXPIRY, trade_id, expires_at)
         return TradeResult(True, "✅ Предложение обмена отправлено!", trade_id)
     
     async def accept_trade(self, trade_id: int, user_id: int) -> TradeResult:
@@ -277,19 +280,19 @@ class TradeService:
             )
             return list(result.scalars().all())
     
-    async def expire_old_trades(self) -> int:
-        """Expire old trades and return items. Returns count of expired trades."""
+    async def expire_old_trades(self, trade_id: Optional[int] = None) -> int:
+        """
+        Expire old trades and return items. Returns count of expired trades.
+        
+        With trade_id only that trade is checked (delay queue deadline).
+        """
         async_session = get_session()
         async with async_session() as session:
             async with session.begin():
-                result = await session.execute(
-                    select(Trade).where(
-                        and_(
-                            Trade.status == "pending",
-                            Trade.expires_at < utc_now()
-                        )
-                    )
-                )
+                conditions = [Trade.status == "pending", Trade.expires_at <= utc_now()]
+                if trade_id is not None:
+                    conditions.append(Trade.id == trade_id)
+                result = await session.execute(select(Trade).where(and_(*conditions)))
                 expired_trades = result.scalars().all()
                 
                 count = 0
@@ -307,6 +310,15 @@ class TradeService:
                 
                 await session.commit()
                 return count
+    
+    async def pending_trade_deadlines(self) -> List[tuple]:
+        """Deadlines of pending trades for the delay queue: [(trade_id, expires_at, None)]."""
+        async_session = get_session()
+        async with async_session() as session:
+            result = await session.execute(
+                select(Trade.id, Trade.expires_at).where(Trade.status == "pending")
+            )
+            return [(trade_id, expires_at, None) for trade_id, expires_at in result.all()]
 
 
 # Global instance
@@ -5,6 +5,7 @@ This module provides TTS functionality including:
 - Auto-voice probability check (0.1% chance)
 - Fallback to gTTS on Edge TTS unavailability
 - Edge TTS for Russian voice synthesis (Microsoft)
+- Synthesis cache (app/services/tts_cache.py) and file_id reuse on send
 
 **Feature: fortress-update, oleg-commands-fix**
 **Validates: Requirements 5.1, 5.2, 5.3, 5.4, 5.5**
@@ -63,11 +64,25 @@ class TTSService:
         "zgeek": {"voice": "ru-RU-DmitryNeural", "pitch": "-5Hz", "rate": "+5%"},
     }
     
-    def __init__(self, tts_model: Optional[str] = None):
-        """Initialize TTS service."""
+    def __init__(self, tts_model: Optional[str] = None, use_cache: bool = False):
+        """Initialize TTS service.
+        
+        Args:
+            tts_model: Default voice name
+            use_cache: Reuse synthesized audio (shared tts_cache)
+        """
         self._default_voice = tts_model or self.DEFAULT_VOICE
         self._is_available = True
         self._edge_available = True  # Track Edge TTS availability separately
+        self._use_cache = use_cache
+    
+    @property
+    def _cache(self):
+        """Shared TTS cache (imported lazily, only when enabled)."""
+        if not self._use_cache:
+            return None
+        from app.services.tts_cache import tts_cache
+        return tts_cache
     
     def truncate_text(self, text: str, max_length: int = MAX_TEXT_LENGTH) -> tuple[str, bool]:
         """Truncate text to maximum length with suffix."""
@@ -127,22 +142,40 @@ class TTSService:
             return None
     
     async def _generate_audio(self, text: str, persona: str = "oleg") -> Optional[bytes]:
-        """Generate audio using Edge TTS with gTTS fallback."""
+        """Generate audio using Edge TTS with gTTS fallback (cached when enabled)."""
         if not self._is_available:
             logger.warning("TTS service marked as unavailable, skipping generation")
             return None
         
-        # Try Edge TTS first
-        if self._edge_available:
-            logger.debug(f"Attempting Edge TTS generation for persona {persona}...")
-            audio = await self._generate_edge_tts(text, persona)
-            if audio:
-                return audio
-            logger.warning("Edge TTS failed, trying gTTS fallback")
-            self._edge_available = False
+        cache = self._cache
+        config = self.PERSONA_VOICES.get(persona, self.PERSONA_VOICES["oleg"])
+        
+        # Try Edge TTS first (a cached phrase needs no synthesis at all)
+        if self._edge_available or cache is not None:
+            key = None
+            if cache is not None:
+                from app.services.tts_cache import cache_key
+                key = cache_key(text, config["voice"], config["pitch"], config["rate"])
+                audio = await cache.get(key)
+                if audio:
+                    return audio
+            if self._edge_available:
+                logger.debug(f"Attempting Edge TTS generation for persona {persona}...")
+                if cache is not None:
+                    audio = await cache.get_or_create(key, lambda: self._generate_edge_tts(text, persona))
+                else:
+                    audio = await self._generate_edge_tts(text, persona)
+                if audio:
+                    return audio
+                logger.warning("Edge TTS failed, trying gTTS fallback")
+                self._edge_available = False
         
         # Fallback to gTTS
         logger.debug("Attempting gTTS generation...")
+        if cache is not None:
+            from app.services.tts_cache import cache_key
+            key = cache_key(text, "gtts-ru", engine="gtts")
+            return await cache.get_or_create(key, lambda: self._generate_gtts(text))
         return await self._generate_gtts(text)
     
     async def _generate_edge_tts(self, text: str, persona: str = "oleg") -> Optional[bytes]:
@@ -217,6 +250,22 @@ class TTSService:
         """Estimate audio duration (10 chars/sec for Russian)."""
         return len(text) / 10
     
+    async def send_voice(self, send, result: TTSResult, **kwargs):
+        """
+        Send a TTS result as a voice message, by file_id when the same audio
+        was already uploaded (see app/services/media_registry.py).
+        
+        Args:
+            send: Bound sender, e.g. msg.reply_voice or bot.send_voice (with chat_id in kwargs)
+            result: TTSResult from generate_voice
+            **kwargs: Extra arguments for the sender (caption, duration, ...)
+            
+        Returns:
+            Sent message
+        """
+        from app.services.media_registry import media_registry
+        return await media_registry.send(send, "voice", result.audio_data, "voice.mp3", **kwargs)
+    
     @property
     def is_available(self) -> bool:
         """Check if TTS service is available."""
@@ -274,4 +323,4 @@ class TTSService:
 
 
 # Global TTS service instance
-tts_service = TTSService()
+tts_service = TTSService(use_cache=True)
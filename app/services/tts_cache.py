@@ -0,0 +1,224 @@
+"""
+TTS Cache - готовый звук по тексту, голосу и параметрам речи.
+
+Каноничные фразы персон, случайные ответы и короткие повторяющиеся
+реплики раньше синтезировались заново при каждом озвучивании. Теперь
+звук адресуется содержимым: ключ — sha256 от нормализованного текста
+(NFC, схлопнутые пробелы), голоса, pitch, rate и движка.
+
+- память: LRU с лимитом ``tts_cache_memory_mb``;
+- диск: ``tts_cache_dir/<ab>/<key>.mp3`` с LRU-вытеснением по времени
+  последнего обращения и лимитом ``tts_cache_disk_mb``;
+- одновременные запросы одной фразы синтезируются один раз.
+
+Повторная отправка уже загруженного звука по ``file_id`` —
+app/services/media_registry.py.
+
+Usage:
+    from app.services.tts_cache import tts_cache, cache_key
+
+    key = cache_key(text, voice, pitch="+0Hz", rate="+0%")
+    audio = await tts_cache.get_or_create(key, lambda: synthesize(text))
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+AUDIO_SUFFIX = ".mp3"
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация для ключа: NFC и схлопнутые пробелы."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text: str, voice: str, pitch: str = "+0Hz", rate: str = "+0%", engine: str = "edge") -> str:
+    """Ключ звука: одинаковые фраза, голос и параметры речи — один файл."""
+    payload = "\x1f".join((engine, voice, pitch, rate, normalize_text(text)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Звук TTS: LRU в памяти + LRU на диске."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        memory_limit_bytes: Optional[int] = None,
+        disk_limit_bytes: Optional[int] = None,
+    ):
+        self.cache_dir = cache_dir or settings.tts_cache_dir
+        self.memory_limit = (
+            memory_limit_bytes if memory_limit_bytes is not None else settings.tts_cache_memory_mb * 1024 * 1024
+        )
+        self.disk_limit = disk_limit_bytes if disk_limit_bytes is not None else settings.tts_cache_disk_mb * 1024 * 1024
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # Индекс диска: key -> (размер, последнее обращение); строится лениво
+        self._disk: Optional[Dict[str, Tuple[int, float]]] = None
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = asyncio.Lock()
+
+    # --- пути и диск (вызывается в потоке) ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}{AUDIO_SUFFIX}")
+
+    def _scan_disk(self) -> Dict[str, Tuple[int, float]]:
+        index: Dict[str, Tuple[int, float]] = {}
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(AUDIO_SUFFIX):
+                        st = os.stat(os.path.join(root, name))
+                        index[name[: -len(AUDIO_SUFFIX)]] = (st.st_size, st.st_mtime)
+        return index
+
+    async def _disk_index(self) -> Dict[str, Tuple[int, float]]:
+        if self._disk is None:
+            self._disk = await asyncio.to_thread(self._scan_disk)
+            self._disk_bytes = sum(size for size, _ in self._disk.values())
+        return self._disk
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))  # mtime = последнее обращение (LRU)
+            return data
+        except OSError:
+            return None
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    # --- память ---
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_limit:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # --- API ---
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Звук из памяти или с диска."""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            await metrics.increment_counter("tts_cache_total", labels={"result": "memory"})
+            return data
+        index = await self._disk_index()
+        if key in index:
+            data = await asyncio.to_thread(self._read, key)
+            if data is not None:
+                index[key] = (len(data), time.time())
+                self._remember(key, data)
+                await metrics.increment_counter("tts_cache_total", labels={"result": "disk"})
+                return data
+            self._disk_bytes -= index.pop(key)[0]
+        await metrics.increment_counter("tts_cache_total", labels={"result": "miss"})
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        """Сохранить звук в память и на диск (с вытеснением давно неиспользуемых)."""
+        if not data:
+            return
+        self._remember(key, data)
+        try:
+            index = await self._disk_index()
+            await asyncio.to_thread(self._write, key, data)
+            async with self._lock:
+                old = index.get(key)
+                if old:
+                    self._disk_bytes -= old[0]
+                index[key] = (len(data), time.time())
+                self._disk_bytes += len(data)
+                await self._evict_disk(index)
+        except OSError as e:
+            logger.warning(f"TTS cache disk write failed: {e}")
+
+    async def _evict_disk(self, index: Dict[str, Tuple[int, float]]) -> None:
+        if self._disk_bytes <= self.disk_limit:
+            return
+        victims = []
+        for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= self.disk_limit:
+                break
+            victims.append(key)
+            self._disk_bytes -= size
+            del index[key]
+        await asyncio.to_thread(lambda: [self._remove(key) for key in victims])
+        await metrics.increment_counter("tts_cache_evictions_total", len(victims))
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """
+        Звук из кэша или от ``factory`` (одновременные запросы ключа ждут
+        один синтез). Пустой результат не кэшируется.
+        """
+        data = await self.get(key)
+        if data is not None:
+            return data
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await factory()
+            if data:
+                await self.put(key, data)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Ожидающих может не быть — не логировать "never retrieved"
+            raise
+        finally:
+            del self._inflight[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk or {}),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+# Global TTS cache instance
+tts_cache = TTSCache()
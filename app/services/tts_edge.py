@@ -2,7 +2,9 @@
 
 This module provides TTS functionality using Microsoft Edge TTS API:
 - Russian voices: Dmitry (male) and Svetlana (female)
-- Temp file lifecycle management: Create → Send → Delete
+- In-memory send path: synthesized audio goes to Telegram from a buffer,
+  nothing is written to disk
+- Temp file lifecycle management (synthesize_to_file): Create → Send → Delete
 - Error handling with user notification
 
 **Feature: grand-casino-dictator, Property 20: TTS File Lifecycle**
@@ -17,7 +19,7 @@ from dataclasses import dataclass
 from typing import Optional
 
 from aiogram import Bot
-from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile
 
 logger = logging.getLogger(__name__)
 
@@ -55,7 +57,9 @@ class EdgeTTSService:
     """
     TTS service using Microsoft Edge API.
     
-    Provides voice generation with proper temp file lifecycle:
+    send_voice streams synthesized audio into memory and uploads it from
+    a buffer. synthesize_to_file keeps the temp file lifecycle for callers
+    that need a real file:
     1. Create temp file with audio
     2. Send as voice message
     3. Delete temp file (always, regardless of success/failure)
@@ -74,16 +78,33 @@ class EdgeTTSService:
     FILE_PREFIX = "oleg_tts_"
     FILE_SUFFIX = ".mp3"
     
-    def __init__(self, voice: str = DEFAULT_VOICE):
+    def __init__(self, voice: str = DEFAULT_VOICE, use_cache: bool = False):
         """
         Initialize Edge TTS service.
         
         Args:
             voice: Voice type - "male" (Dmitry) or "female" (Svetlana)
+            use_cache: Reuse synthesized audio (shared tts_cache) and uploaded
+                file_ids (media_registry)
         """
         self._voice_type = voice
         self._voice_name = self.RUSSIAN_VOICES.get(voice, self.RUSSIAN_VOICES["male"])
         self._is_available = True
+        self._use_cache = use_cache
+    
+    @property
+    def _cache(self):
+        """Shared TTS cache (imported lazily, only when enabled)."""
+        if not self._use_cache:
+            return None
+        from app.services.tts_cache import tts_cache
+        return tts_cache
+    
+    def _cache_key(self, text: str, voice_name: str) -> Optional[str]:
+        if not self._use_cache:
+            return None
+        from app.services.tts_cache import cache_key
+        return cache_key(text, voice_name)
     
     @property
     def voice_name(self) -> str:
@@ -117,7 +138,7 @@ class EdgeTTSService:
     
     async def synthesize(self, text: str, voice: Optional[str] = None) -> Optional[bytes]:
         """
-        Synthesize speech from text.
+        Synthesize speech from text (repeated phrases come from tts_cache when enabled).
         
         Args:
             text: Text to convert to speech
@@ -134,6 +155,15 @@ class EdgeTTSService:
         
         voice_name = self.RUSSIAN_VOICES.get(voice, self._voice_name) if voice else self._voice_name
         
+        cache = self._cache
+        if cache is not None:
+            return await cache.get_or_create(
+                self._cache_key(text, voice_name), lambda: self._synthesize(text, voice_name)
+            )
+        return await self._synthesize(text, voice_name)
+    
+    async def _synthesize(self, text: str, voice_name: str) -> Optional[bytes]:
+        """Stream Edge TTS audio into memory."""
         try:
             import edge_tts
             
@@ -259,12 +289,12 @@ class EdgeTTSService:
         reply_to_message_id: Optional[int] = None
     ) -> TTSFileResult:
         """
-        Generate and send voice message with full lifecycle management.
+        Generate and send voice message without touching the disk.
         
-        Implements the complete temp file lifecycle:
-        1. Create temp file with synthesized audio
-        2. Send as voice message to chat
-        3. Delete temp file (always, regardless of success/failure)
+        Audio is synthesized into memory and uploaded from a buffer, so
+        there is no temp file to create, race on or clean up. The result
+        keeps the lifecycle fields: file_path is empty and deleted is
+        always True.
         
         Args:
             bot: Aiogram Bot instance
@@ -278,34 +308,58 @@ class EdgeTTSService:
             
         **Validates: Requirements 15.1, 15.2, 15.3, 15.4**
         """
-        # Step 1: Create temp file
-        result = await self.synthesize_to_file(text, voice)
+        voice_name = self.RUSSIAN_VOICES.get(voice, self._voice_name) if voice else self._voice_name
+        result = TTSFileResult(
+            file_path="",
+            audio_bytes=None,
+            text=text,
+            voice=voice_name,
+            created=False,
+            sent=False,
+            deleted=True,
+            error=None
+        )
         
-        if not result.created:
-            # Cleanup attempt even if creation failed (file might be partial)
-            result.deleted = self.delete_temp_file(result.file_path)
+        # Step 1: Synthesize into memory
+        if not text or not text.strip():
+            result.error = "Empty text provided"
             return result
+        result.audio_bytes = await self.synthesize(text, voice)
+        if not result.audio_bytes:
+            result.error = "Synthesis failed"
+            return result
+        result.created = True
         
-        # Step 2: Send voice message
+        # Step 2: Send voice message (by file_id if this audio was uploaded before)
+        await self._send_buffer(bot, chat_id, result, reply_to_message_id)
+        return result
+    
+    async def _send_buffer(
+        self,
+        bot: Bot,
+        chat_id: int,
+        result: TTSFileResult,
+        reply_to_message_id: Optional[int] = None
+    ) -> None:
+        """Upload result.audio_bytes as a voice message (by file_id if already uploaded)."""
         try:
-            voice_file = FSInputFile(result.file_path)
-            await bot.send_voice(
-                chat_id=chat_id,
-                voice=voice_file,
-                reply_to_message_id=reply_to_message_id
-            )
+            if self._use_cache:
+                from app.services.media_registry import media_registry
+                await media_registry.send(
+                    bot.send_voice, "voice", result.audio_bytes, f"voice{self.FILE_SUFFIX}",
+                    chat_id=chat_id, reply_to_message_id=reply_to_message_id
+                )
+            else:
+                await bot.send_voice(
+                    chat_id=chat_id,
+                    voice=BufferedInputFile(result.audio_bytes, filename=f"voice{self.FILE_SUFFIX}"),
+                    reply_to_message_id=reply_to_message_id
+                )
             result.sent = True
             logger.info(f"Sent voice message to chat {chat_id}")
-            
         except Exception as e:
             result.error = f"Failed to send voice: {e}"
             logger.error(result.error)
-        
-        # Step 3: Delete temp file (ALWAYS, regardless of send success)
-        finally:
-            result.deleted = self.delete_temp_file(result.file_path)
-        
-        return result
     
     async def send_voice_with_notification(
         self,
@@ -371,46 +425,39 @@ class EdgeTTSService:
         text: str,
         reply_to_message_id: Optional[int] = None
     ) -> Optional[TTSFileResult]:
-        """Fallback to gTTS (Google Translate TTS)."""
-        file_path = self._generate_temp_path()
-        
+        """Fallback to gTTS (Google Translate TTS), synthesized into memory."""
         result = TTSFileResult(
-            file_path=file_path,
+            file_path="",
             audio_bytes=None,
             text=text,
             voice="gtts",
             created=False,
             sent=False,
-            deleted=False,
+            deleted=True,
             error=None
         )
         
         try:
             from gtts import gTTS
             import asyncio
+            import io
             
             # gTTS is synchronous, run in executor
-            def generate_gtts():
-                tts = gTTS(text=text, lang='ru')
-                tts.save(file_path)
+            def generate_gtts() -> bytes:
+                buffer = io.BytesIO()
+                gTTS(text=text, lang='ru').write_to_fp(buffer)
+                return buffer.getvalue()
             
-            await asyncio.get_event_loop().run_in_executor(None, generate_gtts)
+            result.audio_bytes = await asyncio.get_event_loop().run_in_executor(None, generate_gtts)
             
-            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            if result.audio_bytes:
                 result.created = True
-                logger.info(f"gTTS created file: {file_path}")
-                
-                # Send voice
-                voice_file = FSInputFile(file_path)
-                await bot.send_voice(
-                    chat_id=chat_id,
-                    voice=voice_file,
-                    reply_to_message_id=reply_to_message_id
-                )
-                result.sent = True
-                logger.info(f"gTTS fallback succeeded for chat {chat_id}")
+                logger.info(f"gTTS synthesized {len(result.audio_bytes)} bytes")
+                await self._send_buffer(bot, chat_id, result, reply_to_message_id)
+                if result.sent:
+                    logger.info(f"gTTS fallback succeeded for chat {chat_id}")
             else:
-                result.error = "gTTS file creation failed"
+                result.error = "gTTS synthesis returned no audio"
                 
         except ImportError:
             logger.warning("gTTS not installed")
@@ -418,9 +465,6 @@ class EdgeTTSService:
         except Exception as e:
             logger.error(f"gTTS fallback failed: {e}")
             result.error = str(e)
-        finally:
-            # Cleanup
-            result.deleted = self.delete_temp_file(file_path)
         
         return result
     
@@ -432,12 +476,12 @@ class EdgeTTSService:
         reply_to_message_id: Optional[int] = None
     ) -> Optional[TTSFileResult]:
         """Fallback to pyttsx3 (offline TTS with espeak)."""
-        # pyttsx3 saves as wav, need to convert
+        # pyttsx3 can only save to a file: the wav is read back and
+        # converted to mp3 through an ffmpeg pipe, the mp3 stays in memory
         wav_path = self._generate_temp_path().replace('.mp3', '.wav')
-        mp3_path = self._generate_temp_path()
         
         result = TTSFileResult(
-            file_path=mp3_path,
+            file_path="",
             audio_bytes=None,
             text=text,
             voice="pyttsx3",
@@ -450,9 +494,9 @@ class EdgeTTSService:
         try:
             import pyttsx3
             import asyncio
-            import subprocess
+            from app.services import media_pipe
             
-            def generate_pyttsx3():
+            def generate_pyttsx3() -> bytes:
                 engine = pyttsx3.init()
                 # Set Russian voice if available
                 voices = engine.getProperty('voices')
@@ -463,39 +507,25 @@ class EdgeTTSService:
                 engine.setProperty('rate', 150)
                 engine.save_to_file(text, wav_path)
                 engine.runAndWait()
+                with open(wav_path, "rb") as f:
+                    return f.read()
             
-            await asyncio.get_event_loop().run_in_executor(None, generate_pyttsx3)
+            wav_bytes = await asyncio.get_event_loop().run_in_executor(None, generate_pyttsx3)
             
-            # Convert wav to mp3 using ffmpeg
-            if os.path.exists(wav_path):
-                proc = await asyncio.create_subprocess_exec(
-                    'ffmpeg', '-y', '-i', wav_path, '-acodec', 'libmp3lame', '-q:a', '4', mp3_path,
-                    stdout=asyncio.subprocess.DEVNULL,
-                    stderr=asyncio.subprocess.DEVNULL
+            # Convert wav to mp3 using ffmpeg (stdin -> stdout)
+            if wav_bytes:
+                result.audio_bytes = await media_pipe.transcode(
+                    wav_bytes, ['-f', 'mp3', '-acodec', 'libmp3lame', '-q:a', '4']
                 )
-                await proc.wait()
-                
-                # Cleanup wav
-                try:
-                    os.remove(wav_path)
-                except:
-                    pass
             
-            if os.path.exists(mp3_path) and os.path.getsize(mp3_path) > 0:
+            if result.audio_bytes:
                 result.created = True
-                logger.info(f"pyttsx3 created file: {mp3_path}")
-                
-                # Send voice
-                voice_file = FSInputFile(mp3_path)
-                await bot.send_voice(
-                    chat_id=chat_id,
-                    voice=voice_file,
-                    reply_to_message_id=reply_to_message_id
-                )
-                result.sent = True
-                logger.info(f"pyttsx3 fallback succeeded for chat {chat_id}")
+                logger.info(f"pyttsx3 synthesized {len(result.audio_bytes)} bytes")
+                await self._send_buffer(bot, chat_id, result, reply_to_message_id)
+                if result.sent:
+                    logger.info(f"pyttsx3 fallback succeeded for chat {chat_id}")
             else:
-                result.error = "pyttsx3 file creation failed"
+                result.error = "pyttsx3 synthesis failed"
                 
         except ImportError:
             logger.warning("pyttsx3 not installed")
@@ -505,15 +535,10 @@ class EdgeTTSService:
             result.error = str(e)
         finally:
             # Cleanup
-            result.deleted = self.delete_temp_file(mp3_path)
-            try:
-                if os.path.exists(wav_path):
-                    os.remove(wav_path)
-            except:
-                pass
+            result.deleted = self.delete_temp_file(wav_path)
         
         return result
 
 
 # Global Edge TTS service instance
-edge_tts_service = EdgeTTSService()
+edge_tts_service = EdgeTTSService(use_cache=True)
@@ -20,6 +20,7 @@ from sqlalchemy import select, delete
 
 from app.database.session import get_session
 from app.database.models import SilentBan
+from app.services.pattern_matcher import PatternMatcher
 from app.utils import utc_now
 
 logger = logging.getLogger(__name__)
@@ -131,6 +132,7 @@ class UserScanner:
     def __init__(self):
         """Initialize UserScanner with default settings."""
         self._spam_words = set(SPAM_WORDS)
+        self._spam_matcher = PatternMatcher(self._spam_words)
         self._silent_ban_threshold = SILENT_BAN_THRESHOLD
         self._captcha_threshold = CAPTCHA_THRESHOLD
     
@@ -582,11 +584,8 @@ class UserScanner:
     
     def _has_spam_words(self, text_lower: str) -> bool:
         """Check if text contains spam words."""
-        # Check each spam word
-        for word in self._spam_words:
-            if word in text_lower:
-                return True
-        return False
+        # Single Aho-Corasick pass instead of one substring check per word
+        return self._spam_matcher.contains_any(text_lower)
     
     def _has_excessive_special_chars(self, text: str) -> bool:
         """Check if text has excessive special characters."""
@@ -620,12 +619,14 @@ class UserScanner:
     def add_spam_word(self, word: str) -> None:
         """Add a word to the spam words list."""
         self._spam_words.add(word.lower())
+        self._spam_matcher.reload(self._spam_words)
     
     def remove_spam_word(self, word: str) -> bool:
         """Remove a word from the spam words list."""
         word_lower = word.lower()
         if word_lower in self._spam_words:
             self._spam_words.discard(word_lower)
+            self._spam_matcher.reload(self._spam_words)
             return True
         return False
     
@@ -0,0 +1,240 @@
+"""
+Video Note Templates - заранее закодированные шаблоны кружочков.
+
+Раньше каждый кружочек перекодировал весь шаблон персоны libx264 только
+ради того, чтобы наложить голос (секунды CPU на ответ). Теперь шаблоны из
+``assets/video_templates`` один раз (фоном при старте или при первом
+запросе) кодируются в зацикленные сегменты нескольких длительностей
+(корзины ``video_note_buckets``) с ключевым кадром каждую секунду.
+
+Ответ собирается копированием видеопотока (``-c:v copy``) из сегмента
+ближайшей подходящей длины и быстрым кодированием звука в AAC —
+миллисекунды вместо полного x264. Кэш лежит на диске, ключ — шаблон,
+его mtime и корзина; изменённый шаблон перекодируется, старые сегменты
+удаляются при прогреве.
+
+Usage:
+    from app.services.video_note_templates import video_note_templates
+
+    video = await video_note_templates.assemble(template_path, mp3_bytes)
+"""
+
+import asyncio
+import glob
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.services import media_pipe
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram ограничивает кружочек минутой
+MAX_VIDEO_NOTE_SECONDS = 60
+# Запас к оценке длительности звука (VBR, тишина в конце)
+DURATION_MARGIN_SECONDS = 1.0
+SEGMENT_ENCODE_TIMEOUT_SECONDS = 300.0
+ASSEMBLE_TIMEOUT_SECONDS = 10.0
+
+# Битрейты MPEG Audio Layer III, кбит/с (индекс 1..14)
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG-1
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),  # MPEG-2
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),  # MPEG-2.5
+}
+_MP3_SCAN_BYTES = 64 * 1024
+
+
+def mp3_duration(data: bytes) -> Optional[float]:
+    """
+    Длительность CBR mp3 по заголовку первого фрейма (Edge TTS и gTTS
+    отдают CBR). None, если заголовок не найден.
+    """
+    offset = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size
+    end = min(len(data) - 4, offset + _MP3_SCAN_BYTES)
+    for i in range(offset, max(offset, end)):
+        if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+            continue
+        version = (data[i + 1] >> 3) & 0x03
+        layer = (data[i + 1] >> 1) & 0x03
+        bitrate_index = data[i + 2] >> 4
+        sample_rate_index = (data[i + 2] >> 2) & 0x03
+        if version == 1 or layer != 1 or not 0 < bitrate_index < 15 or sample_rate_index == 3:
+            continue
+        kbps = _MP3_BITRATES[version][bitrate_index]
+        return (len(data) - i) * 8 / (kbps * 1000)
+    return None
+
+
+def _parse_buckets(value: str) -> Tuple[int, ...]:
+    buckets = sorted({int(part) for part in value.split(",") if part.strip()})
+    buckets = [b for b in buckets if 0 < b <= MAX_VIDEO_NOTE_SECONDS]
+    return tuple(buckets) or (MAX_VIDEO_NOTE_SECONDS,)
+
+
+class VideoNoteTemplateCache:
+    """Сегменты шаблонов по корзинам длительности + сборка копированием."""
+
+    def __init__(
+        self,
+        template_dir: str = "assets/video_templates",
+        cache_dir: Optional[str] = None,
+        buckets: Optional[Sequence[int]] = None,
+    ):
+        self.template_dir = template_dir
+        self.cache_dir = cache_dir or settings.video_note_cache_dir
+        self.buckets = tuple(sorted(buckets)) if buckets else _parse_buckets(settings.video_note_buckets)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def bucket_for(self, seconds: Optional[float]) -> int:
+        """Наименьшая корзина, вмещающая звук (иначе самая длинная)."""
+        if seconds is None:
+            return self.buckets[-1]
+        needed = seconds + DURATION_MARGIN_SECONDS
+        for bucket in self.buckets:
+            if bucket >= needed:
+                return bucket
+        return self.buckets[-1]
+
+    def segment_path(self, template_path: str, bucket: int) -> str:
+        """Путь сегмента: имя шаблона + хэш (путь, mtime) + корзина."""
+        stat = os.stat(template_path)
+        digest = hashlib.sha1(f"{os.path.abspath(template_path)}:{stat.st_mtime_ns}".encode()).hexdigest()[:10]
+        name = os.path.splitext(os.path.basename(template_path))[0]
+        return os.path.join(self.cache_dir, f"{name}_{digest}_{bucket}s.mp4")
+
+    async def segment(self, template_path: str, bucket: int) -> str:
+        """Готовый сегмент (кодируется при первом обращении)."""
+        path = self.segment_path(template_path, bucket)
+        if os.path.exists(path):
+            self._hits += 1
+            return path
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            if os.path.exists(path):
+                self._hits += 1
+                return path
+            self._misses += 1
+            await self._encode_segment(template_path, bucket, path)
+        return path
+
+    async def _encode_segment(self, template_path: str, bucket: int, path: str) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial = f"{path}.part"
+        started = time.perf_counter()
+        try:
+            await media_pipe.run_ffmpeg(
+                [
+                    "-y",
+                    "-stream_loop", "-1",
+                    "-i", template_path,
+                    "-t", str(bucket),
+                    "-an",
+                    "-vf", "setsar=1",
+                    "-c:v", "libx264",
+                    "-preset", "veryfast",
+                    "-crf", "28",
+                    "-pix_fmt", "yuv420p",
+                    # Ключевой кадр каждую секунду: -shortest при копировании режет ровно
+                    "-force_key_frames", "expr:gte(t,n_forced*1)",
+                    "-movflags", "+faststart",
+                    "-f", "mp4",
+                    partial,
+                ],
+                timeout=SEGMENT_ENCODE_TIMEOUT_SECONDS,
+            )
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Video note segment {os.path.basename(path)} encoded in {elapsed:.1f}s")
+        await metrics.observe_histogram("video_note_segment_encode_seconds", elapsed)
+
+    def templates(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.template_dir, "*.mp4")))
+
+    async def warm_up(self) -> int:
+        """
+        Закодировать все шаблоны во все корзины (по одному, фоном) и
+        удалить сегменты изменённых/удалённых шаблонов.
+
+        Returns:
+            Количество закодированных сегментов
+        """
+        if not media_pipe.ffmpeg_available():
+            return 0
+        encoded = 0
+        expected = set()
+        for template_path in self.templates():
+            for bucket in self.buckets:
+                try:
+                    path = self.segment_path(template_path, bucket)
+                    expected.add(path)
+                    if not os.path.exists(path):
+                        await self.segment(template_path, bucket)
+                        encoded += 1
+                except Exception as e:
+                    logger.warning(f"Video note template warm-up failed for {template_path} ({bucket}s): {e}")
+        for stale in glob.glob(os.path.join(self.cache_dir, "*.mp4")):
+            if stale not in expected:
+                os.remove(stale)
+        logger.info(f"Video note templates ready: {len(expected)} segments ({encoded} encoded)")
+        return encoded
+
+    async def assemble(self, template_path: str, audio: bytes, duration_hint: Optional[float] = None) -> bytes:
+        """
+        Собрать кружочек: видео копируется из сегмента, звук кодируется в AAC.
+
+        Args:
+            template_path: Шаблон персоны (640x640 без звука)
+            audio: Голос (mp3)
+            duration_hint: Оценка длительности, если её нельзя взять из mp3
+
+        Returns:
+            Фрагментированный mp4
+
+        Raises:
+            media_pipe.FFmpegError: сборка не удалась
+        """
+        duration = mp3_duration(audio) or duration_hint
+        bucket = self.bucket_for(duration)
+        segment = await self.segment(template_path, bucket)
+
+        started = time.perf_counter()
+        video = await media_pipe.run_ffmpeg(
+            [
+                "-i", segment,
+                "-i", "{extra}",
+                "-map", "0:v:0",
+                "-map", "1:a:0",
+                "-c:v", "copy",
+                "-c:a", "aac",
+                "-b:a", "64k",
+                "-shortest",
+                "-t", str(MAX_VIDEO_NOTE_SECONDS),
+                "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+                "-f", "mp4",
+                "pipe:1",
+            ],
+            extra_input=audio,
+            timeout=ASSEMBLE_TIMEOUT_SECONDS,
+        )
+        await metrics.observe_histogram("video_note_assemble_seconds", time.perf_counter() - started)
+        return video
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"buckets": len(self.buckets), "hits": self._hits, "misses": self._misses}
+
+
+# Global video note template cache instance
+video_note_templates = VideoNoteTemplateCache()
@@ -7,16 +7,22 @@ Step 2: Oleg LLM комментирует описание в своём сти
 Улучшения v2:
 - Определение типа изображения (скриншот, железо, мем)
 - Специализированные промпты для разных типов
-- Кэширование описаний
+- Кэширование описаний (точный sha256 и промпт — LRU в памяти;
+  file_unique_id и перцептивный хэш в Redis — см. perceptual_cache)
+- Запросы к vision-модели идут через vision_queue: картинка уменьшается
+  до родного разрешения модели, параллельность ограничена, очередь
+  справедлива между чатами; время шагов — в метрике vision_step_seconds
 """
 
+import asyncio
 import base64
 import hashlib
 import json
 import logging
 import re
+import time
 from dataclasses import dataclass, asdict
-from typing import Optional
+from typing import Dict, Hashable, Optional
 from enum import Enum
 
 import httpx
@@ -25,6 +31,8 @@ import cachetools
 from app.config import settings
 from app.services.think_filter import think_filter
 from app.services.http_clients import get_ollama_client
+from app.services.perceptual_cache import PerceptualCache, image_dhash
+from app.services.vision_queue import VisionQueueFull, observe_step, vision_queue
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +47,24 @@ class ImageType(Enum):
     GENERAL = "general"        # Всё остальное
 
 
-# Кэш описаний изображений (по хешу)
-_description_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=100, ttl=3600)  # 1 час
+# Кэш описаний изображений по (хеш, промпт): LRU с TTL 1 час
+_description_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=256, ttl=3600)
+
+# Описания похожих картинок (репосты, перекодированные копии) — между процессами и рестартами
+_similar_descriptions = PerceptualCache("vision_description")
+
+# То же для специализированных промптов (отдельное пространство на промпт)
+_specialized_descriptions: Dict[str, PerceptualCache] = {}
+
+
+def _similar_cache(specialized_prompt: Optional[str]) -> PerceptualCache:
+    if not specialized_prompt:
+        return _similar_descriptions
+    key = hashlib.sha256(specialized_prompt.encode()).hexdigest()[:8]
+    cache = _specialized_descriptions.get(key)
+    if cache is None:
+        cache = _specialized_descriptions[key] = PerceptualCache(f"vision_description_{key}")
+    return cache
 
 
 @dataclass
@@ -209,7 +233,14 @@ Describe factually without opinions.""",
         """Возвращает специализированный промпт для типа изображения."""
         return self.SPECIALIZED_PROMPTS.get(img_type, self.VISION_DESCRIPTION_PROMPT)
     
-    async def analyze(self, image_data: bytes, user_query: Optional[str] = None) -> str:
+    async def analyze(
+        self,
+        image_data: bytes,
+        user_query: Optional[str] = None,
+        file_unique_id: Optional[str] = None,
+        chat_id: Hashable = None,
+        vision_timeout: Optional[float] = None,
+    ) -> str:
         """
         Анализирует изображение через 2-step pipeline.
         
@@ -219,15 +250,23 @@ Describe factually without opinions.""",
         Args:
             image_data: Байты изображения
             user_query: Опциональный вопрос пользователя к изображению
+            file_unique_id: Telegram file_unique_id (для кэша описаний)
+            chat_id: Чат (справедливость очереди vision-модели)
+            vision_timeout: Лимит на запрос к vision-модели (без ожидания
+                в очереди)
             
         Returns:
             Комментарий Олега к изображению
+
+        Raises:
+            asyncio.TimeoutError: vision-модель не уложилась в vision_timeout
         """
-        import time
         start_time = time.time()
         
         # Step 1: Получаем первичное описание для определения типа
-        description = await self._get_image_description(image_data)
+        description = await self._get_image_description(
+            image_data, file_unique_id=file_unique_id, chat_id=chat_id, timeout=vision_timeout
+        )
         
         if not description:
             return self.ERROR_VISION_UNAVAILABLE
@@ -239,7 +278,10 @@ Describe factually without opinions.""",
         # Если тип специфичный — получаем более детальное описание
         if img_type != ImageType.GENERAL and img_type in self.SPECIALIZED_PROMPTS:
             specialized_prompt = self._get_specialized_prompt(img_type)
-            detailed_description = await self._get_image_description(image_data, specialized_prompt)
+            detailed_description = await self._get_image_description(
+                image_data, specialized_prompt, file_unique_id=file_unique_id, chat_id=chat_id,
+                timeout=vision_timeout,
+            )
             if detailed_description and len(detailed_description) > len(description):
                 description = detailed_description
                 logger.info(f"Vision: Got specialized description ({len(description)} chars)")
@@ -294,23 +336,65 @@ Describe factually without opinions.""",
         
         return final_response, state
     
-    async def _get_image_description(self, image_data: bytes, specialized_prompt: Optional[str] = None) -> Optional[str]:
+    async def _get_image_description(
+        self,
+        image_data: bytes,
+        specialized_prompt: Optional[str] = None,
+        file_unique_id: Optional[str] = None,
+        chat_id: Hashable = None,
+        timeout: Optional[float] = None,
+    ) -> Optional[str]:
         """
         Получает техническое описание от Vision модели.
         
         Args:
             image_data: Байты изображения
             specialized_prompt: Специализированный промпт (опционально)
+            file_unique_id: Telegram file_unique_id (опционально, для кэша)
+            chat_id: Чат (справедливость очереди vision-модели)
+            timeout: Лимит на запрос к модели, см. VisionQueue.run
             
         Returns:
             Описание изображения или None при ошибке
         """
+        # Используем специализированный промпт если есть
+        prompt = specialized_prompt or self.VISION_DESCRIPTION_PROMPT
+        
         # Проверяем кэш
         image_hash = hashlib.sha256(image_data).hexdigest()[:16]
-        if image_hash in _description_cache:
+        cache_key = (image_hash, prompt)
+        if cache_key in _description_cache:
             logger.info(f"Vision Step 1: Cache hit for {image_hash}")
-            return _description_cache[image_hash]
+            return _description_cache[cache_key]
+        
+        # Та же картинка по file_unique_id или похожая по dHash
+        similar_cache = _similar_cache(specialized_prompt)
+        phash = await asyncio.to_thread(image_dhash, image_data)
+        similar = await similar_cache.get(file_unique_id=file_unique_id, hashes=[phash])
+        if similar:
+            logger.info(f"Vision Step 1: Similar image cache hit for {image_hash}")
+            _description_cache[cache_key] = similar
+            return similar
+        
+        # Уменьшаем до разрешения модели вне event loop и ждём слот в очереди
+        prepared = await vision_queue.prepare(image_data)
+        try:
+            content = await vision_queue.run(
+                lambda: self._request_description(prepared, prompt), chat_id=chat_id, timeout=timeout
+            )
+        except VisionQueueFull:
+            logger.warning(f"Vision Step 1: Queue is full (chat {chat_id}), skipping image")
+            return None
         
+        if content:
+            # Сохраняем в кэш
+            _description_cache[cache_key] = content
+            await similar_cache.put(content, file_unique_id=file_unique_id, hashes=[phash])
+        return content
+    
+    async def _request_description(self, image_data: bytes, prompt: str) -> Optional[str]:
+        """Запрос описания к Vision модели (выполняется в слоте vision_queue)."""
+        started = time.perf_counter()
         try:
             image_base64 = base64.b64encode(image_data).decode('utf-8')
             
@@ -318,9 +402,6 @@ Describe factually without opinions.""",
             from app.services.ollama_client import get_active_model
             vision_model = await get_active_model("vision")
             
-            # Используем специализированный промпт если есть
-            prompt = specialized_prompt or self.VISION_DESCRIPTION_PROMPT
-            
             # Формат для Ollama vision API
             # Некоторые модели требуют images на уровне сообщения, другие — отдельно
             payload = {
@@ -384,8 +465,6 @@ Describe factually without opinions.""",
             
             if content and content != think_filter.fallback_message:
                 logger.info(f"Vision Step 1: Got description ({len(content)} chars)")
-                # Сохраняем в кэш
-                _description_cache[image_hash] = content
                 return content
             
             # Если после фильтрации пусто — возможно весь ответ был в think-тегах
@@ -410,6 +489,8 @@ Describe factually without opinions.""",
         except Exception as e:
             logger.error(f"Vision Step 1: Error getting description: {e}")
             return None
+        finally:
+            await observe_step("describe", time.perf_counter() - started)
     
     async def _generate_oleg_comment(self, description: str, user_query: Optional[str] = None, img_type: ImageType = ImageType.GENERAL) -> Optional[str]:
         """
@@ -423,6 +504,7 @@ Describe factually without opinions.""",
         Returns:
             Комментарий в стиле персоны или None при ошибке
         """
+        started = time.perf_counter()
         try:
             # Проверяем нужен ли веб-поиск для фактчекинга
             from app.services.web_search_trigger import should_trigger_web_search
@@ -564,6 +646,8 @@ Describe factually without opinions.""",
         except Exception as e:
             logger.error(f"Vision Step 2: Error generating comment: {e}")
             return None
+        finally:
+            await observe_step("comment", time.perf_counter() - started)
 
 
 # Глобальный экземпляр pipeline для удобства использования
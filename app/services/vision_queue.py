@@ -0,0 +1,203 @@
+"""
+Vision Queue - очередь запросов к vision-модели.
+
+VisionPipeline отправлял фото в полном разрешении (base64) без
+ограничения размера и параллельности: пара альбомов подряд забивала
+vision-модель, а base64 снимка с телефона весил мегабайты. Теперь
+Step 1 (описание картинки) идёт через эту очередь:
+
+- картинка уменьшается до ``vision_image_max_side`` (родное разрешение
+  модели) и перекодируется в JPEG вне event loop;
+- к модели одновременно не больше ``vision_concurrency`` запросов;
+- ожидающие запросы — в справедливой очереди (app/services/fair_queue.py):
+  по кругу между чатами, ``vision_queue_size`` всего и
+  ``vision_queue_per_chat`` на чат, лишние отклоняются (VisionQueueFull);
+- ``timeout`` в ``run`` ограничивает только выполнение запроса у модели:
+  отсчёт идёт с момента, когда воркер взял задачу, ожидание в очереди
+  не считается;
+- метрики: глубина очереди и время каждого шага
+  (``vision_step_seconds{step=prepare|queue|describe|comment}``).
+
+Usage:
+    from app.services.vision_queue import vision_queue
+
+    image = await vision_queue.prepare(image_bytes)
+    description = await vision_queue.run(lambda: request(image), chat_id=chat_id)
+"""
+
+import asyncio
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.services.fair_queue import FairQueue, QueueFull
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 85
+
+# Форматы, которые модель принимает как есть (если картинка уже маленькая)
+PASSTHROUGH_FORMATS = ("JPEG", "PNG")
+
+
+class VisionQueueFull(QueueFull):
+    """Очередь vision-модели переполнена (общая или чата)."""
+
+
+class _VisionFairQueue(FairQueue):
+    full_error = VisionQueueFull
+
+
+def prepare_image(image_data: bytes, max_side: int, quality: int = JPEG_QUALITY) -> bytes:
+    """
+    Уменьшает картинку до ``max_side`` по большей стороне и кодирует в JPEG.
+
+    Маленькие JPEG/PNG возвращаются как есть; не картинка — тоже как есть
+    (пусть решает модель).
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            if image.format in PASSTHROUGH_FORMATS and max(image.size) <= max_side:
+                return image_data
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                # Прозрачность (стикеры) — на белый фон, иначе JPEG даст чёрный
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                image = image.convert("RGB")
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality)
+            return buffer.getvalue()
+    except Exception as e:
+        logger.debug(f"Vision: cannot re-encode image, sending original: {e}")
+        return image_data
+
+
+async def observe_step(step: str, seconds: float) -> None:
+    """Время одного шага vision-запроса."""
+    await metrics.observe_histogram("vision_step_seconds", seconds, labels={"step": step})
+
+
+@dataclass
+class _Job:
+    factory: Callable[[], Awaitable[Any]]
+    future: asyncio.Future = field(repr=False)
+    timeout: Optional[float] = None
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class VisionQueue:
+    """Подготовка картинок и ограниченная справедливая очередь запросов к модели."""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        per_chat: Optional[int] = None,
+        max_side: Optional[int] = None,
+    ):
+        self.concurrency = concurrency or settings.vision_concurrency
+        self.queue_size = queue_size or settings.vision_queue_size
+        self.per_chat = per_chat or settings.vision_queue_per_chat
+        self.max_side = max_side or settings.vision_image_max_side
+        self.queue: Optional[_VisionFairQueue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        # Воркеры и очередь привязаны к event loop: на новом цикле — заново
+        self._loop = loop
+        self.queue = _VisionFairQueue(self.queue_size, self.per_chat)
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def prepare(self, image_data: bytes) -> bytes:
+        """Уменьшить и перекодировать картинку вне event loop."""
+        started = time.perf_counter()
+        prepared = await asyncio.to_thread(prepare_image, image_data, self.max_side)
+        await observe_step("prepare", time.perf_counter() - started)
+        if len(prepared) < len(image_data):
+            logger.debug(f"Vision: image {len(image_data)} -> {len(prepared)} bytes")
+        return prepared
+
+    async def run(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        chat_id: Hashable = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Выполнить запрос к модели, когда освободится слот.
+
+        Args:
+            factory: Функция, возвращающая корутину запроса
+            chat_id: Ключ справедливости (чат)
+            timeout: Лимит на выполнение запроса (без ожидания в очереди)
+
+        Returns:
+            Результат корутины
+
+        Raises:
+            VisionQueueFull: очередь переполнена
+            asyncio.TimeoutError: запрос выполнялся дольше ``timeout``
+        """
+        self._ensure_started()
+        job = _Job(factory=factory, future=self._loop.create_future(), timeout=timeout)
+        try:
+            self.queue.put_nowait(chat_id, job)
+        except VisionQueueFull:
+            await metrics.increment_counter("vision_requests_total", labels={"status": "rejected"})
+            raise
+        await metrics.set_gauge("vision_queue_depth", self.queue.qsize())
+        return await job.future
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            await metrics.set_gauge("vision_queue_depth", self.queue.qsize())
+            if job.future.cancelled():
+                continue
+            await observe_step("queue", time.monotonic() - job.enqueued)
+            try:
+                result = await asyncio.wait_for(job.factory(), timeout=job.timeout)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except asyncio.TimeoutError as e:
+                await metrics.increment_counter("vision_requests_total", labels={"status": "timeout"})
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            except Exception as e:
+                await metrics.increment_counter("vision_requests_total", labels={"status": "error"})
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            await metrics.increment_counter("vision_requests_total", labels={"status": "ok"})
+            if not job.future.done():
+                job.future.set_result(result)
+
+
+# Global vision queue instance
+vision_queue = VisionQueue()
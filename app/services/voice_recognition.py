@@ -1,15 +1,42 @@
-"""Сервис распознавания голосовых сообщений (STT) на базе faster-whisper."""
+"""
+Сервис распознавания голосовых сообщений (STT) на базе faster-whisper.
 
+Декодирование идёт вне event loop: модель принадлежит движку
+TranscriptionEngine, который выполняет задачи в пуле потоков
+(CTranslate2 отпускает GIL на время декодирования). Голосовое на минуту
+больше не замораживает ответы во всех чатах.
+
+- очередь задач ограничена и справедлива между чатами: задачи берутся
+  по кругу из очередей чатов, у одного чата не больше
+  ``whisper_queue_per_chat`` ожидающих;
+- аудио потоком идёт из Telegram в ffmpeg (app/services/media_pipe.py)
+  и выходит 16 кГц mono PCM (без временных файлов и блокирующего
+  subprocess.run);
+- тишина отрезается VAD (Silero, встроен в faster-whisper), beam size
+  настраивается, для длинных записей — батчевый пайплайн;
+- метрики: глубина очереди, real-time factor, длительность аудио.
+"""
+
+import asyncio
+import io
 import logging
 import os
-import tempfile
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Optional, Union
+
+from app.config import settings
+from app.services import media_pipe
+from app.services.fair_queue import FairQueue as BaseFairQueue, QueueFull
+from app.services.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 # Флаг доступности faster-whisper
 _whisper_available = False
 _whisper_model = None
+_batched_pipeline = None
 
 try:
     from faster_whisper import WhisperModel
@@ -18,28 +45,181 @@ try:
 except ImportError:
     logger.warning("faster-whisper не установлен. Распознавание голосовых недоступно. Установи: pip install faster-whisper")
 
+try:
+    import numpy as np
+except ImportError:  # numpy приходит вместе с faster-whisper
+    np = None
+
+SAMPLE_RATE = media_pipe.SAMPLE_RATE
+
+
+class TranscriptionQueueFull(QueueFull):
+    """Очередь распознавания переполнена (общая или чата)."""
+
+
+class FairQueue(BaseFairQueue):
+    """Справедливая очередь распознавания (см. app/services/fair_queue.py)."""
+
+    full_error = TranscriptionQueueFull
+
+
+@dataclass
+class _Job:
+    audio: Any  # np.ndarray (PCM float32) или BytesIO/путь для декодирования моделью
+    audio_seconds: Optional[float]
+    future: asyncio.Future = field(repr=False)
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+def _decode(audio: Any, beam_size: int, vad_filter: bool, batch_size: int):
+    """Распознавание в потоке пула. Возвращает (текст, длительность аудио)."""
+    options = dict(language="ru", beam_size=beam_size, vad_filter=vad_filter)
+    if vad_filter:
+        options["vad_parameters"] = {"min_silence_duration_ms": 500}
+    if batch_size > 1 and _batched_pipeline is not None:
+        segments, info = _batched_pipeline.transcribe(audio, batch_size=batch_size, **options)
+    else:
+        segments, info = _whisper_model.transcribe(audio, **options)
+    # segments — генератор: декодирование происходит здесь, в потоке пула
+    text = " ".join(segment.text for segment in segments).strip()
+    return text, getattr(info, "duration", None)
+
+
+class TranscriptionEngine:
+    """Пул распознавания: справедливая очередь и воркеры вне event loop."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        per_chat: Optional[int] = None,
+    ):
+        self.workers = workers or settings.whisper_workers
+        self.queue = FairQueue(
+            queue_size or settings.whisper_queue_size,
+            per_chat or settings.whisper_queue_per_chat,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: list = []
+
+    def _ensure_started(self) -> None:
+        if self._tasks:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="whisper")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def transcribe(self, audio: Any, chat_id: Hashable = None) -> Optional[str]:
+        """
+        Поставить аудио в очередь и дождаться текста.
+
+        Args:
+            audio: PCM 16 кГц float32 (numpy), BytesIO или путь к файлу
+            chat_id: Ключ справедливости (чат)
+
+        Returns:
+            Текст или None (пустой результат)
+
+        Raises:
+            TranscriptionQueueFull: очередь переполнена
+        """
+        self._ensure_started()
+        audio_seconds = len(audio) / SAMPLE_RATE if np is not None and isinstance(audio, np.ndarray) else None
+        job = _Job(audio=audio, audio_seconds=audio_seconds, future=asyncio.get_running_loop().create_future())
+        self.queue.put_nowait(chat_id, job)
+        await metrics.set_gauge("whisper_queue_depth", self.queue.qsize())
+        return await job.future
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            await metrics.set_gauge("whisper_queue_depth", self.queue.qsize())
+            if job.future.cancelled():
+                continue
+            await metrics.observe_histogram("whisper_queue_wait_seconds", time.monotonic() - job.enqueued)
+            started = time.perf_counter()
+            try:
+                text, duration = await loop.run_in_executor(
+                    self._executor, _decode, job.audio,
+                    settings.whisper_beam_size, settings.whisper_vad_filter, settings.whisper_batch_size,
+                )
+            except Exception as e:
+                await metrics.increment_counter("whisper_jobs_total", labels={"status": "error"})
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+
+            elapsed = time.perf_counter() - started
+            audio_seconds = duration or job.audio_seconds
+            if audio_seconds:
+                await metrics.observe_histogram("whisper_audio_seconds", audio_seconds)
+                await metrics.observe_histogram("whisper_real_time_factor", elapsed / audio_seconds)
+            await metrics.increment_counter("whisper_jobs_total", labels={"status": "ok"})
+            if not job.future.done():
+                job.future.set_result(text or None)
+
+
+_engine: Optional[TranscriptionEngine] = None
+
+
+def get_engine() -> TranscriptionEngine:
+    global _engine
+    if _engine is None:
+        _engine = TranscriptionEngine()
+    return _engine
+
+
+async def shutdown_whisper() -> None:
+    """Остановить воркеры распознавания (при завершении бота)."""
+    if _engine is not None:
+        await _engine.stop()
+
+
+def _load_model(model_name: str):
+    global _whisper_model, _batched_pipeline
+    # Параллельные вызовы из потоков пула: num_workers экземпляров декодера
+    _whisper_model = WhisperModel(
+        model_name, device="cpu", compute_type="int8", num_workers=settings.whisper_workers
+    )
+    if settings.whisper_batch_size > 1:
+        try:
+            from faster_whisper import BatchedInferencePipeline
+            _batched_pipeline = BatchedInferencePipeline(model=_whisper_model)
+        except ImportError:
+            logger.warning("BatchedInferencePipeline недоступен в этой версии faster-whisper, батчинг выключен")
+
 
 async def init_whisper():
     """Инициализирует модель Whisper."""
-    global _whisper_model
-    
     if not _whisper_available:
         logger.warning("faster-whisper недоступен, пропускаем инициализацию")
         return False
-    
+
     try:
-        from app.config import settings
         model_name = settings.whisper_model
-        
+
         # Устанавливаем зеркало HuggingFace если указано (для РФ)
         hf_mirror = getattr(settings, 'huggingface_mirror', None) or os.environ.get('HF_ENDPOINT')
         if hf_mirror:
             os.environ['HF_ENDPOINT'] = hf_mirror
             logger.info(f"Используется зеркало HuggingFace: {hf_mirror}")
-        
+
         logger.info(f"Загрузка модели faster-whisper: {model_name}...")
-        # CPU mode, int8 для скорости
-        _whisper_model = WhisperModel(model_name, device="cpu", compute_type="int8")
+        # CPU mode, int8 для скорости; загрузка (и скачивание) — вне event loop
+        await asyncio.get_running_loop().run_in_executor(None, _load_model, model_name)
         logger.info(f"Модель faster-whisper '{model_name}' загружена")
         return True
     except Exception as e:
@@ -53,175 +233,128 @@ def is_available() -> bool:
     return _whisper_available and _whisper_model is not None
 
 
-async def transcribe_voice(file_path: str) -> Optional[str]:
+async def _prepare_audio(source: media_pipe.MediaSource, seekable: bool = False) -> Any:
+    """
+    Поток байтов -> PCM float32 через ffmpeg pipe (загрузка и декодирование
+    перекрываются). Без ffmpeg/numpy — BytesIO, который декодирует модель.
+
+    ``seekable=True`` — для mp4, где moov-атом может быть в конце файла.
+    """
+    if np is not None and media_pipe.ffmpeg_available():
+        try:
+            pcm = await media_pipe.to_pcm(source, seekable=seekable)
+            return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        except media_pipe.FFmpegError as e:
+            logger.error(f"FFmpeg ошибка при извлечении аудио: {e}")
+            return None
+    return io.BytesIO(await media_pipe.read_all(source))
+
+
+async def _transcribe_source(
+    source: media_pipe.MediaSource,
+    chat_id: Hashable = None,
+    seekable: bool = False,
+) -> Optional[str]:
+    audio = await _prepare_audio(source, seekable=seekable)
+    if audio is None:
+        return None
+    try:
+        text = await get_engine().transcribe(audio, chat_id=chat_id)
+    except TranscriptionQueueFull:
+        logger.warning(f"Очередь распознавания переполнена (чат {chat_id}), голосовое пропущено")
+        await metrics.increment_counter("whisper_jobs_total", labels={"status": "rejected"})
+        return None
+    if text:
+        logger.info(f"Распознано: {text[:100]}...")
+    else:
+        logger.warning("Пустой результат распознавания")
+    return text
+
+
+async def transcribe_voice(file_path: Union[str, bytes], chat_id: Hashable = None) -> Optional[str]:
     """
     Распознаёт речь из аудиофайла.
-    
+
     Args:
-        file_path: Путь к аудиофайлу (ogg, mp3, wav и т.д.)
-        
+        file_path: Путь к аудиофайлу (ogg, mp3, wav и т.д.) или его содержимое
+        chat_id: Чат (для справедливой очереди)
+
     Returns:
         Распознанный текст или None при ошибке
     """
     if not is_available():
         logger.warning("faster-whisper недоступен для распознавания")
         return None
-    
-    if not os.path.exists(file_path):
-        logger.error(f"Файл не найден: {file_path}")
-        return None
-    
+
     try:
-        logger.info(f"Начинаю распознавание: {file_path}")
-        
-        # faster-whisper API
-        segments, info = _whisper_model.transcribe(
-            file_path,
-            language="ru",
-            beam_size=5
-        )
-        
-        # Собираем текст из сегментов
-        text = " ".join(segment.text for segment in segments).strip()
-        
-        if text:
-            logger.info(f"Распознано: {text[:100]}...")
+        if isinstance(file_path, bytes):
+            data = file_path
         else:
-            logger.warning("Пустой результат распознавания")
-            
-        return text if text else None
-        
+            if not os.path.exists(file_path):
+                logger.error(f"Файл не найден: {file_path}")
+                return None
+            data = await asyncio.to_thread(_read_file, file_path)
+        logger.info(f"Начинаю распознавание ({len(data)} байт)")
+        return await _transcribe_source(data, chat_id)
     except Exception as e:
         logger.error(f"Ошибка при распознавании голоса: {e}")
         return None
 
 
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
 
-async def transcribe_voice_message(bot, file_id: str) -> Optional[str]:
+
+async def transcribe_voice_message(bot, file_id: str, chat_id: Hashable = None) -> Optional[str]:
     """
-    Скачивает и распознаёт голосовое сообщение из Telegram.
-    
+    Распознаёт голосовое сообщение из Telegram: загрузка идёт потоком
+    прямо в ffmpeg, без файлов на диске.
+
     Args:
         bot: Экземпляр бота
         file_id: ID файла в Telegram
-        
+        chat_id: Чат (для справедливой очереди)
+
     Returns:
         Распознанный текст или None
     """
     if not is_available():
         return None
-    
-    temp_file = None
-    temp_path = None
+
     try:
-        # Получаем информацию о файле
-        file_info = await bot.get_file(file_id)
-        
-        # Создаём временный файл
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".ogg")
-        temp_path = temp_file.name
-        temp_file.close()
-        
-        # Скачиваем файл
-        await bot.download_file(file_info.file_path, destination=temp_path)
-        logger.info(f"Голосовое скачано: {temp_path}")
-        
-        # Распознаём
-        text = await transcribe_voice(temp_path)
-        
-        return text
-        
+        return await _transcribe_source(media_pipe.stream_telegram_file(bot, file_id), chat_id)
     except Exception as e:
         logger.error(f"Ошибка при обработке голосового сообщения: {e}")
         return None
-        
-    finally:
-        # Удаляем временный файл
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-                logger.debug(f"Временный файл удалён: {temp_path}")
-            except Exception as e:
-                logger.warning(f"Не удалось удалить временный файл: {e}")
 
 
-async def transcribe_video_note(bot, file_id: str) -> Optional[str]:
+async def transcribe_video_note(
+    bot,
+    file_id: str,
+    chat_id: Hashable = None,
+    data: Optional[bytes] = None,
+) -> Optional[str]:
     """
-    Скачивает видеосообщение (кружочек), извлекает аудио и распознаёт речь.
-    
+    Распознаёт речь из видеосообщения (кружочка): ffmpeg берёт звуковую
+    дорожку из mp4 в памяти (memfd). Не из pipe: у mp4 без faststart
+    moov-атом лежит после mdat, и демуксеру нужен seek.
+
     Args:
         bot: Экземпляр бота
         file_id: ID файла в Telegram
-        
+        chat_id: Чат (для справедливой очереди)
+        data: Уже скачанное видео (чтобы не качать второй раз)
+
     Returns:
         Распознанный текст или None
     """
-    import subprocess
-    
     if not is_available():
         return None
-    
-    temp_video = None
-    temp_audio = None
-    video_path = None
-    audio_path = None
+
     try:
-        # Получаем информацию о файле
-        file_info = await bot.get_file(file_id)
-        
-        # Создаём временный файл для видео
-        temp_video = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-        video_path = temp_video.name
-        temp_video.close()
-        
-        # Скачиваем видео
-        await bot.download_file(file_info.file_path, destination=video_path)
-        logger.info(f"Видеосообщение скачано: {video_path}")
-        
-        # Создаём временный файл для аудио
-        temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        audio_path = temp_audio.name
-        temp_audio.close()
-        
-        # Извлекаем аудио с помощью ffmpeg
-        cmd = [
-            "ffmpeg", "-y", "-i", video_path,
-            "-vn",  # Без видео
-            "-acodec", "pcm_s16le",  # WAV формат
-            "-ar", "16000",  # 16kHz для Whisper
-            "-ac", "1",  # Моно
-            audio_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode != 0:
-            logger.error(f"FFmpeg ошибка: {result.stderr}")
-            return None
-        
-        logger.info(f"Аудио извлечено: {audio_path}")
-        
-        # Распознаём
-        text = await transcribe_voice(audio_path)
-        
-        return text
-        
-    except subprocess.TimeoutExpired:
-        logger.error("FFmpeg таймаут при извлечении аудио")
-        return None
-    except FileNotFoundError:
-        logger.error("FFmpeg не найден. Установи ffmpeg для распознавания видеосообщений.")
-        return None
+        source = data if data is not None else media_pipe.stream_telegram_file(bot, file_id)
+        return await _transcribe_source(source, chat_id, seekable=True)
     except Exception as e:
         logger.error(f"Ошибка при обработке видеосообщения: {e}")
         return None
-        
-    finally:
-        # Удаляем временные файлы
-        for path in [video_path, audio_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.unlink(path)
-                    logger.debug(f"Временный файл удалён: {path}")
-                except Exception as e:
-                    logger.warning(f"Не удалось удалить временный файл: {e}")
@@ -16,7 +16,7 @@ from typing import Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.session import get_session
+from app.database.unit_of_work import session_scope
 from app.database.models import User, Wallet
 
 logger = logging.getLogger(__name__)
@@ -46,8 +46,7 @@ async def get_or_create_user(tg_user_id: int, username: Optional[str] = None) ->
     Returns:
         User object
     """
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         result = await session.execute(
             select(User).where(User.tg_user_id == tg_user_id)
         )
@@ -77,8 +76,7 @@ async def get_balance(tg_user_id: int) -> int:
     Returns:
         Current balance (creates wallet with default balance if not exists)
     """
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         # Get user
         result = await session.execute(
             select(User).where(User.tg_user_id == tg_user_id)
@@ -130,8 +128,7 @@ async def add_balance(tg_user_id: int, amount: int, reason: str = "") -> Balance
             error_code="INVALID_AMOUNT"
         )
     
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         # Get or create user
         result = await session.execute(
             select(User).where(User.tg_user_id == tg_user_id)
@@ -194,8 +191,7 @@ async def deduct_balance(tg_user_id: int, amount: int, reason: str = "") -> Bala
             error_code="INSUFFICIENT_FUNDS"
         )
     
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         result = await session.execute(
             select(User).where(User.tg_user_id == tg_user_id)
         )
@@ -251,8 +247,7 @@ async def set_balance(tg_user_id: int, amount: int, reason: str = "") -> Balance
             error_code="INVALID_AMOUNT"
         )
     
-    async_session = get_session()
-    async with async_session() as session:
+    async with session_scope() as session:
         result = await session.execute(
             select(User).where(User.tg_user_id == tg_user_id)
         )
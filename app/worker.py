@@ -253,7 +253,7 @@ async def gif_analysis_task(
         gif_data = base64.b64decode(gif_data_base64)
         
         # Analyze GIF
-        result = await gif_patrol_service.analyze_gif(gif_data)
+        result = await gif_patrol_service.analyze_gif(gif_data, chat_id=chat_id)
         
         # Determine action based on result
         if result.is_safe:
@@ -452,6 +452,11 @@ async def shutdown(ctx: Dict[str, Any]) -> None:
     Clean up resources.
     """
     logger.info("Arq worker shutting down...")
+    
+    # Quote renders run in the render process pool
+    from app.services.render_pool import render_pool
+    render_pool.stop()
+    
     logger.info("Arq worker shutdown complete")
 
 
@@ -788,7 +793,6 @@ async def handle_tts_completion(bot, result: Dict[str, Any]) -> bool:
     """
     import base64
     from io import BytesIO
-    from aiogram.types import BufferedInputFile
     
     chat_id = result.get("chat_id")
     reply_to = result.get("reply_to")
@@ -821,12 +825,12 @@ async def handle_tts_completion(bot, result: Dict[str, Any]) -> bool:
             return False
         
         audio_data = base64.b64decode(audio_base64)
-        audio_file = BufferedInputFile(audio_data, filename="voice.ogg")
         
-        # Send voice message
-        await bot.send_voice(
+        # Send voice message (repeated audio goes by file_id)
+        from app.services.media_registry import media_registry
+        await media_registry.send(
+            bot.send_voice, "voice", audio_data, "voice.ogg",
             chat_id=chat_id,
-            voice=audio_file,
             reply_to_message_id=reply_to,
         )
         
@@ -852,7 +856,6 @@ async def handle_quote_completion(bot, result: Dict[str, Any]) -> bool:
         True if notification sent successfully
     """
     import base64
-    from aiogram.types import BufferedInputFile
     
     chat_id = result.get("chat_id")
     reply_to = result.get("reply_to")
@@ -881,19 +884,19 @@ async def handle_quote_completion(bot, result: Dict[str, Any]) -> bool:
         
         image_data = base64.b64decode(image_base64)
         image_format = result.get("format", "webp")
-        image_file = BufferedInputFile(image_data, filename=f"quote.{image_format}")
         
-        # Send as sticker (WebP) or photo
+        # Send as sticker (WebP) or photo; a repeated quote goes by file_id
+        from app.services.media_registry import media_registry
         if image_format == "webp":
-            await bot.send_sticker(
+            await media_registry.send(
+                bot.send_sticker, "sticker", image_data, f"quote.{image_format}",
                 chat_id=chat_id,
-                sticker=image_file,
                 reply_to_message_id=reply_to,
             )
         else:
-            await bot.send_photo(
+            await media_registry.send(
+                bot.send_photo, "photo", image_data, f"quote.{image_format}",
                 chat_id=chat_id,
-                photo=image_file,
                 reply_to_message_id=reply_to,
             )
         
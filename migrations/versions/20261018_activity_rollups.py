@@ -0,0 +1,58 @@
+"""Add hourly chat activity and keyword rollup tables
+
+Revision ID: 20261018_rollups
+Revises: 20261018_msg_indexes
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261018_rollups'
+down_revision: Union[str, None] = '20261018_msg_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Почасовые счётчики (chat_id, час, user_id); заполняются ActivityRollupService
+    op.create_table('chat_activity_rollups',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('text_count', sa.Integer(), nullable=False),
+        sa.Column('link_count', sa.Integer(), nullable=False),
+        sa.Column('toxic_count', sa.Integer(), nullable=False),
+        sa.Column('positive_count', sa.Integer(), nullable=False),
+        sa.Column('negative_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chat_id', 'hour', 'user_id', name='uq_rollup_chat_hour_user')
+    )
+    op.create_index(
+        'ix_rollups_chat_user_hour', 'chat_activity_rollups',
+        ['chat_id', 'user_id', 'hour'], unique=False
+    )
+
+    # Почасовые упоминания ключевых слов (горячие темы)
+    op.create_table('chat_keyword_rollups',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('keyword', sa.String(length=64), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chat_id', 'hour', 'keyword', name='uq_keyword_rollup_chat_hour_keyword')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('chat_keyword_rollups')
+    op.drop_index('ix_rollups_chat_user_hour', table_name='chat_activity_rollups')
+    op.drop_table('chat_activity_rollups')
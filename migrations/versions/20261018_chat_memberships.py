@@ -0,0 +1,46 @@
+"""Per-chat membership status maintained from chat_member updates
+
+Revision ID: 20261018_memberships
+Revises: 20261018_msg_retention
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261018_memberships'
+down_revision: Union[str, None] = '20261018_msg_retention'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'chat_memberships',
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='member'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('checked_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('chat_id', 'user_id'),
+    )
+    op.create_index('ix_chat_memberships_checked_at', 'chat_memberships', ['checked_at'])
+    op.create_index('ix_chat_memberships_user_id', 'chat_memberships', ['user_id'])
+
+    # Стартовый набор: все, кто писал в группах; сверка пройдёт по ним
+    # постепенно (checked_at = NULL идут первыми)
+    op.execute(
+        "INSERT INTO chat_memberships (chat_id, user_id, status, updated_at) "
+        "SELECT DISTINCT chat_id, user_id, 'member', CURRENT_TIMESTAMP "
+        "FROM messages WHERE chat_id < 0 AND user_id IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_memberships_user_id', table_name='chat_memberships')
+    op.drop_index('ix_chat_memberships_checked_at', table_name='chat_memberships')
+    op.drop_table('chat_memberships')
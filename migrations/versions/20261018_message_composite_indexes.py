@@ -0,0 +1,41 @@
+"""Composite indexes for messages hot paths
+
+Revision ID: 20261018_msg_indexes
+Revises: 20260128_mafia_game_v950
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261018_msg_indexes'
+down_revision: Union[str, None] = '20260128_mafia_game_v950'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Последние сообщения чата: WHERE chat_id = ? ORDER BY created_at DESC LIMIT N
+    op.create_index('ix_messages_chat_created', 'messages', ['chat_id', 'created_at'], unique=False)
+    # То же внутри топика форума
+    op.create_index(
+        'ix_messages_chat_topic_created', 'messages',
+        ['chat_id', 'topic_id', 'created_at'], unique=False
+    )
+    # /whois: COUNT и MIN(created_at) по (chat_id, user_id) только по индексу
+    op.create_index(
+        'ix_messages_chat_user_created', 'messages',
+        ['chat_id', 'user_id', 'created_at'], unique=False
+    )
+    # Префикс ix_messages_chat_created полностью заменяет одиночный индекс
+    op.drop_index('ix_messages_chat_id', table_name='messages')
+
+
+def downgrade() -> None:
+    op.create_index('ix_messages_chat_id', 'messages', ['chat_id'], unique=False)
+    op.drop_index('ix_messages_chat_user_created', table_name='messages')
+    op.drop_index('ix_messages_chat_topic_created', table_name='messages')
+    op.drop_index('ix_messages_chat_created', table_name='messages')
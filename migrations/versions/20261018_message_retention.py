@@ -0,0 +1,107 @@
+"""Per-chat message retention and monthly partitions for messages (PostgreSQL)
+
+Revision ID: 20261018_msg_retention
+Revises: 20261018_rollups
+Create Date: 2026-10-18
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261018_msg_retention'
+down_revision: Union[str, None] = '20261018_rollups'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Партиции создаются на столько месяцев вперёд (дальше — MessageRetentionService)
+MONTHS_AHEAD = 2
+
+COLUMNS = "id, chat_id, message_id, user_id, username, text, has_link, links, topic_id, created_at"
+
+INDEXES = [
+    ('ix_messages_user_id', ['user_id']),
+    ('ix_messages_topic_id', ['topic_id']),
+    ('ix_messages_created_at', ['created_at']),
+    ('ix_messages_chat_created', ['chat_id', 'created_at']),
+    ('ix_messages_chat_topic_created', ['chat_id', 'topic_id', 'created_at']),
+    ('ix_messages_chat_user_created', ['chat_id', 'user_id', 'created_at']),
+]
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'messages', columns, unique=False)
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('message_retention_days', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite: одна горячая таблица, ограниченная удалением по сроку + VACUUM
+        return
+
+    # PostgreSQL: messages -> таблица с месячными партициями по created_at,
+    # чтобы истёкшие месяцы удалялись DROP'ом партиции, а не DELETE
+    op.execute("ALTER TABLE messages RENAME TO messages_legacy")
+    op.execute(
+        "CREATE TABLE messages (LIKE messages_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE messages ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE messages ADD PRIMARY KEY (id, created_at)")
+    # Последовательность id переходит к новой таблице (иначе удалится вместе со старой)
+    op.execute("ALTER SEQUENCE IF EXISTS messages_id_seq OWNED BY messages.id")
+
+    now = datetime.utcnow()
+    oldest, newest = bind.execute(
+        sa.text("SELECT min(created_at), max(created_at) FROM messages_legacy")
+    ).first()
+    month = _month_start(oldest or now)
+    last = _month_start(max(newest or now, now))
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f"CREATE TABLE messages_p{month:%Y%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.execute(
+        f"INSERT INTO messages ({COLUMNS}) "
+        f"SELECT {COLUMNS.replace('created_at', 'COALESCE(created_at, now())')} FROM messages_legacy"
+    )
+    op.execute("DROP TABLE messages_legacy")
+    # Индексы на родителе создаются после загрузки и наследуются партициями
+    _create_indexes()
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE TABLE messages_plain (LIKE messages INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO messages_plain ({COLUMNS}) SELECT {COLUMNS} FROM messages")
+        op.execute("ALTER SEQUENCE IF EXISTS messages_id_seq OWNED BY messages_plain.id")
+        op.execute("DROP TABLE messages CASCADE")
+        op.execute("ALTER TABLE messages_plain RENAME TO messages")
+        op.execute("ALTER TABLE messages ADD PRIMARY KEY (id)")
+        _create_indexes()
+
+    op.drop_column('chats', 'message_retention_days')
@@ -0,0 +1,245 @@
+"""
+Integration tests for streaming activity rollups.
+
+Счётчики, накопленные record() и записанные flush(), должны совпадать
+с агрегатами по сырым строкам MessageLog.
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models  # noqa: F401
+from app.database.models import ChatActivityRollup, MessageLog
+from app.database.session import Base
+from app.services.activity_rollup import (
+    ActivityRollupService,
+    classify_text,
+    extract_keywords,
+    hour_bucket,
+)
+
+CHAT_ID = -100777
+BASE_TIME = datetime(2026, 10, 17, 0, 0)
+
+SAMPLE_TEXTS = [
+    "привет всем, как дела",
+    "steam deck опять тормозит, блять",
+    "спасибо, круто получилось 👍",
+    "ужас какой-то с линуксом",
+    "ссылка https://example.com смотрите",
+    None,
+    "ты дебил что ли",
+    "линукс линукс линукс",
+]
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+def _messages(count: int, seed: int = 0) -> list[MessageLog]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        text = rng.choice(SAMPLE_TEXTS)
+        rows.append(MessageLog(
+            chat_id=CHAT_ID if i % 4 else CHAT_ID - 1,
+            message_id=i,
+            user_id=rng.randint(0, 6),
+            username=f"user{i % 7}",
+            text=text,
+            has_link=bool(text and "https://" in text),
+            created_at=BASE_TIME + timedelta(minutes=rng.randint(0, 48 * 60 - 1)),
+        ))
+    return rows
+
+
+def test_classify_and_keywords():
+    assert classify_text("ну ты и дебил").toxic
+    assert classify_text("Спасибо, круто!").positive
+    assert classify_text("это ужас").negative
+    assert classify_text(None) == classify_text("")
+    assert not classify_text("обычное сообщение").toxic
+    assert extract_keywords("Линукс и ЛИНУКС это просто линукс steam") == ["линукс", "steam"]
+
+
+def test_hour_bucket_normalises_timezones():
+    from datetime import timezone
+    aware = datetime(2026, 10, 17, 15, 42, 10, tzinfo=timezone(timedelta(hours=3)))
+    assert hour_bucket(aware) == datetime(2026, 10, 17, 12, 0)
+    assert hour_bucket(datetime(2026, 10, 17, 12, 59)) == datetime(2026, 10, 17, 12, 0)
+
+
+@pytest.mark.asyncio
+async def test_rollups_match_raw_aggregates(session_factory):
+    """Totals, top users, hourly counts and /whois match a raw MessageLog scan."""
+    service = ActivityRollupService(session_factory)
+    messages = _messages(600)
+    async with session_factory() as session:
+        session.add_all(messages)
+        await session.commit()
+
+    # Две записи подряд: upsert складывает дельты
+    for msg in messages[:300]:
+        service.record(msg)
+    await service.flush()
+    for msg in messages[300:]:
+        service.record(msg)
+    await service.flush()
+    assert service.pending_rows() == 0
+
+    start, end = BASE_TIME + timedelta(hours=5), BASE_TIME + timedelta(hours=29)
+    window = [m for m in messages if m.chat_id == CHAT_ID and start <= m.created_at < end]
+
+    async with session_factory() as session:
+        totals = await service.chat_totals(session, CHAT_ID, start, end)
+        assert totals["message_count"] == len(window)
+        assert totals["active_users"] == len({m.user_id for m in window})
+        assert totals["text_count"] == sum(1 for m in window if m.text)
+        assert totals["link_count"] == sum(1 for m in window if m.has_link)
+        assert totals["toxic_count"] == sum(1 for m in window if classify_text(m.text).toxic)
+
+        raw_top = (await session.execute(
+            select(MessageLog.user_id, func.count(MessageLog.id).label("n"))
+            .where(MessageLog.chat_id == CHAT_ID, MessageLog.created_at >= start, MessageLog.created_at < end)
+            .group_by(MessageLog.user_id)
+        )).all()
+        top = await service.top_users(session, CHAT_ID, start, end, limit=10)
+        assert {row["user_id"]: row["count"] for row in top} == {r.user_id: r.n for r in raw_top}
+
+        hourly = await service.hourly_counts(session, CHAT_ID, start, end)
+        assert sum(count for _, count in hourly) == len(window)
+        assert len(hourly) <= 24
+
+        user_window = [m for m in messages if m.chat_id == CHAT_ID and m.user_id == 3]
+        count, first_hour = await service.user_totals(session, CHAT_ID, 3)
+        assert count == len(user_window)
+        assert first_hour == hour_bucket(min(m.created_at for m in user_window))
+
+        keywords = dict(await service.top_keywords(session, CHAT_ID, start, end, limit=50))
+        assert keywords["линукс"] == sum(1 for m in window if "линукс" in extract_keywords(m.text))
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_deltas(session_factory):
+    """If the DB write fails, deltas go back to the buffer and are written next time."""
+    calls = {"n": 0}
+
+    def flaky_factory():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("database is locked")
+        return session_factory()
+
+    service = ActivityRollupService(flaky_factory)
+    for msg in _messages(50):
+        service.record(msg)
+    assert await service.flush() == 0
+    assert service.flush_errors == 1
+    assert service.pending_rows() > 0
+
+    service.record(_messages(1, seed=1)[0])
+    assert await service.flush() > 0
+    async with session_factory() as session:
+        total = await session.scalar(select(func.sum(ChatActivityRollup.message_count)))
+    assert total == 51
+
+
+@pytest.mark.asyncio
+async def test_backfill_builds_rollups_once(session_factory):
+    """Backfill covers messages up to the watermark; later runs are skipped."""
+    service = ActivityRollupService(session_factory)
+    messages = _messages(250)
+    async with session_factory() as session:
+        session.add_all(messages)
+        await session.commit()
+
+    max_id = await service._backfill_watermark()
+    assert max_id == 250
+    assert await service.backfill(max_id, chunk_size=100) == 250
+    assert service.backfill_done
+    assert service.messages_recorded == 0
+    assert await service._backfill_watermark() is None
+
+    async with session_factory() as session:
+        total = await session.scalar(select(func.sum(ChatActivityRollup.message_count)))
+        count, _ = await service.user_totals(session, CHAT_ID, 2)
+    assert total == 250
+    assert count == sum(1 for m in messages if m.chat_id == CHAT_ID and m.user_id == 2)
+
+
+@pytest.mark.asyncio
+async def test_bot_replies_do_not_force_hot_topic_rebuild(session_factory):
+    """Hot-topic coverage compares against user text only: bot replies are never clustered."""
+    from app.services.topic_clusters import TopicClusterService
+
+    service = ActivityRollupService(session_factory)
+    clusters = TopicClusterService()
+    clusters.tracking_since = hour_bucket(BASE_TIME)
+    for i in range(100):
+        created_at = BASE_TIME + timedelta(minutes=5 * i)
+        question = MessageLog(
+            chat_id=CHAT_ID, message_id=2 * i, user_id=i % 5 + 1, username=f"user{i % 5}",
+            text="steam deck опять тормозит", has_link=False, created_at=created_at,
+        )
+        # Ответ бота (qna._log_bot_response) попадает только в роллапы
+        reply = MessageLog(
+            chat_id=CHAT_ID, message_id=2 * i + 1, user_id=0, username="oleg_bot",
+            text="обнови прошивку steam deck", has_link=False, created_at=created_at,
+        )
+        service.record(question)
+        service.record(reply)
+        clusters.record(question)
+    await service.flush()
+
+    start, end = BASE_TIME, BASE_TIME + timedelta(hours=24)
+    async with session_factory() as session:
+        totals = await service.chat_totals(session, CHAT_ID, start, end)
+
+    assert totals["text_count"] == 200
+    assert totals["user_text_count"] == 100
+    assert clusters.top_clusters(CHAT_ID, start, end, expected_messages=totals["user_text_count"])
+    # Со всеми текстовыми (включая бота) покрытие было бы 50% — вечная перестройка
+    assert clusters.top_clusters(CHAT_ID, start, end, expected_messages=totals["text_count"]) is None
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_benchmark_rollup_vs_raw_scan(session_factory):
+    """Benchmark: дневные счётчики из роллапов против агрегата по сырым строкам."""
+    service = ActivityRollupService(session_factory)
+    messages = _messages(50000, seed=2)
+    async with session_factory() as session:
+        session.add_all(messages)
+        await session.commit()
+    for msg in messages:
+        service.record(msg)
+    await service.flush()
+
+    start, end = BASE_TIME, BASE_TIME + timedelta(hours=48)
+    async with session_factory() as session:
+        t0 = time.perf_counter()
+        for _ in range(20):
+            await session.execute(
+                select(MessageLog.user_id, MessageLog.text)
+                .where(MessageLog.chat_id == CHAT_ID, MessageLog.created_at >= start, MessageLog.created_at < end)
+            )
+        raw = (time.perf_counter() - t0) / 20
+
+        t0 = time.perf_counter()
+        for _ in range(20):
+            await service.chat_totals(session, CHAT_ID, start, end)
+        rolled = (time.perf_counter() - t0) / 20
+
+    print(f"\n[BENCH] raw scan {raw * 1000:.2f}ms vs rollups {rolled * 1000:.2f}ms")
+    assert rolled < raw
@@ -0,0 +1,102 @@
+"""
+Integration tests for #dailystats aggregation.
+
+Статистика собирается фиксированным числом запросов (без select(User)
+на каждую строку) и переиспользуется всеми чатами.
+"""
+
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models  # noqa: F401
+from app.database.models import GameHistory, GameStat, Tournament, TournamentScore, User
+from app.database.session import Base
+from app.database.unit_of_work import instrument_engine, track_queries
+from app.services.dailies import DailiesService
+from app.utils import utc_now
+
+MAX_QUERIES = 4
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _seed(session_factory, users: int) -> None:
+    now = utc_now().replace(tzinfo=None)
+    async with session_factory() as session:
+        for i in range(1, users + 1):
+            session.add(User(id=i, tg_user_id=1000 + i, username=f"user{i}"))
+            session.add(GameStat(user_id=i, tg_user_id=1000 + i, username=f"user{i}", size_cm=i * 3))
+            # user i: i игр, выигрыш 10*i в одной игре; вчерашние игры не считаются
+            session.add_all([
+                GameHistory(
+                    user_id=i, chat_id=-1, game_type="dice", bet_amount=10,
+                    result_amount=10 * i if g == 0 else -5, won=g == 0, played_at=now,
+                )
+                for g in range(i)
+            ])
+            session.add(GameHistory(
+                user_id=i, chat_id=-1, game_type="dice", bet_amount=10,
+                result_amount=100000, won=True, played_at=now - timedelta(days=2),
+            ))
+        tournament = Tournament(type="daily", start_at=now, end_at=now + timedelta(days=1), status="active")
+        session.add(tournament)
+        await session.flush()
+        for discipline in ("grow", "pvp"):
+            session.add_all([
+                TournamentScore(tournament_id=tournament.id, user_id=1000 + i, discipline=discipline, score=i)
+                for i in range(1, min(users, 6) + 1)
+            ])
+        await session.commit()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("users", [5, 60])
+async def test_daily_stats_constant_queries(session_factory, users):
+    """Query count does not depend on the number of players."""
+    await _seed(session_factory, users)
+    service = DailiesService()
+
+    async with track_queries("dailystats") as stats:
+        async with session_factory() as session:
+            ds = await service.aggregate_daily_stats(-1, session)
+
+    assert stats.query_count <= MAX_QUERIES
+
+    assert [g["username"] for g in ds.top_growers] == [f"user{i}" for i in range(users, users - 5, -1)]
+    assert [loser["size"] for loser in ds.top_losers] == [3, 6, 9]
+    assert [w["username"] for w in ds.big_winners] == [f"user{i}" for i in range(users, users - 3, -1)]
+    assert [w["amount"] for w in ds.big_winners] == [10 * i for i in range(users, users - 3, -1)]
+    assert [g["count"] for g in ds.top_gamblers] == [users, users - 1, users - 2]
+
+    top = min(users, 6)
+    assert [(s["discipline"], s["rank"], s["username"]) for s in ds.tournament_standings] == [
+        (discipline, rank, f"user{top - rank + 1}")
+        for discipline in ("grow", "pvp")
+        for rank in (1, 2, 3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_daily_stats_shared_across_chats(session_factory):
+    """Other chats reuse the global stats without touching the database."""
+    await _seed(session_factory, 10)
+    service = DailiesService()
+
+    async with session_factory() as session:
+        first = await service.aggregate_daily_stats(-1, session)
+        async with track_queries("dailystats") as stats:
+            others = [await service.aggregate_daily_stats(chat_id, session) for chat_id in (-2, -3, -4)]
+
+    assert stats.query_count == 0
+    assert all(o.top_growers == first.top_growers for o in others)
+    assert [o.chat_id for o in others] == [-2, -3, -4]
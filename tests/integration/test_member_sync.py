@@ -0,0 +1,122 @@
+"""
+Integration tests for incremental member status and sampled reconciliation.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models  # noqa: F401
+from app.database.models import ChatMembership, User
+from app.database.session import Base
+from app.services.chat_broadcast import SendLimiter
+from app.services.member_sync import MemberSyncService
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _statuses(session_factory):
+    async with session_factory() as session:
+        users = (await session.execute(select(User.tg_user_id, User.status))).all()
+    return dict(users)
+
+
+class FakeBot:
+    """get_chat_member по словарю; отсутствующие — 'user not found'."""
+
+    def __init__(self, members):
+        self.members = members
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append((chat_id, user_id))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        status = self.members.get((chat_id, user_id))
+        if status is None:
+            raise TelegramBadRequest(method=None, message="Bad Request: user not found")
+        return SimpleNamespace(status=status)
+
+
+@pytest.mark.asyncio
+async def test_updates_maintain_user_status_across_chats(session_factory):
+    service = MemberSyncService(session_factory)
+    async with session_factory() as session:
+        session.add_all([User(tg_user_id=1, username="a"), User(tg_user_id=2, username="b")])
+        await session.commit()
+
+    await service.apply(-1, 1, "member")
+    await service.apply(-2, 1, "member")
+    await service.apply(-1, 2, "member")
+
+    # Вышел из одного чата, но остался в другом — всё ещё активен
+    await service.apply(-1, 1, "left")
+    assert await _statuses(session_factory) == {1: "active", 2: "active"}
+
+    await service.apply(-2, 1, "kicked")
+    await service.apply(-1, 2, "left")
+    assert await _statuses(session_factory) == {1: "left", 2: "left"}
+
+    # Сообщение в группе добавляет пару, но не перетирает известный статус
+    await service.note_seen(-3, 2)
+    await service.note_seen(-1, 1)
+    async with session_factory() as session:
+        rows = dict(
+            ((r.chat_id, r.user_id), r.status)
+            for r in (await session.execute(select(ChatMembership))).scalars()
+        )
+    assert rows[(-3, 2)] == "member"
+    assert rows[(-1, 1)] == "left"
+
+
+@pytest.mark.asyncio
+async def test_reconcile_checks_a_rate_limited_sample_and_advances(session_factory):
+    service = MemberSyncService(session_factory)
+    chats, users = 5, 40
+    async with session_factory() as session:
+        session.add_all([User(tg_user_id=u, username=f"u{u}") for u in range(1, users + 1)])
+        session.add_all([
+            ChatMembership(chat_id=-c, user_id=u, status="member")
+            for c in range(1, chats + 1) for u in range(1, users + 1)
+        ])
+        await session.commit()
+
+    # Пользователь 7 ушёл из всех чатов, пока бот не видел апдейтов
+    members = {(-c, u): "member" for c in range(1, chats + 1) for u in range(1, users + 1) if u != 7}
+    bot = FakeBot(members)
+    limiter = SendLimiter(rate_per_second=1000, chat_interval=0.0)
+
+    first = await service.reconcile(bot, sample_size=50, concurrency=4, limiter=limiter)
+    assert first.checked == 50 and len(bot.calls) == 50
+    assert bot.max_in_flight <= 4
+
+    # Курсор: следующий проход берёт другие записи
+    await service.reconcile(bot, sample_size=50, concurrency=4, limiter=limiter)
+    assert len(set(bot.calls)) == 100
+
+    # Полный круг за chats*users/sample проходов, не за один
+    for _ in range(2):
+        await service.reconcile(bot, sample_size=50, concurrency=4, limiter=limiter)
+    assert set(bot.calls) == set(members) | {(-c, 7) for c in range(1, chats + 1)}
+    assert (await _statuses(session_factory))[7] == "left"
+    assert (await _statuses(session_factory))[8] == "active"
+
+    # Ушедшие больше не сверяются
+    bot.calls.clear()
+    await service.reconcile(bot, sample_size=500, concurrency=4, limiter=limiter)
+    assert len(bot.calls) == chats * (users - 1)
@@ -0,0 +1,147 @@
+"""
+EXPLAIN-регрессия для горячих запросов MessageLog.
+
+Планы SQLite проверяются на заполненной и проанализированной таблице:
+каждый запрос из app/database/queries.py должен идти по своему составному
+индексу, без полного сканирования messages и без сортировки во временном
+B-дереве — иначе рост таблицы превратит его в full scan.
+"""
+
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import models  # noqa: F401
+from app.database.models import MessageLog
+from app.database.queries import (
+    chat_messages_in_range_query,
+    private_chat_history_query,
+    recent_chat_messages_query,
+    user_message_stats_query,
+)
+from app.database.session import Base
+from app.utils import utc_now
+
+CHAT_ID = -100500
+
+
+@pytest.fixture
+async def engine():
+    """SQLite с несколькими чатами, топиками и ANALYZE-статистикой."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        now = utc_now()
+        await conn.execute(
+            MessageLog.__table__.insert(),
+            [
+                {
+                    "chat_id": CHAT_ID - (i % 20),
+                    "message_id": i,
+                    "user_id": i % 97,
+                    "username": f"user{i % 97}",
+                    "text": f"сообщение {i}",
+                    "has_link": False,
+                    "topic_id": (i // 20) % 5 or None,
+                    "created_at": now - timedelta(minutes=i),
+                }
+                for i in range(5000)
+            ],
+        )
+        await conn.execute(text("ANALYZE"))
+    yield engine
+    await engine.dispose()
+
+
+async def _plan(engine, query) -> str:
+    compiled = query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def _assert_uses_index(plan: str, index_name: str) -> None:
+    assert index_name in plan, plan
+    assert "SCAN messages\n" not in plan + "\n", plan
+    assert "TEMP B-TREE" not in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_indexes_created_from_model(engine):
+    """create_all создаёт те же индексы, что и миграция."""
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text("PRAGMA index_list('messages')"))).all()
+    names = {row[1] for row in rows}
+    assert {
+        "ix_messages_chat_created",
+        "ix_messages_chat_topic_created",
+        "ix_messages_chat_user_created",
+    } <= names
+    assert "ix_messages_chat_id" not in names
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("exclude_bot", [False, True])
+async def test_recent_chat_messages_plan(engine, exclude_bot):
+    plan = await _plan(engine, recent_chat_messages_query(CHAT_ID, limit=15, exclude_bot=exclude_bot))
+    _assert_uses_index(plan, "ix_messages_chat_created")
+
+
+@pytest.mark.asyncio
+async def test_recent_topic_messages_plan(engine):
+    plan = await _plan(engine, recent_chat_messages_query(CHAT_ID, topic_id=3, limit=15))
+    _assert_uses_index(plan, "ix_messages_chat_topic_created")
+
+
+@pytest.mark.asyncio
+async def test_private_chat_history_plan(engine):
+    plan = await _plan(engine, private_chat_history_query(12345, 21))
+    _assert_uses_index(plan, "ix_messages_chat_created")
+
+
+@pytest.mark.asyncio
+async def test_hot_topics_range_plan(engine):
+    now = utc_now()
+    query = chat_messages_in_range_query(CHAT_ID, now - timedelta(days=1), now)
+    _assert_uses_index(await _plan(engine, query), "ix_messages_chat_created")
+
+
+@pytest.mark.asyncio
+async def test_whois_stats_plan_is_covering(engine):
+    plan = await _plan(engine, user_message_stats_query(CHAT_ID, 7))
+    _assert_uses_index(plan, "COVERING INDEX ix_messages_chat_user_created")
+
+
+@pytest.mark.asyncio
+async def test_chat_id_only_filters_still_use_index(engine):
+    """Запросы только по chat_id (статистика, сводки) используют префикс составного индекса."""
+    query = select(func.count(MessageLog.id)).where(MessageLog.chat_id == CHAT_ID)
+    plan = await _plan(engine, query)
+    assert "USING" in plan and "INDEX ix_messages_chat_" in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_queries_return_expected_rows(engine):
+    """Переписанные запросы возвращают то же, что и раньше."""
+    async with engine.connect() as conn:
+        recent = (await conn.execute(recent_chat_messages_query(CHAT_ID, limit=5))).all()
+        assert len(recent) == 5
+        assert [r.created_at for r in recent] == sorted((r.created_at for r in recent), reverse=True)
+
+        no_bot = (await conn.execute(recent_chat_messages_query(CHAT_ID, limit=50, exclude_bot=True))).all()
+        assert all(r.user_id != 0 for r in no_bot)
+
+        topic = (await conn.execute(recent_chat_messages_query(CHAT_ID, topic_id=3, limit=10))).all()
+        assert topic
+
+        count, first = (await conn.execute(user_message_stats_query(CHAT_ID, 20))).one()
+        expected = await conn.scalar(
+            select(func.count(MessageLog.id)).where(
+                MessageLog.chat_id == CHAT_ID, MessageLog.user_id == 20
+            )
+        )
+        assert count == expected > 0
+        assert first is not None
@@ -0,0 +1,246 @@
+"""
+Integration tests for MessageLog retention, archiving and SQLite vacuum.
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import models  # noqa: F401
+from app.database.models import Chat, ChatActivityRollup, ChatKeywordRollup, MessageLog
+from app.database.session import Base, enable_incremental_auto_vacuum
+from app.services.message_retention import (
+    MIN_RETENTION_DAYS,
+    MessageRetentionService,
+    archive_path,
+    month_start,
+    next_month,
+    partition_name,
+)
+from app.utils import utc_now
+
+SHORT_CHAT, DEFAULT_CHAT, FOREVER_CHAT = -1001, -1002, -1003
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'retention.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+def retention_settings(monkeypatch):
+    monkeypatch.setattr(settings, "message_retention_days", 30)
+    monkeypatch.setattr(settings, "message_archive_enabled", True)
+    monkeypatch.setattr(settings, "sqlite_vacuum_freelist_ratio", 0.0)
+
+
+async def _seed(session_factory, days: int = 60, per_day: int = 20) -> None:
+    now = utc_now().replace(tzinfo=None)
+    async with session_factory() as session:
+        session.add_all([
+            Chat(id=SHORT_CHAT, title="short", message_retention_days=10),
+            Chat(id=DEFAULT_CHAT, title="default"),
+            Chat(id=FOREVER_CHAT, title="forever", message_retention_days=0),
+        ])
+        for chat_id in (SHORT_CHAT, DEFAULT_CHAT, FOREVER_CHAT):
+            session.add_all([
+                MessageLog(
+                    chat_id=chat_id,
+                    message_id=day * per_day + i,
+                    user_id=i,
+                    username=f"user{i}",
+                    text=f"день {day}, сообщение {i} " + "x" * 200,
+                    created_at=now - timedelta(days=day, minutes=i),
+                )
+                for day in range(days)
+                for i in range(per_day)
+            ])
+        await session.commit()
+
+
+async def _oldest(session_factory, chat_id: int) -> datetime:
+    async with session_factory() as session:
+        return await session.scalar(
+            select(func.min(MessageLog.created_at)).where(MessageLog.chat_id == chat_id)
+        )
+
+
+def _read_archive(root, chat_id: int) -> list[dict]:
+    records = []
+    for path in sorted((root / str(chat_id)).glob("*.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+
+def test_horizon_rules():
+    assert MessageRetentionService.effective_days(None, 90) == 90
+    assert MessageRetentionService.effective_days(0, 90) is None
+    assert MessageRetentionService.effective_days(None, 0) is None
+    assert MessageRetentionService.effective_days(2, 90) == MIN_RETENTION_DAYS
+
+
+def test_month_helpers():
+    month = month_start(datetime(2026, 12, 17, 13, 5))
+    assert month == datetime(2026, 12, 1)
+    assert next_month(month) == datetime(2027, 1, 1)
+    assert next_month(datetime(2026, 1, 1)) == datetime(2026, 2, 1)
+    assert partition_name(month) == "messages_p202612"
+    assert archive_path("/a", -5, month).endswith("-5/2026-12.jsonl.gz")
+
+
+@pytest.mark.asyncio
+async def test_retention_archives_then_deletes_per_chat(session_factory, tmp_path, retention_settings):
+    """Each chat is trimmed to its own horizon; archived rows are readable gzip JSONL."""
+    await _seed(session_factory)
+    archive_dir = tmp_path / "archive"
+    service = MessageRetentionService(session_factory, archive_dir=str(archive_dir), batch_size=100)
+
+    report = await service.run()
+    now = utc_now().replace(tzinfo=None)
+
+    assert await _oldest(session_factory, SHORT_CHAT) >= now - timedelta(days=10, minutes=1)
+    assert await _oldest(session_factory, DEFAULT_CHAT) >= now - timedelta(days=30, minutes=1)
+    assert await _oldest(session_factory, FOREVER_CHAT) < now - timedelta(days=59)
+    assert report.chats_trimmed == 2
+    assert report.deleted == report.archived > 0
+
+    short_archive = _read_archive(archive_dir, SHORT_CHAT)
+    default_archive = _read_archive(archive_dir, DEFAULT_CHAT)
+    assert len(short_archive) + len(default_archive) == report.archived
+    assert not (archive_dir / str(FOREVER_CHAT)).exists()
+    assert {r["chat_id"] for r in short_archive} == {SHORT_CHAT}
+    assert all(datetime.fromisoformat(r["created_at"]) < now - timedelta(days=10) for r in short_archive)
+    assert len({r["id"] for r in short_archive}) == len(short_archive)
+
+    async with session_factory() as session:
+        remaining = await session.scalar(select(func.count()).select_from(MessageLog))
+    assert report.hot_rows == remaining == 3 * 60 * 20 - report.deleted
+
+
+@pytest.mark.asyncio
+async def test_second_run_is_noop_and_appends_archive(session_factory, tmp_path, retention_settings, monkeypatch):
+    """Re-running does nothing; tightening the horizon appends to existing archive files."""
+    await _seed(session_factory)
+    archive_dir = tmp_path / "archive"
+    service = MessageRetentionService(session_factory, archive_dir=str(archive_dir), batch_size=100)
+
+    await service.run()
+    again = await service.run()
+    assert again.deleted == 0 and again.archived == 0
+
+    archived_before = len(_read_archive(archive_dir, DEFAULT_CHAT))
+    monkeypatch.setattr(settings, "message_retention_days", 20)
+    tightened = await service.run()
+    assert tightened.deleted > 0
+    assert tightened.chats_trimmed == 1
+    assert len(_read_archive(archive_dir, DEFAULT_CHAT)) == archived_before + tightened.deleted
+
+
+@pytest.mark.asyncio
+async def test_rollups_are_pruned_to_their_horizons(session_factory, tmp_path, retention_settings, monkeypatch):
+    """Activity and keyword rollups are deleted past their own horizons; 0 keeps them forever."""
+    monkeypatch.setattr(settings, "activity_rollup_retention_days", 40)
+    monkeypatch.setattr(settings, "keyword_rollup_retention_days", 10)
+    hour = utc_now().replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    async with session_factory() as session:
+        for chat_id in (SHORT_CHAT, DEFAULT_CHAT):
+            for day in range(60):
+                session.add(ChatActivityRollup(
+                    chat_id=chat_id, hour=hour - timedelta(days=day), user_id=1, message_count=1,
+                ))
+                session.add(ChatKeywordRollup(
+                    chat_id=chat_id, hour=hour - timedelta(days=day), keyword="видеокарта", count=1,
+                ))
+        await session.commit()
+
+    service = MessageRetentionService(session_factory, archive_dir=str(tmp_path / "a"), batch_size=100)
+    report = await service.run()
+
+    async with session_factory() as session:
+        activity = await session.scalar(select(func.count()).select_from(ChatActivityRollup))
+        keywords = await session.scalar(select(func.count()).select_from(ChatKeywordRollup))
+    assert activity == 2 * 40 and keywords == 2 * 10
+    assert report.rollups_deleted == 2 * (60 - 40) + 2 * (60 - 10)
+
+    monkeypatch.setattr(settings, "keyword_rollup_retention_days", 0)
+    monkeypatch.setattr(settings, "activity_rollup_retention_days", 0)
+    assert (await service.run()).rollups_deleted == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_delete_does_not_duplicate_archive(session_factory, tmp_path, retention_settings, monkeypatch):
+    """Rows archived before a failed DELETE are deleted on the next run without being archived again."""
+    from app.services import message_retention as module
+
+    await _seed(session_factory)
+    archive_dir = tmp_path / "archive"
+    service = MessageRetentionService(session_factory, archive_dir=str(archive_dir), batch_size=100)
+
+    real_delete = module.delete
+
+    def failing_delete(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(module, "delete", failing_delete)
+    with pytest.raises(RuntimeError):
+        await service.run()
+    assert list(archive_dir.glob("*/.archived-ids.json"))
+
+    monkeypatch.setattr(module, "delete", real_delete)
+    report = await service.run()
+
+    records = _read_archive(archive_dir, SHORT_CHAT) + _read_archive(archive_dir, DEFAULT_CHAT)
+    assert len({r["id"] for r in records}) == len(records)
+    assert report.deleted == len(records)
+    assert not list(archive_dir.glob("*/.archived-ids.json"))
+
+
+@pytest.mark.asyncio
+async def test_sqlite_space_is_reclaimed(session_factory, tmp_path, retention_settings):
+    """The periodic job never runs a full VACUUM; after the startup conversion it vacuums incrementally."""
+    await _seed(session_factory)
+    service = MessageRetentionService(session_factory, archive_dir=str(tmp_path / "a"), batch_size=500)
+
+    report = await service.run()
+    assert report.deleted > 0 and report.vacuum is None
+
+    engine = session_factory.kw["bind"]
+    async with engine.connect() as conn:
+        assert (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() == 0
+    # Запуск бота: один VACUUM с переводом в INCREMENTAL, повторно — ничего
+    assert await enable_incremental_auto_vacuum(engine, min_free_ratio=0.1) == "vacuum"
+    assert await enable_incremental_auto_vacuum(engine, min_free_ratio=0.1) == "incremental"
+
+    async with session_factory() as session:
+        assert (await session.execute(select(func.count()).select_from(MessageLog))).scalar() > 0
+        await session.execute(
+            Chat.__table__.update().where(Chat.id == FOREVER_CHAT).values(message_retention_days=7)
+        )
+        await session.commit()
+    report = await service.run()
+    assert report.deleted > 0
+    assert report.vacuum == "incremental"
+    assert report.pages_freed > 0
+
+
+@pytest.mark.asyncio
+async def test_new_sqlite_file_starts_incremental(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fresh.db'}")
+    try:
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        assert await enable_incremental_auto_vacuum(engine, min_free_ratio=0.5) == "new"
+        async with engine.connect() as conn:
+            assert (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() == 2
+    finally:
+        await engine.dispose()
@@ -0,0 +1,129 @@
+"""
+Integration tests and benchmark for the Pillow render process pool.
+
+Benchmark: рендеров в секунду на ядро и задержка event loop — рендер
+прямо в цикле против пула процессов.
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.services.leagues import League
+from app.services.profile_generator import ProfileData, profile_generator
+from app.services.quote_generator import MessageData, quote_generator_service
+from app.services.render_pool import RenderPool, RenderTimeout
+from app.services.sparkline import sparkline_generator
+from app.services.top_chart import ChartPlayer, to_chart_players, top_chart_generator
+
+HISTORY = [{"date": f"2026-10-{d:02d}", "size": 10 + d * 3 - (d % 3) * 4, "change": 3} for d in range(1, 15)]
+
+
+def _profile(i: int = 0) -> ProfileData:
+    return ProfileData(
+        username=f"user{i}", elo=1000 + i, league=League.SILICON, wins=i, losses=3,
+        growth_history=[h["size"] for h in HISTORY[-7:]],
+    )
+
+
+def _players(count: int = 10) -> list[ChartPlayer]:
+    return [
+        ChartPlayer(tg_user_id=i, username=f"player{i}", size_cm=100 - i,
+                    grow_history=[{**h, "size": h["size"] + i} for h in HISTORY])
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+async def pool():
+    pool = RenderPool(workers=2, timeout=60)
+    await pool.start()
+    yield pool
+    pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_pool_renders_match_inline(pool):
+    messages = [MessageData(text="первое сообщение", username="alice"), MessageData(text="ответ", username="bob")]
+
+    sparkline, profile, chart, quote = await asyncio.gather(
+        pool.run("sparkline", HISTORY),
+        pool.run("profile", _profile()),
+        pool.run("top10", _players()),
+        pool.run("quote_chain", messages),
+    )
+
+    assert sparkline == sparkline_generator.generate(HISTORY)
+    assert profile == profile_generator.generate(_profile())
+    assert chart == top_chart_generator.generate_top10_chart(_players())
+    assert quote.image_data == quote_generator_service.draw_quote_chain(messages).image_data
+    assert quote.format == "webp"
+
+
+@pytest.mark.asyncio
+async def test_timeout_and_unknown_job(pool):
+    with pytest.raises(RenderTimeout):
+        await pool.run("top10", _players(), timeout=0.001)
+    with pytest.raises(ValueError):
+        await pool.run("missing")
+    # Пул остаётся рабочим
+    assert await pool.run("sparkline", HISTORY[:3])
+
+
+def test_chart_players_detach_rows():
+    class Row:
+        tg_user_id, username, size_cm, grow_history = 7, None, 42, HISTORY[:2]
+
+    (player,) = to_chart_players([Row()])
+    assert player == ChartPlayer(tg_user_id=7, username=None, size_cm=42, grow_history=HISTORY[:2])
+    assert player.grow_history is not Row.grow_history
+
+
+async def _loop_lag_during(coro_factory, count: int) -> tuple[float, float]:
+    """(рендеров в секунду, максимальная пауза event loop в мс)."""
+    lags = []
+    stop = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            lags.append(now - last - 0.005)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.02)
+    started = time.perf_counter()
+    await asyncio.gather(*(coro_factory(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    return count / elapsed, max(lags) * 1000
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_benchmark_renders_per_core(pool):
+    """Benchmark: профили в цикле событий против пула процессов."""
+    count = 24
+
+    async def inline(i):
+        return profile_generator.generate(_profile(i))
+
+    async def pooled(i):
+        return await pool.run("profile", _profile(i))
+
+    inline_rate, inline_lag = await _loop_lag_during(inline, count)
+    pooled_rate, pooled_lag = await _loop_lag_during(pooled, count)
+    cores = min(pool.workers, os.cpu_count() or 1)
+    print(
+        f"\n[BENCH] profile: inline {inline_rate:.1f}/s (loop lag {inline_lag:.0f}ms), "
+        f"pool x{pool.workers} {pooled_rate:.1f}/s = {pooled_rate / cores:.1f}/s per core "
+        f"(loop lag {pooled_lag:.0f}ms)"
+    )
+
+    # В пуле event loop не блокируется на время рендера
+    assert pooled_lag < inline_lag
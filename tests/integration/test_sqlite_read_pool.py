@@ -0,0 +1,237 @@
+"""
+Integration tests and benchmark for SQLite read-pool mode and the write queue.
+
+Benchmark: латентность вставки MessageLog, пока параллельно идут тяжёлые
+выборки за 24 часа (как gather_comprehensive_chat_stats).
+"""
+
+import asyncio
+import statistics
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import models  # noqa: F401
+from app.database.models import MessageLog
+from app.database.session import (
+    Base,
+    _install_sqlite_pragmas,
+    _is_sqlite_file,
+    _read_only_url,
+)
+from app.database.write_queue import WriteQueue
+from app.utils import utc_now
+
+CHAT_ID = -100123
+
+
+async def _make_engines(path, read_pool_size: int):
+    url = f"sqlite+aiosqlite:///{path}"
+    writer = create_async_engine(url, connect_args={"timeout": 30.0})
+    _install_sqlite_pragmas(writer)
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    reader = None
+    if read_pool_size:
+        reader = create_async_engine(
+            _read_only_url(url), pool_size=read_pool_size, max_overflow=0
+        )
+        _install_sqlite_pragmas(reader, read_only=True)
+    return writer, reader
+
+
+async def _seed(session_factory, rows: int) -> None:
+    now = utc_now()
+    async with session_factory() as session:
+        session.add_all([
+            MessageLog(
+                chat_id=CHAT_ID,
+                message_id=i,
+                user_id=i % 50,
+                username=f"user{i % 50}",
+                text=f"сообщение номер {i} про steam deck и линукс " * 3,
+                created_at=now - timedelta(seconds=i),
+            )
+            for i in range(rows)
+        ])
+        await session.commit()
+
+
+def test_sqlite_url_helpers():
+    """Read-only URL and file detection."""
+    assert _is_sqlite_file("sqlite+aiosqlite:///./data/oleg.db")
+    assert not _is_sqlite_file("sqlite+aiosqlite:///:memory:")
+    assert not _is_sqlite_file("postgresql+asyncpg://u:p@localhost/db")
+    ro = _read_only_url("sqlite+aiosqlite:///./data/oleg.db")
+    assert ro.query["mode"] == "ro"
+    assert ro.query["uri"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_read_only_engine_rejects_writes(tmp_path):
+    """The read pool can read committed rows but never write."""
+    writer, reader = await _make_engines(tmp_path / "ro.db", read_pool_size=2)
+    try:
+        await _seed(async_sessionmaker(writer), 10)
+        async with async_sessionmaker(reader)() as session:
+            count = await session.scalar(select(func.count(MessageLog.id)))
+            assert count == 10
+            session.add(MessageLog(chat_id=1, message_id=1, user_id=1, created_at=utc_now()))
+            with pytest.raises(Exception):
+                await session.commit()
+    finally:
+        await reader.dispose()
+        await writer.dispose()
+
+
+@pytest.mark.asyncio
+async def test_write_queue_batches_commits(tmp_path):
+    """Rows queued together are committed in few batches and all persisted."""
+    writer, _ = await _make_engines(tmp_path / "wq.db", read_pool_size=0)
+    factory = async_sessionmaker(writer, expire_on_commit=False)
+    queue = WriteQueue(factory, batch_size=50, batch_delay=0.05)
+    try:
+        await queue.start()
+        for i in range(120):
+            await queue.add(MessageLog(chat_id=CHAT_ID, message_id=i, user_id=1, created_at=utc_now()))
+        await queue.flush()
+        assert queue.rows_written == 120
+        assert queue.batches_committed <= 5
+        await queue.stop()
+        assert not queue.running
+
+        # Без запущенной задачи add() пишет сразу
+        await queue.add(MessageLog(chat_id=CHAT_ID, message_id=999, user_id=1, created_at=utc_now()))
+        async with factory() as session:
+            count = await session.scalar(select(func.count(MessageLog.id)))
+        assert count == 121
+    finally:
+        await writer.dispose()
+
+
+async def _measure_insert_latency(
+    writer, reader, heavy_reads: bool, queue: WriteQueue | None = None, inserts: int = 40
+) -> list[float]:
+    write_factory = async_sessionmaker(writer, expire_on_commit=False)
+    read_factory = async_sessionmaker(reader or writer, expire_on_commit=False)
+    stop = asyncio.Event()
+
+    async def heavy_reader():
+        since = utc_now() - timedelta(hours=24)
+        while not stop.is_set():
+            async with read_factory() as session:
+                rows = (await session.execute(
+                    select(MessageLog.user_id, func.count(MessageLog.id), func.sum(func.length(MessageLog.text)))
+                    .where(MessageLog.chat_id == CHAT_ID, MessageLog.created_at >= since)
+                    .group_by(MessageLog.user_id)
+                )).all()
+                assert rows
+
+    readers = [asyncio.create_task(heavy_reader()) for _ in range(3)] if heavy_reads else []
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    for i in range(inserts):
+        row = MessageLog(chat_id=CHAT_ID, message_id=10**6 + i, user_id=1, created_at=utc_now())
+        start = time.perf_counter()
+        if queue is not None:
+            await queue.add(row)
+        else:
+            async with write_factory() as session:
+                session.add(row)
+                await session.commit()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.005)
+
+    if queue is not None:
+        await queue.flush()
+    stop.set()
+    await asyncio.gather(*readers)
+    return latencies
+
+
+def _p95(values: list[float]) -> float:
+    return statistics.quantiles(values, n=20)[-1] * 1000
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_benchmark_insert_latency_under_heavy_reads(tmp_path):
+    """
+    Benchmark: p95 вставки при тяжёлых чтениях.
+
+    - shared: выборки и вставки через один движок
+    - read_pool: выборки через read-only пул (снимок WAL в своих потоках aiosqlite)
+    - read_pool+queue: как в MessageLoggerMiddleware — апдейт только ставит
+      строку в очередь, коммитит единственный писатель пачками
+    """
+    results = {}
+    for mode, pool_size, queued in (
+        ("shared", 0, False),
+        ("read_pool", 4, False),
+        ("read_pool+queue", 4, True),
+    ):
+        writer, reader = await _make_engines(tmp_path / f"{pool_size}{queued}.db", read_pool_size=pool_size)
+        queue = WriteQueue(async_sessionmaker(writer), batch_size=100, batch_delay=0.05) if queued else None
+        try:
+            await _seed(async_sessionmaker(writer), 50000)
+            if queue is not None:
+                await queue.start()
+            idle = await _measure_insert_latency(writer, reader, heavy_reads=False, queue=queue)
+            loaded = await _measure_insert_latency(writer, reader, heavy_reads=True, queue=queue)
+            results[mode] = (_p95(idle), _p95(loaded))
+        finally:
+            if queue is not None:
+                await queue.stop()
+            if reader is not None:
+                await reader.dispose()
+            await writer.dispose()
+
+    for mode, (idle, loaded) in results.items():
+        print(f"\n[BENCH] {mode}: insert p95 idle={idle:.2f}ms under_reads={loaded:.2f}ms")
+
+    # Для апдейта вставка через очередь остаётся плоской независимо от чтений
+    queued_idle, queued_loaded = results["read_pool+queue"]
+    assert queued_loaded < results["shared"][1]
+    assert queued_loaded < max(queued_idle * 5, 1.0)
+
+
+@pytest.mark.asyncio
+async def test_private_history_sees_queued_rows_and_skips_current(tmp_path, monkeypatch):
+    """ЛС-история дожидается пачки write queue и исключает текущее сообщение по message_id."""
+    from app.database import write_queue as write_queue_module
+    from app.services import ollama_client
+
+    writer, _ = await _make_engines(tmp_path / "history.db", read_pool_size=0)
+    factory = async_sessionmaker(writer, expire_on_commit=False)
+    queue = WriteQueue(session_factory=factory, batch_size=50, batch_delay=0.2)
+    monkeypatch.setattr(write_queue_module, "write_queue", queue)
+    monkeypatch.setattr(ollama_client, "get_session", lambda: factory)
+
+    user_id, now = 777, utc_now()
+
+    def row(message_id, author, text, seconds):
+        return MessageLog(
+            chat_id=user_id, message_id=message_id, user_id=author,
+            username="oleg" if author == 0 else "alice", text=text,
+            created_at=now + timedelta(seconds=seconds),
+        )
+
+    await queue.start()
+    try:
+        # Прошлый обмен и текущее сообщение ещё лежат в очереди
+        for item in (row(1, user_id, "привет", 0), row(2, 0, "здарова", 1), row(3, user_id, "как дела?", 2)):
+            await queue.add(item)
+        history = await ollama_client._get_private_chat_history(user_id, current_message_id=3)
+    finally:
+        await queue.stop()
+        await writer.dispose()
+
+    assert history == [
+        {"role": "user", "content": "привет"},
+        {"role": "assistant", "content": "здарова"},
+    ]
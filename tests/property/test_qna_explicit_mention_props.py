@@ -8,7 +8,7 @@ import os
 import sys
 import asyncio
 import importlib.util
-from unittest.mock import MagicMock, AsyncMock, PropertyMock
+from unittest.mock import MagicMock, AsyncMock, PropertyMock, patch
 from hypothesis import given, strategies as st, settings, assume
 import pytest
 
@@ -16,20 +16,30 @@ import pytest
 _project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 _module_path = os.path.join(_project_root, 'app', 'handlers', 'qna.py')
 
-# We need to mock some dependencies before importing qna
-sys.modules['aiogram'] = MagicMock()
-sys.modules['aiogram.filters'] = MagicMock()
-sys.modules['aiogram.types'] = MagicMock()
-sys.modules['sqlalchemy'] = MagicMock()
-sys.modules['sqlalchemy.select'] = MagicMock()
-sys.modules['app.database.session'] = MagicMock()
-sys.modules['app.database.models'] = MagicMock()
-sys.modules['app.handlers.games'] = MagicMock()
-sys.modules['app.services.ollama_client'] = MagicMock()
-sys.modules['app.services.recommendations'] = MagicMock()
-sys.modules['app.services.tts'] = MagicMock()
-sys.modules['app.services.golden_fund'] = MagicMock()
-sys.modules['app.utils'] = MagicMock()
+# Dependencies of qna.py that these tests replace. They are patched only
+# while this module's tests run (patch.dict restores sys.modules afterwards),
+# so the mocks do not leak into other test modules.
+_MOCKED_MODULES = [
+    'aiogram',
+    'aiogram.filters',
+    'aiogram.types',
+    'sqlalchemy',
+    'sqlalchemy.select',
+    'app.database.session',
+    'app.database.models',
+    'app.handlers.games',
+    'app.services.ollama_client',
+    'app.services.recommendations',
+    'app.services.tts',
+    'app.services.golden_fund',
+    'app.utils',
+]
+
+
+@pytest.fixture(autouse=True, scope="module")
+def mocked_qna_dependencies():
+    with patch.dict(sys.modules, {name: MagicMock() for name in _MOCKED_MODULES}):
+        yield
 
 
 def create_mock_message(
@@ -19,7 +19,9 @@ _challenges_module = importlib.util.module_from_spec(_spec)
 
 # Mock dependencies before loading the module
 import sys
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+
+import pytest
 
 # Create mock modules for dependencies
 mock_modules = [
@@ -31,9 +33,15 @@ mock_modules = [
     'app.handlers.games', 'app.utils'
 ]
 
-for mod in mock_modules:
-    if mod not in sys.modules:
-        sys.modules[mod] = MagicMock()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def mocked_challenges_dependencies():
+    """Mock missing dependencies only while this module's tests run."""
+    missing = {mod: MagicMock() for mod in mock_modules if mod not in sys.modules}
+    with patch.dict(sys.modules, missing):
+        yield
+
 
 # Now we can test the keyboard creation functions directly
 # We'll re-implement them here for testing since the module has complex dependencies
@@ -0,0 +1,127 @@
+"""
+Property-based tests and benchmark for the combined toxicity/mood scorer.
+
+Feature: toxicity-scorer
+Один комбинированный regex по склеенной пачке должен давать те же признаки,
+что отдельные ``re.search`` по каждому паттерну и ``marker in text`` по
+каждому сообщению.
+"""
+
+import re
+import time
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from app.services.toxicity_scorer import (
+    NEGATIVE_MARKERS,
+    POSITIVE_MARKERS,
+    TOXIC_PATTERNS,
+    TextSignals,
+    classify_batch,
+    classify_text,
+    score_batch,
+)
+
+_COMPILED = [re.compile(p, re.IGNORECASE) for p in TOXIC_PATTERNS]
+
+
+def _reference(text):
+    """Прежняя реализация: отдельный проход на каждый паттерн и маркер."""
+    if not text:
+        return TextSignals()
+    lower = text.lower()
+    return TextSignals(
+        toxic=any(p.search(lower) for p in _COMPILED),
+        positive=any(m in lower for m in POSITIVE_MARKERS),
+        negative=any(m in lower for m in NEGATIVE_MARKERS),
+    )
+
+
+_WORDS = [
+    "привет", "линукс", "Steam", "похудеть", "набережная", "убедить", "суббота",
+    "хуйня", "нахуй", "заебал", "Блять", "пиздец", "сука", "fuck", "дебил",
+    "спасибо", "КРУТО", "топчик", "суперский", "ужас", "плохо", "отстой",
+    "👍", "😡", "❤️", "🎉", "😭", "123", "ok",
+]
+_SEPARATORS = [" ", "\n", ", ", "! ", "... "]
+
+_message = st.one_of(
+    st.none(),
+    st.just(""),
+    st.lists(
+        st.tuples(st.sampled_from(_WORDS), st.sampled_from(_SEPARATORS)),
+        min_size=1, max_size=12,
+    ).map(lambda pairs: "".join(word + sep for word, sep in pairs).strip()),
+)
+
+
+class TestScorerEquivalence:
+    """
+    **Feature: toxicity-scorer, Property 1: batch scan == per-pattern loop**
+
+    *For any* batch of messages built from separate words, ``classify_batch``
+    SHALL return, for every message, exactly the signals of the reference
+    per-pattern implementation, and ``classify_text`` SHALL agree with it.
+    """
+
+    @settings(max_examples=300)
+    @given(st.lists(_message, max_size=20))
+    def test_batch_matches_reference(self, messages):
+        expected = [_reference(m) for m in messages]
+        assert classify_batch(messages) == expected
+        assert [classify_text(m) for m in messages] == expected
+
+    @settings(max_examples=200)
+    @given(st.lists(_message, max_size=20))
+    def test_totals_are_sums(self, messages):
+        totals = score_batch(messages)
+        expected = [_reference(m) for m in messages]
+        assert totals.text_count == sum(1 for m in messages if m)
+        assert totals.toxic_count == sum(s.toxic for s in expected)
+        assert totals.positive_count == sum(s.positive for s in expected)
+        assert totals.negative_count == sum(s.negative for s in expected)
+        assert 0.0 <= totals.toxicity_percent <= 100.0
+
+
+def test_prefixed_profanity_and_false_friends():
+    assert classify_text("да иди ты нахуй").toxic
+    assert classify_text("опять заебал со своим линуксом").toxic
+    assert not classify_text("хочу похудеть к лету").toxic
+    assert not classify_text("гуляли по набережной").toxic
+    signals = classify_text("блять, ну это пиздец")
+    assert signals.toxic and signals.negative and not signals.positive
+
+
+@pytest.mark.slow
+def test_benchmark_batch_vs_reference():
+    """Benchmark: один проход по пачке против отдельных regex на сообщение."""
+    import random
+
+    rng = random.Random(0)
+    # Обычная переписка: маркеры и мат — несколько процентов слов
+    neutral = (
+        "сегодня вечером обсуждали новый релиз ядра линукс и драйвера видеокарты "
+        "кто нибудь пробовал собрать проект под arch вчера было обновление steam"
+    ).split()
+    messages = [
+        " ".join(
+            rng.choice(_WORDS) if rng.random() < 0.05 else rng.choice(neutral)
+            for _ in range(rng.randint(3, 25))
+        )
+        for _ in range(500)
+    ]
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        reference = [_reference(m) for m in messages]
+    old = (time.perf_counter() - t0) / 20
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        batch = classify_batch(messages)
+    new = (time.perf_counter() - t0) / 20
+
+    print(f"\n[BENCH] 500 messages: per-pattern {old * 1000:.2f}ms vs batch {new * 1000:.2f}ms")
+    assert batch == reference
+    assert new < old
@@ -207,89 +207,72 @@ class TestTTSFileLifecycleIntegration:
     **Validates: Requirements 15.3**
     """
     
+    @staticmethod
+    def _streaming_edge_tts(audio: bytes = b"fake audio data"):
+        """Mock edge_tts module whose Communicate.stream yields audio chunks."""
+        mock_edge_tts = MagicMock()
+        mock_communicate_instance = MagicMock()
+        
+        async def mock_stream():
+            yield {"type": "audio", "data": audio[:4]}
+            yield {"type": "WordBoundary"}
+            yield {"type": "audio", "data": audio[4:]}
+        
+        async def mock_save(path):
+            raise AssertionError("send_voice must not write audio to disk")
+        
+        mock_communicate_instance.stream = mock_stream
+        mock_communicate_instance.save = mock_save
+        mock_edge_tts.Communicate = MagicMock(return_value=mock_communicate_instance)
+        return mock_edge_tts
+    
     def test_send_voice_lifecycle_file_deleted_on_success(self):
         """
-        Property: After successful send_voice, temp file is deleted.
+        Property: send_voice uploads audio from memory, no temp file is left.
         
-        Tests the complete lifecycle: Create → Send → Delete
+        Tests the complete lifecycle: Synthesize → Send, nothing on disk
         """
         import tempfile
         
         service = EdgeTTSService()
+        service.TEMP_DIR = tempfile.mkdtemp()
         
         # Create mock bot
         mock_bot = MagicMock()
         mock_bot.send_voice = AsyncMock()
         
-        # Create a real temp file to simulate successful synthesis
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-            f.write(b"fake audio data")
-            temp_path = f.name
-        
-        # Patch the service to use our temp file
-        original_generate = service._generate_temp_path
-        service._generate_temp_path = lambda: temp_path
-        
-        # Create mock edge_tts module
-        mock_edge_tts = MagicMock()
-        mock_communicate_instance = MagicMock()
-        
-        async def mock_save(path):
-            # File already exists from our setup
-            pass
-        
-        mock_communicate_instance.save = mock_save
-        mock_edge_tts.Communicate = MagicMock(return_value=mock_communicate_instance)
-        
-        with patch.dict('sys.modules', {'edge_tts': mock_edge_tts}):
+        with patch.dict('sys.modules', {'edge_tts': self._streaming_edge_tts()}):
             loop = asyncio.new_event_loop()
             try:
                 result = loop.run_until_complete(
                     service.send_voice(mock_bot, 12345, "Test text")
                 )
                 
-                # File should be deleted after send
+                assert result.created is True
+                assert result.sent is True
                 assert result.deleted is True
-                assert not os.path.exists(temp_path), "Temp file should be deleted after send"
+                assert result.audio_bytes == b"fake audio data"
+                uploaded = mock_bot.send_voice.call_args.kwargs["voice"]
+                assert uploaded.data == b"fake audio data"
+                assert os.listdir(service.TEMP_DIR) == [], "No temp file should be written"
             finally:
                 loop.close()
-                service._generate_temp_path = original_generate
-                # Cleanup just in case
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+                os.rmdir(service.TEMP_DIR)
     
     def test_send_voice_lifecycle_file_deleted_on_send_failure(self):
         """
-        Property: Even if send fails, temp file is still deleted.
+        Property: Even if send fails, nothing is left on disk.
         """
         import tempfile
         
         service = EdgeTTSService()
+        service.TEMP_DIR = tempfile.mkdtemp()
         
         # Create mock bot that fails to send
         mock_bot = MagicMock()
         mock_bot.send_voice = AsyncMock(side_effect=Exception("Send failed"))
         
-        # Create a real temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-            f.write(b"fake audio data")
-            temp_path = f.name
-        
-        # Patch the service
-        original_generate = service._generate_temp_path
-        service._generate_temp_path = lambda: temp_path
-        
-        # Create mock edge_tts module
-        mock_edge_tts = MagicMock()
-        mock_communicate_instance = MagicMock()
-        
-        async def mock_save(path):
-            pass
-        
-        mock_communicate_instance.save = mock_save
-        mock_edge_tts.Communicate = MagicMock(return_value=mock_communicate_instance)
-        
-        with patch.dict('sys.modules', {'edge_tts': mock_edge_tts}):
+        with patch.dict('sys.modules', {'edge_tts': self._streaming_edge_tts()}):
             loop = asyncio.new_event_loop()
             try:
                 result = loop.run_until_complete(
@@ -300,14 +283,12 @@ class TestTTSFileLifecycleIntegration:
                 assert result.sent is False
                 assert result.error is not None
                 
-                # But file should STILL be deleted
+                # But nothing should be left behind
                 assert result.deleted is True
-                assert not os.path.exists(temp_path), "Temp file should be deleted even on send failure"
+                assert os.listdir(service.TEMP_DIR) == [], "No temp file even on send failure"
             finally:
                 loop.close()
-                service._generate_temp_path = original_generate
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+                os.rmdir(service.TEMP_DIR)
     
     def test_send_voice_lifecycle_file_deleted_on_synthesis_failure(self):
         """
@@ -0,0 +1,108 @@
+"""Tests for precomputed daily briefings (disk backend)."""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.services.briefings import (
+    EVENING_EXTRAS,
+    EVENING_SUMMARY,
+    MORNING,
+    BriefingService,
+    delivery_date,
+    precompute_time,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+MOSCOW = pytz.timezone("Europe/Moscow")
+
+
+class CountingBriefings(BriefingService):
+    """Replaces LLM/rendering with a counter so tests see when work happens."""
+
+    def __init__(self, *args, fail_for=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.builds = []
+        self.fail_for = set(fail_for)
+
+    async def build(self, kind, chat_id, session=None):
+        self.builds.append((kind, chat_id))
+        if chat_id in self.fail_for:
+            raise RuntimeError("LLM timeout")
+        if chat_id == -3:
+            return []  # нет активности
+        return [{"text": f"<b>{kind}</b> {chat_id}"}, {"text": "stats", "photo": PNG}]
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    yield async_sessionmaker(engine)
+    await engine.dispose()
+
+
+def test_precompute_time_is_before_delivery():
+    assert precompute_time(MORNING, 30) == (7, 30)
+    assert precompute_time(EVENING_SUMMARY, 45) == (19, 15)
+    assert precompute_time(EVENING_EXTRAS, 5) == (20, 55)
+
+
+def test_delivery_date_uses_delivery_timezone():
+    # 22:30 UTC = 01:30 следующего дня по Москве
+    moment = pytz.utc.localize(datetime(2026, 10, 17, 22, 30))
+    assert delivery_date(EVENING_SUMMARY, moment).isoformat() == "2026-10-18"
+
+
+@pytest.mark.asyncio
+async def test_precomputed_payload_is_delivered_without_rebuilding(tmp_path, session_factory):
+    service = CountingBriefings(storage_dir=str(tmp_path), session_factory=session_factory)
+    now = MOSCOW.localize(datetime(2026, 10, 18, 20, 30))
+
+    assert await service.precompute(EVENING_EXTRAS, [-1, -2, -3], now=now) == 3
+    assert len(service.builds) == 3
+
+    messages = await service.get_messages(EVENING_EXTRAS, -1, now=now + timedelta(minutes=30))
+    assert messages == [{"text": f"<b>{EVENING_EXTRAS}</b> -1"}, {"text": "stats", "photo": PNG}]
+    # Пустой результат тоже кэшируется: доставка его не пересобирает
+    assert await service.get_messages(EVENING_EXTRAS, -3, now=now) == []
+    assert len(service.builds) == 3
+    assert service.hits == 2 and service.misses == 0
+
+
+@pytest.mark.asyncio
+async def test_miss_and_failed_precompute_fall_back_to_live_build(tmp_path, session_factory):
+    service = CountingBriefings(storage_dir=str(tmp_path), session_factory=session_factory, fail_for={-2})
+    now = MOSCOW.localize(datetime(2026, 10, 18, 7, 30))
+
+    assert await service.precompute(MORNING, [-1, -2], now=now) == 1
+    assert service.precompute_errors == 1
+
+    service.fail_for.clear()
+    messages = await service.get_messages(MORNING, -2, now=now)
+    assert messages[0]["text"] == f"<b>{MORNING}</b> -2"
+    assert service.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_payloads_are_ignored_and_pruned(tmp_path, session_factory):
+    service = CountingBriefings(storage_dir=str(tmp_path), session_factory=session_factory)
+    yesterday = MOSCOW.localize(datetime(2026, 10, 17, 19, 30))
+    today = yesterday + timedelta(days=1)
+
+    await service.precompute(EVENING_SUMMARY, [-1], now=yesterday)
+    assert (tmp_path / "2026-10-17").is_dir()
+
+    await service.get_messages(EVENING_SUMMARY, -1, now=today)
+    assert service.misses == 1
+
+    # Чужие файлы и каталоги в хранилище не мешают очистке и не удаляются
+    (tmp_path / "2026-10-17" / "nested").mkdir()
+    (tmp_path / "README").write_text("briefings")
+    (tmp_path / "0-old").mkdir()
+
+    await service.precompute(EVENING_SUMMARY, [-1], now=today)
+    assert not (tmp_path / "2026-10-17").exists()
+    assert (tmp_path / "README").exists() and (tmp_path / "0-old").is_dir()
+    assert (tmp_path / "2026-10-18" / f"{EVENING_SUMMARY}_-1.json").exists()
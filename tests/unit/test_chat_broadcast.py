@@ -0,0 +1,145 @@
+"""Tests for the scheduled broadcast fan-out and the Telegram send limiter."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.services.chat_broadcast import ChatFanOut, OutgoingMessage, SendLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    """Records sends; optional flood-control errors for a chat."""
+
+    def __init__(self, flood_chats=()):
+        self.sent = []
+        self.flood_chats = set(flood_chats)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.flood_chats:
+            self.flood_chats.discard(chat_id)
+            raise TelegramRetryAfter(
+                method=SendMessage(chat_id=chat_id, text=text), message="Flood", retry_after=0
+            )
+        self.sent.append((chat_id, text, time.monotonic()))
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        self.sent.append((chat_id, caption, time.monotonic()))
+
+
+def _chats(n):
+    return [SimpleNamespace(id=-100 - i) for i in range(n)]
+
+
+def test_limiter_global_rate_and_chat_interval():
+    """Burst is served immediately, then sends are spaced by the global rate and per chat."""
+    clock = FakeClock()
+    limiter = SendLimiter(rate_per_second=10, chat_interval=1.0, clock=clock)
+
+    delays = [limiter._reserve(chat_id) for chat_id in range(15)]
+    assert delays[:10] == [0.0] * 10
+    assert delays[10:] == pytest.approx([0.1, 0.2, 0.3, 0.4, 0.5])
+
+    clock.now = 10.0
+    assert limiter._reserve(1) == 0.0
+    assert limiter._reserve(1) == pytest.approx(1.0)
+    assert limiter._reserve(1) == pytest.approx(2.0)
+
+
+def test_limiter_pause_applies_to_all_chats():
+    clock = FakeClock()
+    limiter = SendLimiter(rate_per_second=30, chat_interval=0, clock=clock)
+    limiter.pause(5)
+    assert limiter._reserve(1) == pytest.approx(5.0)
+    assert limiter._reserve(2) == pytest.approx(5.0)
+
+
+@pytest.mark.asyncio
+async def test_fanout_prepares_concurrently_with_bound():
+    """Generation overlaps across chats but never exceeds the concurrency limit."""
+    running = 0
+    peak = 0
+
+    async def prepare(chat):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return [OutgoingMessage(chat_id=chat.id, text="hi")]
+
+    fanout = ChatFanOut(concurrency=4, chat_timeout=10, limiter=SendLimiter(rate_per_second=30, chat_interval=0))
+    bot = FakeBot()
+    t0 = time.monotonic()
+    report = await fanout.run(bot, "test", _chats(12), prepare)
+
+    assert peak == 4
+    assert time.monotonic() - t0 < 0.5  # последовательно было бы 12 × 0.05
+    assert report.sent_chats == 12 and report.messages_sent == 12
+    assert {chat_id for chat_id, _, _ in bot.sent} == {c.id for c in _chats(12)}
+
+
+@pytest.mark.asyncio
+async def test_fanout_isolates_failures_and_skips():
+    """A failing or slow chat does not stop the others; empty output is a skip."""
+    async def prepare(chat):
+        if chat.id == -100:
+            raise RuntimeError("LLM down")
+        if chat.id == -101:
+            await asyncio.sleep(5)
+        if chat.id == -102:
+            return []
+        return [OutgoingMessage(chat_id=chat.id, text="a"), OutgoingMessage(chat_id=chat.id, text="b")]
+
+    fanout = ChatFanOut(concurrency=2, chat_timeout=0.1, limiter=SendLimiter(rate_per_second=30, chat_interval=0))
+    bot = FakeBot()
+    report = await fanout.run(bot, "test", _chats(5), prepare)
+
+    assert report.failed == 2
+    assert set(report.errors) == {-100, -101}
+    assert "TimeoutError" in report.errors[-101]
+    assert report.skipped == 1
+    assert report.sent_chats == 2 and report.messages_sent == 4
+    # Порядок сообщений внутри чата сохраняется
+    for chat_id in (-103, -104):
+        assert [text for cid, text, _ in bot.sent if cid == chat_id] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_fanout_retries_after_flood_control():
+    async def prepare(chat):
+        return [OutgoingMessage(chat_id=chat.id, text="x")]
+
+    fanout = ChatFanOut(concurrency=2, chat_timeout=10, limiter=SendLimiter(rate_per_second=30, chat_interval=0))
+    bot = FakeBot(flood_chats={-101})
+    report = await fanout.run(bot, "test", _chats(3), prepare)
+
+    assert report.failed == 0
+    assert report.messages_sent == 3
+
+
+@pytest.mark.asyncio
+async def test_fanout_paces_messages_to_one_chat():
+    """Several messages to one chat respect the per-chat interval instead of fixed sleeps."""
+    async def prepare(chat):
+        return [OutgoingMessage(chat_id=chat.id, text=str(i)) for i in range(3)]
+
+    fanout = ChatFanOut(concurrency=2, chat_timeout=10, limiter=SendLimiter(rate_per_second=30, chat_interval=0.05))
+    bot = FakeBot()
+    await fanout.run(bot, "test", _chats(2), prepare)
+
+    for chat in _chats(2):
+        times = [t for cid, _, t in bot.sent if cid == chat.id]
+        assert len(times) == 3
+        assert all(b - a >= 0.04 for a, b in zip(times, times[1:]))
@@ -0,0 +1,156 @@
+"""Tests for the delay queue (in-memory backend)."""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.delay_queue import MAX_ATTEMPTS, RETRY_DELAY_SECONDS, DelayQueue
+from app.services.redis_client import redis_client
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(redis_client, "_available", False)
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_tasks_fire_at_deadline_in_order():
+    clock = Clock()
+    queue = DelayQueue(clock=clock)
+    fired = []
+
+    async def handler(bot, key, payload):
+        fired.append((key, payload, clock.now))
+
+    queue.register("trade_expiry", handler)
+    await queue.schedule("trade_expiry", 2, 1300.0)
+    await queue.schedule("trade_expiry", 1, 1100.0, {"chat_id": -5})
+    assert await queue.next_due() == 1100.0
+
+    clock.now = 1099.9
+    assert await queue.run_due() == 0
+    clock.now = 1100.0
+    assert await queue.run_due() == 1
+    clock.now = 1400.0
+    assert await queue.run_due() == 1
+    assert fired == [("1", {"chat_id": -5}, 1100.0), ("2", {}, 1400.0)]
+    assert await queue.next_due() is None
+
+
+@pytest.mark.asyncio
+async def test_reschedule_and_cancel():
+    clock = Clock()
+    queue = DelayQueue(clock=clock)
+    fired = []
+
+    async def handler(bot, key, payload):
+        fired.append(key)
+
+    queue.register("auction_end", handler)
+    await queue.schedule("auction_end", 7, 1100.0)
+    await queue.schedule("auction_end", 7, 1500.0)  # продление
+    await queue.schedule("auction_end", 8, 1100.0)
+    await queue.cancel("auction_end", 8)
+
+    clock.now = 1200.0
+    assert await queue.run_due() == 0
+    assert await queue.next_due() == 1500.0
+    clock.now = 1500.0
+    assert await queue.run_due() == 1
+    assert fired == ["7"]
+
+
+@pytest.mark.asyncio
+async def test_failed_task_is_retried_then_dropped():
+    clock = Clock()
+    queue = DelayQueue(clock=clock)
+    calls = []
+
+    async def handler(bot, key, payload):
+        calls.append(payload.get("_attempt", 0))
+        raise RuntimeError("db locked")
+
+    queue.register("verification_expiry", handler)
+    await queue.schedule("verification_expiry", 1, 1000.0)
+    for _ in range(MAX_ATTEMPTS + 1):
+        await queue.run_due()
+        clock.now += RETRY_DELAY_SECONDS
+    assert calls == list(range(MAX_ATTEMPTS))
+    assert await queue.next_due() is None
+
+
+@pytest.mark.asyncio
+async def test_reload_restores_deadlines_after_restart():
+    clock = Clock()
+    queue = DelayQueue(clock=clock)
+    fired = []
+
+    async def handler(bot, key, payload):
+        fired.append((bot, key))
+
+    async def pending():
+        # Время из БД — naive UTC
+        return [(5, datetime(1970, 1, 1, 0, 20), None)]
+
+    queue.register("trade_expiry", handler, reload=pending)
+    assert await queue.reload() == 1
+    assert await queue.next_due() == datetime(1970, 1, 1, 0, 20, tzinfo=timezone.utc).timestamp()
+    queue._bot = "bot"
+    clock.now = 1200.0
+    assert await queue.run_due() == 1
+    assert fired == [("bot", "5")]
+
+
+@pytest.mark.asyncio
+async def test_loop_wakes_exactly_without_polling():
+    queue = DelayQueue()
+    fired = asyncio.Event()
+    fired_at = []
+
+    async def handler(bot, key, payload):
+        fired_at.append(time.time())
+        fired.set()
+
+    queue.register("mafia_night_end", handler)
+    await queue.start(bot=None)
+    try:
+        # Цикл уже спит без задач; новая задача будит его
+        await asyncio.sleep(0.05)
+        due = time.time() + 0.2
+        await queue.schedule("mafia_night_end", 1, due, {"chat_id": -1})
+        await asyncio.wait_for(fired.wait(), timeout=2)
+    finally:
+        await queue.stop()
+    assert due <= fired_at[0] < due + 0.15
+
+
+@pytest.mark.asyncio
+async def test_night_end_schedules_discussion_only_when_game_continues(monkeypatch):
+    from app.handlers import mafia
+
+    scheduled = []
+    continues = iter([True, False])
+
+    async def process_night(bot, game_id, chat_id):
+        return next(continues)
+
+    async def schedule(kind, game_id, chat_id, seconds):
+        scheduled.append((kind, game_id))
+
+    monkeypatch.setattr(mafia, "process_night_phase_task", process_night)
+    monkeypatch.setattr(mafia, "schedule_phase_end", schedule)
+
+    await mafia.on_night_end(None, "7", {"chat_id": -1})
+    # Игра отменена или закончилась ночью — обсуждение не планируется
+    await mafia.on_night_end(None, "8", {"chat_id": -1})
+    assert scheduled == [(mafia.MAFIA_DISCUSSION_END, 7)]
@@ -0,0 +1,92 @@
+"""Tests for scene-change frame sampling and contact-sheet analysis in GIF patrol."""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from app.services.gif_patrol import ContentCategory, GIFPatrolService
+from app.services.redis_client import redis_client
+
+
+def _gif(colors, size=(120, 90)) -> bytes:
+    frames = [Image.new("RGB", size, color) for color in colors]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=50, loop=0)
+    return buffer.getvalue()
+
+
+BLACK, GRAY, WHITE = (0, 0, 0), (128, 128, 128), (255, 255, 255)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(redis_client, "_available", False)
+    return GIFPatrolService()
+
+
+def test_distinct_scenes_are_picked(service):
+    # 40 кадров: три сцены разной длины
+    gif = _gif([BLACK] * 25 + [WHITE] * 3 + [GRAY] * 12)
+    frames = service.sample_frames(gif)
+    assert [f.getpixel((0, 0))[0] for f in frames] == [0, 255, 128]
+
+
+def test_static_animation_is_padded_to_three(service):
+    gif = _gif([GRAY] * 30)
+    assert len(service.sample_frames(gif)) == 1
+    frames = service.extract_frames(gif)
+    assert len(frames) == 3 and frames[0] == frames[1] == frames[2]
+    assert frames[0][:2] == b"\xff\xd8"  # JPEG
+
+
+def test_frames_are_downscaled_and_sheet_is_a_grid(service):
+    frames = service.sample_frames(_gif([BLACK, WHITE, GRAY], size=(1600, 900)))
+    assert all(max(f.size) <= service.FRAME_MAX_SIDE for f in frames)
+
+    sheet = Image.open(io.BytesIO(service.build_contact_sheet(frames)))
+    tile = service.CONTACT_SHEET_TILE
+    assert sheet.size == (2 * tile, 2 * tile)
+
+
+class ScriptedVision:
+    def __init__(self, sheet_answer, frame_answers=()):
+        self.sheet_answer = sheet_answer
+        self.frame_answers = list(frame_answers)
+        self.queries = []
+
+    async def analyze(self, image_data, user_query=None, chat_id=None, vision_timeout=None):
+        self.queries.append(user_query)
+        if user_query == GIFPatrolService.CONTACT_SHEET_PROMPT:
+            if isinstance(self.sheet_answer, Exception):
+                raise self.sheet_answer
+            return self.sheet_answer
+        return self.frame_answers.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_one_call_per_gif(service):
+    service._vision_pipeline = vision = ScriptedVision("VIOLENCE")
+    result = await service.analyze_gif(_gif([BLACK, WHITE, GRAY]))
+    assert len(vision.queries) == 1
+    assert not result.is_safe and result.detected_categories == [ContentCategory.VIOLENCE.value]
+
+
+@pytest.mark.asyncio
+async def test_fallback_stops_at_first_unsafe_frame(service):
+    service._vision_pipeline = vision = ScriptedVision(RuntimeError("model down"), ["SAFE", "PORNOGRAPHY", "SAFE"])
+    result = await service.analyze_gif(_gif([BLACK, WHITE, GRAY]))
+    assert not result.is_safe
+    # Раскадровка + 2 кадра, третий не проверяется
+    assert len(vision.queries) == 3
+    assert [r.frame_index for r in result.frame_results] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_timeout_does_not_fall_back_to_frames(service):
+    service._vision_pipeline = vision = ScriptedVision(asyncio.TimeoutError(), ["SAFE", "SAFE", "SAFE"])
+    result = await service.analyze_gif(_gif([BLACK, WHITE, GRAY]))
+    # Fail-open без лишних запросов в и так занятую очередь
+    assert result.is_safe and len(vision.queries) == 1
+    assert [r.confidence for r in result.frame_results] == [0.0]
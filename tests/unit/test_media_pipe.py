@@ -0,0 +1,99 @@
+"""Tests for the in-memory ffmpeg pipe (with a stand-in ffmpeg executable)."""
+
+import os
+import stat
+import sys
+
+import pytest
+
+from app.services import media_pipe
+
+# Заменитель ffmpeg: stdin (и pipe:N, если передан) -> stdout;
+# "-fail" в аргументах — ошибка в stderr и код 1. Как mov-демуксер,
+# не читает из pipe mp4, у которого moov лежит после mdat.
+FAKE_FFMPEG = """#!{python}
+import os, sys
+args = sys.argv[1:]
+if "-fail" in args:
+    sys.stderr.write("Invalid data found when processing input")
+    sys.exit(1)
+out = sys.stdout.buffer
+for i, arg in enumerate(args):
+    if arg.startswith("pipe:") and arg not in ("pipe:0", "pipe:1"):
+        with os.fdopen(int(arg[5:]), "rb") as extra:
+            out.write(b"extra:" + extra.read() + b";")
+    elif args[i - 1] == "-i" and not arg.startswith("pipe:"):
+        with open(arg, "rb") as f:
+            f.seek(0, os.SEEK_END)  # moov в конце — нужен seek
+            f.seek(0)
+            out.write(f.read())
+if "pipe:0" in args:
+    data = sys.stdin.buffer.read()
+    if data[4:8] == b"ftyp" and data.find(b"moov") > data.find(b"mdat"):
+        sys.stderr.write("moov atom not found")
+        sys.exit(1)
+    out.write(data)
+"""
+
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+    return (8 + len(payload)).to_bytes(4, "big") + kind + payload
+
+
+# mp4 без faststart: ftyp, mdat, а moov — в самом конце
+NON_FASTSTART_MP4 = (
+    _box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41")
+    + _box(b"mdat", b"\x00" * 200_000)
+    + _box(b"moov", _box(b"mvhd", b"\x00" * 100))
+)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setattr(media_pipe, "_ffmpeg_available", None)
+    return path
+
+
+@pytest.mark.asyncio
+async def test_streams_chunks_through_stdin_to_stdout(fake_ffmpeg):
+    assert media_pipe.ffmpeg_available()
+    produced = []
+
+    async def download():
+        for i in range(50):
+            chunk = bytes([i]) * 100_000
+            produced.append(chunk)
+            yield chunk
+
+    # 5 МБ проходят через pipe без файлов на диске
+    output = await media_pipe.transcode(download(), ["-f", "s16le"])
+    assert output == b"".join(produced)
+
+
+@pytest.mark.asyncio
+async def test_extra_input_goes_through_its_own_pipe(fake_ffmpeg):
+    output = await media_pipe.run_ffmpeg(["-i", "{extra}", "pipe:1"], extra_input=b"voice")
+    assert output == b"extra:voice;"
+
+
+@pytest.mark.asyncio
+async def test_failure_raises_with_stderr(fake_ffmpeg):
+    with pytest.raises(media_pipe.FFmpegError, match="Invalid data"):
+        await media_pipe.run_ffmpeg(["-fail", "-i", "pipe:0", "pipe:1"], b"garbage")
+
+
+@pytest.mark.asyncio
+async def test_non_faststart_mp4_is_decoded_from_seekable_input(fake_ffmpeg):
+    async def download():
+        for start in range(0, len(NON_FASTSTART_MP4), 64 * 1024):
+            yield NON_FASTSTART_MP4[start:start + 64 * 1024]
+
+    with pytest.raises(media_pipe.FFmpegError, match="moov atom not found"):
+        await media_pipe.to_pcm(download())
+
+    output = await media_pipe.to_pcm(download(), seekable=True)
+    assert output == NON_FASTSTART_MP4
@@ -0,0 +1,103 @@
+"""Tests for file_id reuse of generated media."""
+
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+
+from app.services.media_registry import MediaRegistry
+from app.services.redis_client import redis_client
+
+
+class FakeRedis:
+    """GET/SET EX/DELETE, TTL запоминается для проверки."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        self.data[key] = value
+        self.ttl[key] = ex
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+        return 1
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_client, "_client", fake)
+    monkeypatch.setattr(redis_client, "_available", True)
+    return fake
+
+
+class FakeChat:
+    """send_photo: file_id вида "<prefix><n>", отвергает file_id из ``rejected``."""
+
+    def __init__(self, prefix="p", rejected=()):
+        self.prefix = prefix
+        self.calls = []
+        self.rejected = set(rejected)
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        if isinstance(photo, str) and photo in self.rejected:
+            raise TelegramBadRequest(method=None, message="Bad Request: wrong file identifier/HTTP URL specified")
+        self.calls.append((chat_id, photo if isinstance(photo, str) else "upload"))
+        sizes = [SimpleNamespace(file_id=f"thumb{len(self.calls)}"), SimpleNamespace(file_id=f"{self.prefix}{len(self.calls)}")]
+        return SimpleNamespace(photo=sizes)
+
+
+@pytest.mark.asyncio
+async def test_identical_bytes_are_uploaded_once(fake_redis):
+    registry = MediaRegistry(ttl_seconds=3600)
+    bot = FakeChat()
+
+    for chat_id in (-1, -2, -3):
+        await registry.send(bot.send_photo, "photo", b"chart-png", "chart.png", chat_id=chat_id, caption="top")
+    await registry.send(bot.send_photo, "photo", b"other-png", "chart.png", chat_id=-1)
+
+    # Самый большой размер фото — последний в списке
+    assert bot.calls == [(-1, "upload"), (-2, "p1"), (-3, "p1"), (-1, "upload")]
+    assert sorted(fake_redis.ttl.values()) == [3600, 3600]
+
+    # Другой процесс: локального кэша нет, file_id берётся из Redis
+    other = MediaRegistry(ttl_seconds=3600)
+    await other.send(bot.send_photo, "photo", b"chart-png", "chart.png", chat_id=-9)
+    assert bot.calls[-1] == (-9, "p1")
+
+
+@pytest.mark.asyncio
+async def test_rejected_file_id_is_reuploaded(fake_redis):
+    registry = MediaRegistry(ttl_seconds=60)
+    await registry.send(FakeChat().send_photo, "photo", b"png", "a.png", chat_id=-1)
+
+    # Например, бот сменил токен: старый file_id недействителен
+    bot = FakeChat(prefix="n", rejected={"p1"})
+    await registry.send(bot.send_photo, "photo", b"png", "a.png", chat_id=-1)
+    await registry.send(bot.send_photo, "photo", b"png", "a.png", chat_id=-2)
+    assert bot.calls == [(-1, "upload"), (-2, "n1")]
+    assert list(fake_redis.data.values()) == ["n1"]
+
+
+@pytest.mark.asyncio
+async def test_other_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(redis_client, "_available", False)
+    registry = MediaRegistry(ttl_seconds=60)
+    uploads = []
+
+    async def send_photo(photo, **kwargs):
+        if isinstance(photo, str):
+            raise TelegramBadRequest(method=None, message="Bad Request: message to be replied not found")
+        uploads.append(photo)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="p1")])
+
+    await registry.send(send_photo, "photo", b"png", "a.png")
+    with pytest.raises(TelegramBadRequest):
+        await registry.send(send_photo, "photo", b"png", "a.png")
+    assert len(uploads) == 1
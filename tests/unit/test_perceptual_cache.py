@@ -0,0 +1,151 @@
+"""Tests for perceptual-hash reuse of GIF verdicts and image descriptions."""
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services import perceptual_cache as pc
+from app.services.gif_patrol import GIFPatrolService
+from app.services.perceptual_cache import PerceptualCache, hamming, image_dhash
+from app.services.redis_client import redis_client
+
+
+class FakeRedis:
+    """GET/SET и два Lua-скрипта кэша (SET + ZADD с лимитом, чтение ZSET по ключам)."""
+
+    def __init__(self):
+        self.data = {}
+        self.zsets = {}
+        self.ttl = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        self.data[key] = value
+        self.ttl[key] = ex
+        return True
+
+    def _prune(self, key, now):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= now]:
+            del zset[member]
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        keys, args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        if script == pc._STORE_SCRIPT:
+            payload, ttl, member, now, cap = args
+            self.data[keys[0]] = payload
+            self.ttl[keys[0]] = ttl
+            for key in keys[1:]:
+                self._prune(key, now)
+                zset = self.zsets.setdefault(key, {})
+                zset[member] = now + ttl
+                for oldest in sorted(zset, key=zset.get)[:max(0, len(zset) - cap)]:
+                    del zset[oldest]
+            return 1
+        assert script == pc._CANDIDATES_SCRIPT
+        for key in keys:
+            self._prune(key, args[0])
+        return [member for key in keys for member in sorted(self.zsets.get(key, {}))]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_client, "_client", fake)
+    monkeypatch.setattr(redis_client, "_available", True)
+    return fake
+
+
+def _picture(seed: int, size=(160, 120)) -> Image.Image:
+    image = Image.new("RGB", size, (20 * seed % 255, 40, 90))
+    draw = ImageDraw.Draw(image)
+    for i in range(6):
+        x = (seed * 37 + i * 53) % size[0]
+        draw.ellipse([x, i * 18, x + 40, i * 18 + 30], fill=((seed * 90 + i * 40) % 255, 200, 50 * i % 255))
+    return image
+
+
+def _encode(image: Image.Image, fmt="PNG", **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def _gif(seeds, scale=1.0) -> bytes:
+    frames = [_picture(s) for s in seeds]
+    if scale != 1.0:
+        frames = [f.resize((int(f.width * scale), int(f.height * scale))) for f in frames]
+    return _encode(frames[0], "GIF", save_all=True, append_images=frames[1:], duration=100, loop=0)
+
+
+def test_dhash_tolerates_reencoding():
+    original = image_dhash(_encode(_picture(1)))
+    recompressed = image_dhash(_encode(_picture(1).resize((120, 90)), "JPEG", quality=60))
+    other = image_dhash(_encode(_picture(4)))
+    assert hamming(original, recompressed) <= 5
+    assert hamming(original, other) > 10
+    assert image_dhash(b"not an image") is None
+
+
+@pytest.mark.asyncio
+async def test_near_match_is_shared_through_redis(fake_redis):
+    h = image_dhash(_encode(_picture(2)))
+    writer = PerceptualCache("test", ttl_seconds=600, max_distance=5)
+    await writer.put({"verdict": "safe"}, file_unique_id="AgAD1", hashes=[h, h])
+
+    reader = PerceptualCache("test", ttl_seconds=600, max_distance=5)
+    assert await reader.get(file_unique_id="AgAD1") == {"verdict": "safe"}
+    assert await reader.get(hashes=[h ^ 0b1011, h ^ (1 << 40)]) == {"verdict": "safe"}
+    assert await reader.get(hashes=[h ^ 0b111111, h]) is None  # 6 бит — слишком далеко
+    assert await reader.get(hashes=[h]) is None  # другое число кадров
+    assert set(fake_redis.ttl.values()) == {600}
+
+
+@pytest.mark.asyncio
+async def test_band_index_expires_and_is_capped(fake_redis, monkeypatch):
+    h = image_dhash(_encode(_picture(3)))
+    cache = PerceptualCache("test", ttl_seconds=600, max_distance=5, band_size=2)
+    for i in range(3):
+        await cache.put({"n": i}, hashes=[h, h ^ (1 << (20 + i))])
+    # В каждой полосе только две самые свежие записи
+    assert all(len(zset) == 2 for zset in fake_redis.zsets.values())
+    assert len(fake_redis.zsets) == pc.BANDS
+
+    now = pc.time.time()
+    monkeypatch.setattr(pc.time, "time", lambda: now + 601)
+    reader = PerceptualCache("test", ttl_seconds=600, max_distance=5)
+    assert await reader.get(hashes=[h, h]) is None
+    # Истёкшие записи вычищены при чтении, а не живут вместе с ключом
+    assert all(not zset for zset in fake_redis.zsets.values())
+
+
+class CountingVision:
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze(self, image_data, user_query=None, chat_id=None, vision_timeout=None):
+        self.calls += 1
+        return "SAFE"
+
+
+@pytest.mark.asyncio
+async def test_reposted_gif_skips_vision_calls(monkeypatch):
+    monkeypatch.setattr(redis_client, "_available", False)
+    service = GIFPatrolService()
+    service._vision_pipeline = vision = CountingVision()
+
+    first = await service.analyze_gif(_gif([1, 2, 3]), file_unique_id="AgADgif")
+    assert first.is_safe and vision.calls == 1  # одна раскадровка
+
+    # Перекодированная копия (другой размер и байты) — вердикт из кэша
+    again = await service.analyze_gif(_gif([1, 2, 3], scale=0.8))
+    assert again.is_safe and vision.calls == 1
+
+    # Репост: вердикт по file_unique_id без скачивания
+    assert (await service.cached_verdict("AgADgif")).is_safe
+
+    await service.analyze_gif(_gif([5, 6, 7]))
+    assert vision.calls == 2
@@ -0,0 +1,165 @@
+"""Tests for the scheduler leader lease, leader-only jobs and missed-run catch-up."""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+import app.services.scheduler_leader as leader_module
+from app.services.redis_client import redis_client
+from app.services.scheduler_leader import SchedulerLeader, previous_fire_time
+
+UTC = pytz.utc
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for the lease: SET NX PX, GET and the two scripts."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def _alive(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and self.clock() >= expires:
+            self.data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._alive(key) is not None:
+            return None
+        ttl = px / 1000 if px else ex
+        self.data[key] = (value, self.clock() + ttl if ttl else None)
+        return True
+
+    async def get(self, key):
+        return self._alive(key)
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self._alive(key) != token:
+            return 0
+        if script == leader_module._RENEW_SCRIPT:
+            self.data[key] = (token, self.clock() + int(args[0]) / 1000)
+        else:
+            self.data.pop(key)
+        return 1
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch, clock):
+    fake = FakeRedis(clock)
+    monkeypatch.setattr(redis_client, "_client", fake)
+    monkeypatch.setattr(redis_client, "_available", True)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_single_leader_and_failover(fake_redis, clock):
+    first = SchedulerLeader(lease_seconds=30, replica_id="a", clock=clock)
+    second = SchedulerLeader(lease_seconds=30, replica_id="b", clock=clock)
+
+    assert await first.try_acquire()
+    assert not await second.try_acquire()
+
+    # Лидер продлевает аренду — второй её не получает
+    clock.now += 20
+    assert await first.try_acquire()
+    clock.now += 20
+    assert not await second.try_acquire()
+    assert first.is_leader and not second.is_leader
+
+    # Лидер завис: аренда истекает и у него локально, и в Redis
+    clock.now += 31
+    assert not first.is_leader
+    assert await second.try_acquire()
+    assert not await first.try_acquire()
+
+    # Корректная остановка сразу отдаёт аренду
+    await second.stop()
+    assert await first.try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_standalone_without_redis(monkeypatch):
+    monkeypatch.setattr(redis_client, "_available", False)
+    leader = SchedulerLeader(lease_seconds=30, replica_id="solo")
+    assert await leader.try_acquire()
+    assert leader.is_leader
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_only_on_leader(monkeypatch, fake_redis, clock):
+    from app.jobs import scheduler as scheduler_module
+
+    runs = []
+
+    async def job(bot):
+        runs.append(bot)
+
+    leader = SchedulerLeader(lease_seconds=30, replica_id="a", clock=clock)
+    monkeypatch.setattr(leader_module, "scheduler_leader", leader)
+    wrapped = scheduler_module._leader_only("demo", job)
+
+    await wrapped("bot")
+    assert runs == []
+
+    await leader.try_acquire()
+    await wrapped("bot")
+    assert runs == ["bot"]
+    assert await leader.last_run("demo") is not None
+
+
+def test_previous_fire_time():
+    trigger = CronTrigger(hour=8, minute=0, timezone=UTC)
+    now = UTC.localize(datetime(2026, 10, 18, 9, 30))
+    assert previous_fire_time(trigger, now, timedelta(hours=2)) == UTC.localize(datetime(2026, 10, 18, 8, 0))
+    assert previous_fire_time(trigger, now, timedelta(hours=1)) is None
+
+
+@pytest.mark.asyncio
+async def test_catch_up_runs_missed_cron_once(monkeypatch, fake_redis, clock):
+    from app.jobs import scheduler as scheduler_module
+
+    async def job(bot):
+        pass
+
+    leader = SchedulerLeader(lease_seconds=30, replica_id="a", clock=clock)
+    monkeypatch.setattr(leader_module, "scheduler_leader", leader)
+    monkeypatch.setattr(scheduler_module.settings, "scheduler_catchup_grace_minutes", 24 * 60)
+
+    scheduler = AsyncIOScheduler(timezone=UTC)
+    scheduler.add_job(job, CronTrigger(hour=0, minute=0, timezone=UTC), args=["bot"], id="missed")
+    scheduler.add_job(job, CronTrigger(hour=0, minute=0, timezone=UTC), args=["bot"], id="done")
+    scheduler.add_job(job, CronTrigger(hour=0, minute=0, timezone=UTC), args=["bot"], id="new")
+    scheduler.add_job(job, IntervalTrigger(minutes=1), args=["bot"], id="interval")
+
+    now = datetime.now(UTC)
+    await leader.record_run("missed", now - timedelta(days=2))
+    await leader.record_run("done", now)
+
+    assert await scheduler_module.catch_up_missed_runs(scheduler) == 1
+    jobs = {job.id: job for job in scheduler.get_jobs()}
+    assert jobs["missed"].next_run_time is not None
+    # Без истории запусков — только отметка, без догоняющего запуска
+    assert await leader.last_run("new") is not None
+    assert await scheduler_module.catch_up_missed_runs(scheduler) == 1  # "missed" ещё не выполнен
+
+    await leader.record_run("missed")
+    assert await scheduler_module.catch_up_missed_runs(scheduler) == 0
@@ -0,0 +1,83 @@
+"""Tests for the shared glyph-metrics and line-wrapping cache."""
+
+import random
+import time
+
+import pytest
+from PIL import ImageFont
+
+from app.services.quote_generator import QuoteGeneratorService
+from app.services.text_layout import TextLayout
+
+WORDS = "привет как дела steam deck опять тормозит спасибо круто получилось линукс ладно WAVE Today ок".split()
+DEJAVU = ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "DejaVuSans.ttf")
+
+
+def _reference_wrap(text, font, max_width):
+    """Прежний перенос: getbbox растущей строки на каждое слово."""
+    lines, current = [], []
+    for word in text.split():
+        if font.getbbox(" ".join(current + [word]))[2] <= max_width:
+            current.append(word)
+        else:
+            if current:
+                lines.append(" ".join(current))
+            current = [word]
+    if current:
+        lines.append(" ".join(current))
+    return lines or [""]
+
+
+def _texts(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 60))) for _ in range(count)]
+
+
+def test_wrap_matches_measured_wrap():
+    layout = TextLayout()
+    font = layout.load_font(DEJAVU, 34)
+    for text in _texts(200):
+        assert list(layout.wrap(text, font, 700)) == _reference_wrap(text, font, 700)
+    assert layout.wrap("", font, 700) == ("",)
+    assert layout.wrap("слишком_длинное_слово_без_пробелов", font, 50) == ("слишком_длинное_слово_без_пробелов",)
+
+
+def test_caches_are_shared_per_font():
+    layout = TextLayout(wrap_cache_size=2)
+    font = layout.load_font(DEJAVU, 20)
+    assert layout.load_font(DEJAVU, 20) is font
+    same_font = ImageFont.truetype(font.path, 20)
+
+    layout.wrap("a b c", font, 100)
+    layout.wrap("a b c", same_font, 100)
+    layout.wrap("d e", font, 100)
+    layout.wrap("f", font, 100)
+    stats = layout.get_stats()
+    assert (stats["wrap_hits"], stats["wrap_misses"], stats["wrap_entries"]) == (1, 3, 2)
+    assert stats["fonts"] == 1
+
+    assert layout.bbox(font, "Ayg") == font.getbbox("Ayg")
+    layout.bbox(same_font, "Ayg")
+    assert layout.get_stats()["bbox_hits"] == 1
+
+
+@pytest.mark.slow
+def test_benchmark_long_chain_layout():
+    """Benchmark: раскладка длинной цепочки цитат (10 сообщений) повторно."""
+    service = QuoteGeneratorService()
+    font = service.text_font_small
+    texts = _texts(10, seed=1)
+
+    started = time.perf_counter()
+    for _ in range(5):
+        reference = [_reference_wrap(t, font, 800) for t in texts]
+    measured = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(5):
+        cached = [service._wrap_text(t, font, 800) for t in texts]
+    layout = time.perf_counter() - started
+
+    print(f"\n[BENCH] chain wrap x5: getbbox {measured * 1000:.1f}ms, layout cache {layout * 1000:.1f}ms")
+    assert cached == reference
+    assert layout < measured
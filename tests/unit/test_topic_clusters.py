@@ -0,0 +1,154 @@
+"""Tests for incremental topic clustering and LLM-free hot topics."""
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.dailies import DailiesService
+from app.services.topic_clusters import TopicClusterService, cluster_messages
+
+BASE = datetime(2026, 10, 17, 9, 0)
+
+TOPICS = {
+    "deck": ["steam", "deck", "батарея", "эмулятор", "игры", "экран", "прошивка"],
+    "gpu": ["видеокарта", "драйвер", "nvidia", "радеон", "температура", "разгон", "память"],
+    "mortgage": ["ипотека", "банк", "ставка", "квартира", "платеж", "кредит", "процент"],
+}
+FILLER = ["сегодня", "вообще", "кстати", "думаю", "вроде", "короче", "реально"]
+
+
+def _chat(count=300, seed=0):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        topic = rng.choice(list(TOPICS))
+        words = rng.sample(TOPICS[topic], 3) + rng.sample(FILLER, 2)
+        rng.shuffle(words)
+        messages.append(SimpleNamespace(
+            chat_id=-1,
+            message_id=i,
+            user_id=rng.randint(1, 20),
+            text=" ".join(words),
+            created_at=BASE + timedelta(minutes=2 * i),
+            topic=topic,
+        ))
+    return messages
+
+
+def _purity(messages, summaries):
+    """Share of each true topic's messages whose best-matching cluster is the topic's main one."""
+    assigned = {}
+    for msg in messages:
+        words = set(msg.text.split())
+        assigned[msg.message_id] = max(
+            summaries, key=lambda s: len(words & set(s.terms))
+        ).cluster_id
+    result = {}
+    for name in TOPICS:
+        ids = [assigned[m.message_id] for m in messages if m.topic == name]
+        result[name] = max(ids.count(c) for c in set(ids)) / len(ids)
+    return result
+
+
+def test_clusters_recover_topics():
+    messages = _chat()
+    summaries = cluster_messages(messages, limit=8)
+
+    assert len(summaries) >= 3
+    top3 = summaries[:3]
+    assert sum(s.count for s in top3) >= 0.9 * len(messages)
+    vocab = {name: set(words) for name, words in TOPICS.items()}
+    found = {
+        name for s in top3 for name, words in vocab.items()
+        if set(s.terms[:3]) <= words
+    }
+    assert found == set(TOPICS)
+    assert all(s.message_id is not None and s.sample for s in top3)
+    assert min(_purity(messages, summaries).values()) >= 0.9
+
+
+def test_online_matches_rebuild_and_windows():
+    """Incremental state gives the same clusters as a rebuild over the same messages."""
+    messages = _chat(240, seed=1)
+    service = TopicClusterService()
+    service.tracking_since = BASE
+    for msg in messages:
+        service.record(msg)
+
+    start, end = BASE, BASE + timedelta(hours=24)
+    online = service.top_clusters(-1, start, end)
+    rebuilt = cluster_messages(messages)
+    assert [(s.terms, s.count) for s in online] == [(s.terms, s.count) for s in rebuilt]
+
+    # Окно в 2 часа: только сообщения за эти часы
+    window = service.top_clusters(-1, BASE + timedelta(hours=2), BASE + timedelta(hours=4))
+    in_window = [m for m in messages if BASE + timedelta(hours=2) <= m.created_at < BASE + timedelta(hours=4)]
+    assert sum(s.count for s in window) <= len(in_window)
+    assert sum(s.count for s in window) >= 0.8 * len(in_window)
+
+    # Период до запуска — онлайн-состояния нет, нужна перестройка по БД
+    assert service.top_clusters(-1, BASE - timedelta(hours=1), end) is None
+    assert service.top_clusters(-999, start, end) == []
+
+
+def test_partial_state_falls_back_to_rebuild():
+    """A process that saw only part of the chat (restart, other replica) defers to the DB."""
+    messages = _chat(240, seed=2)
+    start, end = BASE, BASE + timedelta(hours=24)
+    replica = TopicClusterService()
+    replica.tracking_since = BASE
+    for msg in messages[::2]:
+        replica.record(msg)
+
+    assert replica.messages_between(-1, start, end) == 120
+    assert replica.top_clusters(-1, start, end, expected_messages=240) is None
+    assert replica.top_clusters(-1, start, end, expected_messages=125)
+    assert replica.top_clusters(-999, start, end, expected_messages=10) is None
+
+
+@pytest.mark.asyncio
+async def test_hot_topics_prompt_is_small(monkeypatch):
+    """The LLM only names clusters: the prompt is a fraction of the raw-message prompt."""
+    import app.services.ollama_client as ollama_client
+
+    messages = _chat()
+    summaries = cluster_messages(messages)
+    prompts = []
+
+    async def fake_chat(llm_messages, temperature=0.3, **kwargs):
+        prompts.append(llm_messages[-1]["content"])
+        return '[{"id": %d, "topic": "🎮 Steam Deck"}]' % summaries[0].cluster_id
+
+    monkeypatch.setattr(ollama_client, "_ollama_chat", fake_chat)
+    names = await DailiesService()._name_topic_clusters(summaries)
+
+    assert names == {summaries[0].cluster_id: "🎮 Steam Deck"}
+    raw_prompt = sum(len(m.text[:200]) + 20 for m in messages[:100])
+    assert len(prompts[0]) * 5 < raw_prompt
+
+
+@pytest.mark.asyncio
+async def test_hot_topics_without_llm(monkeypatch):
+    """When naming fails the summary still gets deterministic keyword labels and counts."""
+    import app.services.ollama_client as ollama_client
+    from app.services import topic_clusters as module
+
+    async def broken_chat(*args, **kwargs):
+        raise RuntimeError("ollama down")
+
+    service = TopicClusterService()
+    service.tracking_since = BASE
+    for msg in _chat():
+        service.record(msg)
+    monkeypatch.setattr(ollama_client, "_ollama_chat", broken_chat)
+    monkeypatch.setattr(module, "topic_clusters", service)
+
+    dailies = DailiesService()
+    first = await dailies._extract_hot_topics(-1, BASE, BASE + timedelta(hours=12), session=None)
+    second = await dailies._extract_hot_topics(-1, BASE, BASE + timedelta(hours=12), session=None)
+
+    assert first == second
+    assert len(first) >= 3
+    assert all(t["keyword"] and t["mentions"] >= 3 and t["message_id"] is not None for t in first)
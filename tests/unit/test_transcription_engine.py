@@ -0,0 +1,136 @@
+"""Tests for the off-loop Whisper transcription engine."""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services import voice_recognition
+from app.services.metrics import metrics
+from app.services.voice_recognition import (
+    SAMPLE_RATE,
+    FairQueue,
+    TranscriptionEngine,
+    TranscriptionQueueFull,
+)
+
+
+class FakeModel:
+    """Блокирующая «модель»: декодирование занимает delay секунд."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.threads = set()
+
+    def transcribe(self, audio, **options):
+        self.calls.append((audio, options))
+        self.threads.add(threading.current_thread().name)
+
+        def segments():
+            time.sleep(self.delay)
+            yield SimpleNamespace(text=f" {audio[0]:.0f} ")
+
+        return segments(), SimpleNamespace(duration=len(audio) / SAMPLE_RATE)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(voice_recognition, "_whisper_model", fake)
+    monkeypatch.setattr(voice_recognition, "_batched_pipeline", None)
+    return fake
+
+
+def _audio(tag, seconds=1.0):
+    audio = np.zeros(int(SAMPLE_RATE * seconds), dtype=np.float32)
+    audio[0] = tag
+    return audio
+
+
+@pytest.mark.asyncio
+async def test_fair_queue_round_robin_and_bounds():
+    queue = FairQueue(maxsize=5, per_key=3)
+    for item in ("a1", "a2", "a3"):
+        queue.put_nowait("a", item)
+    with pytest.raises(TranscriptionQueueFull):
+        queue.put_nowait("a", "a4")
+    queue.put_nowait("b", "b1")
+    queue.put_nowait("c", "c1")
+    with pytest.raises(TranscriptionQueueFull):
+        queue.put_nowait("d", "d1")
+
+    order = [await queue.get() for _ in range(5)]
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+    assert queue.qsize() == 0
+
+
+@pytest.mark.asyncio
+async def test_decode_runs_off_loop_with_configured_options(model):
+    engine = TranscriptionEngine(workers=1, queue_size=8, per_chat=4)
+    ticks = 0
+    stop = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        texts = await asyncio.gather(*(engine.transcribe(_audio(i), chat_id=-1) for i in range(3)))
+    finally:
+        stop.set()
+        await ticker_task
+        await engine.stop()
+
+    assert texts == ["0", "1", "2"]
+    # 3 × 50 мс блокирующего декодирования — event loop всё это время тикал
+    assert ticks >= 10
+    assert all(name.startswith("whisper") for name in model.threads)
+    options = model.calls[0][1]
+    assert options["language"] == "ru"
+    assert "beam_size" in options and "vad_filter" in options
+
+
+@pytest.mark.asyncio
+async def test_chats_are_served_fairly(model):
+    engine = TranscriptionEngine(workers=1, queue_size=16, per_chat=8)
+    done = []
+
+    async def job(chat_id, tag):
+        await engine.transcribe(_audio(tag), chat_id=chat_id)
+        done.append(chat_id)
+
+    try:
+        # Чат -1 завалил очередь, чат -2 прислал одно голосовое позже
+        spam = [asyncio.create_task(job(-1, i)) for i in range(6)]
+        await asyncio.sleep(0)
+        late = asyncio.create_task(job(-2, 99))
+        await asyncio.gather(*spam, late)
+    finally:
+        await engine.stop()
+    assert done.index(-2) <= 2
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_full_and_records_rtf(model):
+    await metrics.reset()
+    engine = TranscriptionEngine(workers=1, queue_size=2, per_chat=1)
+    try:
+        first = asyncio.create_task(engine.transcribe(_audio(1), chat_id=-1))
+        await asyncio.sleep(0)
+        with pytest.raises(TranscriptionQueueFull):
+            await engine.transcribe(_audio(2), chat_id=-1)
+        assert await first == "1"
+    finally:
+        await engine.stop()
+
+    text = await metrics.get_metrics()
+    assert 'whisper_jobs_total{status="ok"} 1' in text
+    assert "whisper_real_time_factor" in text
+    assert "whisper_queue_depth" in text
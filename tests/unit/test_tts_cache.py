@@ -0,0 +1,93 @@
+"""Tests for the TTS audio cache."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import media_registry as media_registry_module
+from app.services import tts_cache as tts_cache_module
+from app.services.media_registry import MediaRegistry
+from app.services.tts import TTSService
+from app.services.tts_cache import TTSCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSCache(str(tmp_path / "tts"), memory_limit_bytes=250, disk_limit_bytes=350)
+
+
+def test_key_normalizes_text_but_not_voice_settings():
+    base = cache_key("Привет,  мир!", "ru-RU-DmitryNeural", "-15Hz", "+0%")
+    assert cache_key(" Привет, мир!\n", "ru-RU-DmitryNeural", "-15Hz", "+0%") == base
+    assert cache_key("Привет, мир!", "ru-RU-DmitryNeural", "-10Hz", "+0%") != base
+    assert cache_key("Привет, мир!", "ru-RU-SvetlanaNeural", "-15Hz", "+0%") != base
+
+
+@pytest.mark.asyncio
+async def test_memory_and_disk_lru(cache, tmp_path):
+    for i in range(3):
+        await cache.put(f"k{i}", bytes([i]) * 100)
+    # Память: 250 байт — k0 вытеснен, но остался на диске
+    assert "k0" not in cache._memory
+    assert await cache.get("k0") == bytes([0]) * 100
+
+    # Диск: 350 байт — четвёртая запись вытесняет давно не читанную k1
+    await cache.put("k3", b"3" * 100)
+    assert await cache.get("k1") is None
+    assert cache.get_stats()["disk_bytes"] <= 350
+
+    # Новый процесс видит диск
+    fresh = TTSCache(cache.cache_dir, memory_limit_bytes=250, disk_limit_bytes=350)
+    assert await fresh.get("k3") == b"3" * 100
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_synthesize_once(cache):
+    calls = 0
+
+    async def synthesize():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"audio"
+
+    results = await asyncio.gather(*(cache.get_or_create("same", synthesize) for _ in range(5)))
+    assert results == [b"audio"] * 5
+    assert await cache.get_or_create("same", synthesize) == b"audio"
+    assert calls == 1
+
+
+class FakeSender:
+    def __init__(self):
+        self.sent = []
+
+    async def __call__(self, voice, **kwargs):
+        self.sent.append(("id", voice) if isinstance(voice, str) else ("upload", voice.data))
+        return SimpleNamespace(voice=SimpleNamespace(file_id=f"fid-{len(self.sent)}"))
+
+
+@pytest.mark.asyncio
+async def test_repeats_skip_synthesis_and_upload(cache, monkeypatch):
+    monkeypatch.setattr(tts_cache_module, "tts_cache", cache)
+    monkeypatch.setattr(media_registry_module, "media_registry", MediaRegistry(ttl_seconds=60))
+    service = TTSService(use_cache=True)
+    synthesized = []
+
+    async def fake_edge(text, persona="oleg"):
+        synthesized.append(text)
+        return f"mp3:{text}".encode()
+
+    monkeypatch.setattr(service, "_generate_edge_tts", fake_edge)
+    sender = FakeSender()
+
+    for _ in range(3):
+        result = await service.generate_voice("Ну и зачем?", persona="dude")
+        await service.send_voice(sender, result, duration=1)
+
+    assert synthesized == ["Ну и зачем?"]
+    assert sender.sent == [("upload", "mp3:Ну и зачем?".encode()), ("id", "fid-1"), ("id", "fid-1")]
+
+    # Другая персона — другой голос, свой звук
+    await service.generate_voice("Ну и зачем?", persona="anime")
+    assert len(synthesized) == 2
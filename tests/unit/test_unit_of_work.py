@@ -0,0 +1,223 @@
+"""Tests for the request-scoped unit of work and query instrumentation."""
+
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.session import Base
+from app.database import models  # noqa: F401
+from app.database.models import User
+from app.database.unit_of_work import (
+    UnitOfWork,
+    current_unit_of_work,
+    db_metrics,
+    instrument_engine,
+    session_scope,
+    track_queries,
+)
+
+
+@pytest.fixture
+async def session_factory():
+    """In-memory SQLite with instrumentation attached."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    db_metrics.reset()
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_track_queries_counts_statements(session_factory):
+    """Every executed statement is counted in the current scope and globally."""
+    async with track_queries("test") as stats:
+        async with session_factory() as session:
+            for _ in range(3):
+                await session.execute(select(User).where(User.tg_user_id == 1))
+
+    assert stats.query_count == 3
+    assert stats.query_time > 0
+    assert stats.pool_checkouts >= 1
+    assert stats.most_repeated()[0][1] == 3
+    assert db_metrics.total_queries >= 3
+
+
+@pytest.mark.asyncio
+async def test_n_plus_one_warning(session_factory, caplog):
+    """More than K queries in one scope logs an N+1 warning."""
+    with caplog.at_level(logging.WARNING, logger="app.database.unit_of_work"):
+        async with track_queries("/whois", warn_threshold=2):
+            async with session_factory() as session:
+                for user_id in range(5):
+                    await session.execute(select(User).where(User.tg_user_id == user_id))
+
+    assert "[DB N+1] /whois: 5 queries" in caplog.text
+    assert db_metrics.n_plus_one_warnings == 1
+
+
+@pytest.mark.asyncio
+async def test_no_warning_under_threshold(session_factory, caplog):
+    """Scopes under the threshold stay quiet."""
+    with caplog.at_level(logging.WARNING, logger="app.database.unit_of_work"):
+        async with track_queries("/balance", warn_threshold=10):
+            async with session_factory() as session:
+                await session.execute(select(User))
+
+    assert "[DB N+1]" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_session_scope_shares_session_within_unit_of_work(session_factory):
+    """Services inside one update get the same session and one commit at the end."""
+    async with UnitOfWork(session_factory) as uow:
+        async with session_scope() as first:
+            first.add(User(tg_user_id=42, username="first"))
+        async with session_scope() as second:
+            assert second is first
+            async with session_scope() as nested:
+                assert nested is first
+        assert current_unit_of_work() is uow
+
+    assert current_unit_of_work() is None
+    async with session_factory() as session:
+        result = await session.execute(select(User).where(User.tg_user_id == 42))
+        assert result.scalars().first() is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_scope_rolls_back_only_its_own_work(session_factory):
+    """An exception discards the failing scope's changes, not earlier scopes'."""
+    with pytest.raises(RuntimeError):
+        async with UnitOfWork(session_factory):
+            async with session_scope() as session:
+                session.add(User(tg_user_id=6, username="kept"))
+            async with session_scope() as session:
+                session.add(User(tg_user_id=7, username="ghost"))
+                await session.flush()
+                raise RuntimeError("handler failed")
+
+    async with session_factory() as session:
+        result = await session.execute(select(User.tg_user_id).where(User.tg_user_id.in_([6, 7])))
+        assert result.scalars().all() == [6]
+
+
+@pytest.mark.asyncio
+async def test_scope_releases_connection_between_scopes(session_factory):
+    """No transaction (and no pooled connection) is held between scopes of one update."""
+    async with UnitOfWork(session_factory):
+        async with session_scope() as session:
+            user = User(tg_user_id=8, username="cached")
+            session.add(user)
+        assert not session.in_transaction()
+        assert db_metrics.pool_checked_out == 0
+        # Загруженные атрибуты читаются и после выхода из scope
+        assert user.username == "cached"
+
+        # Как будто хендлер ждёт LLM — затем следующий сервис
+        async with session_scope() as again:
+            result = await again.execute(select(User).where(User.tg_user_id == 8))
+            assert result.scalars().one().username == "cached"
+
+
+@pytest.mark.asyncio
+async def test_next_scope_sees_changes_from_other_sessions(session_factory):
+    """A later scope reads the row, not the object cached by an earlier scope."""
+    async with session_factory() as setup:
+        setup.add(User(tg_user_id=9, username="before"))
+        await setup.commit()
+
+    async with UnitOfWork(session_factory):
+        async with session_scope() as session:
+            result = await session.execute(select(User).where(User.tg_user_id == 9))
+            # Хендлер держит объект — он остаётся в identity map (weakref)
+            seen = result.scalars().one()
+            assert seen.username == "before"
+
+        # Другой апдейт меняет строку между scope'ами
+        async with session_factory() as other:
+            result = await other.execute(select(User).where(User.tg_user_id == 9))
+            result.scalars().one().username = "after"
+            await other.commit()
+
+        async with session_scope() as session:
+            result = await session.execute(select(User).where(User.tg_user_id == 9))
+            user = result.scalars().one()
+            assert user.username == "after"
+            assert seen.username == "before"
+            user.username = user.username + "!"
+
+    async with session_factory() as session:
+        result = await session.execute(select(User.username).where(User.tg_user_id == 9))
+        assert result.scalar_one() == "after!"
+
+
+@pytest.mark.asyncio
+async def test_background_task_gets_its_own_session(session_factory):
+    """create_task copies the contextvar, but the task must not share the update's session."""
+    sessions = []
+
+    async def background():
+        async with session_scope() as session:
+            sessions.append(session)
+            await session.execute(select(User))
+
+    async with UnitOfWork(session_factory) as uow:
+        async with session_scope() as session:
+            sessions.append(session)
+        # Задача работает, пока единица работы апдейта ещё открыта
+        await asyncio.create_task(background())
+        assert not uow.closed
+
+    assert sessions[0] is not sessions[1]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tasks_get_separate_sessions(session_factory):
+    """A second task never uses the shared session while another task holds it."""
+    seen = []
+    release = asyncio.Event()
+
+    async def holder():
+        async with session_scope() as session:
+            seen.append(session)
+            await release.wait()
+
+    async def other():
+        async with session_scope() as session:
+            seen.append(session)
+        release.set()
+
+    async with UnitOfWork(session_factory):
+        await asyncio.gather(holder(), other())
+
+    assert len(seen) == 2
+    assert seen[0] is not seen[1]
+
+
+@pytest.mark.asyncio
+async def test_closed_unit_of_work_falls_back(session_factory):
+    """Background tasks that outlive the update get their own session."""
+    async with UnitOfWork(session_factory) as uow:
+        pass
+
+    assert uow.closed
+    assert current_unit_of_work() is None
+    with pytest.raises(RuntimeError):
+        _ = uow.session
+
+
+@pytest.mark.asyncio
+async def test_session_scope_passes_caller_session_through(session_factory):
+    """A caller-provided session is used as is and left open and uncommitted."""
+    async with session_factory() as own:
+        async with UnitOfWork(session_factory):
+            async with session_scope(own) as session:
+                assert session is own
+                session.add(User(tg_user_id=10, username="pending"))
+        assert own.in_transaction()
+        await own.rollback()
@@ -0,0 +1,100 @@
+"""Tests for the pre-encoded video note template cache."""
+
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+from app.services import media_pipe
+from app.services.video_note_templates import VideoNoteTemplateCache, mp3_duration
+
+# Заменитель ffmpeg: пишет argv в лог; выход в файл — "segment", в pipe:1 — "video"
+FAKE_FFMPEG = """#!{python}
+import json, sys
+args = sys.argv[1:]
+with open({log!r}, "a") as log:
+    log.write(json.dumps(args) + "\\n")
+if args[-1] == "pipe:1":
+    sys.stdout.buffer.write(b"video")
+else:
+    with open(args[-1], "wb") as out:
+        out.write(b"segment")
+"""
+
+
+def _mp3(seconds: float, kbps: int = 48) -> bytes:
+    # MPEG-2 Layer III, 48 кбит/с, 24 кГц (как у Edge TTS)
+    header = bytes([0xFF, 0xF3, 0x64, 0xC4])
+    return b"ID3\x04\x00\x00\x00\x00\x00\x02ab" + header + b"\x00" * (int(seconds * kbps * 1000 / 8) - 4)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    log = tmp_path / "calls.log"
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    path = bin_dir / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable, log=str(log)))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setattr(media_pipe, "_ffmpeg_available", None)
+
+    def calls():
+        return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+    return calls
+
+
+@pytest.fixture
+def cache(tmp_path):
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    for name in ("default", "thedude"):
+        (templates / f"{name}.mp4").write_bytes(b"template")
+    return VideoNoteTemplateCache(str(templates), str(tmp_path / "cache"), buckets=[5, 10, 60])
+
+
+def test_mp3_duration_and_buckets(cache):
+    assert mp3_duration(_mp3(7.5)) == pytest.approx(7.5, abs=0.01)
+    assert mp3_duration(b"not an mp3 at all") is None
+    assert cache.bucket_for(3.0) == 5
+    assert cache.bucket_for(4.5) == 10  # запас в секунду
+    assert cache.bucket_for(120.0) == 60
+    assert cache.bucket_for(None) == 60
+
+
+@pytest.mark.asyncio
+async def test_segment_encoded_once_then_stream_copied(cache, fake_ffmpeg):
+    template = os.path.join(cache.template_dir, "default.mp4")
+
+    assert await cache.assemble(template, _mp3(3.0)) == b"video"
+    assert await cache.assemble(template, _mp3(2.0)) == b"video"
+    assert await cache.assemble(template, _mp3(8.0)) == b"video"
+
+    calls = fake_ffmpeg()
+    encodes = [c for c in calls if "libx264" in c]
+    assembles = [c for c in calls if c[-1] == "pipe:1"]
+    # x264 — по разу на корзину (5 и 10 с), сборка — копированием видео
+    assert [c[c.index("-t") + 1] for c in encodes] == ["5", "10"]
+    assert len(assembles) == 3
+    assert all(c[c.index("-c:v") + 1] == "copy" for c in assembles)
+    assert cache.get_stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_warm_up_encodes_all_and_drops_stale(cache, fake_ffmpeg):
+    os.makedirs(cache.cache_dir)
+    stale = os.path.join(cache.cache_dir, "removed_0123456789_5s.mp4")
+    open(stale, "wb").close()
+
+    assert await cache.warm_up() == 6
+    assert not os.path.exists(stale)
+    assert await cache.warm_up() == 0
+
+    # Изменённый шаблон получает новые сегменты
+    template = os.path.join(cache.template_dir, "thedude.mp4")
+    os.utime(template, ns=(0, 10**9))
+    assert await cache.warm_up() == 3
+    assert len(os.listdir(cache.cache_dir)) == 6
@@ -0,0 +1,140 @@
+"""Tests for the bounded vision request queue and image preparation."""
+
+import asyncio
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from app.services import vision_pipeline as vp
+from app.services.metrics import metrics
+from app.services.redis_client import redis_client
+from app.services.vision_queue import VisionQueue, VisionQueueFull, prepare_image
+
+
+def _photo(size, seed=0, fmt="JPEG", mode="RGB") -> bytes:
+    rng = random.Random(seed)
+    small = Image.new(mode, (16, 12))
+    small.putdata([tuple(rng.randrange(256) for _ in mode) for _ in range(16 * 12)])
+    buffer = io.BytesIO()
+    small.resize(size, Image.Resampling.BICUBIC).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_large_photo_is_downscaled_for_the_model():
+    original = _photo((4000, 3000))
+    prepared = prepare_image(original, max_side=1024)
+    with Image.open(io.BytesIO(prepared)) as image:
+        assert image.format == "JPEG" and image.size == (1024, 768)
+    # Пикселей в ~15 раз меньше — запрос к модели легчает в разы, а не на проценты
+    assert len(prepared) * 4 < len(original)
+
+
+def test_small_images_and_garbage_pass_through():
+    small = _photo((800, 600))
+    assert prepare_image(small, max_side=1024) is small
+    assert prepare_image(b"not an image", max_side=1024) == b"not an image"
+
+    # Прозрачный стикер: фон белый, а не чёрный
+    sticker = Image.new("RGBA", (2000, 2000), (0, 0, 0, 0))
+    buffer = io.BytesIO()
+    sticker.save(buffer, format="WEBP")
+    with Image.open(io.BytesIO(prepare_image(buffer.getvalue(), max_side=512))) as image:
+        assert image.size == (512, 512) and image.getpixel((0, 0)) == (255, 255, 255)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_chat_fairness():
+    queue = VisionQueue(concurrency=2, queue_size=16, per_chat=8)
+    in_flight = peak = 0
+    done = []
+
+    async def request(chat_id):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        done.append(chat_id)
+        return chat_id
+
+    try:
+        # Чат -1 прислал альбом, чат -2 — одно фото чуть позже
+        spam = [asyncio.create_task(queue.run(lambda: request(-1), chat_id=-1)) for _ in range(6)]
+        await asyncio.sleep(0)
+        late = asyncio.create_task(queue.run(lambda: request(-2), chat_id=-2))
+        results = await asyncio.gather(*spam, late)
+    finally:
+        await queue.stop()
+
+    assert results == [-1] * 6 + [-2]
+    assert peak == 2
+    assert done.index(-2) <= 3
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_chat_queue_is_full():
+    queue = VisionQueue(concurrency=1, queue_size=8, per_chat=1)
+    gate = asyncio.Event()
+    try:
+        first = asyncio.create_task(queue.run(gate.wait, chat_id=-1))
+        await asyncio.sleep(0)  # первый запрос занял слот
+        second = asyncio.create_task(queue.run(gate.wait, chat_id=-1))
+        await asyncio.sleep(0)
+        with pytest.raises(VisionQueueFull):
+            await queue.run(gate.wait, chat_id=-1)
+        gate.set()
+        assert await first and await second
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_timeout_excludes_time_spent_in_queue():
+    queue = VisionQueue(concurrency=1, queue_size=8, per_chat=8)
+
+    async def request(seconds):
+        await asyncio.sleep(seconds)
+        return seconds
+
+    try:
+        busy = asyncio.create_task(queue.run(lambda: request(0.2), chat_id=-1))
+        await asyncio.sleep(0)
+        # Ждёт в очереди 0.2 с, но сам запрос укладывается в 0.1 с
+        assert await queue.run(lambda: request(0.01), chat_id=-2, timeout=0.1) == 0.01
+        assert await busy == 0.2
+        with pytest.raises(asyncio.TimeoutError):
+            await queue.run(lambda: request(0.3), chat_id=-2, timeout=0.05)
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_sends_prepared_image_and_caches_per_prompt(monkeypatch):
+    monkeypatch.setattr(redis_client, "_available", False)
+    monkeypatch.setattr(vp, "vision_queue", VisionQueue(concurrency=1, queue_size=4, per_chat=4, max_side=512))
+    await metrics.reset()
+    sent = []
+
+    async def fake_request(image_data, prompt):
+        sent.append((Image.open(io.BytesIO(image_data)).size, prompt))
+        return f"description {len(sent)}"
+
+    pipeline = vp.VisionPipeline()
+    monkeypatch.setattr(pipeline, "_request_description", fake_request)
+    photo = _photo((2048, 1536), seed=42)
+    hardware = pipeline.SPECIALIZED_PROMPTS[vp.ImageType.HARDWARE]
+    try:
+        assert await pipeline._get_image_description(photo, chat_id=-1) == "description 1"
+        assert await pipeline._get_image_description(photo, chat_id=-1) == "description 1"
+        # Специализированный промпт — отдельный запрос, а не общее описание из кэша
+        assert await pipeline._get_image_description(photo, hardware, chat_id=-1) == "description 2"
+    finally:
+        await vp.vision_queue.stop()
+
+    assert sent == [((512, 384), pipeline.VISION_DESCRIPTION_PROMPT), ((512, 384), hardware)]
+    text = await metrics.get_metrics()
+    assert 'vision_step_seconds{step="prepare"}' in text
+    assert 'vision_step_seconds{step="queue"}' in text
+    assert 'vision_requests_total{status="ok"} 2' in text